@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+
+"""
+Compare what Dinor3x's devices cost before and after they came from the
+shared device pool (deviceregistry.py), on a fake sysfs tree. No EV3
+needed.
+
+"before" makes the devices the way Dinor3x.__init__ used to: a
+MediumMotor, two LargeMotors, a MoveTank and a MoveSteering with two more
+LargeMotors each, the three sensors and Sound, and the roar in a
+ClipCache as Dinor3x loads it now, so only the devices differ. "after" is
+Dinor3x() itself.
+Both then drive every motor and read every sensor once, the way a walk, a
+turn and a roar would, so each motor object opens the files it uses.
+
+Each is measured in its own Python process, --repeat times:
+
+    build     making the robot
+    drive     driving it the first time, which now makes the devices
+    devices   ev3dev2 devices made
+    files     sysfs attribute files left open
+    heap      bytes Python holds for the robot, from tracemalloc
+    rss       how much the resident memory grew, in kB
+
+    $ ./bench_pool.py --repeat 50
+"""
+
+import argparse
+import gc
+import json
+import os
+import subprocess
+import sys
+import time
+import tracemalloc
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'common'))
+from clipcache import ClipCache
+from deviceregistry import registry, resident_kb, sysfs_files
+from fakesys import FakeSys
+from sensorsnapshot import SensorSnapshot
+
+from ev3dev2 import Device
+from ev3dev2.motor import LargeMotor, MediumMotor, MoveTank, MoveSteering, OUTPUT_A, OUTPUT_B, OUTPUT_C
+from ev3dev2.sensor import INPUT_1, INPUT_3, INPUT_4
+from ev3dev2.sensor.lego import TouchSensor, ColorSensor, InfraredSensor
+from ev3dev2.sound import Sound
+
+
+class EagerDinor3x(object):
+    """
+    Dinor3x's devices as Dinor3x.__init__ made them before the pool
+    """
+
+    def __init__(self):
+        self.jaw_motor = MediumMotor(address=OUTPUT_A)
+
+        self.left_motor = LargeMotor(address=OUTPUT_B)
+        self.right_motor = LargeMotor(address=OUTPUT_C)
+        self.tank_driver = MoveTank(left_motor_port=OUTPUT_B, right_motor_port=OUTPUT_C, motor_class=LargeMotor)
+        self.steer_driver = MoveSteering(left_motor_port=OUTPUT_B, right_motor_port=OUTPUT_C, motor_class=LargeMotor)
+
+        self.touch_sensor = TouchSensor(address=INPUT_1)
+        self.color_sensor = ColorSensor(address=INPUT_3)
+        self.color_sensor.mode = ColorSensor.MODE_COL_COLOR
+
+        self.ir_sensor = InfraredSensor(address=INPUT_4)
+        self.ir_sensor.mode = InfraredSensor.MODE_IR_REMOTE
+
+        self.sensors = SensorSnapshot()
+        self.sensors.add('color', self.color_sensor, 'value0', int)
+        self.sensors.add('ir_buttons', self.ir_sensor, 'value0', int)
+
+        self.speaker = Sound()
+
+        self.clips = ClipCache()
+        self.clips.load(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'T-rex roar.wav'))
+
+
+def pooled_dinor3x():
+    from dinor3x import Dinor3x
+    return Dinor3x()
+
+
+def drive(robot):
+    robot.tank_driver.on(left_speed=10, right_speed=20)
+    robot.tank_driver.off(brake=True)
+    robot.steer_driver.on(steering=0, speed=-40)
+    robot.steer_driver.off()
+
+    for motor in (robot.left_motor, robot.right_motor, robot.jaw_motor):
+        motor.on(speed=40)
+        motor.off(brake=True)
+
+    robot.touch_sensor.is_pressed
+    robot.sensors.tick()
+    robot.sensors.get('color')
+    robot.sensors.get('ir_buttons')
+
+
+class DeviceCounter(object):
+
+    def __init__(self):
+        self.made = 0
+        device_init = Device.__init__
+
+        def counting_init(device, *args, **kwargs):
+            self.made += 1
+            device_init(device, *args, **kwargs)
+
+        Device.__init__ = counting_init
+
+
+def measure(make, repeat):
+    """
+    Runs in the child process, returns the numbers for one variant
+    """
+    counter = DeviceCounter()
+    builds = []
+    drives = []
+    first = None
+
+    for i in range(repeat):
+        registry.clear()
+        gc.collect()
+
+        if first is None:
+            rss = resident_kb()
+            tracemalloc.start()
+
+        start = time.perf_counter()
+        robot = make()
+        built = time.perf_counter()
+        drive(robot)
+        driven = time.perf_counter()
+        builds.append(built - start)
+        drives.append(driven - built)
+
+        if first is None:
+            first = {
+                'devices': counter.made,
+                'files': sysfs_files(),
+                'heap': tracemalloc.get_traced_memory()[0],
+                'rss': resident_kb() - rss,
+            }
+            tracemalloc.stop()
+
+        robot.sensors.close()
+        del robot
+
+    builds.sort()
+    drives.sort()
+    first['build'] = builds[len(builds) // 2]
+    first['drive'] = drives[len(drives) // 2]
+    return first
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Compare Dinor3x's devices before and after the device pool")
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument('--variant', choices=('before', 'after'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.variant:
+        fake = FakeSys()
+
+        try:
+            fake.add_motor('ev3-ports:outA', 'lego-ev3-m-motor')
+            fake.add_motor('ev3-ports:outB')
+            fake.add_motor('ev3-ports:outC')
+            fake.add_sensor('ev3-ports:in1', 'lego-ev3-touch')
+            fake.add_sensor('ev3-ports:in3', 'lego-ev3-color', 'COL-COLOR')
+            fake.add_sensor('ev3-ports:in4', 'lego-ev3-ir', 'IR-REMOTE')
+            fake.install()
+
+            # Imported before anything is measured
+            import dinor3x
+
+            make = EagerDinor3x if args.variant == 'before' else pooled_dinor3x
+            print(json.dumps(measure(make, args.repeat)))
+        finally:
+            fake.cleanup()
+
+        sys.exit(0)
+
+    print("%7s %10s %10s %8s %6s %8s %8s" % ('', 'build (us)', 'drive (us)', 'devices', 'files', 'heap', 'rss (kB)'))
+
+    for variant in ('before', 'after'):
+        output = subprocess.check_output([sys.executable, os.path.abspath(__file__), '--variant', variant,
+                                          '--repeat', str(args.repeat)], universal_newlines=True)
+        result = json.loads(output.strip().splitlines()[-1])
+        print("%7s %10.0f %10.0f %8d %6d %8d %8d" % (
+            variant, 1000000 * result['build'], 1000000 * result['drive'], result['devices'],
+            result['files'], result['heap'], result['rss']))
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+
+"""
+Count the sysfs reads and time each pass of Dinor3x.main() on a fake sysfs
+tree, before and after the sensor snapshot. No EV3 needed.
+
+"before" makes the same sensor calls the decision functions used to make,
+one ev3dev2 call per check. "after" runs the real decision functions with
+one SensorSnapshot tick per pass. No buttons are pressed and no color is
+seen so every check runs and the robot never moves.
+
+    $ ./bench_sensors.py --passes 2000
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'common'))
+from fakesys import FakeSys
+
+from ev3dev2 import Device
+from ev3dev2.sensor.lego import ColorSensor
+
+
+class ReadCounter(object):
+    """
+    Counts every attribute read the ev3dev2 device classes make
+    """
+
+    def __init__(self):
+        self.reads = 0
+        self.original = Device._get_attribute
+
+        def counting_get_attribute(device, attribute, name):
+            self.reads += 1
+            return self.original(device, attribute, name)
+
+        Device._get_attribute = counting_get_attribute
+
+    def restore(self):
+        Device._get_attribute = self.original
+
+
+def before_pass(dinor3x):
+    channel = dinor3x.ir_beacon_channel
+    ir = dinor3x.ir_sensor
+
+    # roar_by_ir_beacon()
+    ir.beacon(channel=channel)
+
+    # change_speed_by_color()
+    for color in (ColorSensor.COLOR_RED, ColorSensor.COLOR_GREEN, ColorSensor.COLOR_WHITE):
+        if dinor3x.color_sensor.color == color:
+            break
+
+    # walk_by_ir_beacon()
+    (ir.top_left(channel=channel) and ir.top_right(channel=channel)) or \
+        (ir.bottom_left(channel=channel) and ir.bottom_right(channel=channel)) or \
+        ir.top_left(channel=channel) or \
+        ir.top_right(channel=channel) or \
+        ir.bottom_left(channel=channel) or \
+        ir.bottom_right(channel=channel)
+
+
+def after_pass(dinor3x):
+    dinor3x.sensors.tick()
+    dinor3x.roar_by_ir_beacon()
+    dinor3x.change_speed_by_color()
+    dinor3x.walk_by_ir_beacon()
+
+
+def measure(dinor3x, counter, function, passes):
+    """
+    Returns (sysfs reads per pass, microseconds per pass)
+    """
+    reads = counter.reads + dinor3x.sensors.reads
+    start = time.perf_counter()
+
+    for i in range(passes):
+        function(dinor3x)
+
+    elapsed = time.perf_counter() - start
+    reads = counter.reads + dinor3x.sensors.reads - reads
+    return (float(reads) / passes, 1000000 * elapsed / passes)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the Dinor3x sensor reads on a fake sysfs tree')
+    parser.add_argument('--passes', type=int, default=2000, help='number of passes of the control loop')
+    args = parser.parse_args()
+
+    fake = FakeSys()
+
+    try:
+        fake.add_motor('ev3-ports:outA', 'lego-ev3-m-motor')
+        fake.add_motor('ev3-ports:outB')
+        fake.add_motor('ev3-ports:outC')
+        fake.add_sensor('ev3-ports:in1', 'lego-ev3-touch')
+        fake.add_sensor('ev3-ports:in3', 'lego-ev3-color', 'COL-COLOR')
+        fake.add_sensor('ev3-ports:in4', 'lego-ev3-ir', 'IR-REMOTE')
+        fake.install()
+
+        from dinor3x import Dinor3x
+        dinor3x = Dinor3x()
+        counter = ReadCounter()
+
+        print("%7s %14s %12s" % ('', 'reads / pass', 'us / pass'))
+
+        for (name, function) in (('before', before_pass), ('after', after_pass)):
+            print("%7s %14.1f %12.1f" % ((name,) + measure(dinor3x, counter, function, args.passes)))
+
+        print("snapshot reads in the last tick: %d" % dinor3x.sensors.reads_per_tick)
+        counter.restore()
+        dinor3x.sensors.close()
+    finally:
+        fake.cleanup()
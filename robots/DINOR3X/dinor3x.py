@@ -1,6 +1,9 @@
 #!/usr/bin/env micropython
 
 
+import os
+import sys
+
 from ev3dev2.motor import (
     LargeMotor, MediumMotor, MoveTank, MoveSteering,
     OUTPUT_A, OUTPUT_B, OUTPUT_C
@@ -9,6 +12,12 @@ from ev3dev2.sensor import INPUT_1, INPUT_3, INPUT_4
 from ev3dev2.sensor.lego import TouchSensor, ColorSensor, InfraredSensor
 from ev3dev2.sound import Sound
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'common'))
+from clipcache import ClipCache
+from deviceregistry import registry
+from sensorsnapshot import SensorSnapshot
+from tracerecorder import TraceRecorder
+
 
 class Dinor3x:
     FAST_WALK_SPEED = 80
@@ -20,25 +29,54 @@ class Dinor3x:
             jaw_motor_port: str = OUTPUT_A,
             left_motor_port: str = OUTPUT_B, right_motor_port: str = OUTPUT_C,
             touch_sensor_port: str = INPUT_1, color_sensor_port: str = INPUT_3,
-            ir_sensor_port: str = INPUT_4, ir_beacon_channel: int = 1):
-        self.jaw_motor = MediumMotor(address=jaw_motor_port)
-
-        self.left_motor = LargeMotor(address=left_motor_port)
-        self.right_motor = LargeMotor(address=right_motor_port)
-        self.tank_driver = MoveTank(left_motor_port=left_motor_port,
-                                    right_motor_port=right_motor_port,
-                                    motor_class=LargeMotor)
-        self.steer_driver = MoveSteering(left_motor_port=left_motor_port,
+            ir_sensor_port: str = INPUT_4, ir_beacon_channel: int = 1,
+            trace_file: str = None):
+        # Nothing is read from sysfs until a device is first used, the
+        # drive helpers and the speaker may not be needed for a while. The
+        # tank and the steering drive the same two leg motors as
+        # left_motor and right_motor, not two more of their own each.
+        self.jaw_motor = registry.get(MediumMotor, jaw_motor_port)
+
+        self.left_motor = registry.get(LargeMotor, left_motor_port)
+        self.right_motor = registry.get(LargeMotor, right_motor_port)
+        self.tank_driver = registry.lazy(MoveTank,
+                                         left_motor_port=left_motor_port,
                                          right_motor_port=right_motor_port,
-                                         motor_class=LargeMotor)
+                                         motor_class=registry.shared(LargeMotor))
+        self.steer_driver = registry.lazy(MoveSteering,
+                                          left_motor_port=left_motor_port,
+                                          right_motor_port=right_motor_port,
+                                          motor_class=registry.shared(LargeMotor))
 
-        self.touch_sensor = TouchSensor(address=touch_sensor_port)
-        self.color_sensor = ColorSensor(address=color_sensor_port)
+        self.touch_sensor = registry.get(TouchSensor, touch_sensor_port)
+        self.color_sensor = registry.get(ColorSensor, color_sensor_port, mode=ColorSensor.MODE_COL_COLOR)
 
-        self.ir_sensor = InfraredSensor(address=ir_sensor_port)
+        self.ir_sensor = registry.get(InfraredSensor, ir_sensor_port, mode=InfraredSensor.MODE_IR_REMOTE)
         self.ir_beacon_channel = ir_beacon_channel
 
-        self.speaker = Sound()
+        # The color and the IR buttons are read once per pass of main(),
+        # every decision in that pass sees the same values
+        self.sensors = SensorSnapshot()
+        self.sensors.add('color', self.color_sensor, 'value0', int)
+        self.sensors.add(
+            'ir_buttons', self.ir_sensor, 'value%d' % (ir_beacon_channel - 1),
+            lambda value: InfraredSensor._BUTTON_VALUES.get(int(value), []))
+
+        self.speaker = registry.lazy(Sound)
+
+        self.clips = ClipCache()
+        self.clips.load(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'T-rex roar.wav'))
+
+        self.trace = TraceRecorder.for_devices(trace_file, [
+            ('touch', self.touch_sensor, 'value0'),
+            ('color', self.color_sensor, 'value0'),
+            ('ir', self.ir_sensor, 'value%d' % (ir_beacon_channel - 1)),
+            ('jaw_position', self.jaw_motor, 'position'),
+            ('left_position', self.left_motor, 'position'),
+            ('left_speed', self.left_motor, 'speed'),
+            ('right_position', self.right_motor, 'position'),
+            ('right_speed', self.right_motor, 'speed'),
+        ])
 
         self.roaring = False
         self.walk_speed = self.NORMAL_WALK_SPEED
@@ -47,7 +85,7 @@ class Dinor3x:
         """
         Dinor3x roars when the Beacon button is pressed
         """
-        if self.ir_sensor.beacon(channel=self.ir_beacon_channel):
+        if 'beacon' in self.sensors.get('ir_buttons'):
             self.roaring = True
             self.open_mouth()
             self.roar()
@@ -63,7 +101,9 @@ class Dinor3x:
         - Green: walk normally
         - White: walk slowly
         """
-        if self.color_sensor.color == ColorSensor.COLOR_RED:
+        color = self.sensors.get('color')
+
+        if color == ColorSensor.COLOR_RED:
             self.speaker.speak(
                 text='RUN!',
                 volume=100,
@@ -71,7 +111,7 @@ class Dinor3x:
             self.walk_speed = self.FAST_WALK_SPEED
             self.walk(speed=self.walk_speed)
 
-        elif self.color_sensor.color == ColorSensor.COLOR_GREEN:
+        elif color == ColorSensor.COLOR_GREEN:
             self.speaker.speak(
                 text='Normal',
                 volume=100,
@@ -79,7 +119,7 @@ class Dinor3x:
             self.walk_speed = self.NORMAL_WALK_SPEED
             self.walk(speed=self.walk_speed)
 
-        elif self.color_sensor.color == ColorSensor.COLOR_WHITE:
+        elif color == ColorSensor.COLOR_WHITE:
             self.speaker.speak(
                 text='slow...',
                 volume=100,
@@ -97,31 +137,30 @@ class Dinor3x:
         - Bottom Left / Red Down: stop
         - Bottom Right / Blue Down: calibrate to make the legs straight
         """
+        buttons = self.sensors.get('ir_buttons')
 
         # forward
-        if self.ir_sensor.top_left(channel=self.ir_beacon_channel) and \
-                self.ir_sensor.top_right:
+        if 'top_left' in buttons and 'top_right' in buttons:
             self.walk(speed=self.walk_speed)
 
         # backward
-        elif self.ir_sensor.bottom_left(channel=self.ir_beacon_channel) and \
-                self.ir_sensor.bottom_right(channel=self.ir_beacon_channel):
+        elif 'bottom_left' in buttons and 'bottom_right' in buttons:
             self.walk(speed=-self.walk_speed)
 
         # turn left on the spot
-        elif self.ir_sensor.top_left(channel=self.ir_beacon_channel):
+        elif 'top_left' in buttons:
             self.turn(speed=self.walk_speed)
 
         # turn right on the spot
-        elif self.ir_sensor.top_right(channel=self.ir_beacon_channel):
+        elif 'top_right' in buttons:
             self.turn(speed=-self.walk_speed)
 
         # stop
-        elif self.ir_sensor.bottom_left(channel=self.ir_beacon_channel):
+        elif 'bottom_left' in buttons:
             self.tank_driver.off(brake=True)
 
         # calibrate legs
-        elif self.ir_sensor.bottom_right(channel=self.ir_beacon_channel):
+        elif 'bottom_right' in buttons:
             self.calibrate_legs()
 
     def calibrate_legs(self):
@@ -203,10 +242,7 @@ class Dinor3x:
             brake=False)
 
     def roar(self):
-        self.speaker.play_file(
-            wav_file='T-rex roar.wav',
-            volume=100,
-            play_type=Sound.PLAY_NO_WAIT_FOR_COMPLETE)
+        self.clips.play('T-rex roar.wav')
 
         self.jaw_motor.on_for_degrees(
             speed=40,
@@ -234,14 +270,28 @@ class Dinor3x:
             block=True)
 
     def main(self):
+        self.speaker.set_volume(100)
+        self.clips.start()
         self.close_mouth()
 
-        while True:
-            self.roar_by_ir_beacon()
-            self.change_speed_by_color()
-            self.walk_by_ir_beacon()
+        try:
+            while True:
+                self.sensors.tick()
+
+                if self.trace:
+                    self.trace.sample()
+
+                self.roar_by_ir_beacon()
+                self.change_speed_by_color()
+                self.walk_by_ir_beacon()
+
+        finally:
+            self.clips.close()
+
+            if self.trace:
+                self.trace.close()
 
 
 if __name__ == '__main__':
-    DINOR3X = Dinor3x()
+    DINOR3X = Dinor3x(trace_file=sys.argv[1] if len(sys.argv) > 1 else None)
     DINOR3X.main()
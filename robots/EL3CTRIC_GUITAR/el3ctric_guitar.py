@@ -1,6 +1,9 @@
 #!/usr/bin/env micropython
 
 
+import os
+import sys
+
 from ev3dev2.motor import MediumMotor, OUTPUT_D
 from ev3dev2.sensor import INPUT_1, INPUT_4
 from ev3dev2.sensor.lego import TouchSensor, InfraredSensor
@@ -9,31 +12,54 @@ from ev3dev2.sound import Sound
 
 from time import sleep
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'common'))
+from deviceregistry import registry
+from ledanimator import LedAnimator
+from synth import ToneSynth
+from tracerecorder import TraceRecorder
+
 
 class El3ctricGuitar:
     NOTES = [1318, 1174, 987, 880, 783, 659, 587, 493, 440, 392, 329, 293]
     N_NOTES = len(NOTES)
+    POLL_INTERVAL = 0.01
 
     def __init__(
             self, lever_motor_port: str = OUTPUT_D,
-            touch_sensor_port: str = INPUT_1, ir_sensor_port: str = INPUT_4):
-        self.lever_motor = MediumMotor(address=lever_motor_port)
+            touch_sensor_port: str = INPUT_1, ir_sensor_port: str = INPUT_4,
+            trace_file: str = None):
+        # Each device is made the first time it is used
+        self.lever_motor = registry.get(MediumMotor, lever_motor_port)
+
+        self.touch_sensor = registry.get(TouchSensor, touch_sensor_port)
+
+        self.ir_sensor = registry.get(InfraredSensor, ir_sensor_port)
+
+        self.leds = registry.lazy(Leds)
 
-        self.touch_sensor = TouchSensor(address=touch_sensor_port)
+        # Flashes the LEDs while the lever is calibrated and the guitar plays
+        self.animator = LedAnimator(self.leds)
 
-        self.ir_sensor = InfraredSensor(address=ir_sensor_port)
-        
-        self.leds = Leds()
+        self.speaker = registry.lazy(Sound)
 
-        self.speaker = Sound()
+        # One continuous tone that follows the IR distance and the tremolo
+        # bar, started by main()
+        self.synth = ToneSynth()
+
+        # The IR sensor is in proximity mode so value0 is the distance
+        self.trace = TraceRecorder.for_devices(trace_file, [
+            ('touch', self.touch_sensor, 'value0'),
+            ('proximity', self.ir_sensor, 'value0'),
+            ('lever_position', self.lever_motor, 'position'),
+        ])
 
     def start_up(self):
-        self.leds.animate_flash(
+        self.animator.start()
+        self.animator.play(self.animator.flash(
             color='ORANGE',
             groups=('LEFT', 'RIGHT'),
             sleeptime=0.5,
-            duration=3,
-            block=True)
+            duration=3))
 
         self.lever_motor.on_for_seconds(
             speed=5,
@@ -51,22 +77,57 @@ class El3ctricGuitar:
 
         self.lever_motor.reset()
 
+    def note(self, proximity):
+        return self.NOTES[min(round(proximity / 5), self.N_NOTES - 1)] - 11 * self.lever_motor.position
+
     def play_music(self):
+        if not self.synth.running:
+            return self.play_tones()
+
+        # The synthesizer glides between readings, one of each is enough
+        if self.touch_sensor.is_released:
+            self.synth.glide_to(self.note(self.ir_sensor.proximity))
+        else:
+            self.synth.glide_to(None)
+
+        sleep(self.POLL_INTERVAL)
+
+    def play_tones(self):
+        """
+        A beep per note, where the synthesizer cannot play
+        """
         if self.touch_sensor.is_released:
             raw = sum(self.ir_sensor.proximity for _ in range(4)) / 4
 
             self.speaker.tone(
-                self.NOTES[min(round(raw / 5), self.N_NOTES - 1)]
-                - 11 * self.lever_motor.position,
+                self.note(raw),
                 100,
                 play_type=Sound.PLAY_WAIT_FOR_COMPLETE)
 
     def main(self):
         self.start_up()
-        while True:
-            self.play_music()
+
+        try:
+            self.synth.start()
+        except (ImportError, OSError) as e:
+            # No aplay, or micropython
+            print("cannot start the synthesizer (%s), playing beeps" % e, file=sys.stderr)
+
+        try:
+            while True:
+                if self.trace:
+                    self.trace.sample()
+
+                self.play_music()
+
+        finally:
+            self.synth.close()
+            self.animator.close()
+
+            if self.trace:
+                self.trace.close()
 
 
 if __name__ == '__main__':
-    EL3CTRIC_GUITAR = El3ctricGuitar()
+    EL3CTRIC_GUITAR = El3ctricGuitar(trace_file=sys.argv[1] if len(sys.argv) > 1 else None)
     EL3CTRIC_GUITAR.main()
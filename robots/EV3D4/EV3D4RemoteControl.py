@@ -1,16 +1,20 @@
 #!/usr/bin/env python3
 
 import logging
+import os
 import sys
 from ev3dev2.motor import OUTPUT_A, OUTPUT_B, OUTPUT_C, MediumMotor
-from ev3dev2.control.rc_tank import RemoteControlledTank
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'common'))
+from deviceregistry import registry
+from lease import LeasedRemoteControlledTank
 
-class EV3D4RemoteControlled(RemoteControlledTank):
 
-    def __init__(self, medium_motor=OUTPUT_A, left_motor=OUTPUT_C, right_motor=OUTPUT_B):
-        RemoteControlledTank.__init__(self, left_motor, right_motor)
-        self.medium_motor = MediumMotor(medium_motor)
+class EV3D4RemoteControlled(LeasedRemoteControlledTank):
+
+    def __init__(self, medium_motor=OUTPUT_A, left_motor=OUTPUT_C, right_motor=OUTPUT_B, ttl=0.3):
+        LeasedRemoteControlledTank.__init__(self, left_motor, right_motor, ttl=ttl)
+        self.medium_motor = registry.get(MediumMotor, medium_motor)
         self.medium_motor.reset()
 
 
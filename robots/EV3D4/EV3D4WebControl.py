@@ -1,20 +1,45 @@
 #!/usr/bin/env python3
 
+import argparse
 import logging
+import os
 import sys
-from ev3dev2.motor import OUTPUT_A, OUTPUT_B, OUTPUT_C, MediumMotor
+from ev3dev2.motor import OUTPUT_A, OUTPUT_B, OUTPUT_C, LargeMotor, MediumMotor
 from ev3dev2.control.webserver import WebControlledTank
+from assets import AssetTable
+from telemetry import Telemetry
+from webcontrol import EV3D4WebHandler, TankControl, PooledWebServer
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'common'))
+from deviceregistry import registry
 
 
 class EV3D4WebControlled(WebControlledTank):
 
-    def __init__(self, medium_motor=OUTPUT_A, left_motor=OUTPUT_C, right_motor=OUTPUT_B):
-        WebControlledTank.__init__(self, left_motor, right_motor)
-        self.medium_motor = MediumMotor(medium_motor)
+    def __init__(self, medium_motor=OUTPUT_A, left_motor=OUTPUT_C, right_motor=OUTPUT_B, port_number=8000, record=None):
+        # Every motor comes from the registry, shared with anything else
+        # that drives the same port
+        WebControlledTank.__init__(self, left_motor, right_motor, port_number,
+                                   motor_class=registry.shared(LargeMotor))
+        self.medium_motor = registry.get(MediumMotor, medium_motor)
         self.medium_motor.reset()
 
+        # Commands come in over a WebSocket, or a GET each as a fallback
+        self.control = TankControl(self, record)
+        self.telemetry = Telemetry(self, self.control)
+
+        # Read, hash and gzip the web interface once instead of per request
+        self.assets = AssetTable(os.path.dirname(os.path.abspath(__file__)))
+
+        # A phone has a WebSocket and a telemetry stream open
+        self.www = PooledWebServer(self, EV3D4WebHandler, port_number, max_streams=8)
+
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Control EV3D4 from a web browser')
+    parser.add_argument('--port', type=int, default=8000, help='port for the web server')
+    parser.add_argument('--record', help='write every command to this file, for loadtest.py --trace')
+    args = parser.parse_args()
 
     # Change level to logging.INFO to make less chatty
     logging.basicConfig(level=logging.DEBUG,
@@ -26,6 +51,8 @@ if __name__ == '__main__':
     logging.addLevelName(logging.WARNING, "\033[91m%s\033[0m" % logging.getLevelName(logging.WARNING))
 
     log.info("Starting EV3D4")
-    ev3d4 = EV3D4WebControlled()
+    ev3d4 = EV3D4WebControlled(port_number=args.port, record=args.record)
     ev3d4.main()  # start the web server
+    ev3d4.telemetry.close()
+    ev3d4.control.close()
     log.info("Exiting EV3D4")
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+
+"""
+The files of the EV3D4 web interface, loaded once at startup.
+
+Reading every file from the SD card for every request and sending it
+uncompressed with no validators makes each page load slow over WiFi or
+Bluetooth. AssetTable reads them all once and keeps, for each one, the
+body, a gzip'd body when that is smaller, and an ETag made from a hash of
+the content.
+
+Each file other than the pages is also served under a URL with that hash
+in it, /include/tank-mobile.<hash>.js, and the pages are rewritten to use
+those URLs. Hashed URLs never change content so they are cached for a
+year without being revalidated. The pages themselves are always
+revalidated, which costs a 304 until the robot gets new files.
+"""
+
+import gzip
+import hashlib
+import os
+import re
+from ev3dev2.control.webserver import RobotWebHandler
+
+MIMETYPES = RobotWebHandler.mimetype
+
+# png, gif and jpg are compressed already
+COMPRESSIBLE = ('css', 'html', 'ico', 'js')
+
+CACHE_IMMUTABLE = 'public, max-age=31536000, immutable'
+CACHE_REVALIDATE = 'no-cache'
+
+# src="..." and href="..." pointing at one of our own files
+REFERENCE = re.compile(r'''((?:src|href)\s*=\s*['"])([^'":?#]+\.(?:%s))(['"])''' % '|'.join(MIMETYPES))
+
+
+class Asset(object):
+
+    def __init__(self, url, body, cache_control):
+        self.url = url
+        self.extension = url.split('.')[-1]
+        self.mimetype = MIMETYPES[self.extension]
+        self.body = body
+        self.digest = hashlib.sha1(body).hexdigest()[:12]
+        self.etag = '"%s"' % self.digest
+        self.cache_control = cache_control
+        self.gzipped = None
+        self.gzip_etag = None
+
+        if self.extension in COMPRESSIBLE:
+            gzipped = gzip.compress(body, 9)
+
+            if len(gzipped) < len(body):
+                self.gzipped = gzipped
+                self.gzip_etag = '"%s-gz"' % self.digest
+
+    def hashed(self, cache_control):
+        """
+        The same file under a URL with its hash in it
+        """
+        (base, extension) = self.url.rsplit('.', 1)
+        hashed = Asset.__new__(Asset)
+        hashed.__dict__.update(self.__dict__)
+        hashed.url = '%s.%s.%s' % (base, self.digest, extension)
+        hashed.cache_control = cache_control
+        return hashed
+
+    def variant(self, accept_encoding):
+        """
+        Returns (body, etag, content encoding or None) to send to a client
+        that sent accept_encoding
+        """
+        if self.gzipped is not None and 'gzip' in accept_encoding:
+            return (self.gzipped, self.gzip_etag, 'gzip')
+
+        return (self.body, self.etag, None)
+
+
+class AssetTable(object):
+    """
+    Every file under root with an extension in MIMETYPES, by URL
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self.assets = {}
+        self.hashed = {}
+        pages = []
+
+        for (dirpath, dirnames, filenames) in os.walk(root):
+            dirnames[:] = [d for d in dirnames if not d.startswith('.') and d != '__pycache__']
+
+            for filename in sorted(filenames):
+                extension = filename.split('.')[-1]
+
+                if extension not in MIMETYPES:
+                    continue
+
+                path = os.path.join(dirpath, filename)
+                url = '/' + os.path.relpath(path, root).replace(os.sep, '/')
+
+                if extension == 'html':
+                    pages.append((url, path))
+                    continue
+
+                with open(path, 'rb') as fh:
+                    asset = Asset(url, fh.read(), CACHE_REVALIDATE)
+
+                # The plain URL still works, for anything linking to it
+                self.assets[url] = asset
+                hashed = asset.hashed(CACHE_IMMUTABLE)
+                self.assets[hashed.url] = hashed
+                self.hashed[url] = hashed.url
+
+        for (url, path) in pages:
+            with open(path, 'rb') as fh:
+                body = self.rewrite(url, fh.read().decode())
+
+            self.assets[url] = Asset(url, body.encode(), CACHE_REVALIDATE)
+
+        if '/index.html' in self.assets:
+            self.assets['/'] = self.assets['/index.html']
+
+    def rewrite(self, page_url, html):
+        """
+        Point the references in html at the hashed URLs
+        """
+        directory = page_url.rsplit('/', 1)[0]
+
+        def hashed(match):
+            reference = match.group(2)
+            url = reference if reference.startswith('/') else '%s/%s' % (directory, reference)
+            return match.group(1) + self.hashed.get(url, reference) + match.group(3)
+
+        return REFERENCE.sub(hashed, html)
+
+    def get(self, url):
+        return self.assets.get(url)
+
+    def __len__(self):
+        return len(self.assets)
+
+    def size(self):
+        """
+        Returns (bytes, gzip'd bytes) of the distinct files
+        """
+        assets = [asset for (url, asset) in self.assets.items() if url != '/' and url not in self.hashed]
+        return (sum(len(asset.body) for asset in assets),
+                sum(len(asset.gzipped if asset.gzipped is not None else asset.body) for asset in assets))
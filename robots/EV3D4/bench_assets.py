@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+
+"""
+Load the EV3D4 web interface through a slow link, the way a browser
+would, and report the bytes sent and how long until the page can be used,
+no EV3 needed.
+
+The link is a proxy that delays everything by half of --rtt each way,
+charges a round trip for each new connection and shares --kbps between
+all of the connections from the server. The browser fetches the page,
+then the files it references over up to six connections, and keeps a
+cache between loads. The page is "interactive" once the html, css and
+javascript are in, "loaded" once the images are too. The jQuery files
+come from a CDN so they are not counted.
+
+"before" serves the files the way RobotWebHandler does, read from disk
+for every request with no compression and no validators. "after" serves
+them from the AssetTable.
+
+    $ ./bench_assets.py --kbps 1000 --rtt 0.05
+"""
+
+import argparse
+import gzip
+import http.client
+import logging
+import os
+import queue
+import socket
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'common'))
+from fakesys import FakeSys
+
+from assets import REFERENCE, AssetTable
+
+
+class ThrottledLink(object):
+    """
+    A TCP proxy from a local port to upstream_port
+    """
+
+    def __init__(self, upstream_port, kbps, rtt):
+        self.upstream_port = upstream_port
+        self.rate = kbps * 1000 / 8.0
+        self.rtt = rtt
+        self.lock = threading.Lock()
+        self.free_at = 0.0
+        self.bytes = 0
+        self.listener = socket.socket()
+        self.listener.bind(('127.0.0.1', 0))
+        self.listener.listen(16)
+        self.port = self.listener.getsockname()[1]
+        threading.Thread(target=self.accept, daemon=True).start()
+
+    def accept(self):
+        while True:
+            (client, address) = self.listener.accept()
+            threading.Thread(target=self.connect, args=(client,), daemon=True).start()
+
+    def connect(self, client):
+        # The TCP handshake
+        time.sleep(self.rtt)
+        server = socket.create_connection(('127.0.0.1', self.upstream_port))
+
+        for sock in (client, server):
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+        self.pipe(client, server, False)
+        self.pipe(server, client, True)
+
+    def transmit(self, length):
+        """
+        Wait until length bytes would have gone through the link
+        """
+        with self.lock:
+            self.bytes += length
+            self.free_at = max(time.perf_counter(), self.free_at) + length / self.rate
+            free_at = self.free_at
+
+        delay = free_at - time.perf_counter()
+
+        if delay > 0:
+            time.sleep(delay)
+
+    def pipe(self, src, dst, throttled):
+        chunks = queue.Queue()
+
+        def read():
+            while True:
+                try:
+                    data = src.recv(1460)
+                except OSError:
+                    data = b''
+
+                chunks.put((time.perf_counter() + self.rtt / 2, data))
+
+                if not data:
+                    break
+
+        def write():
+            while True:
+                (due, data) = chunks.get()
+                delay = due - time.perf_counter()
+
+                if delay > 0:
+                    time.sleep(delay)
+
+                try:
+                    if not data:
+                        dst.shutdown(socket.SHUT_WR)
+                        break
+
+                    if throttled:
+                        self.transmit(len(data))
+
+                    dst.sendall(data)
+                except OSError:
+                    break
+
+        threading.Thread(target=read, daemon=True).start()
+        threading.Thread(target=write, daemon=True).start()
+
+
+class Browser(object):
+
+    def __init__(self, port, connections=6):
+        self.port = port
+        self.connections = connections
+        self.cache = {}
+
+    def get(self, local, url):
+        """
+        Returns (body, whether a request was made, whether it was a 304)
+        """
+        cached = self.cache.get(url)
+
+        if cached:
+            (etag, cache_control, body) = cached
+
+            if 'max-age' in cache_control and 'no-cache' not in cache_control:
+                return (body, False, False)
+
+        if not hasattr(local, 'connection'):
+            local.connection = http.client.HTTPConnection('127.0.0.1', self.port)
+
+        headers = {'Accept-Encoding': 'gzip'}
+
+        if cached and cached[0]:
+            headers['If-None-Match'] = cached[0]
+
+        local.connection.request('GET', url, headers=headers)
+        response = local.connection.getresponse()
+        body = response.read()
+
+        if response.will_close:
+            local.connection.close()
+
+        if response.status == 304:
+            return (cached[2], True, True)
+
+        if response.status != 200:
+            raise Exception("GET %s: %d" % (url, response.status))
+
+        if response.getheader('Content-Encoding') == 'gzip':
+            body = gzip.decompress(body)
+
+        self.cache[url] = (response.getheader('ETag'), response.getheader('Cache-Control', ''), body)
+        return (body, True, False)
+
+    def load(self, page):
+        """
+        Returns (requests, 304s, seconds to interactive, seconds to loaded)
+        """
+        local = threading.local()
+        results = []
+        start = time.perf_counter()
+
+        def fetch(url):
+            (body, requested, not_modified) = self.get(local, url)
+            results.append((requested, not_modified))
+            return (body, time.perf_counter() - start)
+
+        with ThreadPoolExecutor(max_workers=self.connections) as pool:
+            (html, interactive) = pool.submit(fetch, page).result()
+            urls = [match.group(2) for match in REFERENCE.finditer(html.decode())]
+            urls = ['/' + url.lstrip('/') for url in urls]
+
+            # Like a browser, ask for what blocks the page first
+            urls.sort(key=lambda url: url.split('.')[-1] not in ('css', 'js'))
+            futures = [(url, pool.submit(fetch, url)) for url in urls]
+            loaded = interactive
+
+            for (url, future) in futures:
+                (body, elapsed) = future.result()
+                loaded = max(loaded, elapsed)
+
+                if url.split('.')[-1] in ('css', 'js'):
+                    interactive = max(interactive, elapsed)
+
+        return (sum(1 for (requested, not_modified) in results if requested),
+                sum(1 for (requested, not_modified) in results if not_modified),
+                interactive, loaded)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Measure EV3D4 page loads over a throttled link')
+    parser.add_argument('--kbps', type=float, default=1000, help='link bandwidth, kbit/s')
+    parser.add_argument('--rtt', type=float, default=0.05, help='link round trip time, seconds')
+    parser.add_argument('--page', default='/mobile.html')
+    parser.add_argument('--loads', type=int, default=3, help='warm loads to average')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+
+    # RobotWebHandler serves files from the current directory
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    fake = FakeSys()
+
+    try:
+        fake.add_motor('ev3-ports:outA', 'lego-ev3-m-motor')
+        fake.add_motor('ev3-ports:outB')
+        fake.add_motor('ev3-ports:outC')
+        fake.install()
+
+        from EV3D4WebControl import EV3D4WebControlled
+        ev3d4 = EV3D4WebControlled(port_number=0)
+        assets = ev3d4.assets
+        link = ThrottledLink(ev3d4.www.bind(), args.kbps, args.rtt)
+        threading.Thread(target=ev3d4.www.run, daemon=True).start()
+
+        start = time.perf_counter()
+        AssetTable(os.curdir)
+        print("AssetTable: %d URLs, %d bytes, %d gzip'd, built in %.1fms" % (
+            len(assets), assets.size()[0], assets.size()[1], 1000 * (time.perf_counter() - start)))
+        print("%6s %5s %8s %5s %8s %16s %11s" % (
+            'mode', 'load', 'requests', '304s', 'bytes', 'interactive (ms)', 'loaded (ms)'))
+
+        for (mode, table) in (('before', None), ('after', assets)):
+            ev3d4.assets = table
+            browser = Browser(link.port)
+
+            for load in ['cold'] + ['warm'] * args.loads:
+                link.bytes = 0
+                (requests, not_modified, interactive, loaded) = browser.load(args.page)
+                print("%6s %5s %8d %5d %8d %16.0f %11.0f" % (
+                    mode, load, requests, not_modified, link.bytes, 1000 * interactive, 1000 * loaded))
+
+        ev3d4.www.shutdown()
+        ev3d4.control.close()
+    finally:
+        fake.cleanup()
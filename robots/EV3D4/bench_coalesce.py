@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+
+"""
+Flood the EV3D4 web server with joystick positions on a fake sysfs tree
+and measure how stale the positions that reach the motors are, no EV3
+needed.
+
+The motor writes are slowed down by --motor-delay to stand in for the EV3,
+where setting the speed of both motors takes a few milliseconds. "inline"
+applies every move-xy as it comes in, the way TankWebHandler did, so a
+flood queues up behind the motors. "coalesce" is TankControl's latest-wins
+slot, applying the newest position at most once per control tick.
+
+For every position written to the motors we record its age (how long ago
+it was sent) and its lag (how many newer positions had been sent by then).
+"drain" is how long the motors kept changing after the flood stopped.
+
+    $ ./bench_coalesce.py --rate 200 --seconds 3 --motor-delay 0.02
+"""
+
+import argparse
+import logging
+import math
+import os
+import sys
+import threading
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'common'))
+from fakesys import FakeSys
+
+from loadtest import GetClient, WebSocketClient, percentile
+from webcontrol import TankControl
+
+
+def flood(client, seq, rate, seconds, sent):
+    """
+    Send move-xy at rate per second for seconds, going round in a circle.
+    Returns the next seq.
+    """
+    client.send(seq, 'joystick-engaged', [])
+    seq += 1
+    start = time.perf_counter()
+    n = 0
+
+    while True:
+        due = start + n / rate
+
+        if due > start + seconds:
+            break
+
+        delay = due - time.perf_counter()
+
+        if delay > 0:
+            time.sleep(delay)
+
+        angle = 2 * math.pi * n / rate
+        sent.append((seq, time.perf_counter()))
+        client.send(seq, 'move-xy', [int(100 * math.cos(angle)), int(100 * math.sin(angle))])
+        seq += 1
+        n += 1
+
+    return seq
+
+
+def run_mode(ev3d4, tick, transport, rate, seconds, motor_delay, seq):
+    ev3d4.control.close()
+    control = TankControl(ev3d4, tick=tick)
+    ev3d4.control = control
+    sent = []
+    applies = []
+
+    # Slow the motor writes down and time stamp each one
+    apply_drive = control.apply_drive
+
+    def timed_apply_drive(seq, action, args):
+        time.sleep(motor_delay)
+        apply_drive(seq, action, args)
+        applies.append((time.perf_counter(), seq, sent[-1][0]))
+
+    control.apply_drive = timed_apply_drive
+    port = ev3d4.www.bind()
+    client = GetClient(port) if transport == 'get' else WebSocketClient(port)
+    seq = flood(client, seq, rate, seconds, sent)
+    flood_end = time.perf_counter()
+
+    # Wait for the motors to catch up
+    count = -1
+
+    while count != len(applies):
+        count = len(applies)
+        time.sleep(max(0.2, 5 * motor_delay))
+
+    client.close()
+    control.close()
+
+    sent_at = dict(sent)
+    ages = [applied - sent_at[s] for (applied, s, newest) in applies]
+    lags = [newest - s for (applied, s, newest) in applies]
+    drain = max(applies[-1][0] - flood_end, 0.0) if applies else 0.0
+    return (control, ages, lags, drain, seq)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Flood the EV3D4 web server with move-xy and measure staleness')
+    parser.add_argument('--rate', type=float, default=200, help='move-xy commands per second')
+    parser.add_argument('--seconds', type=float, default=3.0, help='how long to flood for')
+    parser.add_argument('--motor-delay', type=float, default=0.02, help='seconds each motor update takes')
+    parser.add_argument('--tick', type=float, default=0.02, help='control tick for the coalescing mode')
+    parser.add_argument('--transport', choices=('websocket', 'get'), default='websocket')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    fake = FakeSys()
+
+    try:
+        fake.add_motor('ev3-ports:outA', 'lego-ev3-m-motor')
+        fake.add_motor('ev3-ports:outB')
+        fake.add_motor('ev3-ports:outC')
+        fake.install()
+
+        from EV3D4WebControl import EV3D4WebControlled
+        ev3d4 = EV3D4WebControlled(port_number=0)
+        ev3d4.www.bind()
+        threading.Thread(target=ev3d4.www.run, daemon=True).start()
+        seq = 0
+
+        print("%9s %8s %9s %8s %8s %9s %9s %9s %8s %9s" % (
+            'mode', 'received', 'coalesced', 'ignored', 'applied',
+            'age p50', 'age p99', 'age max', 'lag max', 'drain (s)'))
+
+        for (mode, tick) in (('inline', None), ('coalesce', args.tick)):
+            (control, ages, lags, drain, seq) = run_mode(
+                ev3d4, tick, args.transport, args.rate, args.seconds, args.motor_delay, seq)
+
+            print("%9s %8d %9d %8d %8d %8.1fms %8.1fms %8.1fms %8d %9.2f" % (
+                mode, control.received, control.coalesced, control.ignored, control.applied,
+                1000 * percentile(ages, 0.5), 1000 * percentile(ages, 0.99), 1000 * max(ages),
+                max(lags), drain))
+
+        ev3d4.www.shutdown()
+    finally:
+        fake.cleanup()
@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+
+"""
+Drive EV3D4 over a lossy link on a fake sysfs tree and report how long it
+takes to stop once the driver lets go, no EV3 needed.
+
+web: --drives times, engage the joystick, send move-xy every 50ms for
+0.2s then hold it still for --hold seconds, renewing the lease every
+150ms like include/control.js, then send move-stop. The renewals, the
+later move-xy and the move-stop are each dropped with probability --loss.
+The stop latency is from sending the move-stop to the motors being
+stopped, by the move-stop or by the lease running out. "off" is
+TankControl with no lease, where a lost move-stop leaves the robot
+driving until --wait runs out. "early" counts the drives where the lease
+ran out while the driver was still holding on and the robot had already
+stopped by the time they let go.
+
+ir: EV3D4RemoteControl with a button held down, then remote.process()
+stalls for --stall seconds. The latency is from the start of the stall to
+the motors being stopped. "off" is the RemoteControlledTank main loop.
+
+    $ ./bench_lease.py --drives 40 --loss 0.2
+"""
+
+import argparse
+import logging
+import os
+import random
+import sys
+import threading
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'common'))
+from ev3dev2.control.rc_tank import RemoteControlledTank
+from deviceregistry import registry
+from fakesys import FakeSys
+
+from loadtest import WebSocketClient, percentile
+from webcontrol import TankControl
+
+LEASE_TTL = 500
+LEASE_RENEW = 0.15
+MOVE_XY_INTERVAL = 0.05
+
+
+def install_stop_clock(control, stops):
+    """
+    Append the time to stops whenever control stops the motors
+    """
+    _command = control._command
+    expire = control.expire
+
+    def timed_command(seq, action, args):
+        result = _command(seq, action, args)
+
+        if action == 'move-stop':
+            stops.append(('stop', time.perf_counter()))
+
+        return result
+
+    def timed_expire(lease):
+        stopped = expire(lease)
+
+        if stopped:
+            stops.append(('lease', time.perf_counter()))
+
+        return stopped
+
+    control._command = timed_command
+    control.expire = timed_expire
+
+    if control.watchdog:
+        control.watchdog.expire = timed_expire
+
+
+def drive(client, seq, rng, args):
+    """
+    One drive up to letting go, returns the next seq
+    """
+    client.send(seq, 'joystick-engaged', [])
+    client.send(seq + 1, 'move-xy', [0, 100])
+    seq += 2
+    start = time.perf_counter()
+    next_move = start + MOVE_XY_INTERVAL
+    next_renew = start + LEASE_RENEW
+    end = start + 0.2 + args.hold
+
+    while True:
+        now = time.perf_counter()
+
+        if now >= end:
+            break
+
+        if now >= next_move and now < start + 0.2:
+            if rng.random() >= args.loss:
+                client.send(seq, 'move-xy', [10, 100])
+            seq += 1
+            next_move += MOVE_XY_INTERVAL
+
+        if now >= next_renew:
+            if rng.random() >= args.loss:
+                client.send(seq, 'lease', [LEASE_TTL])
+            seq += 1
+            next_renew += LEASE_RENEW
+
+        time.sleep(0.005)
+
+    return seq
+
+
+def run_web(ev3d4, lease, port, args):
+    ev3d4.control.close()
+    control = TankControl(ev3d4, lease=lease)
+    ev3d4.control = control
+    stops = []
+    install_stop_clock(control, stops)
+
+    client = WebSocketClient(port)
+    rng = random.Random(args.seed)
+    seq = 1
+    results = {False: [], True: []}
+    never = 0
+    early = 0
+
+    for x in range(args.drives):
+        seq = drive(client, seq, rng, args)
+
+        if control.watchdog and not control.watchdog.held:
+            early += 1
+            continue
+
+        del stops[:]
+        lost = rng.random() < args.loss
+        sent = time.perf_counter()
+
+        if not lost:
+            client.send(seq, 'move-stop', [])
+
+        seq += 1
+        end = time.perf_counter() + args.wait
+
+        while time.perf_counter() < end and not stops:
+            time.sleep(0.001)
+
+        if stops:
+            results[lost].append(stops[0][1] - sent)
+        else:
+            never += 1
+            control.stop()
+
+        time.sleep(0.05)
+
+    client.close()
+    return (control, results, never, early)
+
+
+class StallingRemote(object):
+    """
+    Stands in for the InfraredSensor, process() hangs once when told to
+    """
+
+    def __init__(self, remote):
+        self.remote = remote
+        self.stall = 0.0
+        self.stalled = None
+        self.closed = False
+
+    def process(self):
+        # Ends the main loop without it logging an exception
+        if self.closed:
+            raise SystemExit()
+
+        if self.stall:
+            self.stalled = time.perf_counter()
+            time.sleep(self.stall)
+            self.stall = 0.0
+
+        self.remote.process()
+
+
+def run_ir(fake, leased, args):
+    from EV3D4RemoteControl import EV3D4RemoteControlled
+
+    # Each run is a new program driving the motors, not the last one's
+    registry.clear()
+    ev3d4 = EV3D4RemoteControlled()
+    remote = StallingRemote(ev3d4.remote)
+    ev3d4.remote = remote
+    latencies = []
+
+    off = ev3d4.off
+    stops = []
+
+    def timed_off(*args, **kwargs):
+        stops.append(time.perf_counter())
+        off(*args, **kwargs)
+
+    ev3d4.off = timed_off
+
+    if leased:
+        main = ev3d4.main
+    else:
+        ev3d4.watchdog.close()
+        main = lambda: RemoteControlledTank.main(ev3d4)
+
+    threading.Thread(target=main, daemon=True).start()
+
+    for x in range(args.stalls):
+        # Red up, the left motor runs
+        fake.set('ev3-ports:in4', 'value0', 1)
+        time.sleep(0.2)
+        del stops[:]
+        remote.stall = args.stall
+
+        while remote.stall:
+            time.sleep(0.001)
+
+        stopped = [t for t in stops if t >= remote.stalled]
+        latencies.append(stopped[0] - remote.stalled if stopped else None)
+
+        # Let go, so the next press starts the motor again
+        fake.set('ev3-ports:in4', 'value0', 0)
+        time.sleep(0.1)
+
+    remote.closed = True
+    time.sleep(0.1)
+    ev3d4.watchdog.close()
+    return (ev3d4.watchdog, latencies)
+
+
+def report(mode, lost, latencies, never):
+    if latencies:
+        print("%9s %10s %6d %6d %9.0f %9.0f %9.0f" % (
+            mode, 'lost' if lost else 'delivered', len(latencies) + never, never,
+            1000 * percentile(latencies, 0.5), 1000 * percentile(latencies, 0.99), 1000 * max(latencies)))
+    else:
+        print("%9s %10s %6d %6d %9s %9s %9s" % (
+            mode, 'lost' if lost else 'delivered', never, never, '-', '-', '-'))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Measure how long EV3D4 takes to stop over a lossy link')
+    parser.add_argument('--drives', type=int, default=40)
+    parser.add_argument('--loss', type=float, default=0.2, help='chance each message is dropped')
+    parser.add_argument('--hold', type=float, default=0.6, help='seconds the joystick is held still')
+    parser.add_argument('--wait', type=float, default=2.0, help='seconds before a stop is counted as never')
+    parser.add_argument('--stalls', type=int, default=10)
+    parser.add_argument('--stall', type=float, default=1.0, help='seconds remote.process() hangs for')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.ERROR)
+    fake = FakeSys()
+
+    try:
+        fake.add_motor('ev3-ports:outA', 'lego-ev3-m-motor')
+        fake.add_motor('ev3-ports:outB')
+        fake.add_motor('ev3-ports:outC')
+        fake.add_sensor('ev3-ports:in4', 'lego-ev3-ir', 'IR-REMOTE')
+        fake.install()
+
+        from EV3D4WebControl import EV3D4WebControlled
+        ev3d4 = EV3D4WebControlled(port_number=0)
+        port = ev3d4.www.bind()
+        threading.Thread(target=ev3d4.www.run, daemon=True).start()
+
+        print("web: lease %dms renewed every %dms, %.0f%% loss" % (LEASE_TTL, 1000 * LEASE_RENEW, 100 * args.loss))
+        print("%9s %10s %6s %6s %9s %9s %9s" % ('lease', 'move-stop', 'drives', 'never',
+                                              'p50 (ms)', 'p99 (ms)', 'max (ms)'))
+
+        for (mode, lease) in (('off', None), ('on', LEASE_TTL / 1000.0)):
+            (control, results, never, early) = run_web(ev3d4, lease, port, args)
+
+            for lost in (False, True):
+                report(mode, lost, results[lost], never if lost else 0)
+
+            if control.watchdog:
+                print("  %s, %d drives early" % (control.watchdog, early))
+
+        ev3d4.www.shutdown()
+        ev3d4.telemetry.close()
+        ev3d4.control.close()
+
+        print("")
+        print("ir: lease 300ms, remote.process() stalls for %dms" % (1000 * args.stall))
+        print("%9s %6s %6s %9s %9s" % ('lease', 'stalls', 'never', 'p50 (ms)', 'max (ms)'))
+
+        for (mode, leased) in (('off', False), ('on', True)):
+            (watchdog, latencies) = run_ir(fake, leased, args)
+            stopped = [latency for latency in latencies if latency is not None]
+
+            if stopped:
+                print("%9s %6d %6d %9.0f %9.0f" % (mode, len(latencies), len(latencies) - len(stopped),
+                                                   1000 * percentile(stopped, 0.5), 1000 * max(stopped)))
+            else:
+                print("%9s %6d %6d %9s %9s" % (mode, len(latencies), len(latencies), '-', '-'))
+
+            if leased:
+                print("  %s" % watchdog)
+    finally:
+        fake.cleanup()
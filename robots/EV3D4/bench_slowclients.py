@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+
+"""
+Hold slow connections open to the EV3D4 web server while sending it
+move-stop every --interval, and report how long each stop took, no EV3
+needed.
+
+The slow clients are, --slow of each:
+
+    idle       connect and send nothing
+    slowloris  send a request a byte every half a second
+    reader     ask for --pipeline images on one connection and never read
+
+"single" is the HTTPServer that WebControlledTank runs, one request at a
+time. "threaded" starts a thread per connection, the way EV3D4 used to.
+"pooled" is EV3D4HTTPServer. A stop that gets no reply within --timeout is
+counted as lost. threads is the most threads the server had running.
+
+    $ ./bench_slowclients.py --slow 8 --seconds 5
+"""
+
+import argparse
+import logging
+import os
+import socket
+import sys
+import threading
+import time
+from http.server import HTTPServer
+from socketserver import ThreadingMixIn
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'common'))
+from fakesys import FakeSys
+
+from loadtest import percentile
+from webcontrol import EV3D4HTTPServer, EV3D4WebHandler
+
+
+class ThreadedHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+def idle(port, pipeline, stop):
+    sock = socket.create_connection(('127.0.0.1', port))
+    stop.wait()
+    return sock
+
+
+def slowloris(port, pipeline, stop):
+    sock = socket.create_connection(('127.0.0.1', port))
+
+    for byte in b'GET /index.html HTTP/1.1\r\nX-Slow: ' + b'z' * 1000:
+        try:
+            sock.send(bytes((byte,)))
+        except OSError:
+            break
+
+        if stop.wait(0.5):
+            break
+
+    return sock
+
+
+def reader(port, pipeline, stop):
+    sock = socket.socket()
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 2048)
+    sock.connect(('127.0.0.1', port))
+    sock.settimeout(1.0)
+
+    try:
+        sock.sendall(b'GET /include/ArrowDown.png HTTP/1.1\r\n\r\n' * pipeline)
+    except OSError:
+        pass
+
+    stop.wait()
+    return sock
+
+
+def send_stop(port, seq, timeout):
+    """
+    Returns how long move-stop took to be answered, or None
+    """
+    start = time.perf_counter()
+
+    try:
+        sock = socket.create_connection(('127.0.0.1', port), timeout=timeout)
+    except OSError:
+        return None
+
+    try:
+        sock.settimeout(max(0.01, timeout - (time.perf_counter() - start)))
+        sock.sendall(b'GET /%d/move-stop/ HTTP/1.1\r\nConnection: close\r\n\r\n' % seq)
+        response = b''
+
+        while b'\r\n\r\n' not in response:
+            data = sock.recv(1024)
+
+            if not data:
+                return None
+
+            response += data
+
+        return time.perf_counter() - start if response.startswith(b'HTTP/1.1 204') else None
+    except OSError:
+        return None
+    finally:
+        sock.close()
+
+
+def run_mode(ev3d4, server_class, args):
+    before = set(threading.enumerate())
+    server = server_class(('127.0.0.1', 0), EV3D4WebHandler)
+    ev3d4.www.content_server = server
+    port = server.server_address[1]
+
+    # The slow clients hang up on the server all the time
+    server.handle_error = lambda request, client_address: None
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    stop = threading.Event()
+    clients = []
+    client_threads = []
+
+    def start_client(kind):
+        try:
+            clients.append(kind(port, args.pipeline, stop))
+        except OSError:
+            pass
+
+    for kind in (idle, slowloris, reader):
+        for x in range(args.slow):
+            client_threads.append(threading.Thread(target=start_client, args=(kind,), daemon=True))
+            client_threads[-1].start()
+
+    time.sleep(0.5)
+    latencies = []
+    lost = 0
+    threads = 0
+    seq = 1
+    end = time.perf_counter() + args.seconds
+
+    while time.perf_counter() < end:
+        latency = send_stop(port, seq, args.timeout)
+        threads = max(threads, len(set(threading.enumerate()) - before - set(client_threads)))
+        seq += 1
+
+        if latency is None:
+            lost += 1
+        else:
+            latencies.append(latency)
+
+        time.sleep(args.interval)
+
+    # Let go of the slow clients so a stuck server can finish
+    stop.set()
+    time.sleep(0.1)
+
+    for sock in clients:
+        sock.close()
+
+    server.shutdown()
+    server.server_close()
+    return (server, latencies, lost, threads)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Measure EV3D4 stop latency while slow clients hold connections open')
+    parser.add_argument('--slow', type=int, default=8, help='slow clients of each kind')
+    parser.add_argument('--pipeline', type=int, default=300, help='images each reader asks for')
+    parser.add_argument('--seconds', type=float, default=5.0)
+    parser.add_argument('--interval', type=float, default=0.1, help='seconds between stops')
+    parser.add_argument('--timeout', type=float, default=2.0, help='seconds before a stop is lost')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.ERROR)
+    fake = FakeSys()
+
+    try:
+        fake.add_motor('ev3-ports:outA', 'lego-ev3-m-motor')
+        fake.add_motor('ev3-ports:outB')
+        fake.add_motor('ev3-ports:outC')
+        fake.install()
+
+        from EV3D4WebControl import EV3D4WebControlled
+        ev3d4 = EV3D4WebControlled(port_number=0)
+
+        print("%9s %6s %5s %9s %9s %9s %8s" % ('server', 'stops', 'lost', 'p50 (ms)', 'p99 (ms)', 'max (ms)', 'threads'))
+
+        for (mode, server_class) in (('single', HTTPServer), ('threaded', ThreadedHTTPServer), ('pooled', EV3D4HTTPServer)):
+            (server, latencies, lost, threads) = run_mode(ev3d4, server_class, args)
+
+            if latencies:
+                print("%9s %6d %5d %9.1f %9.1f %9.1f %8d" % (
+                    mode, len(latencies) + lost, lost, 1000 * percentile(latencies, 0.5),
+                    1000 * percentile(latencies, 0.99), 1000 * max(latencies), threads))
+            else:
+                print("%9s %6d %5d %9s %9s %9s %8d" % (mode, lost, lost, '-', '-', '-', threads))
+
+            if mode == 'pooled':
+                print("  %s" % server)
+
+        ev3d4.control.close()
+    finally:
+        fake.cleanup()
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+
+"""
+Watch the EV3D4 telemetry stream with 0, 1, 5 and 20 viewers on a fake
+sysfs tree and report how much CPU the robot's process uses, no EV3
+needed.
+
+The viewers run in a separate process, which also turns the fake motors
+so there is something to report, so the CPU time is the web server's
+alone. "shared" is Telemetry, one sample per interval for everyone.
+"per-viewer" has every stream read sysfs and send a full snapshot itself,
+the way a telemetry route usually starts out.
+
+    $ ./bench_telemetry.py --seconds 5
+"""
+
+import argparse
+import logging
+import multiprocessing
+import os
+import socket
+import sys
+import threading
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'common'))
+from fakesys import FakeSys
+from robotruntime import cpu_percent
+
+from telemetry import Telemetry, encode_event
+
+
+class PerViewerTelemetry(Telemetry):
+    """
+    Every viewer reads sysfs and is sent a full snapshot, once per interval.
+    The ev3dev2 attributes keep one file open each so the reads have to
+    take turns.
+    """
+
+    def __init__(self, robot, control, interval=0.2):
+        self.sysfs_lock = threading.Lock()
+        Telemetry.__init__(self, robot, control, interval)
+
+    def run(self):
+        pass
+
+    def next_event(self, version):
+        time.sleep(self.interval)
+
+        with self.sysfs_lock:
+            values = self.sample()
+
+        version = (version or 0) + 1
+        event = encode_event('snapshot', version, values)
+
+        with self.lock:
+            self.samples += 1
+            self.events += 1
+            self.bytes += len(event)
+
+        return (version, event)
+
+
+def watch(port, stop, received):
+    sock = socket.create_connection(('127.0.0.1', port))
+    sock.sendall(b'GET /telemetry HTTP/1.1\r\n\r\n')
+    sock.settimeout(0.5)
+    events = 0
+
+    while not stop.is_set():
+        try:
+            data = sock.recv(4096)
+        except socket.timeout:
+            continue
+
+        if not data:
+            break
+
+        events += data.count(b'\n\n')
+
+    sock.close()
+    received.append(events)
+
+
+def viewers(port, count, seconds, fake, results):
+    """
+    Runs in its own process
+    """
+    stop = threading.Event()
+    received = []
+    threads = [threading.Thread(target=watch, args=(port, stop, received)) for x in range(count)]
+
+    for thread in threads:
+        thread.start()
+
+    # The tank drives round in circles
+    end = time.monotonic() + seconds
+    position = 0
+
+    while time.monotonic() < end:
+        position += 20
+        fake.set('ev3-ports:outB', 'position', position)
+        fake.set('ev3-ports:outB', 'speed', 400)
+        fake.set('ev3-ports:outC', 'position', position // 2)
+        fake.set('ev3-ports:outC', 'speed', 200)
+        time.sleep(0.05)
+
+    stop.set()
+
+    for thread in threads:
+        thread.join()
+
+    results.put(sum(received))
+
+
+def run(ev3d4, telemetry_class, count, args, fake):
+    ev3d4.telemetry.close()
+    ev3d4.telemetry = telemetry_class(ev3d4, ev3d4.control, interval=args.interval)
+    port = ev3d4.www.bind()
+    results = multiprocessing.Queue()
+    process = multiprocessing.Process(target=viewers, args=(port, count, args.seconds + 1.5, fake, results))
+    process.start()
+
+    # Give the viewers time to connect
+    time.sleep(1.0)
+    telemetry = ev3d4.telemetry
+    (samples, events, sent) = (telemetry.samples, telemetry.events, telemetry.bytes)
+    (cpu_start, wall_start) = (time.process_time(), time.time())
+    time.sleep(args.seconds)
+    cpu = cpu_percent(cpu_start, wall_start)
+    elapsed = time.time() - wall_start
+    rates = ((telemetry.samples - samples) / elapsed, (telemetry.events - events) / elapsed,
+             (telemetry.bytes - sent) / elapsed)
+    received = results.get()
+    process.join()
+    return (cpu, rates, received)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Measure the CPU cost of EV3D4 telemetry viewers')
+    parser.add_argument('--seconds', type=float, default=5.0, help='how long to measure each run for')
+    parser.add_argument('--interval', type=float, default=0.2, help='telemetry interval')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    fake = FakeSys()
+
+    try:
+        fake.add_motor('ev3-ports:outA', 'lego-ev3-m-motor')
+        fake.add_motor('ev3-ports:outB')
+        fake.add_motor('ev3-ports:outC')
+        fake.add_power_supply()
+        fake.install()
+
+        from EV3D4WebControl import EV3D4WebControlled
+        ev3d4 = EV3D4WebControlled(port_number=0)
+        ev3d4.www.options['max_streams'] = 32
+        ev3d4.www.bind()
+        threading.Thread(target=ev3d4.www.run, daemon=True).start()
+
+        print("%11s %7s %7s %10s %9s %9s %9s" % (
+            'telemetry', 'viewers', 'cpu', 'samples/s', 'events/s', 'bytes/s', 'received'))
+
+        for (mode, telemetry_class) in (('shared', Telemetry), ('per-viewer', PerViewerTelemetry)):
+            for count in (0, 1, 5, 20):
+                (cpu, (samples, events, sent), received) = run(ev3d4, telemetry_class, count, args, fake)
+                print("%11s %7d %6.1f%% %10.1f %9.1f %9.0f %9d" % (
+                    mode, count, cpu, samples, events, sent, received))
+
+        ev3d4.www.shutdown()
+        ev3d4.telemetry.close()
+        ev3d4.control.close()
+    finally:
+        fake.cleanup()
@@ -0,0 +1,97 @@
+// Send the commands of the web interface to the robot over one WebSocket,
+// falling back to a GET per command (the old way) while the socket is not
+// open or if the browser has no WebSockets.
+//
+// The robot ignores a movement that shows up after a later one, so seq
+// starts from the clock. A reloaded page then carries on from a higher
+// number than the last one instead of starting from 0 again.
+//
+// Once the robot is moving it stops by itself unless the page renews its
+// lease every LEASE_RENEW ms, so a lost move-stop or a phone that drops
+// off the WiFi does not leave it driving.
+var seq = Date.now() % 2000000000;
+var socket = null;
+var MOVE_XY = 1;
+var LEASE = 2;
+var LEASE_TTL = 500;
+var LEASE_RENEW = 150;
+var lease_timer = null;
+
+function connect() {
+    if (!window.WebSocket) {
+        return;
+    }
+
+    var ws = new WebSocket("ws://" + window.location.host + "/ws");
+    ws.binaryType = "arraybuffer";
+
+    ws.onopen = function() {
+        socket = ws;
+    };
+
+    ws.onclose = function() {
+        socket = null;
+        setTimeout(connect, 1000);
+    };
+}
+
+function hold_lease() {
+    if (lease_timer === null) {
+        lease_timer = setInterval(function() {
+            send_command("lease", [LEASE_TTL]);
+        }, LEASE_RENEW);
+    }
+}
+
+function drop_lease() {
+    if (lease_timer !== null) {
+        clearInterval(lease_timer);
+        lease_timer = null;
+    }
+}
+
+function send_command(action, args) {
+    args = args || [];
+    var this_seq = seq;
+    seq++;
+
+    if (action == "move-xy" || action == "move-start") {
+        hold_lease();
+    } else if (action == "move-stop") {
+        drop_lease();
+    }
+
+    if (socket && socket.readyState == WebSocket.OPEN) {
+
+        // The joystick sends the most commands by far, a binary frame is
+        // 9 bytes: command, seq, x, y. Lease renewals are the same size
+        // with the ttl in place of x.
+        if (action == "move-xy" || action == "lease") {
+            var frame = new DataView(new ArrayBuffer(9));
+            frame.setUint8(0, action == "lease" ? LEASE : MOVE_XY);
+            frame.setUint32(1, this_seq);
+            frame.setInt16(5, args[0]);
+            frame.setInt16(7, action == "lease" ? 0 : args[1]);
+            socket.send(frame.buffer);
+        } else {
+            socket.send(JSON.stringify({seq: this_seq, action: action, args: args}));
+        }
+        return;
+    }
+
+    var ajax_url = "/" + this_seq + "/" + action + "/";
+
+    if (args.length) {
+        ajax_url += args.join("/") + "/";
+    }
+
+    $.ajax({
+        type: "GET",
+        cache: false,
+        dataType: 'text',
+        async: true,
+        url: ajax_url
+    });
+}
+
+$(document).ready(connect);
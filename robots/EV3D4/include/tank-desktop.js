@@ -1,32 +1,14 @@
 
 var moving = 0;
 var ip = 0;
-var seq = 0;
 
 function stop_motors() {
-    var ajax_url = "/" + seq + "/move-stop/"
-    seq++;
-
-    $.ajax({
-        type: "GET",
-        cache: false,
-        dataType: 'text',
-        url: ajax_url
-    });
-
+    send_command("move-stop");
     moving = 0
 }
 
 function stop_medium_motor() {
-    var ajax_url = "/" + seq + "/motor-stop/medium/"
-    seq++;
-
-    $.ajax({
-        type: "GET",
-        cache: false,
-        dataType: 'text',
-        url: ajax_url
-    });
+    send_command("motor-stop", ["medium"]);
     return false;
 }
 
@@ -59,94 +41,46 @@ $(document).ready(function() {
     $('#ArrowUp').bind('touchstart mousedown', function() {
         console.log('ArrowUp down')
         var power = $('#tank-speed').slider("value")
-        var ajax_url = "/" + seq + "/move-start/forward/" + power + "/"
-        seq++;
+        send_command("move-start", ["forward", power]);
         moving = 1
-
-        $.ajax({
-            type: "GET",
-            cache: false,
-            dataType: 'text',
-            url: ajax_url
-        });
         return false;
     });
 
     $('#ArrowDown').bind('touchstart mousedown', function() {
         console.log('ArrowDown down')
         var power = $('#tank-speed').slider("value")
-        var ajax_url = "/" + seq + "/move-start/backward/" + power + "/"
-        seq++;
+        send_command("move-start", ["backward", power]);
         moving = 1
-
-        $.ajax({
-            type: "GET",
-            cache: false,
-            dataType: 'text',
-            url: ajax_url
-        });
         return false;
     });
 
     $('#ArrowLeft').bind('touchstart mousedown', function() {
         console.log('ArrowLeft down')
         var power = $('#tank-speed').slider("value")
-        var ajax_url = "/" + seq + "/move-start/left/" + power + "/"
-        seq++;
+        send_command("move-start", ["left", power]);
         moving = 1
-
-        $.ajax({
-            type: "GET",
-            cache: false,
-            dataType: 'text',
-            url: ajax_url
-        });
         return false;
     });
 
     $('#ArrowRight').bind('touchstart mousedown', function() {
         console.log('ArrowRight down')
         var power = $('#tank-speed').slider("value")
-        var ajax_url = "/" + seq + "/move-start/right/" + power + "/"
-        seq++;
+        send_command("move-start", ["right", power]);
         moving = 1
-
-        $.ajax({
-            type: "GET",
-            cache: false,
-            dataType: 'text',
-            url: ajax_url
-        });
         return false;
     });
 
     $('#desktop-medium-motor-spin .CounterClockwise').bind('touchstart mousedown', function() {
         console.log('CounterClockwise down')
         var power = $('#medium-motor-speed').slider("value")
-        var ajax_url = "/" + seq + "/motor-start/medium/counter-clockwise/" + power + "/"
-        seq++;
-
-        $.ajax({
-            type: "GET",
-            cache: false,
-            dataType: 'text',
-            url: ajax_url
-        });
+        send_command("motor-start", ["medium", "counter-clockwise", power]);
         return false;
     });
 
     $('#desktop-medium-motor-spin .Clockwise').bind('touchstart mousedown', function() {
         console.log('Clockwise down')
         var power = $('#medium-motor-speed').slider("value")
-        var ajax_url = "/" + seq + "/motor-start/medium/clockwise/" + power + "/"
-        seq++;
-
-        $.ajax({
-            type: "GET",
-            cache: false,
-            dataType: 'text',
-            url: ajax_url
-        });
+        send_command("motor-start", ["medium", "clockwise", power]);
         return false;
     });
 
@@ -2,64 +2,27 @@
 var start_x = 0;
 var start_y = 0;
 var moving = 0;
-var seq = 0;
 var prev_x = 0;
 var prev_y = 0;
 
 function stop_motors() {
-    var ajax_url = "/" + seq + "/move-stop/"
-    seq++;
-
-    $.ajax({
-        type: "GET",
-        cache: false,
-        dataType: 'text',
-        async: true,
-        url: ajax_url
-    });
+    send_command("move-stop");
     moving = 0;
 }
 
 function stop_medium_motor() {
-    var ajax_url = "/" + seq + "/motor-stop/medium/"
-    seq++;
-
-    $.ajax({
-        type: "GET",
-        cache: false,
-        dataType: 'text',
-        async: true,
-        url: ajax_url
-    });
+    send_command("motor-stop", ["medium"]);
     return false;
 }
 
-function ajax_move_xy(x, y) {
-    // console.log("FIRE ajax call with x,y " + x + "," + y)
-    var ajax_url = "/" + seq + "/move-xy/" + x + "/" + y + "/"
-    seq++;
-
-    $.ajax({
-        type: "GET",
-        cache: false,
-        dataType: 'text',
-        async: true,
-        url: ajax_url
-    });
+function send_move_xy(x, y) {
+    // console.log("move-xy with x,y " + x + "," + y)
+    send_command("move-xy", [x, y]);
     moving = 1;
 }
 
-function ajax_log(msg) {
-    var ajax_url = "/" + seq + "/log/" + msg + "/"
-    seq++;
-
-    $.ajax({
-        type: "GET",
-        cache: false,
-        dataType: 'text',
-        async: true,
-        url: ajax_url
-    });
+function send_log(msg) {
+    send_command("log", [msg]);
 }
 
 
@@ -89,29 +52,13 @@ $(document).ready(function() {
 
     $('#medium-motor-spin .CounterClockwise').bind('touchstart mousedown', function() {
         var power = $('#medium-motor-speed').slider("value")
-        var ajax_url = "/" + seq + "/motor-start/medium/counter-clockwise/" + power + "/"
-        seq++;
-
-        $.ajax({
-            type: "GET",
-            cache: false,
-            dataType: 'text',
-            url: ajax_url
-        });
+        send_command("motor-start", ["medium", "counter-clockwise", power]);
         return false;
     });
 
     $('#medium-motor-spin .Clockwise').bind('touchstart mousedown', function() {
         var power = $('#medium-motor-speed').slider("value")
-        var ajax_url = "/" + seq + "/motor-start/medium/clockwise/" + power + "/"
-        seq++;
-
-        $.ajax({
-            type: "GET",
-            cache: false,
-            dataType: 'text',
-            url: ajax_url
-        });
+        send_command("motor-start", ["medium", "clockwise", power]);
         return false;
     });
 
@@ -156,7 +103,7 @@ $(document).ready(function() {
             // one of these request so don't send one if the x,y coordinates
             // have only changed a tiny bit
             if (distance >= 10) {
-                ajax_move_xy(x, y);
+                send_move_xy(x, y);
                 prev_x = x;
                 prev_y = y;
             }
@@ -181,15 +128,6 @@ $(document).ready(function() {
     });
 
     $('#joystick-wrapper').bind('touchstart mousedown', function() {
-        var ajax_url = "/" + seq + "/joystick-engaged/"
-        seq++;
-
-        $.ajax({
-            type: "GET",
-            cache: false,
-            dataType: 'text',
-            async: true,
-            url: ajax_url
-        });
+        send_command("joystick-engaged");
     });
 });
@@ -0,0 +1,47 @@
+// Show what the robot is doing, from the Server-Sent Events at /telemetry.
+// The first event is a snapshot of every value, the ones after it only
+// carry the values that changed.
+var telemetry = {};
+
+function show_telemetry() {
+    var rows = [
+        ["Left motor", telemetry.left_position, telemetry.left_speed],
+        ["Right motor", telemetry.right_position, telemetry.right_speed],
+        ["Medium motor", telemetry.medium_position, telemetry.medium_speed]
+    ];
+    var html = "<table><tr><th></th><th>position</th><th>speed</th></tr>";
+
+    for (var i = 0; i < rows.length; i++) {
+        html += "<tr><td>" + rows[i][0] + "</td><td>" + rows[i][1] + "</td><td>" + rows[i][2] + "</td></tr>";
+    }
+
+    html += "</table>";
+    html += "Battery " + (telemetry.battery === null ? "-" : telemetry.battery.toFixed(2) + "V");
+    html += ", command latency " + (telemetry.latency === null ? "-" : telemetry.latency + "ms");
+    $("div.telemetry").html(html);
+}
+
+function watch_telemetry() {
+    if (!window.EventSource) {
+        return;
+    }
+
+    // EventSource reconnects by itself, and gets a snapshot when it does
+    var source = new EventSource("/telemetry");
+
+    source.addEventListener("snapshot", function(e) {
+        telemetry = JSON.parse(e.data);
+        show_telemetry();
+    });
+
+    source.addEventListener("delta", function(e) {
+        var delta = JSON.parse(e.data);
+
+        for (var name in delta) {
+            telemetry[name] = delta[name];
+        }
+        show_telemetry();
+    });
+}
+
+$(document).ready(watch_telemetry);
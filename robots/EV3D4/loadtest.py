@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+
+"""
+Replay a joystick trace against the EV3D4 web server on a fake sysfs tree
+and report the command to motor latency over each transport, no EV3
+needed.
+
+"get" sends every command as its own GET like the old web interface did,
+on a new connection each time with up to six in flight like a browser.
+"websocket" sends them all down one WebSocket. The latency of a command is
+the time from the moment the trace says it was sent to the moment
+TankControl finished with it (for a drive command, wrote it to the
+motors), so it includes any time spent queueing in the client. Drive
+commands overtaken by a newer one before the next control tick are
+coalesced and never reach the motors.
+
+Record a real session with ./EV3D4WebControl.py --record trace.csv and
+replay it with --trace trace.csv. Without --trace a synthetic trace is
+used: drags of the mobile joystick, with drag events every 8ms filtered the
+way tank-mobile.js does.
+
+    $ ./loadtest.py --seconds 10
+    $ ./loadtest.py --trace trace.csv
+"""
+
+import argparse
+import http.client
+import logging
+import math
+import os
+import random
+import socket
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'common'))
+from fakesys import FakeSys
+
+import websocket
+from webcontrol import encode_command
+
+
+def load_trace(filename):
+    """
+    Returns [(time, action, args)] from a file written by TankControl
+    """
+    trace = []
+
+    with open(filename) as fh:
+        for line in fh:
+            (t, seq, action, args) = line.rstrip('\n').split(',', 3)
+            trace.append((float(t), action, args.split('/') if args else []))
+
+    return trace
+
+
+def joystick_trace(seconds, rand):
+    """
+    Drags of the mobile joystick, each one engaging it, moving around and
+    letting go. Drag events come every 8ms and only those that moved 10 or
+    more from the last one sent are kept, like tank-mobile.js does.
+    """
+    trace = []
+    t = 0.5
+
+    while t < seconds:
+        trace.append((t, 'joystick-engaged', []))
+        duration = rand.uniform(0.5, 3.0)
+        heading = rand.uniform(0, 2 * math.pi)
+        turn = rand.uniform(-2.0, 2.0)
+        (prev_x, prev_y) = (None, None)
+        start = t
+
+        while t < start + duration:
+            t += 0.008
+            progress = (t - start) / duration
+            radius = 100 * min(1.0, 4 * progress)
+            angle = heading + turn * progress
+            x = int(radius * math.cos(angle))
+            y = int(radius * math.sin(angle))
+
+            if prev_x is None or math.hypot(x - prev_x, y - prev_y) >= 10:
+                trace.append((t, 'move-xy', [x, y]))
+                (prev_x, prev_y) = (x, y)
+
+        trace.append((t, 'move-stop', []))
+        t += rand.uniform(0.2, 1.5)
+
+    return trace
+
+
+class GetClient(object):
+
+    def __init__(self, port, concurrency=6):
+        self.port = port
+        self.pool = ThreadPoolExecutor(max_workers=concurrency)
+
+    def get(self, url):
+        connection = http.client.HTTPConnection('127.0.0.1', self.port)
+
+        try:
+            connection.request('GET', url)
+
+            # move-xy gets no reply, the server just closes the connection
+            connection.getresponse().read()
+        except (http.client.HTTPException, OSError):
+            pass
+        finally:
+            connection.close()
+
+    def send(self, seq, action, args):
+        url = '/%d/%s/' % (seq, action)
+
+        if args:
+            url += '/'.join(str(arg) for arg in args) + '/'
+
+        self.pool.submit(self.get, url)
+
+    def close(self):
+        self.pool.shutdown()
+
+
+class WebSocketClient(object):
+
+    def __init__(self, port):
+        self.sock = socket.create_connection(('127.0.0.1', port))
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        (request, key) = websocket.handshake_request('127.0.0.1:%d' % port, '/ws')
+        self.sock.sendall(request)
+        response = b''
+
+        while b'\r\n\r\n' not in response:
+            data = self.sock.recv(1024)
+
+            if not data:
+                raise EOFError("connection closed during the handshake")
+
+            response += data
+
+        if not response.startswith(b'HTTP/1.1 101') or websocket.accept_key(key).encode() not in response:
+            raise websocket.WebSocketError("handshake failed: %s" % response)
+
+    def send(self, seq, action, args):
+        (opcode, payload) = encode_command(seq, action, args)
+        self.sock.sendall(websocket.encode_frame(opcode, payload, mask=True))
+
+    def close(self):
+        self.sock.sendall(websocket.encode_frame(websocket.OP_CLOSE, b'\x03\xe8', mask=True))
+        self.sock.close()
+
+
+def replay(client, trace, seq, applied, speedup=1.0):
+    """
+    Send the trace through client in real time, returns {seq: (time it was
+    due, action)} and the next seq
+    """
+    sent = {}
+    start = time.perf_counter()
+
+    for (t, action, args) in trace:
+        due = start + t / speedup
+        delay = due - time.perf_counter()
+
+        if delay > 0:
+            time.sleep(delay)
+
+        sent[seq] = (due, action)
+        client.send(seq, action, args)
+        seq += 1
+
+    # Give the last commands time to arrive
+    deadline = time.perf_counter() + 2.0
+    count = -1
+
+    while time.perf_counter() < deadline and count != len(applied):
+        count = len(applied)
+        time.sleep(0.2)
+
+    return (sent, seq)
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(int(len(values) * p), len(values) - 1)]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Load test the EV3D4 web control transports on a fake sysfs tree')
+    parser.add_argument('--trace', help='replay this trace, as written by EV3D4WebControl.py --record')
+    parser.add_argument('--seconds', type=float, default=10.0, help='length of the synthetic trace')
+    parser.add_argument('--speedup', type=float, default=1.0, help='replay the trace this many times faster')
+    parser.add_argument('--seed', type=int, default=0, help='seed for the synthetic trace')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    trace = load_trace(args.trace) if args.trace else joystick_trace(args.seconds, random.Random(args.seed))
+    fake = FakeSys()
+
+    try:
+        fake.add_motor('ev3-ports:outA', 'lego-ev3-m-motor')
+        fake.add_motor('ev3-ports:outB')
+        fake.add_motor('ev3-ports:outC')
+        fake.install()
+
+        from EV3D4WebControl import EV3D4WebControlled
+        ev3d4 = EV3D4WebControlled(port_number=0)
+        port = ev3d4.www.bind()
+        threading.Thread(target=ev3d4.www.run, daemon=True).start()
+
+        # Time stamp every command when TankControl is done with it, drive
+        # commands when they are written to the motors
+        control = ev3d4.control
+        applied = {}
+        command = control.command
+        apply_drive = control.apply_drive
+
+        def timed_command(seq, action, args):
+            result = command(seq, action, args)
+
+            if action not in control.DRIVE_ACTIONS or not result:
+                applied[seq] = (time.perf_counter(), result)
+
+            return result
+
+        def timed_apply_drive(seq, action, args):
+            apply_drive(seq, action, args)
+            applied[seq] = (time.perf_counter(), True)
+
+        control.command = timed_command
+        control.apply_drive = timed_apply_drive
+        seq = 0
+
+        print("%d commands, %d of them move-xy, over %.1fs" % (
+            len(trace), sum(1 for event in trace if event[1] == 'move-xy'), trace[-1][0] / args.speedup))
+        print("%10s %8s %8s %8s %8s %8s %8s %6s" % (
+            'transport', 'applied', 'ignored', 'merged', 'p50 (ms)', 'p90 (ms)', 'p99 (ms)', 'max'))
+
+        for transport in ('get', 'websocket'):
+            client = GetClient(port) if transport == 'get' else WebSocketClient(port)
+            (sent, seq) = replay(client, trace, seq, applied, args.speedup)
+            client.close()
+
+            latencies = [applied[s][0] - due for (s, (due, action)) in sent.items() if s in applied and applied[s][1]]
+            ignored = sum(1 for s in sent if s in applied and not applied[s][1])
+            merged = sum(1 for s in sent if s not in applied)
+
+            if latencies:
+                print("%10s %8d %8d %8d %8.2f %8.2f %8.2f %6.1f" % (
+                    transport, len(latencies), ignored, merged,
+                    1000 * percentile(latencies, 0.5),
+                    1000 * percentile(latencies, 0.9),
+                    1000 * percentile(latencies, 0.99),
+                    1000 * max(latencies)))
+            else:
+                print("%10s %8d %8d %8d" % (transport, 0, ignored, merged))
+
+        print(control)
+        ev3d4.www.shutdown()
+        control.close()
+    finally:
+        fake.cleanup()
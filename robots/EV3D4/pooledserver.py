@@ -0,0 +1,417 @@
+#!/usr/bin/env python3
+
+"""
+An HTTPServer that serves with a fixed number of threads however many
+clients connect, and that slow clients cannot hold up.
+
+One thread accepts the connections and reads the requests without
+blocking. A connection only gets a worker once all of its request has
+arrived, so a client that sends slowly, or not at all, costs a file
+descriptor instead of a thread. Requests matching priority_route go to a
+pool of their own so they never wait behind the files being sent to a
+client that reads slowly. Requests matching stream_route (WebSockets) get
+a thread of their own for as long as they stay open, up to max_streams.
+
+A keep-alive connection goes back to the accepting thread between
+requests. A connection is closed if it is idle for idle_timeout, takes
+longer than request_timeout to send its request, or stops reading the
+response for request_timeout. Once max_connections are open the one that
+has been waiting the longest is closed to make room for a new one.
+
+Any BaseHTTPRequestHandler works, it is handed a Connection in place of
+the socket.
+"""
+
+import io
+import logging
+import queue
+import selectors
+import socket
+import threading
+import time
+from http.server import HTTPServer
+
+log = logging.getLogger(__name__)
+
+MAX_REQUEST = 16384
+BUSY = b'HTTP/1.1 503 Service Unavailable\r\nContent-Length: 0\r\nConnection: close\r\n\r\n'
+
+
+class RequestReader(object):
+    """
+    The rfile of a request that has been read already. A stream carries on
+    reading from the socket once the request runs out.
+    """
+
+    def __init__(self, request, rfile=None):
+        self.request = io.BytesIO(request)
+        self.rfile = rfile
+        self.keep_alive = False
+
+    def readline(self, limit=-1):
+        line = self.request.readline(limit)
+
+        if line.endswith(b'\n') or (limit >= 0 and len(line) >= limit):
+            return line
+
+        if self.rfile is None:
+            # The handler is after the next request so the connection is
+            # keep-alive, the next request goes back through the server
+            self.keep_alive = True
+            return line
+
+        return line + self.rfile.readline(limit - len(line) if limit >= 0 else -1)
+
+    def read(self, size=-1):
+        data = self.request.read(size)
+
+        if self.rfile is not None and (size < 0 or len(data) < size):
+            data += self.rfile.read(size - len(data) if size >= 0 else -1)
+
+        return data
+
+    def close(self):
+        pass
+
+
+class SocketWriter(object):
+    """
+    The wfile, every write is sent in full
+    """
+    closed = False
+
+    def __init__(self, sock):
+        self.sock = sock
+
+    def write(self, data):
+        self.sock.sendall(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class Connection(object):
+    """
+    A client socket and whatever it has sent that is not handled yet.
+    Request handlers take it for the socket.
+    """
+
+    def __init__(self, sock, client_address):
+        self.sock = sock
+        self.client_address = client_address
+        self.buffer = b''
+        self.since = None
+        self.deadline = None
+        self.rfile = None
+
+    def take_request(self):
+        """
+        Returns the request line and headers once they have all arrived
+        """
+        end = self.buffer.find(b'\r\n\r\n')
+
+        if end < 0:
+            return None
+
+        (request, self.buffer) = (self.buffer[:end + 4], self.buffer[end + 4:])
+        return request
+
+    # What StreamRequestHandler asks of a socket
+    def makefile(self, mode, buffering=None):
+        return self.rfile if 'r' in mode else SocketWriter(self.sock)
+
+    def settimeout(self, timeout):
+        self.sock.settimeout(timeout)
+
+    def setsockopt(self, *args):
+        self.sock.setsockopt(*args)
+
+    def sendall(self, data):
+        self.sock.sendall(data)
+
+    def fileno(self):
+        return self.sock.fileno()
+
+
+class PooledHTTPServer(HTTPServer):
+    allow_reuse_address = True
+
+    # Compiled regular expressions matched against the request line
+    priority_route = None
+    stream_route = None
+
+    def __init__(self, server_address, RequestHandlerClass, workers=2, priority_workers=2,
+                 max_connections=32, max_streams=4, idle_timeout=10.0, request_timeout=5.0):
+        HTTPServer.__init__(self, server_address, RequestHandlerClass)
+        self.max_connections = max_connections
+        self.max_streams = max_streams
+        self.idle_timeout = idle_timeout
+        self.request_timeout = request_timeout
+        self.selector = selectors.DefaultSelector()
+        (self.wakeup_r, self.wakeup_w) = socket.socketpair()
+        self.wakeup_r.setblocking(False)
+        self.lock = threading.Lock()
+        self.running = False
+        self.stopped = threading.Event()
+        self.stopped.set()
+
+        # Touched by the accepting thread only
+        self.connections = set()
+        self.waiting = set()
+
+        # Connections the workers are done with, (connection, keep alive)
+        self.returned = queue.Queue()
+        self.streams = 0
+
+        self.accepted = 0
+        self.refused = 0
+        self.timed_out = 0
+        self.requests = 0
+        self.priority_requests = 0
+
+        self.jobs = queue.Queue()
+        self.priority_jobs = queue.Queue()
+        self.pools = ((self.jobs, workers), (self.priority_jobs, priority_workers))
+        self.workers = []
+
+        for (jobs, count) in self.pools:
+            for x in range(count):
+                worker = threading.Thread(target=self.work, args=(jobs,), daemon=True)
+                worker.start()
+                self.workers.append(worker)
+
+    def __str__(self):
+        return ("%d accepted, %d refused, %d timed out, %d requests (%d priority), %d open, %d streams" %
+                (self.accepted, self.refused, self.timed_out, self.requests, self.priority_requests,
+                 len(self.connections), self.streams))
+
+    def serve_forever(self, poll_interval=0.5):
+        self.running = True
+        self.stopped.clear()
+        self.selector.register(self.socket, selectors.EVENT_READ)
+        self.selector.register(self.wakeup_r, selectors.EVENT_READ)
+
+        try:
+            while self.running:
+                timeout = poll_interval
+
+                if self.waiting:
+                    deadline = min(connection.deadline for connection in self.waiting)
+                    timeout = max(0.0, min(timeout, deadline - time.monotonic()))
+
+                for (key, events) in self.selector.select(timeout):
+                    if key.fileobj is self.socket:
+                        self.accept()
+                    elif key.fileobj is self.wakeup_r:
+                        self.wakeup_r.recv(4096)
+                    else:
+                        self.receive(key.data)
+
+                self.take_back()
+                self.expire()
+        finally:
+            self.selector.unregister(self.socket)
+            self.selector.unregister(self.wakeup_r)
+            self.stopped.set()
+
+    def shutdown(self):
+        self.running = False
+        self.wakeup()
+        self.stopped.wait()
+
+    def server_close(self):
+        HTTPServer.server_close(self)
+
+        for (jobs, count) in self.pools:
+            for x in range(count):
+                jobs.put(None)
+
+        self.take_back()
+
+        for connection in list(self.connections):
+            self.close(connection)
+
+        self.selector.close()
+        self.wakeup_r.close()
+        self.wakeup_w.close()
+
+    def wakeup(self):
+        try:
+            self.wakeup_w.send(b'\0')
+        except OSError:
+            pass
+
+    def accept(self):
+        try:
+            (sock, client_address) = self.socket.accept()
+        except OSError:
+            return
+
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+        # Make room by closing whoever has kept us waiting the longest, so
+        # idle and slow clients cannot lock everyone else out
+        if len(self.connections) >= self.max_connections:
+            if not self.waiting:
+                log.warning("%s: refused, %d connections busy" % (client_address[0], len(self.connections)))
+                self.refused += 1
+                self.send_busy(sock)
+                return
+
+            oldest = min(self.waiting, key=lambda connection: connection.since)
+            log.info("%s: closed to make room" % oldest.client_address[0])
+            self.timed_out += 1
+            self.close(oldest)
+
+        self.accepted += 1
+        connection = Connection(sock, client_address)
+        self.connections.add(connection)
+        self.wait_for_request(connection)
+
+    def send_busy(self, sock):
+        sock.setblocking(False)
+
+        try:
+            sock.send(BUSY)
+        except OSError:
+            pass
+
+        sock.close()
+
+    def wait_for_request(self, connection):
+        connection.sock.setblocking(False)
+        connection.since = time.monotonic()
+        connection.deadline = time.monotonic() + (self.request_timeout if connection.buffer else self.idle_timeout)
+        self.selector.register(connection.sock, selectors.EVENT_READ, connection)
+        self.waiting.add(connection)
+
+        # A request that came in behind the last one
+        if connection.buffer:
+            self.dispatch(connection)
+
+    def receive(self, connection):
+        try:
+            data = connection.sock.recv(4096)
+        except BlockingIOError:
+            return
+        except OSError:
+            data = b''
+
+        if not data:
+            self.close(connection)
+            return
+
+        # The request has started, it has request_timeout to finish
+        if not connection.buffer:
+            connection.deadline = time.monotonic() + self.request_timeout
+
+        connection.buffer += data
+        self.dispatch(connection)
+
+    def dispatch(self, connection):
+        request = connection.take_request()
+
+        if request is None:
+            if len(connection.buffer) > MAX_REQUEST:
+                log.warning("%s: request too long" % connection.client_address[0])
+                self.close(connection)
+            return
+
+        self.selector.unregister(connection.sock)
+        self.waiting.discard(connection)
+        connection.sock.setblocking(True)
+        connection.sock.settimeout(self.request_timeout)
+        request_line = request.split(b'\r\n', 1)[0]
+        self.requests += 1
+
+        if self.stream_route is not None and self.stream_route.match(request_line):
+            if self.streams >= self.max_streams:
+                log.warning("%s: refused stream, %d open" % (connection.client_address[0], self.streams))
+                self.refused += 1
+                self.connections.discard(connection)
+                self.send_busy(connection.sock)
+                return
+
+            with self.lock:
+                self.streams += 1
+
+            connection.sock.settimeout(None)
+            connection.rfile = RequestReader(request + connection.buffer, connection.sock.makefile('rb'))
+            connection.buffer = b''
+            threading.Thread(target=self.serve, args=(connection, True), daemon=True).start()
+
+        elif self.priority_route is not None and self.priority_route.match(request_line):
+            self.priority_requests += 1
+            connection.rfile = RequestReader(request)
+            self.priority_jobs.put(connection)
+
+        else:
+            connection.rfile = RequestReader(request)
+            self.jobs.put(connection)
+
+    def work(self, jobs):
+        while True:
+            connection = jobs.get()
+
+            if connection is None:
+                break
+
+            self.serve(connection)
+
+    def serve(self, connection, stream=False):
+        keep_alive = False
+
+        try:
+            self.RequestHandlerClass(connection, connection.client_address, self)
+            keep_alive = connection.rfile.keep_alive and not stream
+
+        # The client went away or stopped reading
+        except OSError as e:
+            log.info("%s: %s" % (connection.client_address[0], e))
+
+        except Exception:
+            self.handle_error(connection, connection.client_address)
+
+        if stream:
+            with self.lock:
+                self.streams -= 1
+
+        connection.rfile = None
+        self.returned.put((connection, keep_alive))
+        self.wakeup()
+
+    def take_back(self):
+        while True:
+            try:
+                (connection, keep_alive) = self.returned.get_nowait()
+            except queue.Empty:
+                break
+
+            if keep_alive and self.running:
+                self.wait_for_request(connection)
+            else:
+                self.close(connection)
+
+    def expire(self):
+        now = time.monotonic()
+
+        for connection in [c for c in self.waiting if c.deadline <= now]:
+            log.info("%s: timed out" % connection.client_address[0])
+            self.timed_out += 1
+            self.close(connection)
+
+    def close(self, connection):
+        if connection in self.waiting:
+            self.selector.unregister(connection.sock)
+            self.waiting.discard(connection)
+
+        self.connections.discard(connection)
+
+        try:
+            connection.sock.close()
+        except OSError:
+            pass
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+
+"""
+What EV3D4 is doing, pushed to the web interface as Server-Sent Events at
+/telemetry.
+
+One thread reads the motors, the battery and TankControl's latency once
+per interval, however many browsers are watching, and only while at least
+one is. Each sample is encoded once, as a "snapshot" event with every
+value and as a "delta" event with only the values that changed since the
+sample before, and every viewer is sent one of those two cached events.
+A viewer that kept up gets the delta, one that fell behind or just
+connected gets the snapshot. Nothing is sent while nothing changes apart
+from a comment every KEEPALIVE seconds.
+
+    event: snapshot
+    id: 41
+    data: {"left_position": 1520, "left_speed": 0, ..., "battery": 7.61, "latency": null}
+
+    event: delta
+    id: 42
+    data: {"left_position": 1577, "left_speed": 330}
+"""
+
+import json
+import logging
+import threading
+import time
+from ev3dev2 import DeviceNotFound
+from ev3dev2.power import PowerSupply
+
+log = logging.getLogger(__name__)
+
+KEEPALIVE = 5.0
+KEEPALIVE_EVENT = b':\n\n'
+
+
+def encode_event(event, version, values):
+    return ('event: %s\nid: %d\ndata: %s\n\n' % (
+        event, version, json.dumps(values, sort_keys=True, separators=(',', ':')))).encode()
+
+
+class Telemetry(object):
+    """
+    Samples robot every interval seconds while anyone is watching. samples
+    counts the samples taken, events and bytes what was sent to viewers.
+    """
+
+    def __init__(self, robot, control, interval=0.2):
+        self.robot = robot
+        self.control = control
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.changed = threading.Condition(self.lock)
+        self.viewers = 0
+        self.closed = False
+
+        # The newest sample and its two encodings
+        self.version = 0
+        self.values = None
+        self.snapshot = None
+        self.delta = None
+
+        self.samples = 0
+        self.events = 0
+        self.bytes = 0
+
+        try:
+            self.battery = PowerSupply()
+        except DeviceNotFound:
+            log.info("no battery to report on")
+            self.battery = None
+
+        self.thread = threading.Thread(target=self.run, name='telemetry', daemon=True)
+        self.thread.start()
+
+    def __str__(self):
+        return "%d samples, %d viewers, %d events, %d bytes" % (self.samples, self.viewers, self.events, self.bytes)
+
+    def close(self):
+        with self.lock:
+            self.closed = True
+            self.changed.notify_all()
+
+    def sample(self):
+        robot = self.robot
+        latency = self.control.take_latency()
+        values = {}
+
+        for (name, motor) in (('left', robot.left_motor), ('right', robot.right_motor),
+                              ('medium', getattr(robot, 'medium_motor', None))):
+            if motor is not None:
+                values[name + '_position'] = motor.position
+                values[name + '_speed'] = motor.speed
+
+        values['battery'] = round(self.battery.measured_volts, 2) if self.battery else None
+        values['latency'] = round(1000 * latency, 1) if latency is not None else None
+        return values
+
+    def run(self):
+        next_sample = time.monotonic()
+
+        while True:
+            with self.lock:
+                while not self.viewers and not self.closed:
+                    self.changed.wait()
+
+                if self.closed:
+                    return
+
+            try:
+                values = self.sample()
+            except Exception as e:
+                log.exception(e)
+                values = None
+
+            if values is not None:
+                self.publish(values)
+
+            # Skip the samples we were too slow for rather than bunch up
+            next_sample = max(next_sample + self.interval, time.monotonic())
+            time.sleep(max(0.0, next_sample - time.monotonic()))
+
+    def publish(self, values):
+        with self.lock:
+            self.samples += 1
+            previous = self.values or {}
+            delta = dict((name, value) for (name, value) in values.items() if previous.get(name, '') != value)
+
+            if self.values is not None and not delta:
+                return
+
+            self.version += 1
+            self.values = values
+            self.snapshot = encode_event('snapshot', self.version, values)
+            self.delta = encode_event('delta', self.version, delta)
+            self.changed.notify_all()
+
+    def subscribe(self):
+        with self.lock:
+            self.viewers += 1
+            self.changed.notify_all()
+
+    def unsubscribe(self):
+        with self.lock:
+            self.viewers -= 1
+
+    def next_event(self, version):
+        """
+        Returns (version, event) for a viewer that was last sent version,
+        None if it has been sent nothing yet. Blocks until there is
+        something new, or it is time for a keep-alive.
+        """
+        with self.lock:
+            if self.version == version or self.values is None:
+                self.changed.wait_for(lambda: self.closed or (self.values is not None and self.version != version),
+                                      KEEPALIVE)
+
+            if self.closed:
+                raise EOFError("telemetry closed")
+
+            if self.values is None or self.version == version:
+                self.events += 1
+                self.bytes += len(KEEPALIVE_EVENT)
+                return (version, KEEPALIVE_EVENT)
+
+            if version is not None and self.version == version + 1:
+                event = self.delta
+            else:
+                event = self.snapshot
+
+            self.events += 1
+            self.bytes += len(event)
+            return (self.version, event)
@@ -0,0 +1,667 @@
+#!/usr/bin/env python3
+
+"""
+The web server behind EV3D4WebControl.
+
+This replaces the TankWebHandler that comes with ev3dev2 so that the web
+interface can send its commands over a single WebSocket at /ws instead of
+a new HTTP request per touch event. The GET routes, such as
+/<seq>/move-xy/<x>/<y>/, still work for browsers without WebSockets and
+while the socket is reconnecting.
+
+Both ways in end up in TankControl.command(). The joystick moves the most
+by far, so move-xy goes over the socket as a 9 byte binary frame:
+
+    uint8 command (1 = move-xy), uint32 seq, int16 x, int16 y
+
+and so does the lease renewal sent every 150ms while driving:
+
+    uint8 command (2 = lease), uint32 seq, int16 ttl in ms, int16 0
+
+every other command is a JSON text frame:
+
+    {"seq": 12, "action": "move-start", "args": ["forward", 25]}
+"""
+
+import json
+import logging
+import os
+import re
+import socket
+import struct
+import sys
+import threading
+import time
+from ev3dev2.control.webserver import RobotWebHandler, RobotWebServer
+from ev3dev2.motor import list_motors
+
+import websocket
+from pooledserver import PooledHTTPServer
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'common'))
+from lease import Watchdog
+
+log = logging.getLogger(__name__)
+
+MOVE_XY = 1
+LEASE = 2
+MOVE_XY_FRAME = struct.Struct('!BIhh')
+
+# The longest and shortest lease a client may ask for, in seconds
+LEASE_MIN = 0.1
+LEASE_MAX = 2.0
+
+
+class TankControl(object):
+    """
+    Carries out the commands of the web interface on robot, whichever way
+    they came in. Every command carries the client's sequence number, a
+    movement that shows up after a later one has been seen is stale and is
+    ignored. Stops are always carried out.
+
+    Drive commands (move-xy and move-start) are not applied as they come
+    in. They go into a latest-wins slot that a drive thread empties at most
+    once every tick seconds, so a burst of joystick positions never queues
+    up behind a slow motor write: the ones that are overtaken before the
+    next tick are coalesced, only the newest is applied. With tick=None
+    they are applied as they come in, the way TankWebHandler did.
+
+    received, coalesced, ignored and applied count the drive commands.
+    take_latency() returns the longest a command took from coming in to
+    being carried out since it was last called.
+
+    If record is a filename every command is written to it as
+    "time,seq,action,args" so a session can be replayed by loadtest.py.
+
+    Every drive command grants a lease of lease seconds, which the client
+    renews with "lease/<ttl in ms>" while it wants to keep driving. If the
+    lease runs out, because the move-stop was lost or the phone dropped off
+    the WiFi, the robot stops as if it had got the move-stop. expired
+    counts those stops. lease=None drives until told to stop.
+    """
+    DRIVE_ACTIONS = ('move-xy', 'move-start')
+
+    def __init__(self, robot, record=None, tick=0.02, lease=0.5):
+        self.robot = robot
+        self.tick = tick
+        self.lease = lease
+        self.watchdog = Watchdog(self.expire, name='lease') if lease else None
+
+        # lock guards the state below, motor_lock is held for every motor
+        # write so a drive command can never land after a later stop
+        self.lock = threading.Lock()
+        self.motor_lock = threading.Lock()
+        self.wakeup = threading.Condition(self.lock)
+
+        self.max_move_seq = -1
+        self.stop_seq = -1
+        self.joystick_engaged = False
+        self.pending = None
+        self.closed = False
+        self.motor_max_speed = robot.left_motor.max_speed
+        self.commands = 0
+        self.received = 0
+        self.coalesced = 0
+        self.ignored = 0
+        self.applied = 0
+        self.expired = 0
+        self.latency = None
+        self.start = time.time()
+        self.record = open(record, 'w') if record else None
+
+        if hasattr(robot, 'medium_motor'):
+            self.medium_motor_max_speed = robot.medium_motor.max_speed
+        else:
+            self.medium_motor_max_speed = 0
+
+        if tick:
+            self.drive_thread = threading.Thread(target=self.drive_loop, name='drive', daemon=True)
+            self.drive_thread.start()
+
+    def __str__(self):
+        return "%d commands, drive: %d received, %d coalesced, %d ignored, %d applied, %d leases expired" % (
+            self.commands, self.received, self.coalesced, self.ignored, self.applied, self.expired)
+
+    def close(self):
+        with self.lock:
+            self.closed = True
+            self.wakeup.notify()
+
+        if self.watchdog:
+            self.watchdog.close()
+
+        if self.record:
+            self.record.close()
+            self.record = None
+
+    def stale(self, seq):
+        """
+        True if a movement with a later seq has been seen already
+        """
+        if seq <= self.max_move_seq:
+            self.ignored += 1
+            return True
+
+        self.max_move_seq = seq
+        return False
+
+    def note_latency(self, received):
+        """
+        Called with self.lock held
+        """
+        latency = time.perf_counter() - received
+
+        if self.latency is None or latency > self.latency:
+            self.latency = latency
+
+    def take_latency(self):
+        with self.lock:
+            (latency, self.latency) = (self.latency, None)
+
+        return latency
+
+    def command(self, seq, action, args):
+        """
+        Returns True if the command was carried out, or for a drive command
+        queued to be
+        """
+        received = time.perf_counter()
+
+        if action == 'lease':
+            return self.renew_lease(seq, args)
+
+        if action in self.DRIVE_ACTIONS:
+
+            if not self.tick:
+                with self.motor_lock:
+                    with self.lock:
+                        if not self.accept_drive(seq, action, args):
+                            return False
+                        self.applied += 1
+
+                    self.apply_drive(seq, action, args)
+
+                    with self.lock:
+                        self.note_latency(received)
+
+                    return True
+
+            with self.lock:
+                if not self.accept_drive(seq, action, args):
+                    return False
+
+                if self.pending is not None:
+                    self.coalesced += 1
+
+                self.pending = (seq, action, args, received)
+                self.wakeup.notify()
+                return True
+
+        with self.motor_lock:
+            with self.lock:
+                self.log_command(seq, action, args)
+                result = self._command(seq, action, args)
+                self.note_latency(received)
+                return result
+
+    def log_command(self, seq, action, args):
+        self.commands += 1
+
+        if self.record:
+            self.record.write("%.4f,%d,%s,%s\n" % (
+                time.time() - self.start, seq, action, '/'.join(str(arg) for arg in args)))
+
+    def renew_lease(self, seq, args):
+        """
+        Returns False if there was no lease to renew, the robot had stopped
+        """
+        with self.lock:
+            self.log_command(seq, action='lease', args=args)
+
+        if not self.watchdog:
+            return False
+
+        ttl = int(args[0]) / 1000.0 if args else self.lease
+        return self.watchdog.renew(min(max(ttl, LEASE_MIN), LEASE_MAX))
+
+    def accept_drive(self, seq, action, args):
+        """
+        Count a drive command, returns False if it is to be ignored
+        """
+        self.log_command(seq, action, args)
+        self.received += 1
+
+        # A move-xy that shows up after the joystick was let go must not
+        # start the robot again
+        if action == 'move-xy' and not self.joystick_engaged:
+            log.debug("seq %d: %s %s (ignore, joystick idle)" % (seq, action, args))
+            self.ignored += 1
+            return False
+
+        if self.stale(seq):
+            log.debug("seq %d: %s %s (ignore, max seq %d)" % (seq, action, args, self.max_move_seq))
+            return False
+
+        if self.watchdog:
+            self.watchdog.grant(self.lease)
+
+        return True
+
+    def drive_loop(self):
+        """
+        Apply the newest drive command, at most once per tick
+        """
+        while True:
+            with self.lock:
+                while self.pending is None and not self.closed:
+                    self.wakeup.wait()
+
+                if self.closed:
+                    return
+
+                (seq, action, args, received) = self.pending
+                self.pending = None
+
+            with self.motor_lock:
+                with self.lock:
+                    # Stopped while we were waiting for the motors
+                    if seq <= self.stop_seq:
+                        self.coalesced += 1
+                        continue
+
+                    self.applied += 1
+
+                try:
+                    self.apply_drive(seq, action, args)
+                except Exception as e:
+                    log.exception(e)
+
+                with self.lock:
+                    self.note_latency(received)
+
+            time.sleep(self.tick)
+
+    def apply_drive(self, seq, action, args):
+        robot = self.robot
+
+        # mobile interface
+        if action == 'move-xy':
+            x = int(args[0])
+            y = int(args[1])
+            robot.on(x, y)
+            log.debug("seq %d: (x, y) (%4d, %4d)" % (seq, x, y))
+
+        # desktop interface
+        elif action == 'move-start':
+            direction = args[0]
+            speed_percentage = int(args[1])
+            log.debug("seq %d: move %s" % (seq, direction))
+            left_speed = int(speed_percentage * self.motor_max_speed) / 100.0
+            right_speed = int(speed_percentage * self.motor_max_speed) / 100.0
+
+            if direction == 'forward':
+                robot.left_motor.run_forever(speed_sp=left_speed)
+                robot.right_motor.run_forever(speed_sp=right_speed)
+
+            elif direction == 'backward':
+                robot.left_motor.run_forever(speed_sp=left_speed * -1)
+                robot.right_motor.run_forever(speed_sp=right_speed * -1)
+
+            elif direction == 'left':
+                robot.left_motor.run_forever(speed_sp=left_speed * -1)
+                robot.right_motor.run_forever(speed_sp=right_speed)
+
+            elif direction == 'right':
+                robot.left_motor.run_forever(speed_sp=left_speed)
+                robot.right_motor.run_forever(speed_sp=right_speed * -1)
+
+    def _command(self, seq, action, args):
+        robot = self.robot
+
+        # desktop & mobile interface
+        if action == 'move-stop':
+            log.debug("seq %d: move stop" % seq)
+            self.max_move_seq = max(self.max_move_seq, seq)
+            self.stop_seq = max(self.stop_seq, seq)
+
+            if self.pending is not None:
+                self.coalesced += 1
+                self.pending = None
+
+            if self.watchdog:
+                self.watchdog.release()
+
+            robot.left_motor.stop()
+            robot.right_motor.stop()
+            self.joystick_engaged = False
+
+        # medium motor
+        elif action == 'motor-stop':
+            motor = args[0]
+            log.debug("seq %d: motor-stop %s" % (seq, motor))
+
+            if motor == 'medium':
+                if hasattr(robot, 'medium_motor'):
+                    robot.medium_motor.stop()
+            else:
+                raise Exception("motor %s not supported yet" % motor)
+
+        elif action == 'motor-start':
+            (motor, direction, speed_percentage) = (args[0], args[1], int(args[2]))
+            log.debug("seq %d: start motor %s, direction %s, speed_percentage %s" %
+                      (seq, motor, direction, speed_percentage))
+
+            if motor == 'medium':
+                if hasattr(robot, 'medium_motor'):
+                    medium_speed = int(speed_percentage * self.medium_motor_max_speed) / 100.0
+
+                    if direction == 'clockwise':
+                        robot.medium_motor.run_forever(speed_sp=medium_speed)
+
+                    elif direction == 'counter-clockwise':
+                        robot.medium_motor.run_forever(speed_sp=medium_speed * -1)
+                else:
+                    log.info("we do not have a medium_motor")
+            else:
+                raise Exception("motor %s not supported yet" % motor)
+
+        elif action == 'joystick-engaged':
+            self.joystick_engaged = True
+
+        elif action == 'log':
+            log.debug("seq %d: CLIENT LOG: %s" % (seq, ''.join(str(arg) for arg in args)))
+
+        else:
+            log.warning("seq %d: unsupported action %s" % (seq, action))
+            return False
+
+        return True
+
+    def stop(self, lease=None):
+        """
+        Stop driving, unless lease is given and has been renewed since.
+        Returns True if the robot was stopped.
+        """
+        with self.motor_lock:
+            with self.lock:
+                if lease is not None and self.watchdog.lease != lease:
+                    return False
+
+                if self.watchdog:
+                    self.watchdog.release()
+
+                self.pending = None
+                self.stop_seq = self.max_move_seq
+
+                # The joystick is still held after a lease ran out, the
+                # next move-xy to get through starts the robot again
+                if lease is None:
+                    self.joystick_engaged = False
+
+            self.robot.left_motor.stop()
+            self.robot.right_motor.stop()
+            return True
+
+    def expire(self, lease):
+        """
+        Called by the watchdog when the lease runs out
+        """
+        if not self.stop(lease):
+            return False
+
+        with self.lock:
+            self.expired += 1
+
+        log.warning("lease expired, stopped")
+        return True
+
+
+def decode_command(opcode, payload):
+    """
+    Returns (seq, action, args) for a WebSocket message
+    """
+    if opcode == websocket.OP_BINARY:
+        (command, seq, x, y) = MOVE_XY_FRAME.unpack(payload)
+
+        if command == MOVE_XY:
+            return (seq, 'move-xy', [x, y])
+
+        if command == LEASE:
+            return (seq, 'lease', [x])
+
+        raise ValueError("unknown binary command %d" % command)
+
+    message = json.loads(payload.decode())
+    return (int(message['seq']), message['action'], message.get('args', []))
+
+
+def encode_command(seq, action, args):
+    """
+    The WebSocket message for a command, returns (opcode, payload)
+    """
+    if action == 'move-xy':
+        return (websocket.OP_BINARY, MOVE_XY_FRAME.pack(MOVE_XY, seq, int(args[0]), int(args[1])))
+
+    if action == 'lease':
+        return (websocket.OP_BINARY, MOVE_XY_FRAME.pack(LEASE, seq, int(args[0]), 0))
+
+    return (websocket.OP_TEXT, json.dumps({'seq': seq, 'action': action, 'args': args}).encode())
+
+
+class EV3D4WebHandler(RobotWebHandler):
+    """
+    Serves the files and the GET routes like TankWebHandler, plus the
+    WebSocket at /ws and the telemetry stream at /telemetry.
+    self.robot.control is the TankControl, self.robot.assets and
+    self.robot.telemetry, if there are any, the AssetTable to serve files
+    from and the Telemetry to stream.
+    """
+
+    # Keep connections open so a page load does not pay for a new one per
+    # file. Every response must then have a Content-Length or close.
+    protocol_version = 'HTTP/1.1'
+
+    def __str__(self):
+        return "%s-EV3D4WebHandler" % self.robot
+
+    def do_GET(self):
+
+        if self.path == '/ws':
+            self.serve_websocket()
+            return True
+
+        # jQuery adds ?_=<timestamp> to defeat caching
+        url = self.path.split('?')[0]
+
+        if url == '/telemetry':
+            self.serve_telemetry()
+            return True
+        assets = getattr(self.robot, 'assets', None)
+
+        if assets is not None:
+            asset = assets.get(url)
+
+            if asset is not None:
+                self.send_asset(asset)
+                return True
+
+        # RobotWebHandler sends files with no Content-Length
+        if RobotWebHandler.do_GET(self):
+            self.close_connection = True
+            return True
+
+        path = url.split('/')
+
+        try:
+            seq = int(path[1])
+            action = path[2]
+        except (IndexError, ValueError):
+            log.warning("Unsupported URL %s" % self.path)
+            self.send_error(404, 'Unsupported URL: %s' % self.path)
+            return True
+
+        args = [arg for arg in path[3:] if arg]
+        self.robot.control.command(seq, action, args)
+
+        # It is good practice to send this but if we are getting move-xy we
+        # tend to get a lot of them and we need to be as fast as possible so
+        # be bad and don't send a reply. This takes ~20ms.
+        if action != 'move-xy':
+            self.send_response(204)
+            self.end_headers()
+        else:
+            self.close_connection = True
+
+        return True
+
+    def send_asset(self, asset):
+        (body, etag, encoding) = asset.variant(self.headers.get('Accept-Encoding', ''))
+        if_none_match = self.headers.get('If-None-Match', '')
+
+        # A 304 has no body, whatever its Content-Length would say
+        if etag in [tag.strip() for tag in if_none_match.split(',')]:
+            self.send_response(304)
+            body = b''
+        else:
+            self.send_response(200)
+            self.send_header('Content-Type', asset.mimetype)
+            self.send_header('Content-Length', str(len(body)))
+
+            if encoding:
+                self.send_header('Content-Encoding', encoding)
+
+        self.send_header('ETag', etag)
+        self.send_header('Cache-Control', asset.cache_control)
+
+        if asset.gzipped is not None:
+            self.send_header('Vary', 'Accept-Encoding')
+
+        self.end_headers()
+        self.wfile.write(body)
+
+    def serve_telemetry(self):
+        telemetry = getattr(self.robot, 'telemetry', None)
+
+        if telemetry is None:
+            self.send_error(404, 'No telemetry')
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+        self.close_connection = True
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        log.info("%s: telemetry open" % self.client_address[0])
+        telemetry.subscribe()
+        version = None
+
+        try:
+            while True:
+                (version, event) = telemetry.next_event(version)
+                self.wfile.write(event)
+                self.wfile.flush()
+
+        # The browser went away
+        except (OSError, EOFError) as e:
+            log.info("%s: telemetry closed, %s" % (self.client_address[0], e))
+
+        finally:
+            telemetry.unsubscribe()
+
+    def serve_websocket(self):
+        key = self.headers.get('Sec-WebSocket-Key')
+
+        if key is None or self.headers.get('Upgrade', '').lower() != 'websocket':
+            self.send_error(400, 'Expected a WebSocket upgrade')
+            return
+
+        self.wfile.write(websocket.handshake_response(key))
+        self.wfile.flush()
+        self.close_connection = True
+
+        # Each command is a few bytes, send them the moment they are written
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        log.info("%s: websocket open" % self.client_address[0])
+        closed = False
+
+        try:
+            while True:
+                (opcode, payload) = websocket.read_message(self.rfile, self.wfile)
+
+                if opcode == websocket.OP_CLOSE:
+                    websocket.write_frame(self.wfile, websocket.OP_CLOSE, payload[:2])
+                    closed = True
+                    break
+
+                (seq, action, args) = decode_command(opcode, payload)
+                self.robot.control.command(seq, action, args)
+
+        # A closed connection, a malformed frame or a command we do not support
+        except Exception as e:
+            log.info("%s: websocket error %s" % (self.client_address[0], e))
+
+        # A browser that went away in the middle of a drag would leave the
+        # robot driving
+        if not closed:
+            self.robot.control.stop()
+
+        log.info("%s: websocket closed" % self.client_address[0])
+
+
+class EV3D4HTTPServer(PooledHTTPServer):
+    """
+    The drive commands sent as GETs have workers of their own so a stop
+    never waits behind a phone downloading an image, the WebSockets and
+    telemetry streams a thread each
+    """
+    priority_route = re.compile(rb'GET /\d+/(move-start|move-stop|move-xy|lease|motor-start|motor-stop|joystick-engaged)/')
+    stream_route = re.compile(rb'GET /(ws|telemetry)[ ?]')
+
+
+class PooledWebServer(RobotWebServer):
+    """
+    RobotWebServer on an EV3D4HTTPServer, RobotWebServer's own serves one
+    request at a time so one slow client would hold up every command.
+    options are passed on to PooledHTTPServer.
+    """
+
+    def __init__(self, robot, handler_class, port_number=8000, **options):
+        RobotWebServer.__init__(self, robot, handler_class, port_number)
+        self.options = options
+
+    def bind(self):
+        """
+        Create the server, returns the port it listens on
+        """
+        if self.content_server is None:
+            self.content_server = EV3D4HTTPServer(('', self.port_number), self.handler_class, **self.options)
+
+        return self.content_server.server_address[1]
+
+    def run(self):
+
+        try:
+            log.info("Started HTTP server (content) on port %d" % self.bind())
+            self.content_server.serve_forever()
+
+        # Exit cleanly, stop the web server and all motors
+        except (KeyboardInterrupt, Exception) as e:
+            log.exception(e)
+            self.close()
+
+            for motor in list_motors():
+                motor.stop()
+
+    def shutdown(self):
+        """
+        Stop a server running in another thread
+        """
+        if self.content_server:
+            self.content_server.shutdown()
+            self.close()
+
+    def close(self):
+        if self.content_server:
+            self.content_server.server_close()
+            self.content_server = None
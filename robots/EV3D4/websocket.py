@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+
+"""
+Just enough of RFC 6455 to keep one WebSocket open per browser.
+
+The brick has no WebSocket library so this is the handshake and the
+framing, reading from and writing to the file objects of a
+BaseHTTPRequestHandler (or of a plain socket for the load test client).
+Extensions, and frames bigger than MAX_PAYLOAD, are not supported.
+"""
+
+import base64
+import hashlib
+import os
+import struct
+
+GUID = b'258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+MAX_PAYLOAD = 65536
+
+OP_CONTINUATION = 0x0
+OP_TEXT = 0x1
+OP_BINARY = 0x2
+OP_CLOSE = 0x8
+OP_PING = 0x9
+OP_PONG = 0xA
+
+
+class WebSocketError(Exception):
+    pass
+
+
+def accept_key(key):
+    """
+    The Sec-WebSocket-Accept value for the client's Sec-WebSocket-Key
+    """
+    return base64.b64encode(hashlib.sha1(key.strip().encode() + GUID).digest()).decode()
+
+
+def handshake_response(key):
+    """
+    The 101 response to send to the client, it must be HTTP/1.1 even though
+    BaseHTTPRequestHandler talks HTTP/1.0
+    """
+    return ('HTTP/1.1 101 Switching Protocols\r\n'
+            'Upgrade: websocket\r\n'
+            'Connection: Upgrade\r\n'
+            'Sec-WebSocket-Accept: %s\r\n\r\n' % accept_key(key)).encode()
+
+
+def handshake_request(host, path):
+    """
+    Returns (request bytes, key) for a client
+    """
+    key = base64.b64encode(os.urandom(16)).decode()
+    request = ('GET %s HTTP/1.1\r\n'
+               'Host: %s\r\n'
+               'Upgrade: websocket\r\n'
+               'Connection: Upgrade\r\n'
+               'Sec-WebSocket-Key: %s\r\n'
+               'Sec-WebSocket-Version: 13\r\n\r\n' % (path, host, key)).encode()
+    return (request, key)
+
+
+def read_exactly(rfile, length):
+    data = rfile.read(length)
+
+    if data is None or len(data) < length:
+        raise EOFError("connection closed")
+
+    return data
+
+
+def apply_mask(mask, payload):
+    # Much faster than a byte at a time in python
+    length = len(payload)
+    key = (mask * (length // 4 + 1))[:length]
+    return (int.from_bytes(payload, 'big') ^ int.from_bytes(key, 'big')).to_bytes(length, 'big')
+
+
+def read_frame(rfile):
+    """
+    Returns (fin, opcode, payload) of the next frame
+    """
+    (first, second) = read_exactly(rfile, 2)
+    fin = bool(first & 0x80)
+    opcode = first & 0x0F
+    masked = second & 0x80
+    length = second & 0x7F
+
+    if first & 0x70:
+        raise WebSocketError("no extensions were negotiated")
+
+    if length == 126:
+        (length,) = struct.unpack('!H', read_exactly(rfile, 2))
+    elif length == 127:
+        (length,) = struct.unpack('!Q', read_exactly(rfile, 8))
+
+    if length > MAX_PAYLOAD:
+        raise WebSocketError("frame of %d bytes is too big" % length)
+
+    mask = read_exactly(rfile, 4) if masked else None
+    payload = read_exactly(rfile, length) if length else b''
+
+    if mask and payload:
+        payload = apply_mask(mask, payload)
+
+    return (fin, opcode, payload)
+
+
+def read_message(rfile, wfile):
+    """
+    Returns (opcode, payload) of the next text or binary message, joining
+    fragments and answering pings on the way. Returns (OP_CLOSE, payload)
+    once the other side closes.
+    """
+    message = None
+    message_opcode = None
+
+    while True:
+        (fin, opcode, payload) = read_frame(rfile)
+
+        if opcode == OP_PING:
+            write_frame(wfile, OP_PONG, payload)
+            continue
+
+        if opcode == OP_PONG:
+            continue
+
+        if opcode == OP_CLOSE:
+            return (OP_CLOSE, payload)
+
+        if opcode == OP_CONTINUATION:
+            if message is None:
+                raise WebSocketError("continuation frame without a message")
+            message += payload
+        else:
+            message = payload
+            message_opcode = opcode
+
+        if fin:
+            return (message_opcode, message)
+
+
+def encode_frame(opcode, payload, mask=False):
+    """
+    A single frame, clients must mask the frames they send
+    """
+    length = len(payload)
+    mask_bit = 0x80 if mask else 0
+
+    if length < 126:
+        header = struct.pack('!BB', 0x80 | opcode, mask_bit | length)
+    elif length < 65536:
+        header = struct.pack('!BBH', 0x80 | opcode, mask_bit | 126, length)
+    else:
+        header = struct.pack('!BBQ', 0x80 | opcode, mask_bit | 127, length)
+
+    if mask:
+        key = os.urandom(4)
+        return header + key + (apply_mask(key, payload) if payload else b'')
+
+    return header + payload
+
+
+def write_frame(wfile, opcode, payload, mask=False):
+    wfile.write(encode_frame(opcode, payload, mask))
+    wfile.flush()
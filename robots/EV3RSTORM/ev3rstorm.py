@@ -1,8 +1,12 @@
 #!/usr/bin/env python3
 
-import time, random
+import os, sys, time, random
 import ev3dev.ev3 as ev3
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'common'))
+from adaptivepoll import AdaptivePoller, remote_activity
+from motionwait import MotionWaiter
+
 random.seed( time.time() )
 
 def quote(topic):
@@ -42,6 +46,7 @@ class ev3rstorm:
         self.lm = ev3.LargeMotor('outB')
         self.rm = ev3.LargeMotor('outC')
         self.mm = ev3.MediumMotor()
+        self.mm_waiter = MotionWaiter([self.mm])
 
         self.ir = ev3.InfraredSensor()
         self.ts = ev3.TouchSensor()
@@ -83,14 +88,15 @@ class ev3rstorm:
         Shot a ball in the specified direction (valid choices are 'up' and 'down')
         """
         self.mm.run_to_rel_pos(speed_sp=900, position_sp=(-1080 if direction == 'up' else 1080))
-        while 'running' in self.mm.state:
-            time.sleep(0.1)
+        self.mm_waiter.wait_while('running')
 
-    def rc_loop(self):
+    def rc_loop(self, max_latency=0.1):
         """
         Enter the remote control loop. RC buttons on channel 1 control the
         robot movement, channel 2 is for shooting things.
         The loop ends when the touch sensor is pressed.
+        The remote is polled every 10ms while it is in use, backing off to
+        max_latency seconds while it is not.
         """
 
         def roll(motor, led_group, speed):
@@ -137,10 +143,12 @@ class ev3rstorm:
 
         # Now that the event handlers are assigned,
         # lets enter the processing loop:
+        poller = AdaptivePoller(remote_activity(rc1, rc2), min_interval=0.01, max_latency=max_latency)
+
         while not self.ts.is_pressed:
-            rc1.process()
-            rc2.process()
-            time.sleep(0.1)
+            time.sleep(poller.step())
+
+        print(poller)
 
 
 if __name__ == '__main__':
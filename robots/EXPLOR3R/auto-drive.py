@@ -33,6 +33,8 @@
 
 from time   import sleep
 from random import choice, randint
+import os
+import sys
 
 from ev3dev2.motor import OUTPUT_B, OUTPUT_C, LargeMotor
 from ev3dev2.sensor.lego import InfraredSensor, TouchSensor
@@ -40,9 +42,15 @@ from ev3dev2.button import Button
 from ev3dev2.led import Leds
 from ev3dev2.sound import Sound
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'common'))
+from motionwait import MotionWaiter, not_running
+
 # Connect two large motors on output ports B and C:
 motors = [LargeMotor(address) for address in (OUTPUT_B, OUTPUT_C)]
 
+# Wakes up as soon as the motors change state instead of checking every 0.1s
+waiter = MotionWaiter(motors)
+
 # Connect infrared and touch sensors.
 ir = InfraredSensor()
 ts = TouchSensor()
@@ -84,8 +92,7 @@ def backup():
 
     # When motor is stopped, its `state` attribute returns empty list.
     # Wait until both motors are stopped:
-    while any(m.state for m in motors):
-        sleep(0.1)
+    waiter.wait(not_running)
 
     # Turn backup lights off:
     for light in ('LEFT', 'RIGHT'):
@@ -107,8 +114,7 @@ def turn():
         m.run_timed(speed_sp = p * 750, time_sp = t)
 
     # Wait until both motors are stopped:
-    while any(m.state for m in motors):
-        sleep(0.1)
+    waiter.wait(not_running)
 
 # Run the robot until a button is pressed.
 start()
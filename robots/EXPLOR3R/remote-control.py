@@ -29,6 +29,8 @@
 # Leds are used to indicate movement direction.
 # Whenever an obstacle is bumped, robot backs away and apologises.
 
+import os
+import sys
 from time import sleep
 from ev3dev2.motor import OUTPUT_B, OUTPUT_C, LargeMotor
 from ev3dev2.sensor.lego import InfraredSensor, TouchSensor
@@ -36,6 +38,9 @@ from ev3dev2.button import Button
 from ev3dev2.led import Leds
 from ev3dev2.sound import Sound
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'common'))
+from adaptivepoll import AdaptivePoller, remote_activity
+
 # Connect two large motors on output ports B and C
 lmotor, rmotor = [LargeMotor(address) for address in (OUTPUT_B, OUTPUT_C)]
 
@@ -82,9 +87,13 @@ rc.on_channel1_top_right = roll(rmotor, 'RIGHT',  1)
 rc.on_channel1_bottom_right = roll(rmotor, 'RIGHT', -1)
 print("Robot Starting")
 
+# Poll the remote every 10ms while it is in use, backing off to 100ms while
+# it is not. The robot only bumps into things while a button is held.
+poller = AdaptivePoller(remote_activity(rc), min_interval=0.01, max_latency=0.1)
+
 # Enter event processing loop
 while not button.any():
-    rc.process()
+    interval = poller.step()
 
     # Backup when bumped an obstacle
     if ts.is_pressed:
@@ -106,4 +115,6 @@ while not button.any():
 
         leds.all_off()
 
-    sleep(0.01)
+    sleep(interval)
+
+print(poller)
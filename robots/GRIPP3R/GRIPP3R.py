@@ -15,149 +15,124 @@ Implementation of GRIPP3R
 """
 
 import logging
-import signal
+import os
 import sys
 from ev3dev2.motor import OUTPUT_A, OUTPUT_B, OUTPUT_C, MediumMotor
 from ev3dev2.control.rc_tank import RemoteControlledTank
 from ev3dev2.sensor.lego import TouchSensor
-from threading import Thread, Event
-from time import sleep
 
-log = logging.getLogger(__name__)
-
-
-class MonitorTouchSensor(Thread):
-    """
-    A thread to monitor Gripper's TouchSensor and close the gripper when
-    the TouchSensor is pressed
-    """
-
-    def __init__(self, parent):
-        Thread.__init__(self)
-        self.parent = parent
-        self.shutdown_event = Event()
-        self.monitor_ts = Event()
-
-    def __str__(self):
-        return "MonitorTouchSensor"
-
-    def run(self):
-
-        while True:
-
-            if self.monitor_ts.is_set() and self.parent.ts.is_released:
-
-                # We only wait for 1000ms so that we can wake up to see if
-                # our shutdown_event has been set
-                if self.parent.ts.wait_for_pressed(timeout_ms=1000):
-                    self.parent.claw_close(True)
-
-            if self.shutdown_event.is_set():
-                log.info('%s: shutdown_event is set' % self)
-                break
-
-
-class MonitorRemoteControl(Thread):
-    """
-    A thread to monitor Gripper's InfraredSensor and process signals
-    from the remote control
-    """
-
-    def __init__(self, parent):
-        Thread.__init__(self)
-        self.parent = parent
-        self.shutdown_event = Event()
-        self.monitor_ts = Event()
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'common'))
+from adaptivepoll import AdaptivePoller, remote_activity
+from robotruntime import RobotRuntime
 
-    def __str__(self):
-        return "MonitorRemoteControl"
-
-    def run(self):
-
-        while True:
-            self.parent.remote.process()
-            sleep(0.01)
-
-            if self.shutdown_event.is_set():
-                log.info('%s: shutdown_event is set' % self)
-                break
+log = logging.getLogger(__name__)
 
 
 class Gripper(RemoteControlledTank):
     """
     To enable the medium motor toggle the beacon button on the EV3 remote.
+
+    The TouchSensor and the remote control are polled together by the same
+    event loop, every 10ms while the remote is in use and backing off to
+    max_latency seconds while it is not. The claw moves are coroutines on
+    that loop too.
     """
     CLAW_DEGREES_OPEN = 225
     CLAW_DEGREES_CLOSE = 920
     CLAW_SPEED_PCT = 50
+    POLL_INTERVAL = 0.01
 
-    def __init__(self, left_motor_port=OUTPUT_B, right_motor_port=OUTPUT_C, medium_motor_port=OUTPUT_A):
+    def __init__(self, left_motor_port=OUTPUT_B, right_motor_port=OUTPUT_C, medium_motor_port=OUTPUT_A,
+                 runtime=None, max_latency=0.1):
         RemoteControlledTank.__init__(self, left_motor_port, right_motor_port)
         self.set_polarity(MediumMotor.POLARITY_NORMAL)
         self.medium_motor = MediumMotor(medium_motor_port)
         self.ts = TouchSensor()
-        self.mts = MonitorTouchSensor(self)
-        self.mrc = MonitorRemoteControl(self)
-        self.shutdown_event = Event()
+        self.runtime = runtime if runtime is not None else RobotRuntime()
+        self.monitor_ts = False
+        self.ts_pressed = False
+        self.claw_task = None
+        self.remote_activity = remote_activity(self.remote)
+        self.poller = AdaptivePoller(self.poll_sensors, self.POLL_INTERVAL, max_latency)
 
-        # Register our signal_term_handler() to be called if the user sends
-        # a 'kill' to this process or does a Ctrl-C from the command line
-        signal.signal(signal.SIGTERM, self.signal_term_handler)
-        signal.signal(signal.SIGINT, self.signal_int_handler)
-
-        self.claw_open(True)
         self.remote.on_channel4_top_left = self.claw_close
         self.remote.on_channel4_bottom_left = self.claw_open
 
     def shutdown_robot(self):
-
-        if self.shutdown_event.is_set():
-            return
-
-        self.shutdown_event.set()
         log.info('shutting down')
-        self.mts.shutdown_event.set()
-        self.mrc.shutdown_event.set()
         self.remote.on_channel4_top_left = None
         self.remote.on_channel4_bottom_left = None
         self.left_motor.off(brake=False)
         self.right_motor.off(brake=False)
         self.medium_motor.off(brake=False)
-        self.mts.join()
-        self.mrc.join()
 
-    def signal_term_handler(self, signal, frame):
-        log.info('Caught SIGTERM')
-        self.shutdown_robot()
-
-    def signal_int_handler(self, signal, frame):
-        log.info('Caught SIGINT')
-        self.shutdown_robot()
+    def monitor_touch_sensor(self):
+        """
+        Close the claw when the TouchSensor goes from released to pressed,
+        returns True if it did
+        """
+        pressed = self.ts.is_pressed
+        closing = self.monitor_ts and pressed and not self.ts_pressed
+
+        if closing:
+            self.claw_close(True)
+
+        self.ts_pressed = pressed
+        return closing
+
+    def poll_sensors(self):
+        active = self.remote_activity()
+        return self.monitor_touch_sensor() or active
+
+    async def open_claw(self):
+
+        # Stop monitoring the TouchSensor while we are opening the claw. We
+        # do this because the act of opening the claw presses the
+        # TouchSensor so we must ignore that press.
+        self.monitor_ts = False
+        self.medium_motor.on(speed=self.CLAW_SPEED_PCT * -1)
+        await self.runtime.wait_until_not_moving(self.medium_motor)
+        self.medium_motor.off()
+        self.medium_motor.reset()
+        self.medium_motor.on_to_position(speed=self.CLAW_SPEED_PCT,
+                                         position=self.CLAW_DEGREES_OPEN,
+                                         brake=False, block=False)
+        await self.runtime.wait_until_not_moving(self.medium_motor)
+        self.ts_pressed = self.ts.is_pressed
+        self.monitor_ts = True
 
     def claw_open(self, state):
         if state:
 
-            # Clear monitor_ts while we are opening the claw. We do this because
-            # the act of opening the claw presses the TouchSensor so we must
-            # tell mts to ignore that press.
-            self.mts.monitor_ts.clear()
-            self.medium_motor.on(speed=self.CLAW_SPEED_PCT * -1, block=True)
-            self.medium_motor.off()
-            self.medium_motor.reset()
-            self.medium_motor.on_to_position(speed=self.CLAW_SPEED_PCT,
-                                             position=self.CLAW_DEGREES_OPEN,
-                                             brake=False, block=True)
-            self.mts.monitor_ts.set()
+            # Start over if the claw is still opening
+            if self.claw_task is not None and not self.claw_task.done():
+                self.claw_task.cancel()
+
+            self.claw_task = self.runtime.spawn(self.open_claw())
 
     def claw_close(self, state):
         if state:
+            if self.claw_task is not None and not self.claw_task.done():
+                self.claw_task.cancel()
+
             self.medium_motor.on_to_position(speed=self.CLAW_SPEED_PCT,
-                                             position=self.CLAW_DEGREES_CLOSE)
+                                             position=self.CLAW_DEGREES_CLOSE,
+                                             block=False)
+
+    def main(self, duration=None):
+        self.poller.reset_metrics()
+        self.runtime.adaptive(self.poller, 'sensors')
+        self.claw_open(True)
+
+        try:
+            self.runtime.run(duration=duration)
+        finally:
+            self.shutdown_robot()
+
+        for stats in self.runtime.stats.values():
+            log.info(stats)
 
-    def main(self):
-        self.mts.start()
-        self.mrc.start()
-        self.shutdown_event.wait()
+        log.info(self.poller)
 
 
 if __name__ == '__main__':
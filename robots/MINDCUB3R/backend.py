@@ -0,0 +1,29 @@
+#!/usr/bin/env python3
+
+"""
+Device backends for MindCuber.
+
+A backend provides the three motors, the two sensors and a clock. MindCuber
+only talks to the hardware through these so EV3Backend can be swapped for
+simulator.SimBackend to run the scan/solve pipeline on a PC.
+"""
+
+import time
+
+
+class EV3Backend(object):
+    """
+    The real EV3 motors and sensors. The clock is the time module itself,
+    the simulator provides its own clock with the same time() and sleep().
+    """
+
+    def __init__(self):
+        from ev3dev2.motor import LargeMotor, MediumMotor, OUTPUT_A, OUTPUT_B, OUTPUT_C
+        from ev3dev2.sensor.lego import ColorSensor, InfraredSensor
+
+        self.flipper = LargeMotor(OUTPUT_A)
+        self.turntable = LargeMotor(OUTPUT_B)
+        self.colorarm = MediumMotor(OUTPUT_C)
+        self.color_sensor = ColorSensor()
+        self.infrared_sensor = InfraredSensor()
+        self.clock = time
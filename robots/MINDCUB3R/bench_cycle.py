@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+
+"""
+Run full MINDCUB3R cycles on the simulator and report where the time goes.
+
+Each cycle builds a MindCuber on a simulator.SimBackend with a different
+scramble, then does wait_for_cube_insert -> scan -> resolve the same way
+mindcuber.py does. For each phase we report the virtual (robot) time, the
+number of motor commands, the number of sysfs reads and the CPU time used
+on this machine. At the end we check that the simulated cube is solved.
+Runs where the solver rejected the scan and MindCuber.recover_scan() read
+some squares again are counted separately.
+
+    $ ./bench_cycle.py --cycles 10
+    $ ./bench_cycle.py --legacy-scan
+"""
+
+from mindcuber import MindCuber
+from simulator import SimBackend
+from twophase import TwoPhaseSolver
+import argparse
+import logging
+import time
+
+log = logging.getLogger(__name__)
+
+PHASES = ('init', 'insert', 'scan', 'resolve')
+
+
+class PhaseMeter(object):
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.results = {}
+
+    def __call__(self, phase, function, *args, **kwargs):
+        clock = self.backend.clock
+        (virtual, commands, reads, cpu) = (clock.now, self.backend.motor_commands, clock.reads, time.process_time())
+        result = function(*args, **kwargs)
+        self.results[phase] = (
+            clock.now - virtual,
+            self.backend.motor_commands - commands,
+            clock.reads - reads,
+            time.process_time() - cpu)
+        return result
+
+
+def run_cycle(seed, pipelined, noise, read_cost):
+    backend = SimBackend(seed=seed, noise=noise, read_cost=read_cost)
+    meter = PhaseMeter(backend)
+    mcube = meter('init', MindCuber, backend)
+
+    def insert():
+        mcube.wait_for_cube_insert()
+        mcube.flipper_hold_cube(100)
+        mcube.flipper_away(100)
+
+    meter('insert', insert)
+    meter('scan', mcube.scan, pipelined)
+    meter('resolve', mcube.resolve)
+    return (meter.results, backend.cube.is_solved(), mcube)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark MINDCUB3R cycles on the simulator')
+    parser.add_argument('--cycles', type=int, default=5, help='number of cycles to run')
+    parser.add_argument('--legacy-scan', action='store_true', help='use scan_face() instead of scan_face_pipelined()')
+    parser.add_argument('--noise', type=float, default=3.0, help='color sensor noise (raw RGB units)')
+    parser.add_argument('--read-cost', type=float, default=0.0005, help='virtual seconds per sysfs read')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING,
+                        format='%(asctime)s %(filename)12s %(levelname)8s: %(message)s')
+
+    # Build the solver tables up front if there are none, resolve() does
+    # not, and load them so the first cycle is not charged for it
+    MindCuber.scan_stats_filename = None
+    TwoPhaseSolver(MindCuber.solver_tables_filename)
+
+    totals = dict((phase, [0, 0, 0, 0]) for phase in PHASES)
+    solved = 0
+    recoveries = []
+
+    print("%5s %8s %10s %9s %7s %8s" % ('cycle', 'phase', 'robot (s)', 'commands', 'reads', 'cpu (s)'))
+
+    for cycle in range(args.cycles):
+        (results, is_solved, mcube) = run_cycle(cycle, not args.legacy_scan, args.noise, args.read_cost)
+        solved += is_solved
+
+        if mcube.recovery_time is not None:
+            recoveries.append((mcube.squares_reread, mcube.recovery_time))
+
+        for phase in PHASES:
+            print("%5d %8s %10.2f %9d %7d %8.3f" % ((cycle, phase) + results[phase]))
+            for i in range(4):
+                totals[phase][i] += results[phase][i]
+
+        print("%5d %8s %10.2f %9d %7d %8.3f  %s" % (
+            (cycle, 'total') +
+            tuple(sum(results[phase][i] for phase in PHASES) for i in range(4)) +
+            ('solved' if is_solved else 'NOT SOLVED',)))
+
+    print('')
+    print("mean over %d cycles, %d solved" % (args.cycles, solved))
+
+    for phase in PHASES:
+        print("%14s %10.2f %9.1f %7.1f %8.3f" % ((phase,) + tuple(float(x) / args.cycles for x in totals[phase])))
+
+    print("%14s %10.2f %9.1f %7.1f %8.3f" % (('cycle',) + tuple(
+        float(sum(totals[phase][i] for phase in PHASES)) / args.cycles for i in range(4))))
+
+    if recoveries:
+        print("%d recoveries from a rejected scan, %d squares read again, %.1fs mean recovery time" % (
+            len(recoveries), sum(x[0] for x in recoveries), sum(x[1] for x in recoveries) / len(recoveries)))
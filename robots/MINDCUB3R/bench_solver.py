@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+
+"""
+Benchmark the in-process two-phase solver against the kociemba program.
+
+A fixed corpus of scrambles is solved with both and the solve latency and
+move count of each is reported. The kociemba program is skipped if it is
+not installed. This does not need any motors or sensors so it can be run
+on a PC as well as on the brick.
+
+    $ ./bench_solver.py
+    $ ./bench_solver.py --count 50 --timeout 2
+"""
+
+from subprocess import check_output
+from twophase import TwoPhaseSolver, MOVE_NAMES, SOLVED, apply_moves
+import argparse
+import logging
+import random
+import shutil
+import time
+
+log = logging.getLogger(__name__)
+
+
+def scramble_corpus(count, length=25, seed=1):
+    """
+    The same list of scrambled facelet strings every time for a given
+    count/length/seed
+    """
+    rand = random.Random(seed)
+    corpus = []
+
+    for i in range(count):
+        moves = [rand.choice(MOVE_NAMES) for j in range(length)]
+        corpus.append(apply_moves(SOLVED, moves))
+
+    return corpus
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(pct / 100.0 * (len(values) - 1))))]
+
+
+def report(name, latencies, move_counts):
+    print("%-22s solves %3d  latency mean %7.3fs  p50 %7.3fs  p90 %7.3fs  max %7.3fs  moves mean %5.2f  max %2d" %
+          (name, len(latencies),
+           sum(latencies) / len(latencies),
+           percentile(latencies, 50),
+           percentile(latencies, 90),
+           max(latencies),
+           float(sum(move_counts)) / len(move_counts),
+           max(move_counts)))
+
+
+def bench_in_process(corpus, tables_filename, max_length, timeout):
+    start = time.time()
+    solver = TwoPhaseSolver(tables_filename)
+    print("in-process table load %.3fs" % (time.time() - start))
+
+    latencies = []
+    move_counts = []
+
+    for cube in corpus:
+        start = time.time()
+        actions = solver.solve(cube, max_length, timeout)
+        latencies.append(time.time() - start)
+        move_counts.append(len(actions))
+
+        if apply_moves(cube, actions) != SOLVED:
+            raise Exception("in-process solution %s does not solve %s" % (' '.join(actions), cube))
+
+    report("in-process (max %d)" % max_length, latencies, move_counts)
+
+
+def bench_subprocess(corpus):
+    latencies = []
+    move_counts = []
+
+    for cube in corpus:
+        start = time.time()
+        actions = check_output(['kociemba', cube]).decode('ascii').strip().split()
+        latencies.append(time.time() - start)
+        move_counts.append(len(actions))
+
+        if apply_moves(cube, actions) != SOLVED:
+            raise Exception("kociemba solution %s does not solve %s" % (' '.join(actions), cube))
+
+    report("kociemba subprocess", latencies, move_counts)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the MINDCUB3R solvers')
+    parser.add_argument('--count', type=int, default=20, help='number of scrambles to solve')
+    parser.add_argument('--tables', default='twophase_tables.bin', help='two-phase table file')
+    parser.add_argument('--max-length', type=int, default=20, help='stop at a solution this short')
+    parser.add_argument('--timeout', type=float, default=10, help='seconds to look for a shorter solution')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING,
+                        format='%(asctime)s %(filename)12s %(levelname)8s: %(message)s')
+
+    corpus = scramble_corpus(args.count)
+    bench_in_process(corpus, args.tables, args.max_length, args.timeout)
+
+    # Also show how quick the first solution is, this is closest to what
+    # the kociemba program does
+    bench_in_process(corpus, args.tables, 30, args.timeout)
+
+    if shutil.which('kociemba'):
+        bench_subprocess(corpus)
+    else:
+        print("kociemba program not found, skipping the subprocess benchmark")
@@ -11,8 +11,17 @@ the color sensor.
 
 If you move to a different room with different lighting it is a good idea
 to run this program again.
+
+If you give it a profile name and insert a solved cube it will also read all
+six centers and save them as a color profile in color_profiles.json:
+
+    $ ./calibrate_white.py kitchen
+
+mindcuber.py keeps every profile you save and uses whichever one best
+matches the centers of the cube it is scanning.
 """
 
+from colors import ColorProfile, save_profile
 from mindcuber import MindCuber
 import logging
 import sys
@@ -46,6 +55,12 @@ try:
         fh.write("green %s\n" % mcube.color_sensor.green_max)
         fh.write("blue %s\n" % mcube.color_sensor.blue_max)
 
+    if len(sys.argv) > 1:
+        max_rgb = (mcube.color_sensor.red_max, mcube.color_sensor.green_max, mcube.color_sensor.blue_max)
+        profile = ColorProfile(sys.argv[1], mcube.scan_centers(), max_rgb)
+        save_profile(MindCuber.color_profiles_filename, profile)
+        log.info("saved color profile %s: %s" % (profile.name, profile.palette.tolist()))
+
     mcube.colorarm_remove()
     mcube.shutdown_robot()
 
@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+
+"""
+Work out the color of each of the 54 facelets from their RGB readings.
+
+All readings are classified in one batched numpy step. Each facelet may
+have several readings, they are combined with a per channel median so one
+bad reading does not throw it off. The six centers give the six colors,
+then a few rounds of clustering assign exactly nine facelets to each color
+and move each color's mean to the middle of its facelets.
+
+Calibration profiles (see calibrate_white.py) hold the center readings of a
+solved cube taken under some lighting. The profile whose palette best
+matches the scanned centers is used to seed the clusters, which helps a lot
+with the colors that are close together such as red and orange.
+
+Facelets are numbered 1-54 in the ULFRBD order rubiks-color-resolver uses,
+which is what MindCuber.scan_order is in.
+"""
+
+import json
+import logging
+import os
+import time
+
+import numpy as np
+
+log = logging.getLogger(__name__)
+
+# The face each block of 9 facelets belongs to and its center facelet
+SCAN_FACES = 'ULFRBD'
+CENTERS = (5, 14, 23, 32, 41, 50)
+
+# kociemba wants the faces in URFDLB order, this is the square for each
+# character of the kociemba string
+KOCIEMBA_FACES = 'URFDLB'
+KOCIEMBA_SQUARES = tuple(SCAN_FACES.index(face) * 9 + 1 + i for face in KOCIEMBA_FACES for i in range(9))
+
+
+class ColorProfile(object):
+    """
+    The readings of the six centers of a solved cube under one lighting
+    setup, along with the color sensor's white calibration at the time
+    """
+
+    def __init__(self, name, palette, max_rgb):
+        self.name = name
+        self.palette = np.array(palette, dtype=float)
+        self.max_rgb = np.array(max_rgb, dtype=float)
+
+    def to_json(self):
+        return {
+            'name': self.name,
+            'palette': self.palette.tolist(),
+            'max_rgb': self.max_rgb.tolist(),
+        }
+
+    @classmethod
+    def from_json(cls, data):
+        return cls(data['name'], data['palette'], data['max_rgb'])
+
+
+def load_profiles(filename):
+    if not os.path.exists(filename):
+        return []
+
+    with open(filename, 'r') as fh:
+        return [ColorProfile.from_json(x) for x in json.load(fh)['profiles']]
+
+
+def save_profile(filename, profile):
+    """
+    Add profile to filename, replacing any profile with the same name
+    """
+    profiles = [p for p in load_profiles(filename) if p.name != profile.name]
+    profiles.append(profile)
+
+    with open(filename, 'w') as fh:
+        json.dump({'profiles': [p.to_json() for p in profiles]}, fh, indent=4)
+
+
+class ClassifyResult(object):
+    """
+    colors maps each facelet to the center facelet whose color it is,
+    confidence maps each facelet to 0.0 (a coin toss) to 1.0 (certain).
+    distances[i][c] is how far squares[i] is from the color of CENTERS[c].
+    """
+
+    def __init__(self, colors, confidence, profile, elapsed, squares, distances):
+        self.colors = colors
+        self.confidence = confidence
+        self.profile = profile
+        self.elapsed = elapsed
+        self.squares = squares
+        self.distances = distances
+
+    def low_confidence(self, threshold):
+        return sorted(sq for (sq, conf) in self.confidence.items() if conf < threshold)
+
+    def kociemba(self, colors=None):
+        """
+        The 54 character URFDLB string the kociemba solver wants
+        """
+        if colors is None:
+            colors = self.colors
+
+        return ''.join(SCAN_FACES[CENTERS.index(colors[sq])] for sq in KOCIEMBA_SQUARES)
+
+    def suspect_squares(self, is_valid, max_swaps=200, fallback=4):
+        """
+        Return the fewest squares to read again when the cube the colors
+        describe cannot be solved. is_valid is called with a kociemba
+        string and returns True if that cube can be solved.
+
+        Swapping the colors of two squares keeps nine of each color. The
+        swaps are tried cheapest first, where the cost is how much further
+        the two squares are from their new colors than from their current
+        ones, and the two squares of the first swap that gives a valid cube
+        are the ones most likely to have been read wrong. If no swap does
+        the fallback lowest confidence squares are returned instead.
+        """
+        n = len(self.squares)
+        assignment = np.array([CENTERS.index(self.colors[sq]) for sq in self.squares])
+        distances = np.where(np.isinf(self.distances), 0, self.distances)
+
+        # cost[a, b] of giving square a the color of b and b the color of a
+        swapped = distances[:, assignment]
+        own = swapped[np.arange(n), np.arange(n)]
+        cost = swapped + swapped.T - own[:, np.newaxis] - own[np.newaxis, :]
+
+        is_center = np.array([sq in CENTERS for sq in self.squares])
+        skip = ((assignment[:, np.newaxis] == assignment[np.newaxis, :]) |
+                is_center[:, np.newaxis] | is_center[np.newaxis, :] |
+                np.tri(n, dtype=bool))
+        cost[skip] = np.inf
+
+        for flat in np.argsort(cost, axis=None)[:max_swaps]:
+            (a, b) = divmod(int(flat), n)
+
+            if np.isinf(cost[a, b]):
+                break
+
+            colors = dict(self.colors)
+            colors[self.squares[a]] = self.colors[self.squares[b]]
+            colors[self.squares[b]] = self.colors[self.squares[a]]
+
+            if is_valid(self.kociemba(colors)):
+                log.info("swapping the colors of squares %d and %d gives a valid cube (cost %.1f)" %
+                         (self.squares[a], self.squares[b], cost[a, b]))
+                return sorted((self.squares[a], self.squares[b]))
+
+        candidates = [sq for sq in self.squares if sq not in CENTERS]
+        return sorted(sorted(candidates, key=lambda sq: self.confidence[sq])[:fallback])
+
+
+def balanced_assignment(distances, per_cluster):
+    """
+    Assign each row of distances to a column so that no column gets more
+    than per_cluster rows. The rows whose best and second best choices
+    differ the most are assigned first since they have the most to lose.
+    """
+    (n_rows, n_cols) = distances.shape
+    ordered = np.sort(distances, axis=1)
+    regret = ordered[:, 1] - ordered[:, 0]
+    counts = np.zeros(n_cols, dtype=int)
+    assignment = np.full(n_rows, -1, dtype=int)
+
+    for row in np.argsort(-regret):
+        for col in np.argsort(distances[row]):
+            if counts[col] < per_cluster:
+                assignment[row] = col
+                counts[col] += 1
+                break
+
+    return assignment
+
+
+class ColorClassifier(object):
+
+    def __init__(self, profiles=None, iterations=5):
+        self.profiles = profiles if profiles is not None else []
+        self.iterations = iterations
+
+    def choose_profile(self, centers, max_rgb):
+        """
+        Return (profile, palette) where palette is the profile's readings
+        reordered to line up with centers and rescaled to the current white
+        calibration, or (None, None) if there are no profiles
+        """
+        best = (None, None, None)
+
+        for profile in self.profiles:
+            palette = profile.palette * profile.max_rgb / max_rgb
+            distances = np.linalg.norm(centers[:, np.newaxis, :] - palette[np.newaxis, :, :], axis=2)
+            order = balanced_assignment(distances, 1)
+            cost = distances[np.arange(len(centers)), order].sum()
+
+            if best[0] is None or cost < best[0]:
+                best = (cost, profile, palette[order])
+
+        return best[1:]
+
+    def classify(self, samples, max_rgb=(255, 255, 255)):
+        """
+        samples maps each facelet (1-54) to an RGB tuple or a list of them
+        """
+        start = time.time()
+        squares = sorted(samples)
+
+        # Combine multiple readings of a facelet with a per channel median
+        readings = np.array([np.median(np.array(samples[sq], dtype=float).reshape(-1, 3), axis=0)
+                             for sq in squares])
+        center_rows = [squares.index(c) for c in CENTERS]
+        centers = readings[center_rows]
+
+        (profile, palette) = self.choose_profile(centers, np.array(max_rgb, dtype=float))
+
+        # Seed each color half way between the center reading and the
+        # profile, the center is the only reading we know the color of
+        means = centers.copy() if palette is None else (centers + palette) / 2
+
+        for i in range(self.iterations):
+            distances = np.linalg.norm(readings[:, np.newaxis, :] - means[np.newaxis, :, :], axis=2)
+
+            # Centers always belong to their own color
+            distances[center_rows, :] = np.inf
+            distances[center_rows, np.arange(6)] = 0
+
+            assignment = balanced_assignment(distances, 9)
+            new_means = np.array([np.median(readings[assignment == c], axis=0) for c in range(6)])
+
+            if np.allclose(new_means, means):
+                break
+
+            means = new_means
+
+        # Confidence is how much closer the facelet is to its own color than
+        # to the next nearest one
+        own = distances[np.arange(len(squares)), assignment]
+        others = distances.copy()
+        others[np.arange(len(squares)), assignment] = np.inf
+        nearest_other = others.min(axis=1)
+        with np.errstate(invalid='ignore'):
+            confidence = np.clip((nearest_other - own) / np.maximum(nearest_other + own, 1e-9), 0.0, 1.0)
+        confidence[center_rows] = 1.0
+
+        colors = dict((sq, CENTERS[assignment[i]]) for (i, sq) in enumerate(squares))
+        confidence = dict((sq, float(confidence[i])) for (i, sq) in enumerate(squares))
+        return ClassifyResult(colors, confidence, profile, time.time() - start, squares, distances)
@@ -1,11 +1,11 @@
 #!/usr/bin/env python3
 
-from ev3dev2.motor import LargeMotor, MediumMotor, OUTPUT_A, OUTPUT_B, OUTPUT_C, SpeedDPS
-from ev3dev2.sensor.lego import ColorSensor, InfraredSensor
+from backend import EV3Backend
+from ev3dev2.motor import SpeedDPS
+from planner import CostModel, fixed_plan, plan_actions, plan_cost, shortest_paths
 from pprint import pformat
-from rubikscolorresolver import RubiksColorSolverGeneric
 from subprocess import check_output
-from time import sleep
+from twophase import TwoPhaseSolver, SolverError, is_solvable, load_tables
 import json
 import logging
 import os
@@ -13,6 +13,9 @@ import signal
 import sys
 import time
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'common'))
+from motionwait import wait_for_position
+
 log = logging.getLogger(__name__)
 
 
@@ -20,6 +23,13 @@ class ScanError(Exception):
     pass
 
 
+def median_rgb(readings):
+    """
+    The per channel median of a list of (red, green, blue) readings
+    """
+    return tuple(sorted(channel)[len(channel) // 2] for channel in zip(*readings))
+
+
 class MindCuber(object):
     scan_order = [
         5, 9, 6, 3, 2, 1, 4, 7, 8,
@@ -29,22 +39,83 @@ class MindCuber(object):
         41, 43, 44, 45, 42, 39, 38, 37, 40,
         32, 34, 35, 36, 33, 30, 29, 28, 31]
 
+    # Used by scan_face_pipelined(). The gear ratio is 3:1 so 1080 is one
+    # full rotation of the turntable. Each entry is (turntable position at
+    # which to sample the square under the color arm, colorarm move to issue
+    # once that sample is taken, square index for that move).
+    scan_face_plan = (
+        (115, 'edge', 2),
+        (220, 'corner', 3),
+        (380, 'edge', 4),
+        (540, 'corner', 5),
+        (675, 'edge', 6),
+        (810, 'corner', 7),
+        (945, 'edge', 8),
+        (1060, 'remove', 9),
+    )
+
+    # (rotate_cube direction before the flip, face_number) for each face
+    # scanned, face 1 is scanned without moving the cube
+    scan_face_moves = ((None, 1), (None, 2), (None, 3), (-1, 4), (1, 5), (None, 6))
+
+    # Each square is read scan_samples times and the readings are combined.
+    # Once all 54 have been classified the squares we are less than
+    # rescan_confidence sure of are read again, up to rescan_rounds times.
+    scan_samples = 3
+    rescan_confidence = 0.2
+    rescan_rounds = 2
+    color_profiles_filename = 'color_profiles.json'
+
+    # If the solver rejects the scanned colors we read the suspect squares
+    # again, up to recover_attempts times, instead of giving up. The totals
+    # for every run are kept in scan_stats_filename, set it to None to not
+    # keep them.
+    recover_attempts = 2
+    scan_stats_filename = 'scan_stats.json'
+
     hold_cube_pos = 85
     rotate_speed = 400
     flip_speed = 300
     flip_speed_push = 400
 
-    def __init__(self):
+    # The in-process solver keeps looking for a solution of solve_max_length
+    # moves or less for up to solve_timeout seconds, then settles for the
+    # best one it found. Every move saved is a few seconds of robot time.
+    solve_max_length = 20
+    solve_timeout = 10
+    solver_tables_filename = 'twophase_tables.bin'
+
+    def __init__(self, backend=None):
+        """
+        backend provides the motors, sensors and clock, see backend.py.
+        It defaults to the real EV3 devices.
+        """
+        if backend is None:
+            backend = EV3Backend()
+
         self.shutdown = False
-        self.flipper = LargeMotor(OUTPUT_A)
-        self.turntable = LargeMotor(OUTPUT_B)
-        self.colorarm = MediumMotor(OUTPUT_C)
-        self.color_sensor = ColorSensor()
+        self.backend = backend
+        self.clock = backend.clock
+        self.flipper = backend.flipper
+        self.turntable = backend.turntable
+        self.colorarm = backend.colorarm
+        self.color_sensor = backend.color_sensor
         self.color_sensor.mode = self.color_sensor.MODE_RGB_RAW
-        self.infrared_sensor = InfraredSensor()
+        self.infrared_sensor = backend.infrared_sensor
         self.init_motors()
         self.state = ['U', 'D', 'F', 'L', 'B', 'R']
         self.rgb_solver = None
+        self.scan_face_times = []
+        self.scan_time = None
+        self.scan_states = {}
+        self.color_samples = {}
+        self._color_classifier = None
+        self.classify_result = None
+        self.squares_reread = 0
+        self.recovery_time = None
+        self.solver = None
+        self.cost_model = CostModel()
+        self.plan_expected_time = None
         signal.signal(signal.SIGTERM, self.signal_term_handler)
         signal.signal(signal.SIGINT, self.signal_int_handler)
 
@@ -65,6 +136,18 @@ class MindCuber(object):
                         self.color_sensor.blue_max = int(value)
                         log.info("blue max is %d" % self.color_sensor.blue_max)
 
+    @property
+    def color_classifier(self):
+        """
+        Made when it is first needed, colors.py imports NumPy which takes
+        seconds on the EV3
+        """
+        if self._color_classifier is None:
+            from colors import ColorClassifier, load_profiles
+            self._color_classifier = ColorClassifier(load_profiles(MindCuber.color_profiles_filename))
+
+        return self._color_classifier
+
     def init_motors(self):
 
         for x in (self.flipper, self.turntable, self.colorarm):
@@ -170,24 +253,26 @@ class MindCuber(object):
 
             self.flipper.ramp_down_sp=400
             self.flipper.on_to_position(SpeedDPS(speed), MindCuber.hold_cube_pos)
-            sleep(0.05)
+            self.clock.sleep(0.05)
 
-    def flipper_away(self, speed=300):
+    def flipper_away(self, speed=300, block=True):
         """
         Move the flipper arm out of the way
         """
         log.info("flipper_away()")
         self.flipper.ramp_down_sp = 400
-        self.flipper.on_to_position(SpeedDPS(speed), 0)
+        self.flipper.on_to_position(SpeedDPS(speed), 0, block=block)
 
-    def flip(self):
+    def flip(self, settle=True):
         """
         Motors will sometimes stall if you call on_to_position() multiple
         times back to back on the same motor. To avoid this we call a 50ms
         sleep in flipper_hold_cube() and after each on_to_position() below.
 
         We have to sleep after the 2nd on_to_position() because sometimes
-        flip() is called back to back.
+        flip() is called back to back. Pass settle=False when the next step
+        does not move the flipper straight away, scan_face_pipelined() uses
+        this to overlap the settle time with moving the color arm.
         """
         log.info("flip()")
 
@@ -201,23 +286,25 @@ class MindCuber(object):
         self.flipper.ramp_up_sp = 200
         self.flipper.ramp_down_sp = 0
         self.flipper.on_to_position(SpeedDPS(self.flip_speed), 190)
-        sleep(0.05)
+        self.clock.sleep(0.05)
 
         # At this point the cube is at an angle, push it forward to
         # drop it back down in the turntable
         self.flipper.ramp_up_sp = 200
         self.flipper.ramp_down_sp = 400
         self.flipper.on_to_position(SpeedDPS(self.flip_speed_push), MindCuber.hold_cube_pos)
-        sleep(0.05)
+
+        if settle:
+            self.clock.sleep(0.05)
 
         transformation = [2, 4, 1, 3, 0, 5]
         self.apply_transformation(transformation)
 
-    def colorarm_middle(self):
+    def colorarm_middle(self, block=True):
         log.info("colorarm_middle()")
-        self.colorarm.on_to_position(SpeedDPS(600), -750)
+        self.colorarm.on_to_position(SpeedDPS(600), -750, block=block)
 
-    def colorarm_corner(self, square_index):
+    def colorarm_corner(self, square_index, block=True):
         """
         The lower the number the closer to the center
         """
@@ -239,9 +326,9 @@ class MindCuber(object):
         else:
             raise ScanError("colorarm_corner was given unsupported square_index %d" % square_index)
 
-        self.colorarm.on_to_position(SpeedDPS(600), position_target)
+        self.colorarm.on_to_position(SpeedDPS(600), position_target, block=block)
 
-    def colorarm_edge(self, square_index):
+    def colorarm_edge(self, square_index, block=True):
         """
         The lower the number the closer to the center
         """
@@ -263,15 +350,15 @@ class MindCuber(object):
         else:
             raise ScanError("colorarm_edge was given unsupported square_index %d" % square_index)
 
-        self.colorarm.on_to_position(SpeedDPS(600), position_target)
+        self.colorarm.on_to_position(SpeedDPS(600), position_target, block=block)
 
-    def colorarm_remove(self):
+    def colorarm_remove(self, block=True):
         log.info("colorarm_remove()")
-        self.colorarm.on_to_position(SpeedDPS(600), 0)
+        self.colorarm.on_to_position(SpeedDPS(600), 0, block=block)
 
-    def colorarm_remove_halfway(self):
+    def colorarm_remove_halfway(self, block=True):
         log.info("colorarm_remove_halfway()")
-        self.colorarm.on_to_position(SpeedDPS(600), -400)
+        self.colorarm.on_to_position(SpeedDPS(600), -400, block=block)
 
     def scan_face(self, face_number):
         log.info("scan_face() %d/6" % face_number)
@@ -283,7 +370,7 @@ class MindCuber(object):
             self.flipper_away(100)
 
         self.colorarm_middle()
-        self.colors[int(MindCuber.scan_order[self.k])] = self.color_sensor.rgb
+        self.read_square(int(MindCuber.scan_order[self.k]), 1)
 
         self.k += 1
         i = 1
@@ -298,9 +385,8 @@ class MindCuber(object):
         while True:
 
             # 135 is 1/8 of full rotation
-            if self.turntable.position >= target_pos:
-                current_color = self.color_sensor.rgb
-                self.colors[int(MindCuber.scan_order[self.k])] = current_color
+            if self.wait_for_turntable(target_pos):
+                self.read_square(int(MindCuber.scan_order[self.k]), 1)
 
                 i += 1
                 self.k += 1
@@ -348,37 +434,149 @@ class MindCuber(object):
         self.turntable.reset()
         log.info("\n")
 
-    def scan(self):
-        log.info("scan()")
-        self.colors = {}
-        self.k = 0
-        self.scan_face(1)
+    def wait_for_turntable(self, target_pos):
+        """
+        Sleep until the turntable reaches target_pos. Instead of spinning on
+        turntable.position we estimate how long the remaining distance takes
+        at rotate_speed and sleep for most of that, so each wait costs only a
+        handful of sysfs reads, see motionwait.wait_for_position().
 
-        self.flip()
-        self.scan_face(2)
+        Returns False if we are shutting down.
+        """
+        if wait_for_position(self.turntable, target_pos, self.clock, lambda: self.shutdown, MindCuber.rotate_speed):
+            return True
 
-        self.flip()
-        self.scan_face(3)
+        if self.shutdown:
+            return False
 
-        self.rotate_cube(-1, 1)
-        self.flip()
-        self.scan_face(4)
+        raise ScanError("turntable stopped at %d before reaching %d" % (self.turntable.position, target_pos))
 
-        self.rotate_cube(1, 1)
-        self.flip()
-        self.scan_face(5)
+    def read_square(self, square, samples=None):
+        """
+        Read the square under the color sensor samples times. All of the
+        readings are kept for the classifier, self.colors gets their median.
+        """
+        if samples is None:
+            samples = MindCuber.scan_samples
 
-        self.flip()
-        self.scan_face(6)
+        readings = [self.color_sensor.rgb for i in range(samples)]
+        self.color_samples.setdefault(square, []).extend(readings)
+        self.colors[square] = median_rgb(self.color_samples[square])
+
+    def scan_face_pipelined(self, face_number):
+        """
+        Same result as scan_face() but the color arm moves are planned
+        against turntable positions up front (see scan_face_plan) and issued
+        without blocking. The flipper moving away and the color arm moving to
+        the middle square also overlap.
+        """
+        log.info("scan_face_pipelined() %d/6" % face_number)
 
         if self.shutdown:
             return
 
+        if self.flipper.position > 35:
+            self.flipper_away(100, block=False)
+
+        self.colorarm_middle(block=False)
+        self.flipper.wait_until_not_moving()
+        self.colorarm.wait_until_not_moving()
+        self.read_square(int(MindCuber.scan_order[self.k]))
+        self.k += 1
+        self.colorarm_corner(1)
+
+        self.turntable.reset()
+        self.turntable.on_to_position(SpeedDPS(MindCuber.rotate_speed), 1080, block=False)
+        self.turntable.wait_until('running')
+
+        for (target_pos, colorarm_move, square_index) in MindCuber.scan_face_plan:
+
+            if not self.wait_for_turntable(target_pos):
+                return
+
+            # The colorarm move issued after the previous sample is usually
+            # done long before the turntable gets here
+            self.colorarm.wait_until_not_moving()
+            self.read_square(int(MindCuber.scan_order[self.k]))
+            self.k += 1
+
+            if colorarm_move == 'corner':
+                self.colorarm_corner(square_index, block=False)
+
+            elif colorarm_move == 'edge':
+                self.colorarm_edge(square_index, block=False)
+
+            # Last face, move the color arm all the way out of the way
+            elif face_number == 6:
+                self.colorarm_remove(block=False)
+
+            # Move the color arm far enough away so that the flipper
+            # arm doesn't hit it
+            else:
+                self.colorarm_remove_halfway(block=False)
+
+        self.turntable.wait_until_not_moving()
+        self.colorarm.wait_until_not_moving()
+        self.turntable.off()
+        self.turntable.reset()
+        log.info("\n")
+
+    def scan(self, pipelined=True, classify=True):
+        """
+        Read all 54 squares and set self.cube_kociemba. With classify set
+        the colors are worked out by classify_colors(), otherwise by
+        rubiks-color-resolver.
+        """
+        log.info("scan()")
+        self.colors = {}
+        self.color_samples = {}
+        self.scan_states = {}
+        self.k = 0
+        self.scan_face_times = []
+        scan_start = self.clock.time()
+
+        # In pipelined mode the flip does not wait for the flipper to settle,
+        # scan_face_pipelined() moves the color arm in the meantime
+        if pipelined:
+            scan_face = self.scan_face_pipelined
+            settle = False
+        else:
+            scan_face = self.scan_face
+            settle = True
+
+        for (direction, face_number) in MindCuber.scan_face_moves:
+            face_start = self.clock.time()
+
+            if face_number > 1:
+                if direction is not None:
+                    self.rotate_cube(direction, 1)
+                self.flip(settle)
+
+            self.scan_states[face_number] = tuple(self.state)
+            scan_face(face_number)
+            self.scan_face_times.append(self.clock.time() - face_start)
+
+            if self.shutdown:
+                return
+
+        self.scan_time = self.clock.time() - scan_start
+        log.info("scan face times: %s" % ', '.join("%.2fs" % x for x in self.scan_face_times))
+        log.info("scan total time: %.2fs" % self.scan_time)
+
         log.info("RGB json:\n%s\n" % json.dumps(self.colors))
-        self.rgb_solver = RubiksColorSolverGeneric(3)
-        self.rgb_solver.enter_scan_data(self.colors)
-        self.rgb_solver.crunch_colors()
-        self.cube_kociemba = self.rgb_solver.cube_for_kociemba_strict()
+
+        if classify:
+            self.classify_colors()
+
+            if self.shutdown:
+                return
+        else:
+            from rubikscolorresolver import RubiksColorSolverGeneric
+            self.rgb_solver = RubiksColorSolverGeneric(3)
+            self.rgb_solver.enter_scan_data(self.colors)
+            self.rgb_solver.crunch_colors()
+            self.cube_kociemba = self.rgb_solver.cube_for_kociemba_strict()
+
         log.info("Final Colors (kociemba): %s" % ''.join(self.cube_kociemba))
 
         # This is only used if you want to rotate the cube so U is on top, F is
@@ -394,6 +592,146 @@ class MindCuber(object):
         input('Paused')
         '''
 
+    def classify_colors(self):
+        """
+        Classify all of the readings in self.color_samples in one go and
+        set self.cube_kociemba. Squares the classifier is not sure about
+        are read again and everything is classified again.
+        """
+        for rescan_round in range(MindCuber.rescan_rounds + 1):
+            result = self.color_classifier.classify(self.color_samples, self.max_rgb())
+            low_confidence = result.low_confidence(MindCuber.rescan_confidence)
+            log.info("classified colors in %.1fms using profile %s, %d squares below %.2f confidence" %
+                     (result.elapsed * 1000, result.profile.name if result.profile else None,
+                      len(low_confidence), MindCuber.rescan_confidence))
+
+            if not low_confidence or rescan_round == MindCuber.rescan_rounds or self.shutdown:
+                break
+
+            self.rescan_squares(low_confidence)
+
+        log.info("confidence per square:\n%s" % '\n'.join(
+            ' '.join("%2d %.2f" % (sq, result.confidence[sq]) for sq in range(start, start + 9))
+            for start in range(1, 55, 9)))
+
+        self.classify_result = result
+        self.cube_kociemba = result.kociemba()
+
+    def max_rgb(self):
+        return (self.color_sensor.red_max, self.color_sensor.green_max, self.color_sensor.blue_max)
+
+    def rescan_squares(self, squares, replace=False):
+        """
+        Read squares again. Each face is visited in the orientation it was
+        scanned in, taking the cheapest path from wherever the cube is now,
+        and the turntable only stops at the squares that need reading. With
+        replace set the old readings of these squares are thrown away.
+        """
+        log.info("rescan_squares() %s" % ' '.join(map(str, squares)))
+        by_face = {}
+
+        for square in squares:
+            if replace:
+                self.color_samples.pop(square, None)
+
+            k = MindCuber.scan_order.index(square)
+            by_face.setdefault(k // 9 + 1, []).append(k % 9)
+
+        self.colorarm_remove_halfway()
+
+        while by_face and not self.shutdown:
+            paths = shortest_paths((tuple(self.state), self.flipper.position > 35), self.cost_model)
+            (cost, actions, face_number) = min(
+                (cost, actions, face_number)
+                for ((state, holding), (cost, actions)) in paths.items()
+                for face_number in by_face
+                if state == self.scan_states[face_number])
+
+            for action in actions:
+                getattr(self, action)()
+
+            self.rescan_face(face_number, sorted(by_face.pop(face_number)))
+
+        self.colorarm_remove()
+
+    def rescan_face(self, face_number, indexes):
+        """
+        indexes are positions in the scan of this face, 0 is the middle
+        square and 1-8 are the squares around it in the order scan_face()
+        reads them. The turntable goes whichever way round is shorter and
+        stops at the nearest quarter turn when done.
+        """
+        if self.flipper.position > 35:
+            self.flipper_away(100)
+
+        self.turntable.reset()
+        ring = [MindCuber.scan_face_plan[index - 1][0] for index in indexes if index]
+
+        # The gear ratio is 3:1 so 1080 is one full rotation
+        backwards = ring and 1080 - min(ring) < max(ring)
+
+        for index in sorted(indexes, reverse=backwards):
+
+            if self.shutdown:
+                return
+
+            if index == 0:
+                self.colorarm_middle()
+            else:
+                target_pos = MindCuber.scan_face_plan[index - 1][0]
+
+                if backwards:
+                    target_pos -= 1080
+
+                self.turntable.on_to_position(SpeedDPS(MindCuber.rotate_speed), target_pos, block=False)
+
+                if index % 2:
+                    self.colorarm_corner(index)
+                else:
+                    self.colorarm_edge(index)
+
+                self.turntable.wait_until_not_moving()
+
+            self.read_square(MindCuber.scan_order[(face_number - 1) * 9 + index])
+
+        # Line the cube back up with the turntable
+        self.colorarm_remove_halfway()
+        quarter_turns = int(round(self.turntable.position / 270.0))
+        self.turntable.on_to_position(SpeedDPS(MindCuber.rotate_speed), quarter_turns * 270)
+        self.turntable.reset()
+
+        for i in range(quarter_turns % 4):
+            self.apply_transformation([0, 1, 5, 2, 3, 4])
+
+    def scan_centers(self):
+        """
+        Return the median reading of each of the six center squares in
+        the order they are scanned, calibrate_white.py uses this to build
+        a color profile
+        """
+        centers = []
+
+        for (direction, face_number) in MindCuber.scan_face_moves:
+
+            if self.shutdown:
+                break
+
+            if face_number > 1:
+                self.colorarm_remove_halfway()
+
+                if direction is not None:
+                    self.rotate_cube(direction, 1)
+                self.flip()
+
+            if self.flipper.position > 35:
+                self.flipper_away(100)
+
+            self.colorarm_middle()
+            centers.append(median_rgb([self.color_sensor.rgb for i in range(MindCuber.scan_samples)]))
+
+        self.colorarm_remove()
+        return centers
+
     def move(self, face_down):
         log.info("move() face_down %s" % face_down)
 
@@ -414,9 +752,44 @@ class MindCuber(object):
 
             getattr(self, a)()
 
-    def run_kociemba_actions(self, actions):
+    def run_plan(self, plan):
+        """
+        Run a list of MindCuber actions such as the one from plan_actions()
+        and log how long it took compared to the expected time
+        """
+        start = self.clock.time()
+
+        for (i, action) in enumerate(plan):
+
+            if self.shutdown:
+                break
+
+            log.info("Action %d/%d: %s" % (i + 1, len(plan), action))
+            getattr(self, action)()
+
+        log.info("plan took %.1fs, expected %.1fs" % (self.clock.time() - start, self.plan_expected_time))
+
+    def run_kociemba_actions(self, actions, optimize=True):
+        """
+        With optimize set the whole solution is planned up front by
+        planner.plan_actions() which picks the cheapest way to get each face
+        down, otherwise each move uses the fixed lookup in move()
+        """
         log.info('Action (kociemba): %s' % ' '.join(actions))
         total_actions = len(actions)
+        holding = self.flipper.position > 35
+
+        naive_plan = fixed_plan(actions, self.state)
+        naive_expected_time = plan_cost(naive_plan, holding, self.cost_model)
+
+        if optimize:
+            (plan, self.plan_expected_time) = plan_actions(actions, self.state, holding, self.cost_model)
+            log.info("planned %d actions, expected %.1fs (fixed lookup %d actions, expected %.1fs)" %
+                     (len(plan), self.plan_expected_time, len(naive_plan), naive_expected_time))
+            self.run_plan(plan)
+            return
+
+        self.plan_expected_time = naive_expected_time
 
         for (i, a) in enumerate(actions):
 
@@ -444,24 +817,159 @@ class MindCuber(object):
                 self.rotate_cube_blocked_3()
             log.info("\n")
 
-    def resolve(self):
+    def get_solver(self):
+        """
+        The solver tables are loaded on first use and kept around for every
+        solve after that. Returns None if they have not been built, building
+        them takes far too long with a cube waiting in the cradle.
+        """
+        if self.solver is None:
+            tables = load_tables(MindCuber.solver_tables_filename)
+
+            if tables is None:
+                return None
 
-        if self.shutdown:
-            return
+            self.solver = TwoPhaseSolver(MindCuber.solver_tables_filename, tables)
+        return self.solver
 
+    def solve_in_process(self, max_length=None, timeout=None):
+        """
+        Return the kociemba moves for self.cube_kociemba using the in-process
+        two-phase solver, raises SolverError if the cube cannot be solved
+        """
+        if max_length is None:
+            max_length = MindCuber.solve_max_length
+
+        if timeout is None:
+            timeout = MindCuber.solve_timeout
+
+        solver = self.get_solver()
+        start = time.time()
+        actions = solver.solve(''.join(map(str, self.cube_kociemba)), max_length, timeout)
+        log.info("solved in-process in %.2fs, %d moves" % (time.time() - start, len(actions)))
+        return actions
+
+    def solve_kociemba_binary(self):
+        """
+        Return the kociemba moves for self.cube_kociemba by running the
+        kociemba program, raises SolverError if the cube cannot be solved
+        """
         cmd = ['kociemba', ''.join(map(str, self.cube_kociemba))]
         output = check_output(cmd).decode('ascii')
 
         if 'ERROR' in output:
-            msg = "'%s' returned the following error\n%s\n" % (' '.join(cmd), output)
-            log.error(msg)
-            print(msg)
-            sys.exit(1)
+            raise SolverError("'%s' returned the following error\n%s\n" % (' '.join(cmd), output))
+
+        return output.strip().split()
+
+    def resolve(self, in_process=True):
+
+        if self.shutdown:
+            return
+
+        self.squares_reread = 0
+        self.recovery_time = None
+        recovery_start = None
+
+        if in_process and self.get_solver() is None:
+            log.warning("%s not found or out of date, solving with the kociemba program, "
+                        "build it with ./twophase.py --build %s" %
+                        (MindCuber.solver_tables_filename, MindCuber.solver_tables_filename))
+            in_process = False
+
+        for attempt in range(MindCuber.recover_attempts + 1):
+            try:
+                if in_process:
+                    actions = self.solve_in_process()
+                else:
+                    actions = self.solve_kociemba_binary()
+                break
 
-        actions = output.strip().split()
+            except SolverError as e:
+                if recovery_start is None:
+                    recovery_start = self.clock.time()
+
+                if attempt == MindCuber.recover_attempts or not self.recover_scan(e):
+                    self.recovery_time = self.clock.time() - recovery_start
+                    self.update_scan_stats(False)
+                    msg = "solving %s failed\n%s\n" % (''.join(map(str, self.cube_kociemba)), e)
+                    log.error(msg)
+                    print(msg)
+                    sys.exit(1)
+
+        if recovery_start is not None:
+            self.recovery_time = self.clock.time() - recovery_start
+            log.info("recovered from a bad scan in %.1fs by reading %d squares again" %
+                     (self.recovery_time, self.squares_reread))
+
+        self.update_scan_stats(True)
         self.run_kociemba_actions(actions)
         self.cube_done()
 
+    def recover_scan(self, error):
+        """
+        The solver rejected the colors from scan(). Read the squares most
+        likely to be wrong again, see ClassifyResult.suspect_squares(), and
+        classify the colors again. Returns False if we are shutting down.
+        """
+        if self.shutdown:
+            return False
+
+        result = self.classify_result
+
+        # scan(classify=False) used rubiks-color-resolver
+        if result is None:
+            result = self.color_classifier.classify(self.color_samples, self.max_rgb())
+
+        squares = result.suspect_squares(is_solvable)
+        log.warning("solver rejected %s (%s), reading squares %s again" %
+                    (''.join(map(str, self.cube_kociemba)), error, ' '.join(map(str, squares))))
+
+        self.squares_reread += len(squares)
+        self.rescan_squares(squares, replace=True)
+        self.classify_colors()
+        log.info("Final Colors (kociemba): %s" % self.cube_kociemba)
+        return not self.shutdown
+
+    def update_scan_stats(self, solved):
+        """
+        Add this run to the totals in scan_stats_filename. Every recovery
+        that ends in a solve is a full rescan (and a re-insert of the cube)
+        avoided.
+        """
+        if MindCuber.scan_stats_filename is None:
+            return
+
+        stats = {
+            'runs': 0,
+            'recoveries': 0,
+            'full_rescans_avoided': 0,
+            'recoveries_failed': 0,
+            'squares_reread': 0,
+            'recovery_time': 0.0,
+        }
+
+        if os.path.exists(MindCuber.scan_stats_filename):
+            with open(MindCuber.scan_stats_filename, 'r') as fh:
+                stats.update(json.load(fh))
+
+        stats['runs'] += 1
+
+        if self.recovery_time is not None:
+            stats['recoveries'] += 1
+            stats['squares_reread'] += self.squares_reread
+            stats['recovery_time'] += self.recovery_time
+
+            if solved:
+                stats['full_rescans_avoided'] += 1
+            else:
+                stats['recoveries_failed'] += 1
+
+        with open(MindCuber.scan_stats_filename, 'w') as fh:
+            json.dump(stats, fh, indent=4)
+
+        log.info("scan stats: %s" % ', '.join("%s %s" % (k, stats[k]) for k in sorted(stats)))
+
     def cube_done(self):
         self.flipper_away()
 
@@ -493,7 +1001,7 @@ class MindCuber(object):
                 log.info('wait for cube...cube found and stable')
                 break
 
-            time.sleep(0.1)
+            self.clock.sleep(0.1)
 
 
 if __name__ == '__main__':
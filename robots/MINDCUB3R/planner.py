@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+
+"""
+Turn a kociemba solution into the cheapest sequence of MindCuber actions.
+
+MindCuber can only turn the face that is down on the turntable. To turn any
+other face it first has to get that face down with some combination of
+flips and free turntable rotations. move() does this with a fixed lookup
+per kociemba move, which ignores where the cube ends up for the next move
+and what the flipper arm has to do in between (it must be away from the
+cube for a free rotation but holding it for a flip or a blocked rotation).
+
+plan_actions() searches over every way of getting each face down, with the
+cost of each action taken from a CostModel, and returns the cheapest plan
+for the whole solution. Consecutive moves of opposite faces commute, both
+orders are tried. This module does not need any motors so a plan can be
+looked at on a PC:
+
+    $ ./planner.py "D2 R' D' F2 B D R2 D2 R' F2 D' F2 U' B2 L2 U2 D R2 U"
+"""
+
+import heapq
+import logging
+
+log = logging.getLogger(__name__)
+
+# These match MindCuber.flip() and MindCuber.rotate_cube(), each is the
+# new position of the face at each index of MindCuber.state
+FLIP_TRANSFORMATION = (2, 4, 1, 3, 0, 5)
+ROTATE_TRANSFORMATION = {
+    1: (0, 1, 5, 2, 3, 4),
+    -1: (0, 1, 3, 4, 5, 2),
+}
+
+OPPOSITE_FACE = {
+    'U': 'D', 'D': 'U',
+    'F': 'B', 'B': 'F',
+    'L': 'R', 'R': 'L',
+}
+
+# Free rotations, (MindCuber action, direction, nb)
+ROTATIONS = (
+    ('rotate_cube_1', 1, 1),
+    ('rotate_cube_2', 1, 2),
+    ('rotate_cube_3', -1, 1),
+)
+
+
+class CostModel(object):
+    """
+    Expected duration in seconds of each MindCuber action. The defaults
+    come from the motor speeds used in mindcuber.py plus a little for
+    ramping up and down, they can be overridden per instance with the
+    measurements from your own robot.
+    """
+
+    # flip() when the flipper is already holding the cube
+    flip = 0.8
+
+    # Moving the flipper between away and holding the cube
+    flipper_hold = 0.35
+    flipper_away = 0.3
+
+    # rotate_cube_1, rotate_cube_2 and rotate_cube_3 with the flipper away
+    rotate = {
+        'rotate_cube_1': 0.8,
+        'rotate_cube_2': 1.45,
+        'rotate_cube_3': 0.8,
+    }
+
+    # rotate_cube_blocked_N with the flipper already holding the cube
+    blocked = {
+        'rotate_cube_blocked_1': 1.0,
+        'rotate_cube_blocked_2': 1.7,
+        'rotate_cube_blocked_3': 1.0,
+    }
+
+    def __init__(self, **kwargs):
+        for (name, value) in kwargs.items():
+            if not hasattr(CostModel, name):
+                raise ValueError("unknown cost %s" % name)
+            setattr(self, name, value)
+
+
+def apply_transformation(state, transformation):
+    return tuple(state[t] for t in transformation)
+
+
+def blocked_action(kociemba_action):
+    """
+    The blocked rotation for a kociemba move once its face is down, this
+    matches what run_kociemba_actions() has always done
+    """
+    if kociemba_action.endswith("'"):
+        return 'rotate_cube_blocked_1'
+    elif kociemba_action.endswith('2'):
+        return 'rotate_cube_blocked_2'
+    else:
+        return 'rotate_cube_blocked_3'
+
+
+def neighbours(node, cost_model):
+    """
+    Yield (action, next node, cost) for every flip and free rotation from
+    node, a node is (MindCuber.state as a tuple, flipper holding the cube)
+    """
+    (state, holding) = node
+
+    cost = cost_model.flip
+    if not holding:
+        cost += cost_model.flipper_hold
+    yield ('flip', (apply_transformation(state, FLIP_TRANSFORMATION), True), cost)
+
+    for (action, direction, nb) in ROTATIONS:
+        cost = cost_model.rotate[action]
+        if holding:
+            cost += cost_model.flipper_away
+
+        new_state = state
+        for i in range(nb):
+            new_state = apply_transformation(new_state, ROTATE_TRANSFORMATION[direction])
+        yield (action, (new_state, False), cost)
+
+
+def shortest_paths(source, cost_model):
+    """
+    Dijkstra over flips and free rotations, returns {node: (cost, actions)}
+    for every node reachable from source
+    """
+    best = {source: (0, [])}
+    heap = [(0, 0, source)]
+    counter = 1
+
+    while heap:
+        (cost, _, node) = heapq.heappop(heap)
+
+        if cost > best[node][0]:
+            continue
+
+        for (action, next_node, action_cost) in neighbours(node, cost_model):
+            new_cost = cost + action_cost
+
+            if next_node not in best or new_cost < best[next_node][0]:
+                best[next_node] = (new_cost, best[node][1] + [action])
+                heapq.heappush(heap, (new_cost, counter, next_node))
+                counter += 1
+
+    return best
+
+
+class Planner(object):
+
+    def __init__(self, cost_model=None):
+        self.cost_model = cost_model if cost_model is not None else CostModel()
+        self.paths = {}
+
+    def paths_from(self, node):
+        if node not in self.paths:
+            self.paths[node] = shortest_paths(node, self.cost_model)
+        return self.paths[node]
+
+    def step(self, frontier, kociemba_action):
+        """
+        frontier is {node: (cost, plan)}, return the same for after
+        kociemba_action has been done
+        """
+        face = kociemba_action[0]
+        blocked = blocked_action(kociemba_action)
+        result = {}
+
+        for (node, (cost, plan)) in frontier.items():
+            for (target, (path_cost, path)) in self.paths_from(node).items():
+                (state, holding) = target
+
+                if state[1] != face:
+                    continue
+
+                total = cost + path_cost + self.cost_model.blocked[blocked]
+                if not holding:
+                    total += self.cost_model.flipper_hold
+
+                end = (state, True)
+
+                if end not in result or total < result[end][0]:
+                    result[end] = (total, plan + path + [blocked])
+
+        return result
+
+    def plan(self, kociemba_actions, state, holding):
+        """
+        Return (actions, expected seconds) for the cheapest plan that does
+        kociemba_actions starting from MindCuber.state and flipper position
+        """
+        frontier = {(tuple(state), holding): (0, [])}
+        i = 0
+
+        while i < len(kociemba_actions):
+            action = kociemba_actions[i]
+
+            # Moves of opposite faces commute so try both orders
+            if (i + 1 < len(kociemba_actions) and
+                    kociemba_actions[i + 1][0] == OPPOSITE_FACE[action[0]]):
+                next_action = kociemba_actions[i + 1]
+                first = self.step(self.step(frontier, action), next_action)
+                second = self.step(self.step(frontier, next_action), action)
+
+                for (node, value) in second.items():
+                    if node not in first or value[0] < first[node][0]:
+                        first[node] = value
+
+                frontier = first
+                i += 2
+            else:
+                frontier = self.step(frontier, action)
+                i += 1
+
+        (cost, plan) = min(frontier.values(), key=lambda x: x[0])
+        return (plan, cost)
+
+
+def plan_actions(kociemba_actions, state, holding, cost_model=None):
+    return Planner(cost_model).plan(kociemba_actions, state, holding)
+
+
+def fixed_plan(kociemba_actions, state):
+    """
+    The plan that MindCuber.move() and run_kociemba_actions() produce with
+    their fixed lookup, used to compare against plan_actions()
+    """
+    lookup = {
+        0: ['flip', 'flip'],
+        1: [],
+        2: ['rotate_cube_2', 'flip'],
+        3: ['rotate_cube_1', 'flip'],
+        4: ['flip'],
+        5: ['rotate_cube_3', 'flip'],
+    }
+    state = tuple(state)
+    plan = []
+
+    for kociemba_action in kociemba_actions:
+        for action in lookup[state.index(kociemba_action[0])]:
+            plan.append(action)
+            state = simulate(state, action)
+        plan.append(blocked_action(kociemba_action))
+
+    return plan
+
+
+def simulate(state, action):
+    """
+    MindCuber.state after doing action
+    """
+    if action == 'flip':
+        return apply_transformation(state, FLIP_TRANSFORMATION)
+
+    for (name, direction, nb) in ROTATIONS:
+        if action == name:
+            for i in range(nb):
+                state = apply_transformation(state, ROTATE_TRANSFORMATION[direction])
+            return state
+
+    return state
+
+
+def plan_cost(plan, holding, cost_model=None):
+    """
+    Expected seconds to run plan
+    """
+    if cost_model is None:
+        cost_model = CostModel()
+
+    total = 0
+
+    for action in plan:
+        if action == 'flip' or action in cost_model.blocked:
+            if not holding:
+                total += cost_model.flipper_hold
+            total += cost_model.flip if action == 'flip' else cost_model.blocked[action]
+            holding = True
+        else:
+            if holding:
+                total += cost_model.flipper_away
+            total += cost_model.rotate[action]
+            holding = False
+
+    return total
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Plan MindCuber actions for a kociemba solution (dry run)')
+    parser.add_argument('solution', help="kociemba solution such as \"R U2 F'\"")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO,
+                        format='%(asctime)s %(filename)12s %(levelname)8s: %(message)s')
+
+    kociemba_actions = args.solution.split()
+    start_state = ['U', 'D', 'F', 'L', 'B', 'R']
+
+    naive = fixed_plan(kociemba_actions, start_state)
+    (plan, expected) = plan_actions(kociemba_actions, start_state, False)
+
+    print("fixed lookup: %3d actions, %2d flips, expected %.1fs" %
+          (len(naive), naive.count('flip'), plan_cost(naive, False)))
+    print("planned:      %3d actions, %2d flips, expected %.1fs" %
+          (len(plan), plan.count('flip'), expected))
+    print('')
+    print('\n'.join(plan))
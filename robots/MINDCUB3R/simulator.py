@@ -0,0 +1,634 @@
+#!/usr/bin/env python3
+
+"""
+A simulated MINDCUB3R so the scan/solve pipeline can run on a PC.
+
+SimBackend is a drop-in replacement for backend.EV3Backend:
+
+    mcube = MindCuber(SimBackend(scramble="R U R' U'"))
+
+It has a virtual clock, motors whose position follows their speed and ramp
+settings over virtual time, an infrared sensor that sees the cube get
+inserted and a color sensor that returns a noisy RGB reading of whichever
+facelet is under the color arm. The simulated cube follows the flips,
+free rotations and blocked rotations the robot makes so you can check that
+it really is solved at the end.
+
+Every motor or sensor attribute read costs read_cost seconds of virtual
+time, like a sysfs read does on the brick, so polling loops still make
+progress. The python-ev3dev2 package must be installed (it is on PyPI)
+because MindCuber uses its SpeedDPS class, but no EV3 is needed.
+"""
+
+from ev3dev2.motor import speed_to_speedvalue
+from twophase import FACES, MOVE_NAMES, SOLVED, apply_moves
+import logging
+import math
+import random
+import time
+
+log = logging.getLogger(__name__)
+
+
+class SimError(Exception):
+    pass
+
+
+class VirtualClock(object):
+    """
+    Same time() and sleep() as the time module but in virtual time. With
+    speedup set, sleep() also really sleeps for 1/speedup of the time so you
+    can watch what happens, otherwise virtual time passes instantly.
+    """
+
+    def __init__(self, read_cost=0.0005, speedup=None):
+        self.now = 0.0
+        self.read_cost = read_cost
+        self.speedup = speedup
+        self.reads = 0
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        if seconds > 0:
+            self.advance_to(self.now + seconds)
+
+    def advance_to(self, t):
+        if t > self.now:
+            if self.speedup:
+                time.sleep((t - self.now) / self.speedup)
+            self.now = t
+
+    def read(self):
+        """
+        Account for one sysfs read
+        """
+        self.reads += 1
+        self.now += self.read_cost
+
+
+class SimMotor(object):
+    """
+    Enough of ev3dev2.motor.Motor for MindCuber. Moves follow a trapezoid
+    speed profile, ramp_up_sp and ramp_down_sp are the milliseconds to go
+    from 0 to max_speed like on the real motor and inertia_ms is the
+    shortest ramp the motor can physically do. A motor running into one of
+    its limits (a mechanical stop) stalls there.
+    """
+    STATE_RUNNING = 'running'
+    STATE_STALLED = 'stalled'
+    STATE_HOLDING = 'holding'
+    STOP_ACTION_COAST = 'coast'
+    STOP_ACTION_BRAKE = 'brake'
+    STOP_ACTION_HOLD = 'hold'
+
+    def __init__(self, clock, address, max_speed, angle=0, limits=(None, None), inertia_ms=60):
+        self.clock = clock
+        self.address = address
+        self.max_speed = max_speed
+        self.count_per_rot = 360
+        self.limits = limits
+        self.inertia_ms = inertia_ms
+        self.ramp_up_sp = 0
+        self.ramp_down_sp = 0
+        self.speed_sp = 0
+        self.position_sp = 0
+        self.stop_action = self.STOP_ACTION_COAST
+        self.commands = 0
+        self.on_command = None
+
+        # angle is the physical angle, position is angle - offset
+        self.angle = float(angle)
+        self.offset = 0.0
+        self.motion = None
+
+    def __str__(self):
+        return "SimMotor(%s)" % self.address
+
+    # Unit conversions used by ev3dev2's SpeedValue classes
+    @property
+    def max_rps(self):
+        return float(self.max_speed) / self.count_per_rot
+
+    @property
+    def max_rpm(self):
+        return self.max_rps * 60
+
+    @property
+    def max_dps(self):
+        return self.max_rps * 360
+
+    def _acceleration(self, ramp_ms):
+        return self.max_speed / (max(ramp_ms, self.inertia_ms) / 1000.0)
+
+    def _start(self, speed, distance=None):
+        """
+        Start moving at speed (signed, native units) for distance (None
+        means forever). t1, t2 and t3 in self.motion are the end of the
+        ramp up, cruise and ramp down relative to t0.
+        """
+        self._settle()
+        self.commands += 1
+
+        if self.on_command:
+            target = None if distance is None else self.angle - self.offset + distance
+            self.on_command(self, target)
+
+        direction = 1 if speed >= 0 else -1
+        vmax = abs(speed)
+        a_up = self._acceleration(self.ramp_up_sp)
+        a_down = self._acceleration(self.ramp_down_sp)
+
+        if distance is None:
+            t1 = vmax / a_up
+            d1 = 0.5 * a_up * t1 * t1
+            (t2, t3) = (None, None)
+            vpk = vmax
+        else:
+            # Accelerate, cruise, decelerate...or a triangle if there is not
+            # room to reach vmax
+            distance = abs(distance)
+            d_up = vmax * vmax / (2 * a_up)
+            d_down = vmax * vmax / (2 * a_down)
+
+            if d_up + d_down <= distance:
+                vpk = vmax
+            else:
+                vpk = math.sqrt(distance / (1.0 / (2 * a_up) + 1.0 / (2 * a_down)))
+
+            t1 = vpk / a_up
+            d1 = 0.5 * a_up * t1 * t1
+            d_down = vpk * vpk / (2 * a_down)
+            t2 = t1 + ((distance - d1 - d_down) / vpk if vpk else 0)
+            t3 = t2 + vpk / a_down
+
+        self.motion = {
+            't0': self.clock.now,
+            'angle0': self.angle,
+            'direction': direction,
+            'distance': distance,
+            'vpk': vpk,
+            'a_up': a_up,
+            'a_down': a_down,
+            't1': t1,
+            'd1': d1,
+            't2': t2,
+            't3': t3,
+            'stall_at': None,
+        }
+
+        # Where would we hit a mechanical stop?
+        limit = self.limits[1] if direction > 0 else self.limits[0]
+
+        if limit is not None:
+            to_limit = (limit - self.angle) * direction
+
+            if to_limit <= 0:
+                self.motion['stall_at'] = self.clock.now
+            elif distance is None or to_limit < distance:
+                self.motion['stall_at'] = self.clock.now + self._time_for_distance(to_limit)
+                self.motion['limit'] = limit
+
+    def _time_for_distance(self, d):
+        m = self.motion
+        if d <= m['d1']:
+            return math.sqrt(2 * d / m['a_up'])
+        return m['t1'] + (d - m['d1']) / m['vpk']
+
+    def _distance_at(self, tau):
+        m = self.motion
+
+        if tau <= m['t1']:
+            return 0.5 * m['a_up'] * tau * tau
+
+        if m['t2'] is None or tau <= m['t2']:
+            return m['d1'] + m['vpk'] * (tau - m['t1'])
+
+        if tau < m['t3']:
+            d2 = m['d1'] + m['vpk'] * (m['t2'] - m['t1'])
+            dt = tau - m['t2']
+            return d2 + m['vpk'] * dt - 0.5 * m['a_down'] * dt * dt
+
+        return m['distance']
+
+    def _angle_at(self, t):
+        m = self.motion
+
+        if m['stall_at'] is not None and t >= m['stall_at']:
+            return m.get('limit', m['angle0'])
+
+        return m['angle0'] + m['direction'] * self._distance_at(t - m['t0'])
+
+    def _settle(self):
+        """
+        Bring angle up to date with the clock and forget finished moves
+        """
+        if self.motion is None:
+            return
+
+        m = self.motion
+        self.angle = self._angle_at(self.clock.now)
+
+        if m['t3'] is not None and self.clock.now >= m['t0'] + m['t3'] and m['stall_at'] is None:
+            self.motion = None
+
+    def next_event(self):
+        """
+        Virtual time at which state will next change, None if never
+        """
+        if self.motion is None:
+            return None
+
+        m = self.motion
+        if m['stall_at'] is not None:
+            return m['stall_at'] if m['stall_at'] > self.clock.now else None
+        return m['t0'] + m['t3']
+
+    @property
+    def position(self):
+        self.clock.read()
+        self._settle()
+        return int(round(self.angle - self.offset))
+
+    @position.setter
+    def position(self, value):
+        self._settle()
+        self.offset = self.angle - value
+
+    @property
+    def speed(self):
+        self.clock.read()
+        self._settle()
+
+        if self.motion is None:
+            return 0
+
+        m = self.motion
+        tau = self.clock.now - m['t0']
+
+        if m['stall_at'] is not None and self.clock.now >= m['stall_at']:
+            return 0
+
+        if tau <= m['t1']:
+            speed = m['a_up'] * tau
+        elif m['t2'] is None or tau <= m['t2']:
+            speed = m['vpk']
+        else:
+            speed = max(m['vpk'] - m['a_down'] * (tau - m['t2']), 0)
+
+        return int(round(m['direction'] * speed))
+
+    @property
+    def state(self):
+        self.clock.read()
+        self._settle()
+
+        if self.motion is None:
+            return [self.STATE_HOLDING] if self.stop_action == self.STOP_ACTION_HOLD else []
+
+        m = self.motion
+        if m['stall_at'] is not None and self.clock.now >= m['stall_at']:
+            return [self.STATE_RUNNING, self.STATE_STALLED]
+        return [self.STATE_RUNNING]
+
+    @property
+    def is_running(self):
+        return self.STATE_RUNNING in self.state
+
+    def _set_brake(self, brake):
+        self.stop_action = self.STOP_ACTION_HOLD if brake else self.STOP_ACTION_COAST
+
+    def _speed_native_units(self, speed):
+        return speed_to_speedvalue(speed).to_native_units(self)
+
+    def reset(self):
+        self.commands += 1
+        self._settle()
+        self.motion = None
+        self.offset = self.angle
+        self.ramp_up_sp = 0
+        self.ramp_down_sp = 0
+        self.stop_action = self.STOP_ACTION_COAST
+
+    def stop(self, stop_action=None):
+        self.commands += 1
+        self._settle()
+        self.motion = None
+
+        if stop_action is not None:
+            self.stop_action = stop_action
+
+    def off(self, brake=True):
+        self._set_brake(brake)
+        self.stop()
+
+    def on(self, speed, brake=True, block=False):
+        self.speed_sp = int(round(self._speed_native_units(speed)))
+        self._set_brake(brake)
+        self._start(self.speed_sp)
+
+        if block:
+            self.wait_until_not_moving()
+
+    def on_to_position(self, speed, position, brake=True, block=True):
+        self.speed_sp = int(round(abs(self._speed_native_units(speed))))
+        self.position_sp = position
+        self._set_brake(brake)
+        self._settle()
+        distance = position - (self.angle - self.offset)
+        self._start(self.speed_sp if distance >= 0 else -self.speed_sp, distance)
+
+        if block:
+            self.wait_until_not_moving()
+
+    def on_for_degrees(self, speed, degrees, brake=True, block=True):
+        speed = self._speed_native_units(speed)
+        self._settle()
+        degrees = degrees if speed >= 0 else -degrees
+        self.on_to_position(abs(speed) / self.max_speed * 100, self.angle - self.offset + degrees, brake, block)
+
+    def on_for_seconds(self, speed, seconds, brake=True, block=True):
+        speed = self._speed_native_units(speed)
+        self.speed_sp = int(round(speed))
+        self._set_brake(brake)
+        self._start(self.speed_sp)
+        self.motion['t3'] = seconds
+        self.motion['t2'] = self.motion['t3']
+        self.motion['distance'] = self._distance_at(seconds)
+
+        if block:
+            self.wait_until_not_moving()
+
+    def wait(self, cond, timeout=None):
+        """
+        Jump the virtual clock straight to the next state change rather than
+        polling like the real motor does
+        """
+        deadline = self.clock.now + timeout / 1000.0 if timeout is not None else None
+
+        while True:
+            if cond(self.state):
+                return True
+
+            t = self.next_event()
+
+            if t is None:
+                if deadline is None:
+                    raise SimError("%s would wait forever, state %s" % (self, self.state))
+                t = deadline
+
+            if deadline is not None and t >= deadline:
+                self.clock.advance_to(deadline)
+                return cond(self.state)
+
+            self.clock.advance_to(t)
+
+    def wait_until_not_moving(self, timeout=None):
+        return self.wait(lambda state: self.STATE_RUNNING not in state or self.STATE_STALLED in state, timeout)
+
+    def wait_until(self, s, timeout=None):
+        return self.wait(lambda state: s in state, timeout)
+
+    def wait_while(self, s, timeout=None):
+        return self.wait(lambda state: s not in state, timeout)
+
+
+def sticker_points():
+    """
+    A point for each of the 54 facelets (URFDLB order) in doubled cube
+    coordinates, x points right, y up and z towards the front
+    """
+    points = []
+
+    for face in FACES:
+        for r in range(3):
+            for c in range(3):
+                if face == 'U':
+                    (pos, normal) = ((c - 1, 1, r - 1), (0, 1, 0))
+                elif face == 'R':
+                    (pos, normal) = ((1, 1 - r, 1 - c), (1, 0, 0))
+                elif face == 'F':
+                    (pos, normal) = ((c - 1, 1 - r, 1), (0, 0, 1))
+                elif face == 'D':
+                    (pos, normal) = ((c - 1, -1, 1 - r), (0, -1, 0))
+                elif face == 'L':
+                    (pos, normal) = ((-1, 1 - r, c - 1), (-1, 0, 0))
+                else:
+                    (pos, normal) = ((1 - c, 1 - r, -1), (0, 0, -1))
+                points.append(tuple(2 * p + n for (p, n) in zip(pos, normal)))
+
+    return points
+
+
+STICKER_POINTS = sticker_points()
+
+
+def rotation_permutation(rotate, layer=None):
+    """
+    perm[i] is where facelet i ends up after rotate, optionally only for
+    the facelets that layer(point) accepts
+    """
+    index = dict((p, i) for (i, p) in enumerate(STICKER_POINTS))
+    perm = []
+
+    for p in STICKER_POINTS:
+        if layer is None or layer(p):
+            perm.append(index[rotate(p)])
+        else:
+            perm.append(index[p])
+
+    return perm
+
+
+# Whole cube y (same direction as U) and x (same direction as R) rotations
+# and the bottom layer turning the same way as y, which is a D'
+ROTATE_Y = rotation_permutation(lambda p: (-p[2], p[1], p[0]))
+ROTATE_X = rotation_permutation(lambda p: (p[0], p[2], -p[1]))
+TURN_BOTTOM = rotation_permutation(lambda p: (-p[2], p[1], p[0]), lambda p: p[1] <= -2)
+
+# Facelets of the top face the color sensor sees at each 1/8th of a turn
+# of the cube, see MindCuber.scan_order
+SCAN_RING = (7, 8, 5, 2, 1, 0, 3, 6)
+
+# Raw RGB readings of each color and for nothing under the sensor
+PALETTE = {
+    'U': (250, 265, 240),   # white
+    'D': (230, 200, 40),    # yellow
+    'F': (35, 150, 50),     # green
+    'B': (30, 60, 165),     # blue
+    'R': (150, 30, 20),     # red
+    'L': (220, 90, 30),     # orange
+}
+NOTHING = (4, 4, 4)
+
+
+class SimCube(object):
+    """
+    The cube sitting on the turntable. facelets are in world positions
+    (U is up, F faces the color sensor) and each letter is a color.
+    """
+
+    def __init__(self, facelets):
+        self.facelets = facelets
+
+    def apply(self, perm, times=1):
+        for i in range(times % 4):
+            new = [None] * 54
+            for (src, dst) in enumerate(perm):
+                new[dst] = self.facelets[src]
+            self.facelets = ''.join(new)
+
+    def rotate(self, quarter_turns):
+        self.apply(ROTATE_Y, quarter_turns)
+
+    def flip(self):
+        self.apply(ROTATE_X)
+
+    def turn_bottom(self, quarter_turns):
+        self.apply(TURN_BOTTOM, quarter_turns)
+
+    def is_solved(self):
+        return all(len(set(self.facelets[9 * i:9 * i + 9])) == 1 for i in range(6))
+
+
+class SimColorSensor(object):
+    MODE_RGB_RAW = 'RGB-RAW'
+
+    def __init__(self, backend, noise, rand):
+        self.backend = backend
+        self.noise = noise
+        self.rand = rand
+        self.mode = self.MODE_RGB_RAW
+        self.red_max = 300
+        self.green_max = 300
+        self.blue_max = 300
+
+    def raw(self):
+        self.backend.clock.read()
+        color = self.backend.facelet_under_sensor()
+        base = PALETTE[color] if color else NOTHING
+        return tuple(max(0, int(round(self.rand.gauss(c, self.noise)))) for c in base)
+
+    @property
+    def rgb(self):
+        (red, green, blue) = self.raw()
+        return (min(int(red * 255 / self.red_max), 255),
+                min(int(green * 255 / self.green_max), 255),
+                min(int(blue * 255 / self.blue_max), 255))
+
+    def calibrate_white(self):
+        (self.red_max, self.green_max, self.blue_max) = self.raw()
+
+
+class SimInfraredSensor(object):
+
+    def __init__(self, clock, insert_after):
+        self.clock = clock
+        self.insert_after = insert_after
+
+    @property
+    def proximity(self):
+        self.clock.read()
+        return 20 if self.clock.now >= self.insert_after else 70
+
+
+class SimBackend(object):
+    """
+    The simulated robot. scramble is a kociemba style move string applied
+    to a solved cube, a random 25 move scramble is used if it is None.
+    """
+
+    def __init__(self, scramble=None, seed=0, insert_after=1.0, noise=3.0,
+                 read_cost=0.0005, speedup=None, inertia_ms=60):
+        rand = random.Random(seed)
+
+        if scramble is None:
+            scramble = ' '.join(rand.choice(MOVE_NAMES) for i in range(25))
+
+        self.scramble = scramble
+        self.clock = VirtualClock(read_cost, speedup)
+        self.cube = SimCube(apply_moves(SOLVED, scramble))
+
+        # The flipper and color arm start somewhere short of their
+        # mechanical stops, init_motors() drives them into the stops
+        self.flipper = SimMotor(self.clock, 'outA', 1050, angle=40, limits=(0, None), inertia_ms=inertia_ms)
+        self.turntable = SimMotor(self.clock, 'outB', 1050, inertia_ms=inertia_ms)
+        self.colorarm = SimMotor(self.clock, 'outC', 1560, angle=-200, limits=(None, 0), inertia_ms=inertia_ms)
+        self.color_sensor = SimColorSensor(self, noise, rand)
+        self.infrared_sensor = SimInfraredSensor(self.clock, insert_after)
+
+        self.flipper.on_command = self.flipper_command
+        self.turntable.on_command = self.turntable_command
+
+        # Turntable angle at which the cube body lines up with cube.facelets
+        # and, during a blocked rotation, where the turntable started
+        self.aligned_angle = 0.0
+        self.blocked_start = None
+
+    @property
+    def motors(self):
+        return (self.flipper, self.turntable, self.colorarm)
+
+    @property
+    def motor_commands(self):
+        return sum(m.commands for m in self.motors)
+
+    def flipper_holding(self):
+        self.flipper._settle()
+        return self.flipper.angle - self.flipper.offset > 50
+
+    def commit_rotation(self):
+        """
+        Fold a finished free rotation into cube.facelets
+        """
+        self.turntable._settle()
+        quarter_turns = int(round((self.turntable.angle - self.aligned_angle) / 270.0))
+        self.cube.rotate(quarter_turns)
+        self.aligned_angle += 270 * quarter_turns
+
+    def finish_blocked_rotation(self):
+        if self.blocked_start is None:
+            return
+
+        # The bottom layer turned with the turntable, the rest of the cube
+        # stayed where it was
+        self.turntable._settle()
+        delta = self.turntable.angle - self.blocked_start
+        self.cube.turn_bottom(int(round(delta / 270.0)))
+        self.aligned_angle += delta
+        self.blocked_start = None
+
+    def turntable_command(self, motor, target):
+        self.finish_blocked_rotation()
+
+        if self.flipper_holding():
+            self.commit_rotation()
+            self.blocked_start = self.turntable.angle
+
+    def flipper_command(self, motor, target):
+        self.finish_blocked_rotation()
+
+        # Pulling the flipper back past 150 tips the cube over
+        if target is not None and target >= 150:
+            self.commit_rotation()
+            self.cube.flip()
+
+    def facelet_under_sensor(self):
+        self.colorarm._settle()
+        self.turntable._settle()
+        arm = self.colorarm.angle - self.colorarm.offset
+
+        if self.blocked_start is not None:
+            return None
+
+        # Which 1/8th of a turn is the cube at
+        slot = int(round((self.turntable.angle - self.aligned_angle) / 135.0)) % 8
+
+        if arm <= -700:
+            return self.cube.facelets[4]
+
+        if -700 < arm <= -560:
+            return self.cube.facelets[SCAN_RING[slot]]
+
+        return None
@@ -0,0 +1,743 @@
+#!/usr/bin/env python3
+
+"""
+A pure python implementation of Herbert Kociemba's two-phase algorithm.
+
+MindCuber used to shell out to the kociemba program for every solve, which
+means paying for a process spawn plus loading the pruning tables from the SD
+card each time. TwoPhaseSolver builds its move and pruning tables once,
+saves them to a single binary file and memory maps that file on later runs
+so only the pages the search actually touches are read.
+
+Building the tables takes about a minute on a PC and a lot longer on the
+EV3 brick. You can build them on a PC and copy the file over:
+
+    $ ./twophase.py --build twophase_tables.bin
+
+Facelet strings use the same layout as the kociemba program, the 9 facelets
+of each face in URFDLB order.
+"""
+
+from array import array
+import logging
+import mmap
+import os
+import struct
+import sys
+import time
+
+log = logging.getLogger(__name__)
+
+
+class SolverError(Exception):
+    pass
+
+
+# Faces in move order, a move index is 3 * face + (quarter turns - 1)
+FACES = 'URFDLB'
+MOVE_NAMES = [face + suffix for face in FACES for suffix in ('', '2', "'")]
+N_MOVE = 18
+
+# Moves that keep the cube in phase 2's subgroup <U, D, R2, F2, L2, B2>
+PHASE2_MOVES = (0, 1, 2, 4, 7, 9, 10, 11, 13, 16)
+
+N_TWIST = 2187      # 3^7 corner orientations
+N_FLIP = 2048       # 2^11 edge orientations
+N_SLICE = 495       # 12 choose 4 positions of the FR, FL, BL, BR edges
+N_CORNER = 40320    # 8! corner permutations
+N_EDGE8 = 40320     # 8! permutations of the U and D edges in phase 2
+N_SLICE_PERM = 24   # 4! permutations of the slice edges in phase 2
+
+# Facelet indexes of each corner and edge, the first facelet of each is on
+# the U or D face (or F/B for the slice edges)
+CORNER_FACELETS = (
+    (8, 9, 20), (6, 18, 38), (0, 36, 47), (2, 45, 11),
+    (29, 26, 15), (27, 44, 24), (33, 53, 42), (35, 17, 51))
+
+EDGE_FACELETS = (
+    (5, 10), (7, 19), (3, 37), (1, 46), (32, 16), (28, 25),
+    (30, 43), (34, 52), (23, 12), (21, 41), (50, 39), (48, 14))
+
+CORNER_COLORS = (
+    'URF', 'UFL', 'ULB', 'UBR', 'DFR', 'DLF', 'DBL', 'DRB')
+
+EDGE_COLORS = (
+    'UR', 'UF', 'UL', 'UB', 'DR', 'DF', 'DL', 'DB', 'FR', 'FL', 'BL', 'BR')
+
+SOLVED = ''.join(face * 9 for face in FACES)
+
+TABLES_MAGIC = b'TWOPHASE'
+TABLES_VERSION = 1
+
+
+def binomial(n, k):
+    if n < k:
+        return 0
+
+    result = 1
+    for i in range(k):
+        result = result * (n - i) // (i + 1)
+    return result
+
+
+def perm_to_index(perm):
+    """
+    Lehmer code of a permutation of 0..n-1
+    """
+    n = len(perm)
+    index = 0
+
+    for i in range(n):
+        smaller = 0
+        for j in range(i + 1, n):
+            if perm[j] < perm[i]:
+                smaller += 1
+        index = index * (n - i) + smaller
+
+    return index
+
+
+def index_to_perm(index, n):
+    """
+    Inverse of perm_to_index()
+    """
+    factorials = [1] * n
+    for i in range(1, n):
+        factorials[i] = factorials[i - 1] * i
+
+    elements = list(range(n))
+    perm = []
+
+    for i in range(n):
+        f = factorials[n - 1 - i]
+        perm.append(elements.pop(index // f))
+        index %= f
+
+    return perm
+
+
+class CubieCube(object):
+    """
+    The cube on the cubie level: the permutation and orientation of the
+    8 corners and 12 edges
+    """
+
+    def __init__(self, cp=None, co=None, ep=None, eo=None):
+        self.cp = list(cp) if cp is not None else list(range(8))
+        self.co = list(co) if co is not None else [0] * 8
+        self.ep = list(ep) if ep is not None else list(range(12))
+        self.eo = list(eo) if eo is not None else [0] * 12
+
+    def copy(self):
+        return CubieCube(self.cp, self.co, self.ep, self.eo)
+
+    def multiply(self, other):
+        """
+        Apply other on top of this cube, in place
+        """
+        self.multiply_corners(other)
+        self.multiply_edges(other)
+
+    def multiply_corners(self, other):
+        cp = self.cp
+        co = self.co
+        self.cp = [cp[other.cp[i]] for i in range(8)]
+        self.co = [(co[other.cp[i]] + other.co[i]) % 3 for i in range(8)]
+
+    def multiply_edges(self, other):
+        ep = self.ep
+        eo = self.eo
+        self.ep = [ep[other.ep[i]] for i in range(12)]
+        self.eo = [(eo[other.ep[i]] + other.eo[i]) % 2 for i in range(12)]
+
+    def move(self, m):
+        for i in range(m % 3 + 1):
+            self.multiply(BASIC_MOVES[m // 3])
+
+    # Phase 1 coordinates
+    def get_twist(self):
+        twist = 0
+        for i in range(7):
+            twist = 3 * twist + self.co[i]
+        return twist
+
+    def set_twist(self, twist):
+        total = 0
+        for i in range(6, -1, -1):
+            self.co[i] = twist % 3
+            total += self.co[i]
+            twist //= 3
+        self.co[7] = (3 - total % 3) % 3
+
+    def get_flip(self):
+        flip = 0
+        for i in range(11):
+            flip = 2 * flip + self.eo[i]
+        return flip
+
+    def set_flip(self, flip):
+        total = 0
+        for i in range(10, -1, -1):
+            self.eo[i] = flip % 2
+            total += self.eo[i]
+            flip //= 2
+        self.eo[11] = total % 2
+
+    def get_slice(self):
+        """
+        Where the FR, FL, BL and BR edges are, ignoring their order
+        """
+        index = 0
+        x = 0
+        for j in range(11, -1, -1):
+            if self.ep[j] >= 8:
+                index += binomial(11 - j, x + 1)
+                x += 1
+        return index
+
+    def set_slice(self, index):
+        slice_edges = [8, 9, 10, 11]
+        other_edges = [0, 1, 2, 3, 4, 5, 6, 7]
+        self.ep = [-1] * 12
+        x = 4
+
+        for j in range(12):
+            if x and index - binomial(11 - j, x) >= 0:
+                self.ep[j] = slice_edges[4 - x]
+                index -= binomial(11 - j, x)
+                x -= 1
+
+        for j in range(12):
+            if self.ep[j] == -1:
+                self.ep[j] = other_edges.pop(0)
+
+    # Phase 2 coordinates
+    def get_corners(self):
+        return perm_to_index(self.cp)
+
+    def set_corners(self, index):
+        self.cp = index_to_perm(index, 8)
+
+    def get_edge8(self):
+        return perm_to_index(self.ep[:8])
+
+    def set_edge8(self, index):
+        self.ep[:8] = index_to_perm(index, 8)
+
+    def get_slice_perm(self):
+        return perm_to_index([e - 8 for e in self.ep[8:]])
+
+    def set_slice_perm(self, index):
+        self.ep[8:] = [e + 8 for e in index_to_perm(index, 4)]
+
+    def corner_parity(self):
+        return self.permutation_parity(self.cp)
+
+    def edge_parity(self):
+        return self.permutation_parity(self.ep)
+
+    @staticmethod
+    def permutation_parity(perm):
+        parity = 0
+        for i in range(len(perm)):
+            for j in range(i + 1, len(perm)):
+                if perm[j] < perm[i]:
+                    parity += 1
+        return parity % 2
+
+    def to_facelets(self):
+        facelets = list(SOLVED)
+
+        for i in range(8):
+            for k in range(3):
+                facelets[CORNER_FACELETS[i][(k + self.co[i]) % 3]] = CORNER_COLORS[self.cp[i]][k]
+
+        for i in range(12):
+            for k in range(2):
+                facelets[EDGE_FACELETS[i][(k + self.eo[i]) % 2]] = EDGE_COLORS[self.ep[i]][k]
+
+        return ''.join(facelets)
+
+    @classmethod
+    def from_facelets(cls, facelets):
+        """
+        Build a CubieCube from a 54 character URFDLB facelet string, raises
+        SolverError if the string does not describe a solvable cube
+        """
+        if len(facelets) != 54:
+            raise SolverError("facelet string must be 54 characters, got %d" % len(facelets))
+
+        for face in FACES:
+            if facelets.count(face) != 9:
+                raise SolverError("facelet string must have 9 of each color, has %d %s" %
+                                  (facelets.count(face), face))
+
+        for (i, face) in enumerate(FACES):
+            if facelets[9 * i + 4] != face:
+                raise SolverError("center of face %s is %s" % (face, facelets[9 * i + 4]))
+
+        cube = cls()
+        cube.cp = [-1] * 8
+        cube.ep = [-1] * 12
+
+        for i in range(8):
+            colors = [facelets[f] for f in CORNER_FACELETS[i]]
+
+            # The U or D sticker gives the orientation
+            for ori in range(3):
+                if colors[ori] in 'UD':
+                    break
+            else:
+                raise SolverError("corner %d has no U or D facelet" % i)
+
+            for j in range(8):
+                if (colors[(ori + 1) % 3] == CORNER_COLORS[j][1] and
+                        colors[(ori + 2) % 3] == CORNER_COLORS[j][2] and
+                        colors[ori] == CORNER_COLORS[j][0]):
+                    cube.cp[i] = j
+                    cube.co[i] = ori % 3
+                    break
+            else:
+                raise SolverError("corner %d has invalid colors %s" % (i, ''.join(colors)))
+
+        for i in range(12):
+            colors = (facelets[EDGE_FACELETS[i][0]], facelets[EDGE_FACELETS[i][1]])
+
+            for j in range(12):
+                if colors == (EDGE_COLORS[j][0], EDGE_COLORS[j][1]):
+                    cube.ep[i] = j
+                    cube.eo[i] = 0
+                    break
+                if colors == (EDGE_COLORS[j][1], EDGE_COLORS[j][0]):
+                    cube.ep[i] = j
+                    cube.eo[i] = 1
+                    break
+            else:
+                raise SolverError("edge %d has invalid colors %s" % (i, ''.join(colors)))
+
+        if sorted(cube.cp) != list(range(8)):
+            raise SolverError("a corner appears more than once")
+
+        if sorted(cube.ep) != list(range(12)):
+            raise SolverError("an edge appears more than once")
+
+        if sum(cube.co) % 3:
+            raise SolverError("a corner is twisted")
+
+        if sum(cube.eo) % 2:
+            raise SolverError("an edge is flipped")
+
+        if cube.corner_parity() != cube.edge_parity():
+            raise SolverError("two corners or two edges are swapped")
+
+        return cube
+
+
+# The six clockwise face turns U, R, F, D, L, B
+BASIC_MOVES = (
+    CubieCube(cp=[3, 0, 1, 2, 4, 5, 6, 7], co=[0, 0, 0, 0, 0, 0, 0, 0],
+              ep=[3, 0, 1, 2, 4, 5, 6, 7, 8, 9, 10, 11], eo=[0] * 12),
+    CubieCube(cp=[4, 1, 2, 0, 7, 5, 6, 3], co=[2, 0, 0, 1, 1, 0, 0, 2],
+              ep=[8, 1, 2, 3, 11, 5, 6, 7, 4, 9, 10, 0], eo=[0] * 12),
+    CubieCube(cp=[1, 5, 2, 3, 0, 4, 6, 7], co=[1, 2, 0, 0, 2, 1, 0, 0],
+              ep=[0, 9, 2, 3, 4, 8, 6, 7, 1, 5, 10, 11], eo=[0, 1, 0, 0, 0, 1, 0, 0, 1, 1, 0, 0]),
+    CubieCube(cp=[0, 1, 2, 3, 5, 6, 7, 4], co=[0, 0, 0, 0, 0, 0, 0, 0],
+              ep=[0, 1, 2, 3, 5, 6, 7, 4, 8, 9, 10, 11], eo=[0] * 12),
+    CubieCube(cp=[0, 2, 6, 3, 4, 1, 5, 7], co=[0, 1, 2, 0, 0, 2, 1, 0],
+              ep=[0, 1, 10, 3, 4, 5, 9, 7, 8, 2, 6, 11], eo=[0] * 12),
+    CubieCube(cp=[0, 1, 3, 7, 4, 5, 2, 6], co=[0, 0, 1, 2, 0, 0, 2, 1],
+              ep=[0, 1, 2, 11, 4, 5, 6, 10, 8, 9, 3, 7], eo=[0, 0, 0, 1, 0, 0, 0, 1, 0, 0, 1, 1]),
+)
+
+
+def parse_moves(moves):
+    """
+    Turn 'R U2 F' (or a list of such tokens) into move indexes
+    """
+    if isinstance(moves, str):
+        moves = moves.split()
+
+    try:
+        return [MOVE_NAMES.index(m) for m in moves]
+    except ValueError:
+        raise SolverError("invalid move in %s" % ' '.join(moves))
+
+
+def apply_moves(facelets, moves):
+    """
+    Return the facelet string after doing moves to the cube in facelets
+    """
+    cube = CubieCube.from_facelets(facelets)
+
+    for m in parse_moves(moves):
+        cube.move(m)
+
+    return cube.to_facelets()
+
+
+def is_solvable(facelets):
+    """
+    True if facelets describes a cube that can be solved
+    """
+    try:
+        CubieCube.from_facelets(facelets)
+        return True
+    except SolverError:
+        return False
+
+
+# Names, typecodes and lengths of the tables in the order they are stored
+TABLE_LAYOUT = (
+    ('twist_move', 'H', N_TWIST * N_MOVE),
+    ('flip_move', 'H', N_FLIP * N_MOVE),
+    ('slice_move', 'H', N_SLICE * N_MOVE),
+    ('corner_move', 'H', N_CORNER * N_MOVE),
+    ('edge8_move', 'H', N_EDGE8 * N_MOVE),
+    ('slice_perm_move', 'H', N_SLICE_PERM * N_MOVE),
+    ('slice_twist_prune', 'B', N_SLICE * N_TWIST),
+    ('slice_flip_prune', 'B', N_SLICE * N_FLIP),
+    ('slice_corner_prune', 'B', N_SLICE_PERM * N_CORNER),
+    ('slice_edge8_prune', 'B', N_SLICE_PERM * N_EDGE8),
+)
+
+
+def build_move_table(n, set_coord, get_coord, moves=range(N_MOVE)):
+    """
+    table[coord * 18 + m] is the coordinate after move m. Only the six
+    clockwise turns are done on the cubie level, the half and counter
+    clockwise turns are derived from the table itself.
+    """
+    table = array('H', [0] * (n * N_MOVE))
+    moves = set(moves)
+
+    for coord in range(n):
+        cube = CubieCube()
+        set_coord(cube, coord)
+
+        for face in range(6):
+            if not moves.intersection((3 * face, 3 * face + 1, 3 * face + 2)):
+                continue
+
+            # For phase 2 only the half turn of R, F, L and B is allowed, but
+            # the quarter turn is needed to get there
+            c = cube.copy()
+            for power in range(3):
+                c.multiply(BASIC_MOVES[face])
+                if 3 * face + power in moves:
+                    table[coord * N_MOVE + 3 * face + power] = get_coord(c)
+
+    return table
+
+
+def build_prune_table(n1, move1, n2, move2, moves):
+    """
+    Breadth first search over the combined coordinate c1 * n2 + c2, the
+    table holds the number of moves needed to solve both coordinates
+    """
+    table = bytearray(b'\xff' * (n1 * n2))
+    table[0] = 0
+    frontier = [0]
+    depth = 0
+
+    while frontier:
+        depth += 1
+        next_frontier = []
+
+        for index in frontier:
+            c1 = index // n2
+            c2 = index % n2
+
+            for m in moves:
+                new_index = move1[c1 * N_MOVE + m] * n2 + move2[c2 * N_MOVE + m]
+
+                if table[new_index] == 0xff:
+                    table[new_index] = depth
+                    next_frontier.append(new_index)
+
+        frontier = next_frontier
+        log.info("prune table depth %d: %d entries" % (depth, len(frontier)))
+
+    return table
+
+
+def build_tables():
+    tables = {}
+
+    def set_twist(cube, c):
+        cube.set_twist(c)
+
+    def set_flip(cube, c):
+        cube.set_flip(c)
+
+    def set_slice(cube, c):
+        cube.set_slice(c)
+
+    def set_corners(cube, c):
+        cube.set_corners(c)
+
+    def set_edge8(cube, c):
+        cube.set_edge8(c)
+
+    def set_slice_perm(cube, c):
+        cube.set_slice_perm(c)
+
+    log.info("building phase 1 move tables")
+    tables['twist_move'] = build_move_table(N_TWIST, set_twist, CubieCube.get_twist)
+    tables['flip_move'] = build_move_table(N_FLIP, set_flip, CubieCube.get_flip)
+    tables['slice_move'] = build_move_table(N_SLICE, set_slice, CubieCube.get_slice)
+
+    log.info("building phase 2 move tables")
+    tables['corner_move'] = build_move_table(N_CORNER, set_corners, CubieCube.get_corners)
+    tables['edge8_move'] = build_move_table(N_EDGE8, set_edge8, CubieCube.get_edge8, PHASE2_MOVES)
+    tables['slice_perm_move'] = build_move_table(N_SLICE_PERM, set_slice_perm, CubieCube.get_slice_perm, PHASE2_MOVES)
+
+    log.info("building phase 1 prune tables")
+    tables['slice_twist_prune'] = build_prune_table(
+        N_SLICE, tables['slice_move'], N_TWIST, tables['twist_move'], range(N_MOVE))
+    tables['slice_flip_prune'] = build_prune_table(
+        N_SLICE, tables['slice_move'], N_FLIP, tables['flip_move'], range(N_MOVE))
+
+    log.info("building phase 2 prune tables")
+    tables['slice_corner_prune'] = build_prune_table(
+        N_SLICE_PERM, tables['slice_perm_move'], N_CORNER, tables['corner_move'], PHASE2_MOVES)
+    tables['slice_edge8_prune'] = build_prune_table(
+        N_SLICE_PERM, tables['slice_perm_move'], N_EDGE8, tables['edge8_move'], PHASE2_MOVES)
+
+    return tables
+
+
+def header_bytes():
+    byteorder = b'L' if sys.byteorder == 'little' else b'B'
+    return TABLES_MAGIC + struct.pack('<HcB', TABLES_VERSION, byteorder, len(TABLE_LAYOUT))
+
+
+def save_tables(tables, filename):
+    tmp_filename = filename + '.tmp'
+
+    with open(tmp_filename, 'wb') as fh:
+        fh.write(header_bytes())
+
+        for (name, typecode, length) in TABLE_LAYOUT:
+            table = tables[name]
+
+            if len(table) != length:
+                raise SolverError("table %s has %d entries, expected %d" % (name, len(table), length))
+
+            if typecode == 'B':
+                fh.write(table)
+            else:
+                table.tofile(fh)
+
+    # Only replace the file once it is complete so an interrupted build does
+    # not leave a truncated table file behind
+    os.rename(tmp_filename, filename)
+
+
+def load_tables(filename):
+    """
+    Memory map the table file, returns None if the file is missing or was
+    written by a different version or for a different byte order
+    """
+    header = header_bytes()
+    expected_size = len(header) + sum(length * (2 if typecode == 'H' else 1)
+                                      for (name, typecode, length) in TABLE_LAYOUT)
+
+    if not os.path.exists(filename) or os.path.getsize(filename) != expected_size:
+        return None
+
+    with open(filename, 'rb') as fh:
+        mm = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+
+    if mm[:len(header)] != header:
+        mm.close()
+        return None
+
+    tables = {}
+    view = memoryview(mm)
+    offset = len(header)
+
+    for (name, typecode, length) in TABLE_LAYOUT:
+        size = length * (2 if typecode == 'H' else 1)
+        tables[name] = view[offset:offset + size].cast(typecode)
+        offset += size
+
+    return tables
+
+
+class TwoPhaseSolver(object):
+
+    def __init__(self, filename='twophase_tables.bin', tables=None):
+        """
+        tables, from load_tables(filename), are loaded if not given and
+        built if there are none
+        """
+        start = time.time()
+        self.tables = tables if tables is not None else load_tables(filename)
+
+        if self.tables is None:
+            log.info("%s not found or out of date, building tables...this takes a while" % filename)
+            save_tables(build_tables(), filename)
+            self.tables = load_tables(filename)
+            log.info("built and saved %s in %.1fs" % (filename, time.time() - start))
+        else:
+            log.info("loaded %s in %.3fs" % (filename, time.time() - start))
+
+        for (name, table) in self.tables.items():
+            setattr(self, name, table)
+
+    def solve(self, facelets, max_length=20, timeout=None):
+        """
+        Return a list of moves ('R', "U'", 'F2', ...) that solves the cube in
+        facelets.
+
+        The search keeps looking for shorter solutions until it finds one of
+        max_length moves or less, or until timeout seconds have passed. In the
+        latter case the best solution found so far is returned, if nothing has
+        been found yet we keep going until the first solution turns up.
+        """
+        cube = CubieCube.from_facelets(facelets)
+        self.cube = cube
+        self.best = None
+        self.max_length = max_length
+        self.deadline = time.time() + timeout if timeout is not None else None
+        self.done = False
+        self.phase1_moves = []
+
+        twist = cube.get_twist()
+        flip = cube.get_flip()
+        slice_ = cube.get_slice()
+
+        for depth in range(0, 13):
+            self.search_phase1(twist, flip, slice_, depth, -1)
+
+            if self.done:
+                break
+
+        if self.best is None:
+            raise SolverError("no solution found")
+
+        return [MOVE_NAMES[m] for m in self.best]
+
+    def time_is_up(self):
+        return self.best is not None and self.deadline is not None and time.time() > self.deadline
+
+    def search_phase1(self, twist, flip, slice_, depth, prev_face):
+        if (self.slice_twist_prune[slice_ * N_TWIST + twist] > depth or
+                self.slice_flip_prune[slice_ * N_FLIP + flip] > depth):
+            return
+
+        if depth == 0:
+            # A phase 1 solution that ends in a phase 2 move was already
+            # found one depth earlier
+            if self.phase1_moves and self.phase1_moves[-1] in PHASE2_MOVES:
+                return
+            self.start_phase2()
+            return
+
+        # Once we have a solution there is no point in phase 1 solutions
+        # that leave no room for a shorter total
+        if self.best is not None and len(self.phase1_moves) + depth >= len(self.best):
+            return
+
+        for m in range(N_MOVE):
+            face = m // 3
+
+            # Same face twice in a row, or opposite faces in both orders
+            if face == prev_face or face == prev_face - 3:
+                continue
+
+            self.phase1_moves.append(m)
+            self.search_phase1(self.twist_move[twist * N_MOVE + m],
+                               self.flip_move[flip * N_MOVE + m],
+                               self.slice_move[slice_ * N_MOVE + m],
+                               depth - 1, face)
+            self.phase1_moves.pop()
+
+            if self.done:
+                return
+
+    def start_phase2(self):
+        if self.time_is_up():
+            self.done = True
+            return
+
+        cube = self.cube.copy()
+        for m in self.phase1_moves:
+            cube.move(m)
+
+        corners = cube.get_corners()
+        edge8 = cube.get_edge8()
+        slice_perm = cube.get_slice_perm()
+
+        if self.best is None:
+            max_depth = 18
+        else:
+            max_depth = len(self.best) - len(self.phase1_moves) - 1
+
+        prev_face = self.phase1_moves[-1] // 3 if self.phase1_moves else -1
+        self.phase2_moves = []
+
+        for depth in range(0, max_depth + 1):
+            if self.search_phase2(corners, edge8, slice_perm, depth, prev_face):
+                self.best = self.phase1_moves + self.phase2_moves
+                log.debug("found %d move solution (%d + %d)" %
+                          (len(self.best), len(self.phase1_moves), len(self.phase2_moves)))
+
+                if len(self.best) <= self.max_length:
+                    self.done = True
+                break
+
+    def search_phase2(self, corners, edge8, slice_perm, depth, prev_face):
+        if depth == 0:
+            return corners == 0 and edge8 == 0 and slice_perm == 0
+
+        if (self.slice_corner_prune[slice_perm * N_CORNER + corners] > depth or
+                self.slice_edge8_prune[slice_perm * N_EDGE8 + edge8] > depth):
+            return False
+
+        for m in PHASE2_MOVES:
+            face = m // 3
+
+            if face == prev_face or face == prev_face - 3:
+                continue
+
+            self.phase2_moves.append(m)
+
+            if self.search_phase2(self.corner_move[corners * N_MOVE + m],
+                                  self.edge8_move[edge8 * N_MOVE + m],
+                                  self.slice_perm_move[slice_perm * N_MOVE + m],
+                                  depth - 1, face):
+                return True
+
+            self.phase2_moves.pop()
+
+        return False
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Two-phase Rubik's cube solver")
+    parser.add_argument('--build', metavar='FILENAME', help='build the tables into FILENAME and exit')
+    parser.add_argument('--tables', default='twophase_tables.bin', help='table file to use')
+    parser.add_argument('--timeout', type=float, default=None, help='seconds to look for shorter solutions')
+    parser.add_argument('cube', nargs='?', help='54 character URFDLB facelet string')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO,
+                        format='%(asctime)s %(filename)12s %(levelname)8s: %(message)s')
+
+    if args.build:
+        save_tables(build_tables(), args.build)
+        sys.exit(0)
+
+    if not args.cube:
+        parser.error('cube is required unless --build is used')
+
+    solver = TwoPhaseSolver(args.tables)
+
+    try:
+        print(' '.join(solver.solve(args.cube, timeout=args.timeout)))
+    except SolverError as e:
+        print("ERROR: %s" % e)
+        sys.exit(1)
@@ -5,62 +5,41 @@ Implementation of R3PTAR
 """
 
 import logging
-import signal
+import os
 import sys
 from ev3dev2.motor import OUTPUT_A, OUTPUT_B, OUTPUT_C, OUTPUT_D, MediumMotor, LargeMotor
 from ev3dev2.sensor.lego import InfraredSensor
 from ev3dev2.sound import Sound
-from threading import Thread, Event
-from time import sleep
 
-log = logging.getLogger(__name__)
-
-
-class MonitorRemoteControl(Thread):
-    """
-    A thread to monitor R3PTAR's InfraredSensor and process signals
-    from the remote control
-    """
-
-    def __init__(self, parent):
-        Thread.__init__(self)
-        self.parent = parent
-        self.shutdown_event = Event()
-
-    def __str__(self):
-        return "MonitorRemoteControl"
-
-    def run(self):
-        STRIKE_SPEED_PCT = 40
-
-        while True:
-
-            if self.shutdown_event.is_set():
-                log.info('%s: shutdown_event is set' % self)
-                break
-
-            #log.info("proximity: %s" % self.parent.remote.proximity)
-            if self.parent.remote.proximity < 30:
-                self.parent.speaker.play('snake-hiss.wav', Sound.PLAY_NO_WAIT_FOR_COMPLETE)
-                self.parent.strike_motor.on_for_seconds(speed=STRIKE_SPEED_PCT, seconds=0.5)
-                self.parent.strike_motor.on_for_seconds(speed=(STRIKE_SPEED_PCT * -1), seconds=0.5)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'common'))
+from adaptivepoll import AdaptivePoller, remote_activity
+from clipcache import ClipCache
+from robotruntime import RobotRuntime
 
-            self.parent.remote.process()
-            sleep(0.01)
+log = logging.getLogger(__name__)
 
 
 class R3PTAR(object):
+    STRIKE_SPEED_PCT = 40
+    POLL_INTERVAL = 0.01
 
     def __init__(self,
                  drive_motor_port=OUTPUT_B,
                  strike_motor_port=OUTPUT_D,
                  steer_motor_port=OUTPUT_A,
-                 drive_speed_pct=60):
+                 drive_speed_pct=60,
+                 runtime=None,
+                 max_latency=0.1):
 
         self.drive_motor = LargeMotor(drive_motor_port)
         self.strike_motor = LargeMotor(strike_motor_port)
         self.steer_motor = MediumMotor(steer_motor_port)
         self.speaker = Sound()
+
+        self.clips = ClipCache()
+        self.clips.load(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'snake-hiss.wav'))
+        self.runtime = runtime if runtime is not None else RobotRuntime()
+        self.striking = False
         STEER_SPEED_PCT = 30
 
         self.remote = InfraredSensor()
@@ -68,14 +47,11 @@ class R3PTAR(object):
         self.remote.on_channel1_bottom_left = self.make_move(self.drive_motor, drive_speed_pct * -1)
         self.remote.on_channel1_top_right = self.make_move(self.steer_motor, STEER_SPEED_PCT)
         self.remote.on_channel1_bottom_right = self.make_move(self.steer_motor, STEER_SPEED_PCT * -1)
+        self.remote_activity = remote_activity(self.remote)
 
-        self.shutdown_event = Event()
-        self.mrc = MonitorRemoteControl(self)
-
-        # Register our signal_term_handler() to be called if the user sends
-        # a 'kill' to this process or does a Ctrl-C from the command line
-        signal.signal(signal.SIGTERM, self.signal_term_handler)
-        signal.signal(signal.SIGINT, self.signal_int_handler)
+        # Poll every 10ms while the remote is in use, backing off to
+        # max_latency seconds while it is not
+        self.poller = AdaptivePoller(self.monitor_remote_control, self.POLL_INTERVAL, max_latency)
 
     def make_move(self, motor, speed):
         def move(state):
@@ -86,13 +62,7 @@ class R3PTAR(object):
         return move
 
     def shutdown_robot(self):
-
-        if self.shutdown_event.is_set():
-            return
-
-        self.shutdown_event.set()
         log.info('shutting down')
-        self.mrc.shutdown_event.set()
 
         self.remote.on_channel1_top_left = None
         self.remote.on_channel1_bottom_left = None
@@ -103,19 +73,50 @@ class R3PTAR(object):
         self.strike_motor.off(brake=False)
         self.steer_motor.off(brake=False)
 
-        self.mrc.join()
-
-    def signal_term_handler(self, signal, frame):
-        log.info('Caught SIGTERM')
-        self.shutdown_robot()
-
-    def signal_int_handler(self, signal, frame):
-        log.info('Caught SIGINT')
-        self.shutdown_robot()
-
-    def main(self):
-        self.mrc.start()
-        self.shutdown_event.wait()
+    async def strike(self):
+        self.striking = True
+
+        try:
+            self.clips.play('snake-hiss.wav')
+
+            for speed in (self.STRIKE_SPEED_PCT, self.STRIKE_SPEED_PCT * -1):
+                self.strike_motor.on_for_seconds(speed=speed, seconds=0.5, block=False)
+                await self.runtime.sleep(0.5)
+                await self.runtime.wait_until_not_moving(self.strike_motor)
+        finally:
+            self.striking = False
+
+    def monitor_remote_control(self):
+        """
+        Strike at anything that gets close, then process the remote control.
+        The remote keeps working while we strike. Returns True if anything
+        happened.
+        """
+        striking = self.striking
+
+        #log.info("proximity: %s" % self.remote.proximity)
+        if not self.striking and self.remote.proximity < 30:
+            self.runtime.spawn(self.strike())
+            striking = True
+
+        return self.remote_activity() or striking
+
+    def main(self, duration=None):
+        self.poller.reset_metrics()
+        self.runtime.adaptive(self.poller, 'remote')
+        self.speaker.set_volume(100)
+        self.clips.start()
+
+        try:
+            self.runtime.run(duration=duration)
+        finally:
+            self.shutdown_robot()
+            self.clips.close()
+
+        for stats in self.runtime.stats.values():
+            log.info(stats)
+
+        log.info(self.poller)
 
 
 if __name__ == '__main__':
@@ -1,11 +1,19 @@
 #!/usr/bin/env micropython
 
 
+import os
+import sys
+
 from ev3dev2.motor import LargeMotor, MediumMotor, OUTPUT_A, OUTPUT_B, OUTPUT_D
 from ev3dev2.sensor import INPUT_1, INPUT_4
 from ev3dev2.sensor.lego import TouchSensor, InfraredSensor
 from ev3dev2.sound import Sound
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'common'))
+from clipcache import ClipCache
+from deviceregistry import registry
+from tracerecorder import TraceRecorder
+
 
 class Spik3r:
     def __init__(
@@ -14,17 +22,31 @@ class Spik3r:
             move_motor_port: str = OUTPUT_B,
             sting_motor_port: str = OUTPUT_D,
             touch_sensor_port: str = INPUT_1,
-            ir_sensor_port: str = INPUT_4, ir_beacon_channel: int = 1):
-        self.claw_motor = MediumMotor(address=claw_motor_port)
-        self.move_motor = LargeMotor(address=move_motor_port)
-        self.sting_motor = LargeMotor(address=sting_motor_port)
-
-        self.ir_sensor = InfraredSensor(address=ir_sensor_port)
+            ir_sensor_port: str = INPUT_4, ir_beacon_channel: int = 1,
+            trace_file: str = None):
+        # Each device is made the first time it is used
+        self.claw_motor = registry.get(MediumMotor, claw_motor_port)
+        self.move_motor = registry.get(LargeMotor, move_motor_port)
+        self.sting_motor = registry.get(LargeMotor, sting_motor_port)
+
+        self.ir_sensor = registry.get(InfraredSensor, ir_sensor_port)
         self.ir_beacon_channel = ir_beacon_channel
 
-        self.touch_sensor = TouchSensor(address=touch_sensor_port)
+        self.touch_sensor = registry.get(TouchSensor, touch_sensor_port)
+
+        self.speaker = registry.lazy(Sound)
+
+        self.clips = ClipCache()
+        self.clips.load(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Blip 3.wav'))
 
-        self.speaker = Sound()
+        self.trace = TraceRecorder.for_devices(trace_file, [
+            ('touch', self.touch_sensor, 'value0'),
+            ('ir', self.ir_sensor, 'value%d' % (ir_beacon_channel - 1)),
+            ('claw_position', self.claw_motor, 'position'),
+            ('move_position', self.move_motor, 'position'),
+            ('move_speed', self.move_motor, 'speed'),
+            ('sting_position', self.sting_motor, 'position'),
+        ])
 
     def snap_claw_if_touched(self):
         if self.touch_sensor.is_pressed:
@@ -65,10 +87,7 @@ class Spik3r:
                 brake=True,
                 block=False)
 
-            self.speaker.play_file(
-                wav_file='Blip 3.wav',
-                volume=100,
-                play_type=Sound.PLAY_WAIT_FOR_COMPLETE)
+            self.clips.play('Blip 3.wav', block=True)
 
             self.sting_motor.on_for_seconds(
                 speed=-100,
@@ -86,12 +105,25 @@ class Spik3r:
                 pass
 
     def main(self):
-        while True:
-            self.snap_claw_if_touched()
-            self.move_by_ir_beacon()
-            self.sting_by_ir_beacon()
+        self.speaker.set_volume(100)
+        self.clips.start()
+
+        try:
+            while True:
+                if self.trace:
+                    self.trace.sample()
+
+                self.snap_claw_if_touched()
+                self.move_by_ir_beacon()
+                self.sting_by_ir_beacon()
+
+        finally:
+            self.clips.close()
+
+            if self.trace:
+                self.trace.close()
 
 
 if __name__ == '__main__':
-    SPIK3R = Spik3r()
+    SPIK3R = Spik3r(trace_file=sys.argv[1] if len(sys.argv) > 1 else None)
     SPIK3R.main()
@@ -1,24 +1,30 @@
 #!/usr/bin/env python3
 
 import logging
+import os
 import sys
 from ev3dev2.motor import OUTPUT_A, OUTPUT_B, OUTPUT_C, MediumMotor
-from ev3dev2.control.rc_tank import RemoteControlledTank
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'common'))
+from deviceregistry import registry
+from lease import LeasedRemoteControlledTank
 
 log = logging.getLogger(__name__)
 
 
-class TRACK3R(RemoteControlledTank):
+class TRACK3R(LeasedRemoteControlledTank):
     """
     Base class for all TRACK3R variations. The only difference in the child
     classes are in how the medium motor is handled.
 
     To enable the medium motor toggle the beacon button on the EV3 remote.
+    If the remote control loop stalls for more than ttl seconds every motor
+    is stopped.
     """
 
-    def __init__(self, medium_motor, left_motor, right_motor):
-        RemoteControlledTank.__init__(self, left_motor, right_motor)
-        self.medium_motor = MediumMotor(medium_motor)
+    def __init__(self, medium_motor, left_motor, right_motor, ttl=0.3):
+        LeasedRemoteControlledTank.__init__(self, left_motor, right_motor, ttl=ttl)
+        self.medium_motor = registry.get(MediumMotor, medium_motor)
         self.medium_motor.reset()
 
 
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+
+"""
+Poll the IR remote quickly while it is being used and slowly while it is not.
+
+The remote control demos call ``remote.process()`` every 10ms (every 100ms
+in EV3RSTORM) whether or not a button has been touched in minutes.
+AdaptivePoller polls at min_interval while a button is held and for hold
+seconds after the last button event, then backs off by factor per poll up
+to max_latency, which is the longest a button press can go unnoticed.
+
+    poller = AdaptivePoller(remote_activity(remote), max_latency=0.1)
+
+    while not done:
+        time.sleep(poller.step())
+
+or on a RobotRuntime, ``runtime.adaptive(poller, 'remote')``.
+
+polls_per_second, reaction_latency (the average time a press at a random
+moment would wait to be seen, half the poll interval it lands in) and
+cpu_percent are there to trade battery life against responsiveness.
+"""
+
+import logging
+import time
+
+log = logging.getLogger(__name__)
+
+
+def remote_activity(*remotes):
+    """
+    A poll function for AdaptivePoller that processes each remote, ev3dev2
+    InfraredSensor or ev3dev RemoteControl. It returns True if a button was
+    pressed or released, or is being held down.
+    """
+    def poll():
+        active = False
+
+        for remote in remotes:
+            before = set(remote._state)
+            remote.process()
+
+            if remote._state or set(remote._state) != before:
+                active = True
+
+        return active
+
+    return poll
+
+
+class AdaptivePoller(object):
+    """
+    Calls poll(), which returns True when something happened, at between
+    min_interval and max_latency seconds apart. active counts the polls
+    that returned True.
+    """
+
+    def __init__(self, poll, min_interval=0.01, max_latency=0.1, factor=1.5, hold=0.5, clock=time):
+        if max_latency < min_interval:
+            raise ValueError("max_latency %s is shorter than min_interval %s" % (max_latency, min_interval))
+
+        self.poll = poll
+        self.min_interval = min_interval
+        self.max_latency = max_latency
+        self.factor = factor
+        self.hold = hold
+        self.clock = clock
+        self.interval = min_interval
+        self.last_event = None
+        self.reset_metrics()
+
+    def __str__(self):
+        return "%.1f polls/s, %d active, reaction %.1fms, cpu %.1f%%" % (
+            self.polls_per_second, self.active, 1000 * self.reaction_latency, self.cpu_percent)
+
+    def reset_metrics(self):
+        self.polls = 0
+        self.active = 0
+        self.latency_total = 0.0
+        self.wall_start = self.clock.time()
+        self.cpu_start = time.process_time()
+
+    def step(self):
+        """
+        Poll once and return how long to wait before the next poll
+        """
+        now = self.clock.time()
+        self.polls += 1
+
+        # A press is equally likely at any moment of the interval we just
+        # waited, so on average it waited half of it
+        self.latency_total += self.interval * self.interval / 2
+
+        if self.poll():
+            self.active += 1
+            self.last_event = now
+
+        if self.last_event is not None and now - self.last_event < self.hold:
+            self.interval = self.min_interval
+        else:
+            self.interval = min(self.interval * self.factor, self.max_latency)
+
+        return self.interval
+
+    def run(self, until=None):
+        """
+        Poll until until() returns True
+        """
+        while until is None or not until():
+            self.clock.sleep(self.step())
+
+    @property
+    def elapsed(self):
+        return self.clock.time() - self.wall_start
+
+    @property
+    def polls_per_second(self):
+        elapsed = self.elapsed
+        return self.polls / elapsed if elapsed > 0 else 0.0
+
+    @property
+    def reaction_latency(self):
+        """
+        Time weighted average of half the poll interval
+        """
+        elapsed = self.elapsed
+        return self.latency_total / elapsed if elapsed > 0 else 0.0
+
+    @property
+    def cpu_percent(self):
+        elapsed = self.elapsed
+        return 100.0 * (time.process_time() - self.cpu_start) / elapsed if elapsed > 0 else 0.0
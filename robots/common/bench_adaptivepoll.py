@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+
+"""
+Measure what adaptive IR remote polling costs and saves on a fake sysfs
+tree, no EV3 needed.
+
+A driver thread plays the part of someone using the remote: it leaves it
+alone for a random time, holds a button down for a while, lets go, and so
+on. The real ev3dev2 InfraredSensor.process() is polled by an
+AdaptivePoller with different settings, a fixed 10ms poller being the old
+GRIPP3R/R3PTAR/EXPLOR3R loop and a fixed 100ms one the old EV3RSTORM loop.
+For each we report the polls per second, the CPU use, the reaction latency
+the poller estimates and the one actually measured from the moment a
+button was pressed or released to the moment its handler ran.
+
+    $ ./bench_adaptivepoll.py --seconds 30 --idle 8
+"""
+
+import argparse
+import random
+import threading
+import time
+
+from adaptivepoll import AdaptivePoller, remote_activity
+from fakesys import FakeSys
+
+# (name, min_interval, max_latency)
+SETTINGS = (
+    ('fixed 10ms', 0.01, 0.01),
+    ('fixed 100ms', 0.1, 0.1),
+    ('adaptive 100ms', 0.01, 0.1),
+    ('adaptive 250ms', 0.01, 0.25),
+)
+
+
+class RemoteUser(threading.Thread):
+    """
+    Presses and releases the top left button on channel 1 at random
+    """
+
+    def __init__(self, fake, address, seconds, idle, rand):
+        threading.Thread.__init__(self)
+        self.fake = fake
+        self.address = address
+        self.seconds = seconds
+        self.idle = idle
+        self.rand = rand
+        self.events = []
+
+    def run(self):
+        end = time.time() + self.seconds
+
+        while True:
+            time.sleep(self.rand.uniform(0.5, self.idle))
+
+            if time.time() > end:
+                break
+
+            self.fake.set(self.address, 'value0', 1)
+            self.events.append((True, time.time()))
+            time.sleep(self.rand.uniform(0.2, 1.0))
+            self.fake.set(self.address, 'value0', 0)
+            self.events.append((False, time.time()))
+
+
+def run_setting(fake, remote, min_interval, max_latency, seconds, idle, seed):
+    """
+    Returns (poller, measured reaction latencies)
+    """
+    seen = []
+    remote.on_channel1_top_left = lambda state: seen.append((state, time.time()))
+    poller = AdaptivePoller(remote_activity(remote), min_interval, max_latency)
+    user = RemoteUser(fake, 'ev3-ports:in4', seconds, idle, random.Random(seed))
+    user.start()
+    poller.run(until=lambda: not user.is_alive())
+    user.join()
+
+    latencies = [detected - pressed for ((state, pressed), (seen_state, detected)) in zip(user.events, seen)]
+    return (poller, latencies)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark adaptive IR remote polling on a fake sysfs tree')
+    parser.add_argument('--seconds', type=float, default=30.0, help='how long to run each setting')
+    parser.add_argument('--idle', type=float, default=8.0, help='longest time the remote is left alone')
+    parser.add_argument('--seed', type=int, default=0, help='seed for the button presses')
+    args = parser.parse_args()
+
+    fake = FakeSys()
+
+    try:
+        fake.add_sensor('ev3-ports:in4', 'lego-ev3-ir', 'IR-REMOTE')
+        fake.install()
+
+        from ev3dev2.sensor.lego import InfraredSensor
+        remote = InfraredSensor()
+
+        print("%15s %8s %6s %14s %14s %12s" % (
+            'setting', 'polls/s', 'cpu %', 'estimated (ms)', 'measured (ms)', 'worst (ms)'))
+
+        for (name, min_interval, max_latency) in SETTINGS:
+            (poller, latencies) = run_setting(fake, remote, min_interval, max_latency, args.seconds, args.idle, args.seed)
+            print("%15s %8.1f %6.2f %14.1f %14.1f %12.1f" % (
+                name,
+                poller.polls_per_second,
+                poller.cpu_percent,
+                1000 * poller.reaction_latency,
+                1000 * sum(latencies) / len(latencies) if latencies else 0.0,
+                1000 * max(latencies) if latencies else 0.0))
+    finally:
+        fake.cleanup()
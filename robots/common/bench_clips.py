@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+
+"""
+Measure how long after a robot asks for its sound the first sample of it
+reaches the player, with Sound.play_file() and with ClipCache. No EV3 or
+sound card needed.
+
+"spawn" is what play_file() does for each call: set the volume with
+amixer through a shell, then start a player that opens the WAV and reads
+it. cat stands in for both, it starts at least as fast and reads the file
+the same way, so the real thing is slower still: aplay opens and sets up
+the sound card too. "cache" is a ClipCache started with the clip already
+loaded, writing to a pipe instead of aplay.
+
+The time is from the call until the first sample that is not silence
+comes out of the pipe. "cold" is the first time, in a new process, with
+the WAV dropped from the page cache the way it is after a reboot, "warm"
+the --warm times after that. Each cold number is the median of --runs new
+processes.
+
+    $ ./bench_clips.py
+    $ ./bench_clips.py --warm 50 --runs 9
+
+"heard" is when the cache's clip is heard on a brick, the cold trigger
+plus the sound queued ahead of it in aplay. The mixer's CPU, as a share of
+one core, is measured with nothing, one and two clips playing.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+
+from clipcache import ClipCache, FileSink
+from threadloop import clock
+
+ROBOTS = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+CLIPS = [
+    ('dinor3x', 'DINOR3X/T-rex roar.wav'),
+    ('spik3r', 'SPIK3R/Blip 3.wav'),
+    ('r3ptar', 'R3PTAR/snake-hiss.wav'),
+]
+
+
+def evict(path):
+    """
+    Drop path from the page cache, so it is read from the disk again
+    """
+    fd = os.open(path, os.O_RDONLY)
+
+    try:
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+    finally:
+        os.close(fd)
+
+
+def spawn_latency(path):
+    """
+    Seconds from starting a player of path to its first sample
+    """
+    start = clock()
+    os.system('cat /dev/null')
+    process = subprocess.Popen(['cat', path], stdout=subprocess.PIPE)
+    data = b''
+
+    try:
+        while True:
+            chunk = process.stdout.read1(65536)
+
+            if not chunk:
+                raise ValueError("%s is silent" % path)
+
+            data += chunk
+            offset = data.find(b'data')
+
+            if offset >= 0 and data[offset + 8:].strip(b'\0'):
+                return clock() - start
+    finally:
+        process.stdout.close()
+        process.wait()
+
+
+class FirstSample(threading.Thread):
+    """
+    Reads the cache's pipe, heard is when the first sample that was not
+    silence came out of it after arm()
+    """
+
+    def __init__(self, fd):
+        threading.Thread.__init__(self, daemon=True)
+        self.fd = fd
+        self.armed = False
+        self.heard = None
+        self.sound = threading.Event()
+
+    def arm(self):
+        self.heard = None
+        self.sound.clear()
+        self.armed = True
+
+    def run(self):
+        while True:
+            data = os.read(self.fd, 65536)
+
+            if not data:
+                return
+
+            if self.armed and data.strip(b'\0'):
+                self.heard = clock()
+                self.armed = False
+                self.sound.set()
+
+
+def cache_latency(cache, reader, name):
+    reader.arm()
+    voice = cache.play(name)
+
+    if not reader.sound.wait(5):
+        raise ValueError("%s was never heard" % name)
+
+    latency = reader.heard - voice.triggered
+    heard = voice.started + voice.queued - voice.triggered
+    voice.stop()
+
+    # Back to silence before the next one
+    time.sleep(3 * cache.period)
+    return (latency, heard)
+
+
+def mixer_cpu(cache, name, voices, seconds=1.0):
+    """
+    The share of one core the process used with voices copies of name playing
+    """
+    playing = [cache.play(name) for i in range(voices)]
+    start = (clock(), time.process_time())
+    time.sleep(seconds)
+    used = (time.process_time() - start[1]) / (clock() - start[0])
+
+    for voice in playing:
+        voice.stop()
+
+    time.sleep(3 * cache.period)
+    return used
+
+
+def measure(variant, path, warm):
+    """
+    Runs in the child process, returns the numbers for one variant and clip
+    """
+    evict(path)
+    result = {}
+
+    if variant == 'spawn':
+        result['cold'] = spawn_latency(path)
+        result['warm'] = [spawn_latency(path) for i in range(warm)]
+        return result
+
+    (read_fd, write_fd) = os.pipe()
+    reader = FirstSample(read_fd)
+    reader.start()
+
+    start = clock()
+    cache = ClipCache(FileSink(write_fd))
+    name = cache.load(path).name
+    result['load'] = clock() - start
+
+    cache.start()
+    time.sleep(0.1)
+
+    (result['cold'], result['heard']) = cache_latency(cache, reader, name)
+    result['warm'] = [cache_latency(cache, reader, name)[0] for i in range(warm)]
+    result['cpu'] = [mixer_cpu(cache, name, voices) for voices in (0, 1, 2)]
+    cache.close()
+    return result
+
+
+def median(values):
+    values = sorted(values)
+    return values[len(values) // 2]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Measure how long a robot sound takes to start playing')
+    parser.add_argument('--warm', type=int, default=20)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--variant', choices=('spawn', 'cache'), help=argparse.SUPPRESS)
+    parser.add_argument('--clip', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.variant:
+        print(json.dumps(measure(args.variant, args.clip, args.warm)))
+        sys.exit(0)
+
+    print("%8s %6s %8s %8s %8s %8s %8s" % ('', '', 'load ms', 'cold ms', 'warm ms', 'warm max', 'heard ms'))
+    cpu = []
+
+    for (robot, clip) in CLIPS:
+        for variant in ('spawn', 'cache'):
+            results = []
+
+            for run in range(args.runs):
+                output = subprocess.check_output([sys.executable, os.path.abspath(__file__), '--variant', variant,
+                                                  '--clip', os.path.join(ROBOTS, clip), '--warm', str(args.warm)],
+                                                 universal_newlines=True)
+                results.append(json.loads(output.strip().splitlines()[-1]))
+
+            warm = [latency for result in results for latency in result['warm']]
+            line = "%8s %6s %8s %8.2f %8.2f %8.2f" % (
+                robot, variant, '%.2f' % (1000 * median(r['load'] for r in results)) if variant == 'cache' else '-',
+                1000 * median(r['cold'] for r in results), 1000 * median(warm), 1000 * max(warm))
+
+            if variant == 'cache':
+                line += " %8.2f" % (1000 * median(r['heard'] for r in results))
+                cpu.append((robot, [median(r['cpu'][voices] for r in results) for voices in (0, 1, 2)]))
+
+            print(line)
+
+    print()
+    print("%8s %8s %8s %8s" % ('mixer', 'idle', '1 clip', '2 clips'))
+
+    for (robot, (idle, one, two)) in cpu:
+        print("%8s %7.1f%% %7.1f%% %7.1f%%" % (robot, 100 * idle, 100 * one, 100 * two))
@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+
+"""
+Compare LED animations written straight from the caller's thread with the
+same animations played by a LedAnimator, on a fake sysfs tree of the
+brick's four LEDs. No EV3 needed.
+
+"direct" is the loops of the old misc/leds.py and Leds.animate_flash():
+set every LED of each group, then sleep. "animator" is a LedAnimator
+playing the same animation. The animations are El3ctricGuitar's 3s
+orange flash, the demo's traffic light and its colors fade, --fade
+seconds of it.
+
+    $ ./bench_leds.py
+    $ ./bench_leds.py --busy --fade 5
+
+For each we report the brightness writes, per second too, the frames and
+how long after it was due each was written: a direct loop drifts by the
+time its writes take on every frame, the animator by how late its thread
+wakes. "blocked" is how long the caller was held up. --busy adds a thread
+that keeps the CPU busy, the way the rest of a robot program would.
+"""
+
+import argparse
+import math
+import threading
+import time
+
+from ev3dev2 import Device
+
+from fakesys import FakeSys
+from ledanimator import LedAnimator
+from threadloop import clock
+
+TRAFFIC_LIGHT = ('GREEN', 'YELLOW', 'RED')
+FADE_STEP = 0.05
+
+
+def fade_brightness(i):
+    """
+    The demo's colors fade at step i, 10 degrees a step, as
+    (red_left, green_left, red_right, green_right)
+    """
+    rd = math.radians(10 * i)
+    return (.5 * (1 + math.cos(rd)), .5 * (1 + math.sin(rd)), .5 * (1 + math.sin(rd)), .5 * (1 + math.cos(rd)))
+
+
+class WriteCounter(object):
+    """
+    Counts the brightness attributes written through ev3dev2
+    """
+
+    def __init__(self):
+        self.writes = 0
+
+    def install(self):
+        self.set_attribute = Device._set_attribute
+        set_attribute = self.set_attribute
+        counter = self
+
+        def counting_set_attribute(device, attribute, name, value):
+            if name == 'brightness':
+                counter.writes += 1
+            return set_attribute(device, attribute, name, value)
+
+        Device._set_attribute = counting_set_attribute
+
+    def restore(self):
+        Device._set_attribute = self.set_attribute
+
+
+def direct_flash(leds, frames):
+    # Leds.animate_flash('ORANGE', duration=3), block=True
+    start = clock()
+    even = True
+
+    while True:
+        frames.append(clock())
+
+        if even:
+            for group in ('LEFT', 'RIGHT'):
+                leds.set_color(group, 'ORANGE')
+        else:
+            leds.all_off()
+
+        if clock() - start >= 3:
+            break
+
+        even = not even
+        time.sleep(0.5)
+
+
+def direct_traffic(leds, frames):
+    for _ in range(3):
+        for color in TRAFFIC_LIGHT:
+            frames.append(clock())
+
+            for group in ('LEFT', 'RIGHT'):
+                leds.set_color(group, color)
+            time.sleep(0.5)
+
+
+def direct_fade(leds, frames, seconds):
+    order = [leds.leds[name] for name in ('red_left', 'green_left', 'red_right', 'green_right')]
+
+    for i in range(int(round(seconds / FADE_STEP))):
+        frames.append(clock())
+
+        for (led, value) in zip(order, fade_brightness(i)):
+            led.brightness_pct = value
+        time.sleep(FADE_STEP)
+
+
+def run_direct(scenario, leds, seconds):
+    """
+    Returns (jitter, blocked seconds)
+    """
+    frames = []
+    start = clock()
+
+    if scenario == 'flash':
+        direct_flash(leds, frames)
+        step = 0.5
+    elif scenario == 'traffic':
+        direct_traffic(leds, frames)
+        step = 0.5
+    else:
+        direct_fade(leds, frames, seconds)
+        step = FADE_STEP
+
+    return ([when - (start + i * step) for (i, when) in enumerate(frames)], clock() - start)
+
+
+def run_animator(scenario, leds, seconds):
+    animator = LedAnimator(leds)
+
+    if scenario == 'flash':
+        animation = animator.flash('ORANGE', duration=3)
+    elif scenario == 'traffic':
+        animation = animator.cycle(TRAFFIC_LIGHT, duration=4.5)
+    else:
+        functions = dict((name, lambda t, k=k: fade_brightness(t / FADE_STEP)[k])
+                         for (k, name) in enumerate(('red_left', 'green_left', 'red_right', 'green_right')))
+        animation = animator.wave('colors fade', functions, seconds, FADE_STEP, loops=1)
+
+    animator.start()
+
+    try:
+        start = clock()
+        playing = animator.play(animation)
+        blocked = clock() - start
+        playing.wait()
+        time.sleep(0.05)
+    finally:
+        animator.close()
+
+    return (animator.jitter, blocked)
+
+
+def busy_loop(stop):
+    while not stop.is_set():
+        sum(range(1000))
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare direct LED animations with a LedAnimator')
+    parser.add_argument('--fade', type=float, default=18.0, help='seconds of the colors fade')
+    parser.add_argument('--busy', action='store_true', help='run a CPU hungry thread alongside')
+    args = parser.parse_args()
+
+    fake = FakeSys()
+    stop_busy = threading.Event()
+    counter = WriteCounter()
+
+    try:
+        fake.add_ev3_leds()
+        fake.install()
+        leds = fake.ev3_leds()
+        counter.install()
+
+        if args.busy:
+            threading.Thread(target=busy_loop, args=(stop_busy,), daemon=True).start()
+
+        print("%8s %9s %8s %8s %9s %7s %8s %8s %8s %10s" % (
+            '', '', 'seconds', 'writes', 'writes/s', 'frames', 'p50 ms', 'p95 ms', 'max ms', 'blocked ms'))
+
+        for scenario in ('flash', 'traffic', 'fade'):
+            seconds = {'flash': 3.0, 'traffic': 4.5, 'fade': args.fade}[scenario]
+
+            for variant in ('direct', 'animator'):
+                leds.all_off()
+                counter.writes = 0
+
+                if variant == 'direct':
+                    (jitter, blocked) = run_direct(scenario, leds, seconds)
+                else:
+                    (jitter, blocked) = run_animator(scenario, leds, seconds)
+
+                print("%8s %9s %8.1f %8d %9.1f %7d %8.2f %8.2f %8.2f %10.2f" % (
+                    scenario, variant, seconds, counter.writes, counter.writes / seconds, len(jitter),
+                    1000 * percentile(jitter, 0.5), 1000 * percentile(jitter, 0.95), 1000 * max(jitter),
+                    1000 * blocked))
+    finally:
+        stop_busy.set()
+        counter.restore()
+        fake.cleanup()
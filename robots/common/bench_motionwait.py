@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+
+"""
+Compare the old ``while any(m.state for m in motors): sleep(0.1)`` loops with
+MotionWaiter on a fake sysfs tree, no EV3 needed.
+
+A driver thread plays the part of the tacho-motor driver. It marks the
+motors as running, then stops them one after the other after a random
+time. For each wait we measure the wake-up latency (from the moment the
+condition became true to the moment the wait returned) and the number of
+state reads and sleeps/polls per second spent waiting.
+
+Regular files never raise POLLPRI so the driver thread emulates
+sysfs_notify() by writing a byte to a pipe per motor, the state itself is
+still read from the fake state file.
+
+    $ ./bench_motionwait.py --trials 50 --motors 2
+"""
+
+import argparse
+import os
+import random
+import select
+import shutil
+import tempfile
+import threading
+import time
+
+from motionwait import MotionWaiter, not_running
+
+
+class FakeMotor(object):
+    """
+    Reads its state the way the ev3dev2 Device class does, one open file
+    that is rewound before each read
+    """
+
+    def __init__(self, path):
+        self._path = path
+        self.fh = open(os.path.join(path, 'state'), 'r')
+        (self.notify_read, self.notify_write) = os.pipe()
+        self.reads = 0
+
+    @property
+    def state(self):
+        self.reads += 1
+        self.fh.seek(0)
+        return self.fh.read().split()
+
+
+class NoSysfsMotor(object):
+    """
+    The same motor without a _path, MotionWaiter falls back to backoff
+    """
+
+    def __init__(self, motor):
+        self.motor = motor
+
+    @property
+    def state(self):
+        return self.motor.state
+
+
+class FakeSysfsWaiter(MotionWaiter):
+    notify_events = select.POLLIN
+
+    def notify_fd(self, motor, fd):
+        return motor.notify_read
+
+    def states(self):
+        # Reading a real sysfs attribute clears the notification, here we
+        # have to drain the pipe
+        for motor in self.motors:
+            try:
+                while os.read(motor.notify_read, 64):
+                    pass
+            except BlockingIOError:
+                pass
+
+        return MotionWaiter.states(self)
+
+
+class FakeDriver(threading.Thread):
+    """
+    Runs the motors for a random time, then stops them one by one
+    """
+
+    def __init__(self, motors, rand):
+        threading.Thread.__init__(self)
+        self.motors = motors
+        self.rand = rand
+        self.stopped_at = []
+
+    def set_state(self, motor, state):
+        # Fixed length so a reader never sees a half written file
+        fd = os.open(os.path.join(motor._path, 'state'), os.O_WRONLY)
+        os.pwrite(fd, ('%-15s\n' % state).encode(), 0)
+        os.close(fd)
+        os.write(motor.notify_write, b'x')
+
+    def start_motors(self):
+        for motor in self.motors:
+            self.set_state(motor, 'running')
+
+    def run(self):
+        time.sleep(self.rand.uniform(0.05, 0.3))
+
+        for motor in self.motors:
+            self.set_state(motor, '')
+            self.stopped_at.append(time.time())
+            time.sleep(self.rand.uniform(0.0, 0.02))
+
+
+def legacy_wait(motors):
+    sleeps = 0
+
+    while any(m.state for m in motors):
+        time.sleep(0.1)
+        sleeps += 1
+
+    return sleeps
+
+
+def build_tree(root, n_motors):
+    motors = []
+
+    for i in range(n_motors):
+        path = os.path.join(root, 'tacho-motor', 'motor%d' % i)
+        os.makedirs(path)
+
+        with open(os.path.join(path, 'state'), 'w') as fh:
+            fh.write('%-15s\n' % '')
+
+        motor = FakeMotor(path)
+        os.set_blocking(motor.notify_read, False)
+        motors.append(motor)
+
+    return motors
+
+
+def run_trials(name, motors, trials, seed, require):
+    """
+    Returns (latencies, reads per second, wakeups per second)
+    """
+    rand = random.Random(seed)
+    latencies = []
+    (reads, wakeups, waited) = (0, 0, 0.0)
+
+    if name == 'event':
+        waiter = FakeSysfsWaiter(motors)
+    elif name == 'backoff':
+        waiter = MotionWaiter([NoSysfsMotor(m) for m in motors])
+
+    for trial in range(trials):
+        driver = FakeDriver(motors, rand)
+        driver.start_motors()
+
+        # The event waiter preads the state files itself, the others go
+        # through FakeMotor.state
+        if name == 'event':
+            reads_before = waiter.reads
+        else:
+            reads_before = sum(m.reads for m in motors)
+
+        if name != 'legacy':
+            polls_before = waiter.polls
+
+        start = time.time()
+        driver.start()
+
+        if name == 'legacy':
+            wakeups += legacy_wait(motors)
+        else:
+            waiter.wait(not_running, require=require)
+
+        done = time.time()
+        driver.join()
+
+        if name == 'event':
+            reads += waiter.reads - reads_before
+        else:
+            reads += sum(m.reads for m in motors) - reads_before
+
+        if name != 'legacy':
+            wakeups += waiter.polls - polls_before
+
+        waited += done - start
+        condition_met = driver.stopped_at[-1] if require is all else driver.stopped_at[0]
+        latencies.append(max(done - condition_met, 0.0))
+
+    if name == 'event':
+        waiter.close()
+
+    return (latencies, reads / waited, wakeups / waited)
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(int(len(values) * p), len(values) - 1)]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark motor waits on a fake sysfs tree')
+    parser.add_argument('--trials', type=int, default=30, help='number of waits per method')
+    parser.add_argument('--motors', type=int, default=2, help='number of motors to wait for')
+    parser.add_argument('--any', action='store_true', help='wait for any motor instead of all of them')
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix='fake-sysfs-')
+
+    try:
+        motors = build_tree(root, args.motors)
+        require = any if args.any else all
+
+        print("%8s %10s %10s %10s %9s %10s" % ('method', 'mean (ms)', 'p95 (ms)', 'max (ms)', 'reads/s', 'wakeups/s'))
+
+        for name in ('legacy', 'backoff', 'event'):
+
+            # The legacy loop can only wait for all of the motors
+            if name == 'legacy' and args.any:
+                continue
+
+            (latencies, reads, wakeups) = run_trials(name, motors, args.trials, 0, require)
+            print("%8s %10.1f %10.1f %10.1f %9.1f %10.1f" % (
+                name,
+                1000 * sum(latencies) / len(latencies),
+                1000 * percentile(latencies, 0.95),
+                1000 * max(latencies),
+                reads,
+                wakeups))
+    finally:
+        shutil.rmtree(root)
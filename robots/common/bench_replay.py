@@ -0,0 +1,369 @@
+#!/usr/bin/env python3
+
+"""
+Replay sensor streams through the control code of Dinor3x, Spik3r,
+El3ctricGuitar, EXPLOR3R's auto-drive.py and the EDUCATOR scripts, no EV3
+needed, and report how many decisions they make, how long each takes and
+the commands they send. See replay.py.
+
+Without --trace each robot gets a stream made up from --seed, the same
+every run. With --trace it replays a trace recorded on the robot
+(./dinor3x.py dinor3x.trace) or a CSV file with the same channels.
+
+    $ ./bench_replay.py
+    $ ./bench_replay.py dinor3x --trace dinor3x.trace --commands dinor3x.log
+    $ ./bench_replay.py dinor3x --expect dinor3x.log
+    $ ./bench_replay.py el3ctric_guitar --speedup 1
+
+--commands writes every command with its virtual time. --expect compares
+the commands with a file written that way, ignoring the times, and exits
+with 1 if they differ, so a change to the control code can be checked
+against a known good run.
+"""
+
+import argparse
+import importlib
+import math
+import os
+import random
+import runpy
+import sys
+
+from deviceregistry import registry
+from fakesys import FakeSys
+from replay import Replay, SensorStream
+
+ROBOTS = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+# IR remote button codes, see InfraredSensor._BUTTON_VALUES
+IR_NONE = 0
+IR_TOP_LEFT = 1
+IR_BOTTOM_LEFT = 2
+IR_TOP_RIGHT = 3
+IR_BOTTOM_RIGHT = 4
+IR_BOTH_TOP = 5
+IR_BOTH_BOTTOM = 8
+IR_BEACON = 9
+
+# ColorSensor.color values
+COLOR_NONE = 0
+COLOR_GREEN = 3
+COLOR_RED = 5
+COLOR_WHITE = 6
+
+
+def load_module(folder, name):
+    """
+    Import a robot's module while the replay is installed, again if it was
+    imported before, so it picks up the virtual clock
+    """
+    path = os.path.join(ROBOTS, folder)
+
+    if path not in sys.path:
+        sys.path.append(path)
+
+    return importlib.reload(importlib.import_module(name))
+
+
+def run_script(replay, folder, script):
+    replay.run(runpy.run_path, os.path.join(ROBOTS, folder, script), None, '__main__')
+
+
+def segments(rng, seconds, choices, shortest, longest):
+    """
+    A value from choices that changes every shortest to longest seconds,
+    as a function of time
+    """
+    starts = [0.0]
+    values = [rng.choice(choices)]
+
+    while starts[-1] < seconds:
+        starts.append(starts[-1] + rng.uniform(shortest, longest))
+        values.append(rng.choice(choices))
+
+    return lambda t: values[max(0, min(len(starts) - 1, int(sum(1 for start in starts if start <= t)) - 1))]
+
+
+def pulses(period, width, start=0.0):
+    """
+    1 for width seconds every period seconds, 0 otherwise
+    """
+    return lambda t: 1 if t >= start and (t - start) % period < width else 0
+
+
+def make_stream(rate, seconds, channels):
+    """
+    channels is a list of (name, function of time)
+    """
+    times = [n / float(rate) for n in range(int(rate * seconds) + 1)]
+    columns = dict((name, [int(function(t)) for t in times]) for (name, function) in channels)
+    return SensorStream([name for (name, function) in channels], times, columns)
+
+
+# Dinor3x
+
+def dinor3x_devices(fake):
+    fake.add_motor('ev3-ports:outA', 'lego-ev3-m-motor')
+    fake.add_motor('ev3-ports:outB')
+    fake.add_motor('ev3-ports:outC')
+    fake.add_sensor('ev3-ports:in1', 'lego-ev3-touch')
+    fake.add_sensor('ev3-ports:in3', 'lego-ev3-color', 'COL-COLOR')
+    fake.add_sensor('ev3-ports:in4', 'lego-ev3-ir', 'IR-REMOTE')
+    return {
+        'touch': ('ev3-ports:in1', 'value0'),
+        'color': ('ev3-ports:in3', 'value0'),
+        'ir': ('ev3-ports:in4', 'value0'),
+        'jaw_position': ('ev3-ports:outA', 'position'),
+        'left_position': ('ev3-ports:outB', 'position'),
+        'left_speed': ('ev3-ports:outB', 'speed'),
+        'right_position': ('ev3-ports:outC', 'position'),
+        'right_speed': ('ev3-ports:outC', 'speed'),
+    }
+
+
+def dinor3x_stream(rng, seconds):
+    return make_stream(100, seconds, [
+        ('touch', pulses(0.6, 0.1)),
+        ('color', segments(rng, seconds, (COLOR_NONE,) * 3 + (COLOR_RED, COLOR_GREEN, COLOR_WHITE), 1.0, 4.0)),
+        ('ir', segments(rng, seconds, (IR_NONE,) * 3 + (IR_BOTH_TOP, IR_BOTH_BOTTOM, IR_TOP_LEFT, IR_TOP_RIGHT,
+                                                        IR_BOTTOM_LEFT, IR_BEACON), 0.5, 3.0)),
+        ('left_position', lambda t: 300 * t),
+        ('right_position', lambda t: 300 * t),
+    ])
+
+
+def dinor3x_run(replay):
+    robot = load_module('DINOR3X', 'dinor3x').Dinor3x()
+
+    def one_pass():
+        robot.sensors.tick()
+        robot.roar_by_ir_beacon()
+        robot.change_speed_by_color()
+        robot.walk_by_ir_beacon()
+
+    replay.run_passes(one_pass)
+
+
+# Spik3r
+
+def spik3r_devices(fake):
+    fake.add_motor('ev3-ports:outA', 'lego-ev3-m-motor')
+    fake.add_motor('ev3-ports:outB')
+    fake.add_motor('ev3-ports:outD')
+    fake.add_sensor('ev3-ports:in1', 'lego-ev3-touch')
+    fake.add_sensor('ev3-ports:in4', 'lego-ev3-ir', 'IR-REMOTE')
+    return {
+        'touch': ('ev3-ports:in1', 'value0'),
+        'ir': ('ev3-ports:in4', 'value0'),
+        'claw_position': ('ev3-ports:outA', 'position'),
+        'move_position': ('ev3-ports:outB', 'position'),
+        'move_speed': ('ev3-ports:outB', 'speed'),
+        'sting_position': ('ev3-ports:outD', 'position'),
+    }
+
+
+def spik3r_stream(rng, seconds):
+    return make_stream(100, seconds, [
+        ('touch', segments(rng, seconds, (0,) * 5 + (1,), 0.3, 2.0)),
+        ('ir', segments(rng, seconds, (IR_NONE,) * 3 + (IR_BOTH_TOP, IR_TOP_RIGHT, IR_BEACON), 0.5, 3.0)),
+    ])
+
+
+def spik3r_run(replay):
+    robot = load_module('SPIK3R', 'spik3r').Spik3r()
+
+    def one_pass():
+        robot.snap_claw_if_touched()
+        robot.move_by_ir_beacon()
+        robot.sting_by_ir_beacon()
+
+    replay.run_passes(one_pass)
+
+
+# El3ctricGuitar
+
+def el3ctric_guitar_devices(fake):
+    fake.add_motor('ev3-ports:outD', 'lego-ev3-m-motor')
+    fake.add_sensor('ev3-ports:in1', 'lego-ev3-touch')
+    fake.add_sensor('ev3-ports:in4', 'lego-ev3-ir', 'IR-PROX')
+    return {
+        'touch': ('ev3-ports:in1', 'value0'),
+        'proximity': ('ev3-ports:in4', 'value0'),
+        'lever_position': ('ev3-ports:outD', 'position'),
+    }
+
+
+def el3ctric_guitar_stream(rng, seconds):
+    return make_stream(100, seconds, [
+        ('touch', segments(rng, seconds, (0, 0, 1), 0.5, 2.0)),
+        ('proximity', lambda t: 50 + 45 * math.sin(t)),
+        ('lever_position', lambda t: 5 * math.sin(3 * t)),
+    ])
+
+
+def el3ctric_guitar_run(replay):
+    robot = load_module('EL3CTRIC_GUITAR', 'el3ctric_guitar').El3ctricGuitar()
+    replay.run(robot.start_up)
+    replay.run(robot.synth.start)
+    replay.run_passes(robot.play_music)
+
+
+# EXPLOR3R auto-drive.py
+
+def explor3r_devices(fake):
+    fake.add_motor('ev3-ports:outB')
+    fake.add_motor('ev3-ports:outC')
+    fake.add_sensor('ev3-ports:in1', 'lego-ev3-touch')
+    fake.add_sensor('ev3-ports:in4', 'lego-ev3-ir', 'IR-PROX')
+    return {
+        'touch': ('ev3-ports:in1', 'value0'),
+        'proximity': ('ev3-ports:in4', 'value0'),
+    }
+
+
+def explor3r_stream(rng, seconds):
+    return make_stream(20, seconds, [
+        ('touch', pulses(7.0, 0.2, start=3.0)),
+        ('proximity', segments(rng, seconds, (20, 40, 70, 90, 100), 0.5, 3.0)),
+    ])
+
+
+def explor3r_run(replay):
+    run_script(replay, 'EXPLOR3R', 'auto-drive.py')
+
+
+# EDUCATOR
+
+def educator_devices(fake):
+    fake.add_motor('ev3-ports:outA', 'lego-ev3-m-motor')
+    fake.add_motor('ev3-ports:outB')
+    fake.add_motor('ev3-ports:outC')
+    fake.add_sensor('ev3-ports:in1', 'lego-ev3-touch')
+    fake.add_sensor('ev3-ports:in2', 'lego-ev3-gyro', 'GYRO-ANG')
+    fake.add_sensor('ev3-ports:in3', 'lego-ev3-color', 'COL-COLOR')
+    fake.add_sensor('ev3-ports:in4', 'lego-ev3-us', 'US-DIST-CM')
+
+    # The ultrasonic sensor reports millimeters
+    fake.set('ev3-ports:in4', 'decimals', 1)
+    return {
+        'touch': ('ev3-ports:in1', 'value0'),
+        'angle': ('ev3-ports:in2', 'value0'),
+        'color': ('ev3-ports:in3', 'value0'),
+        'distance': ('ev3-ports:in4', 'value0'),
+    }
+
+
+def educator_stream(rng, seconds):
+    return make_stream(100, seconds, [
+        ('touch', pulses(seconds, seconds, start=3.0)),
+        ('angle', lambda t: 30 * t),
+        ('color', segments(rng, seconds, (COLOR_NONE, COLOR_GREEN, COLOR_RED, COLOR_WHITE), 1.0, 5.0)),
+        ('distance', lambda t: max(20, 500 - 50 * t)),
+    ])
+
+
+def educator(script):
+    return lambda replay: run_script(replay, 'EDUCATOR', script)
+
+
+ROBOT_PROFILES = [
+    ('dinor3x', dinor3x_devices, dinor3x_stream, dinor3x_run),
+    ('spik3r', spik3r_devices, spik3r_stream, spik3r_run),
+    ('el3ctric_guitar', el3ctric_guitar_devices, el3ctric_guitar_stream, el3ctric_guitar_run),
+    ('explor3r', explor3r_devices, explor3r_stream, explor3r_run),
+    ('educator-color', educator_devices, educator_stream, educator('color.py')),
+    ('educator-square', educator_devices, educator_stream, educator('square.py')),
+    ('educator-square-gyro', educator_devices, educator_stream, educator('square-gyro.py')),
+    ('educator-touch', educator_devices, educator_stream, educator('touch.py')),
+    ('educator-ultrasonic', educator_devices, educator_stream, educator('ultrasonic.py')),
+]
+
+
+def replay_robot(profile, args):
+    (name, devices, make_stream, run) = profile
+    fake = FakeSys()
+
+    try:
+        channels = devices(fake)
+        fake.install()
+
+        if args.trace:
+            stream = SensorStream.load(args.trace)
+        else:
+            stream = make_stream(random.Random(args.seed), args.seconds)
+
+        with Replay(fake, stream, channels, speedup=args.speedup, seed=args.seed) as replay:
+            run(replay)
+
+        return replay
+    finally:
+        fake.cleanup()
+        registry.clear()
+
+
+def compare_commands(replay, path):
+    """
+    Returns the first line that differs from the commands in path, or None
+    """
+    with open(path) as fh:
+        expected = [line.split(' ', 1)[1].rstrip('\n') for line in fh if line.strip()]
+
+    got = ['%s %s %s' % (device, name, value) for (t, device, name, value) in replay.commands]
+
+    for (n, (line, expected_line)) in enumerate(zip(got, expected)):
+        if line != expected_line:
+            return "command %d is %r, expected %r" % (n + 1, line, expected_line)
+
+    if len(got) != len(expected):
+        return "%d commands, expected %d" % (len(got), len(expected))
+
+    return None
+
+
+if __name__ == '__main__':
+    names = [profile[0] for profile in ROBOT_PROFILES]
+    parser = argparse.ArgumentParser(description='Replay sensor streams through the robot control loops')
+    parser.add_argument('robot', nargs='?', choices=names, help='one robot, all of them if not given')
+    parser.add_argument('--trace', help='a TraceRecorder trace or CSV file to replay')
+    parser.add_argument('--seconds', type=float, default=30.0, help='length of the made up streams')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--speedup', type=float, help='run in real time divided by this, 1 is real time')
+    parser.add_argument('--commands', help='write the commands to this file')
+    parser.add_argument('--expect', help='compare the commands with this file')
+    args = parser.parse_args()
+
+    if (args.trace or args.commands or args.expect) and not args.robot:
+        parser.error("--trace, --commands and --expect need a robot")
+
+    print("%20s %9s %9s %8s %11s %8s %8s %8s %6s %7s %5s %5s %4s" % (
+        'robot', 'decisions', 'robot (s)', 'wall (s)', 'decisions/s', 'p50 (us)', 'p99 (us)', 'max (us)',
+        'motor', 'setting', 'mode', 'sound', 'leds'))
+    failed = False
+
+    for profile in ROBOT_PROFILES:
+        if args.robot and profile[0] != args.robot:
+            continue
+
+        replay = replay_robot(profile, args)
+        latencies = sorted(replay.latencies) or [0.0]
+        counts = replay.command_counts()
+        print("%20s %9d %9.1f %8.2f %11.0f %8.0f %8.0f %8.0f %6d %7d %5d %5d %4d" % (
+            profile[0], len(replay.latencies), replay.now, replay.wall, replay.decisions_per_second,
+            1000000 * latencies[len(latencies) // 2], 1000000 * latencies[min(len(latencies) - 1, int(0.99 * len(latencies)))],
+            1000000 * latencies[-1], counts['motor'], counts['setting'], counts['mode'], counts['sound'],
+            counts['leds']))
+
+        if args.commands:
+            with open(args.commands, 'w') as fh:
+                replay.write_commands(fh)
+
+        if args.expect:
+            difference = compare_commands(replay, args.expect)
+
+            if difference:
+                print("%s: %s" % (args.expect, difference))
+                failed = True
+            else:
+                print("%s: %d commands match" % (args.expect, len(replay.commands)))
+
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+
+"""
+Compare the old thread per job model of GRIPP3R and R3PTAR with
+RobotRuntime on a fake sysfs tree, no EV3 needed.
+
+"threads" runs the loops the robots used to run, one thread each calling
+the sensor and then sleep(0.01). "asyncio" runs the real Gripper or R3PTAR
+main() on RobotRuntime for the same time, at the same fixed rate unless
+--max-latency lets it back off while the remote is idle. Both poll the
+same ev3dev2 sensor objects. For every periodic job we report how late each call was
+compared to its 10ms schedule, the jitter (standard deviation) of the
+interval between calls and the CPU time the process used as a percentage
+of the wall clock time.
+
+--busy adds a thread that burns CPU in short bursts, standing in for the
+rest of what runs on the single core of the EV3.
+
+    $ ./bench_runtime.py --robot gripp3r --seconds 5
+    $ taskset -c 0 ./bench_runtime.py --robot r3ptar --busy
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+
+from fakesys import FakeSys
+from robotruntime import RobotRuntime, TaskStats, cpu_percent
+
+ROBOTS = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+
+def busy_loop(stop):
+    """
+    Keep the CPU about half busy until stop is set
+    """
+    while not stop.is_set():
+        end = time.perf_counter() + 0.005
+
+        while time.perf_counter() < end:
+            pass
+
+        time.sleep(0.005)
+
+
+def polling_thread(name, interval, function, stop):
+    """
+    The loop every Monitor thread ran, instrumented
+    """
+    stats = TaskStats(name, interval)
+
+    def run():
+        scheduled = time.monotonic()
+
+        while not stop.is_set():
+            now = time.monotonic()
+            stats.record(scheduled, now)
+            function()
+            time.sleep(interval)
+            scheduled = now + interval
+
+    return (stats, threading.Thread(target=run))
+
+
+def build_robot(name, max_latency):
+    fake = FakeSys()
+    fake.add_motor('ev3-ports:outA', 'lego-ev3-m-motor')
+    fake.add_motor('ev3-ports:outB')
+    fake.add_motor('ev3-ports:outC')
+    fake.add_motor('ev3-ports:outD')
+    fake.add_sensor('ev3-ports:in1', 'lego-ev3-touch')
+    fake.add_sensor('ev3-ports:in4', 'lego-ev3-ir', 'IR-REMOTE')
+
+    # Nothing in front of R3PTAR and no buttons pressed
+    fake.set('ev3-ports:in4', 'value0', 100)
+    fake.install()
+
+    runtime = RobotRuntime(handle_signals=False)
+
+    if name == 'gripp3r':
+        sys.path.append(os.path.join(ROBOTS, 'GRIPP3R'))
+        from GRIPP3R import Gripper
+        robot = Gripper(runtime=runtime, max_latency=max_latency)
+    else:
+        sys.path.append(os.path.join(ROBOTS, 'R3PTAR'))
+        from r3ptar import R3PTAR
+        robot = R3PTAR(runtime=runtime, max_latency=max_latency)
+
+    return (fake, robot)
+
+
+def run_threads(name, robot, seconds):
+    stop = threading.Event()
+
+    if name == 'gripp3r':
+        # MonitorTouchSensor waited in TouchSensor.wait_for_pressed(), which
+        # checks is_pressed every 10ms
+        jobs = (('remote', robot.remote.process),
+                ('touch', lambda: robot.ts.is_pressed))
+    else:
+        jobs = (('remote', lambda: robot.remote.proximity < 30 or robot.remote.process()),)
+
+    threads = [polling_thread(job, robot.POLL_INTERVAL, function, stop) for (job, function) in jobs]
+
+    for (stats, thread) in threads:
+        thread.start()
+
+    time.sleep(seconds)
+    stop.set()
+
+    for (stats, thread) in threads:
+        thread.join()
+
+    return [stats for (stats, thread) in threads]
+
+
+def run_asyncio(robot, seconds):
+    robot.main(duration=seconds)
+    return [robot.runtime.stats[job] for job in sorted(robot.runtime.stats)]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the threaded and asyncio robot runtimes on a fake sysfs tree')
+    parser.add_argument('--robot', choices=('gripp3r', 'r3ptar'), default='gripp3r')
+    parser.add_argument('--seconds', type=float, default=5.0, help='how long to run each model')
+    parser.add_argument('--busy', action='store_true', help='run a CPU hungry thread alongside')
+    parser.add_argument('--max-latency', type=float, default=0.01,
+                        help='let the asyncio model back off to this poll interval while the remote is idle')
+    args = parser.parse_args()
+
+    (fake, robot) = build_robot(args.robot, args.max_latency)
+    stop_busy = threading.Event()
+
+    if args.busy:
+        threading.Thread(target=busy_loop, args=(stop_busy,), daemon=True).start()
+
+    try:
+        print("%8s %7s %7s %10s %10s %10s %11s %6s" % (
+            'model', 'job', 'calls', 'late (ms)', 'p95 (ms)', 'max (ms)', 'jitter (ms)', 'cpu %'))
+
+        for model in ('threads', 'asyncio'):
+            cpu_start = time.process_time()
+            wall_start = time.time()
+
+            if model == 'threads':
+                results = run_threads(args.robot, robot, args.seconds)
+            else:
+                results = run_asyncio(robot, args.seconds)
+
+            cpu = cpu_percent(cpu_start, wall_start)
+
+            for stats in results:
+                print("%8s %7s %7d %10.2f %10.2f %10.2f %11.2f %6.1f" % (
+                    model,
+                    stats.name,
+                    stats.calls,
+                    1000 * stats.mean_late,
+                    1000 * stats.late_percentile(0.95),
+                    1000 * stats.late_max,
+                    1000 * stats.jitter,
+                    cpu))
+    finally:
+        stop_busy.set()
+        robot.runtime.close()
+        fake.cleanup()
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+
+"""
+Compare Sound.play_song() with a SongCache, for the Star Wars theme of
+misc/sound.py and a made up song of --notes notes. No EV3 needed.
+
+"per note" is play_song() itself, "sequence" SongCache.play(), one
+Sound.tone() for the whole song, and "pcm" the song rendered by SongCache
+and played by a ClipCache into a pipe, ending when its last sample would
+be heard. sleep stands in for beep, for as long as the notes and delays
+it was given, so the only difference between the first two is the beeps
+started and the milliseconds dropped.
+
+    $ ./bench_song.py
+    $ ./bench_song.py --notes 100
+
+For each we report how much longer than it should the song took, the CPU
+it used, counting the programs it started, and how many it started. The
+first SongCache.compile() and clip() of a song, and a cached one, are
+timed too.
+"""
+
+import argparse
+import os
+import random
+import re
+import resource
+import subprocess
+import threading
+import time
+
+from ev3dev2.sound import Sound
+
+from clipcache import ClipCache, FileSink
+from songcache import SongCache, note_seconds
+from threadloop import clock
+
+STAR_WARS = (
+    ('D4', 'e3'), ('D4', 'e3'), ('D4', 'e3'), ('G4', 'h'), ('D5', 'h'),
+    ('C5', 'e3'), ('B4', 'e3'), ('A4', 'e3'), ('G5', 'h'), ('D5', 'q'),
+    ('C5', 'e3'), ('B4', 'e3'), ('A4', 'e3'), ('G5', 'h'), ('D5', 'q'),
+    ('C5', 'e3'), ('B4', 'e3'), ('C5', 'e3'), ('A4', 'h.'),
+)
+
+NOTES = ('C4', 'D4', 'E4', 'F4', 'G4', 'A4', 'B4', 'C5', 'D5', 'E5', 'F5', 'G5')
+VALUES = ('s', 'e3', 'e', 's.')
+
+
+def stress_song(notes, seed):
+    rand = random.Random(seed)
+    return tuple((rand.choice(NOTES), rand.choice(VALUES)) for i in range(notes))
+
+
+def song_seconds(song, tempo, delay):
+    return sum(note_seconds(value, tempo) + delay for (note, value) in song)
+
+
+def cpu_seconds():
+    return sum(usage.ru_utime + usage.ru_stime for usage in
+               (resource.getrusage(resource.RUSAGE_SELF), resource.getrusage(resource.RUSAGE_CHILDREN)))
+
+
+class SleepingBeep(object):
+    """
+    Sound.beep() running sleep for as long as beep would play its arguments
+    """
+
+    def __init__(self):
+        self.started = 0
+
+    def install(self):
+        self.beep = Sound.beep
+        bench = self
+
+        def beep(speaker, args='', play_type=Sound.PLAY_WAIT_FOR_COMPLETE):
+            ms = sum(int(value) for value in re.findall(r'-[lD] (\d+)', args))
+            bench.started += 1
+            subprocess.call(['sleep', '%.3f' % (ms / 1000.0)])
+
+        Sound.beep = beep
+
+    def restore(self):
+        Sound.beep = self.beep
+
+
+def play_pcm(songs, song, tempo, delay):
+    """
+    Returns when the end of the song is heard: after what was queued ahead
+    of it and all of its samples, unless the sink ran dry
+    """
+    (read_fd, write_fd) = os.pipe()
+    threading.Thread(target=drain, args=(read_fd,), daemon=True).start()
+    clips = ClipCache(FileSink(write_fd), rate=16000)
+    clips.add(songs.clip('song', song, clips.rate, tempo, delay))
+    clips.start()
+
+    try:
+        voice = clips.play('song')
+        voice.wait()
+        return voice.started + voice.queued + len(voice.clip) / float(clips.rate) + clips.late * clips.period
+    finally:
+        clips.close()
+
+
+def drain(fd):
+    while os.read(fd, 65536):
+        pass
+
+
+def measure(variant, song, tempo, delay):
+    """
+    Returns (seconds late, CPU seconds, programs started)
+    """
+    beep = SleepingBeep()
+    beep.install()
+    songs = SongCache(Sound())
+
+    # The song is compiled before it is timed, as it would be at startup
+    songs.compile(song, tempo, delay)
+    songs.clip('song', song, 16000, tempo, delay)
+
+    start = (clock(), cpu_seconds())
+
+    try:
+        if variant == 'per note':
+            Sound().play_song(song, tempo, delay)
+            end = clock()
+        elif variant == 'sequence':
+            songs.play(song, tempo, delay)
+            end = clock()
+        else:
+            end = play_pcm(songs, song, tempo, delay)
+    finally:
+        beep.restore()
+
+    return (end - start[0] - song_seconds(song, tempo, delay), cpu_seconds() - start[1], beep.started)
+
+
+def compile_times(song, tempo, delay):
+    """
+    Returns the seconds the first compile, the first render and a cached
+    clip() take
+    """
+    songs = SongCache()
+    times = []
+
+    for make in (lambda: songs.compile(song, tempo, delay),
+                 lambda: songs.clip('song', song, 16000, tempo, delay),
+                 lambda: songs.clip('song', song, 16000, tempo, delay)):
+        start = time.perf_counter()
+        make()
+        times.append(time.perf_counter() - start)
+
+    return times
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare play_song() with a compiled song')
+    parser.add_argument('--notes', type=int, default=500, help='notes in the made up song')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    songs = [
+        ('star wars', STAR_WARS, 120, 0.05),
+        ('%d notes' % args.notes, stress_song(args.notes, args.seed), 240, 0.01),
+    ]
+
+    print("%10s %9s %9s %9s %9s %9s %9s" % ('', '', 'song s', 'late ms', 'cpu ms', 'started', 'compile'))
+
+    for (name, song, tempo, delay) in songs:
+        (compiled, rendered, cached) = compile_times(song, tempo, delay)
+
+        for variant in ('per note', 'sequence', 'pcm'):
+            (late, cpu, started) = measure(variant, song, tempo, delay)
+            made = {'per note': '-', 'sequence': '%.2fms' % (1000 * compiled), 'pcm': '%.1fms' % (1000 * rendered)}
+            print("%10s %9s %9.2f %9.1f %9.1f %9d %9s" % (
+                name, variant, song_seconds(song, tempo, delay), 1000 * late, 1000 * cpu, started, made[variant]))
+
+        print("%10s %9s %49s" % (name, 'cached', '%.1fus' % (1000000 * cached)))
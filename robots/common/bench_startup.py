@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+
+"""
+Measure how long each robot program takes from being started to its first
+control tick, on a fake sysfs tree, so slow startups are caught before
+they reach a brick.
+
+Each program is started --runs times in a new Python process under
+startprofile.py, from its own folder the way Brickman starts it, and
+stopped at its first tick. The table shows the median and the fastest
+run, and for the median run where the time went: starting Python, imports
+and making ev3dev2 devices (see startprofile.py).
+
+    $ ./bench_startup.py
+    $ ./bench_startup.py --save startup.json
+    $ ./bench_startup.py --check startup.json
+    $ ./bench_startup.py --compare ../../before/robots dinor3x mindcub3r
+
+--compare measures each program in the robots folder of another checkout
+too, a worktree of an older commit for example, and prints it as a
+"before" row above the program's "after" row.
+
+--check exits with 1 if a program's median is more than --tolerance times
+what was saved, plus --slack-ms for the noise of a busy machine. The
+motors of the fake tree never report running, so a blocking move costs
+ev3dev2's 100ms wait for that and no more: what a program spends homing
+or calibrating on a brick is not in these numbers.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+from fakesys import FakeSys
+
+ROBOTS = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+STARTPROFILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'startprofile.py')
+
+LARGE = 'lego-ev3-l-motor'
+MEDIUM = 'lego-ev3-m-motor'
+TOUCH = ('lego-ev3-touch', None)
+COLOR = ('lego-ev3-color', 'COL-COLOR')
+IR_REMOTE = ('lego-ev3-ir', 'IR-REMOTE')
+IR_PROX = ('lego-ev3-ir', 'IR-PROX')
+GYRO = ('lego-ev3-gyro', 'GYRO-ANG')
+ULTRASONIC = ('lego-ev3-us', 'US-DIST-CM')
+
+# (name, script, tick, motors, sensors), the motors and sensors are
+# {port: driver}
+PROGRAMS = [
+    ('dinor3x', 'DINOR3X/dinor3x.py', 'sensor',
+     {'outA': MEDIUM, 'outB': LARGE, 'outC': LARGE}, {'in1': TOUCH, 'in3': COLOR, 'in4': IR_REMOTE}),
+    ('spik3r', 'SPIK3R/spik3r.py', 'sensor',
+     {'outA': MEDIUM, 'outB': LARGE, 'outD': LARGE}, {'in1': TOUCH, 'in4': IR_REMOTE}),
+    ('el3ctric_guitar', 'EL3CTRIC_GUITAR/el3ctric_guitar.py', 'sensor',
+     {'outD': MEDIUM}, {'in1': TOUCH, 'in4': IR_PROX}),
+    ('track3r', 'TRACK3R/TRACK3RWithClaw', 'sensor',
+     {'outA': MEDIUM, 'outB': LARGE, 'outC': LARGE}, {'in4': IR_REMOTE}),
+    ('ev3d4', 'EV3D4/EV3D4RemoteControl.py', 'sensor',
+     {'outA': MEDIUM, 'outB': LARGE, 'outC': LARGE}, {'in4': IR_REMOTE}),
+    ('r3ptar', 'R3PTAR/r3ptar.py', 'sensor',
+     {'outA': MEDIUM, 'outB': LARGE, 'outD': LARGE}, {'in4': IR_REMOTE}),
+    ('mindcub3r', 'MINDCUB3R/mindcuber.py', 'sensor',
+     {'outA': LARGE, 'outB': LARGE, 'outC': MEDIUM}, {'in3': COLOR, 'in2': IR_PROX}),
+    ('educator-color', 'EDUCATOR/color.py', 'sensor', {}, {'in3': COLOR}),
+    ('educator-square', 'EDUCATOR/square.py', 'command', {'outB': LARGE, 'outC': LARGE}, {}),
+    ('educator-square-gyro', 'EDUCATOR/square-gyro.py', 'sensor',
+     {'outB': LARGE, 'outC': LARGE}, {'in2': GYRO}),
+    ('educator-touch', 'EDUCATOR/touch.py', 'sensor', {'outB': LARGE, 'outC': LARGE}, {'in1': TOUCH}),
+    ('educator-ultrasonic', 'EDUCATOR/ultrasonic.py', 'sensor',
+     {'outA': MEDIUM, 'outB': LARGE, 'outC': LARGE}, {'in4': ULTRASONIC}),
+]
+
+
+def make_tree(motors, sensors):
+    fake = FakeSys()
+
+    for (port, driver) in sorted(motors.items()):
+        fake.add_motor('ev3-ports:' + port, driver)
+
+    for (port, (driver, mode)) in sorted(sensors.items()):
+        fake.add_sensor('ev3-ports:' + port, driver, mode)
+
+    return fake
+
+
+def start(script, tick, root, timeout, robots=ROBOTS):
+    """
+    Returns startprofile.py's report of one start of script in robots
+    """
+    path = os.path.join(robots, script)
+    command = [sys.executable, STARTPROFILE, '--exit-at-tick', '--json', '--tick', tick, '--sys', root, path]
+    process = subprocess.run(command, cwd=os.path.dirname(path), stdout=subprocess.DEVNULL,
+                             stderr=subprocess.PIPE, timeout=timeout, universal_newlines=True)
+
+    for line in reversed(process.stderr.splitlines()):
+        if line.startswith('{') and json.loads(line)['ticked']:
+            return json.loads(line)
+
+    raise RuntimeError("%s did not reach its first tick:\n%s" % (script, process.stderr))
+
+
+def measure(program, runs, timeout, robots=ROBOTS):
+    (name, script, tick, motors, sensors) = program
+    fake = make_tree(motors, sensors)
+
+    try:
+        reports = sorted((start(script, tick, fake.root, timeout, robots) for i in range(runs)),
+                         key=lambda r: r['total'])
+    finally:
+        fake.cleanup()
+
+    median = reports[len(reports) // 2]
+    median['fastest'] = reports[0]['total']
+    return median
+
+
+def print_report(label, name, report):
+    title = '%s %s' % (label, name.rjust(19 - len(label))) if label else name.rjust(20)
+
+    if report is None:
+        print("%s  did not reach its first tick" % title)
+        return
+
+    print("%s %9.1f %9.1f %9.1f %9.1f %4d %6.1f  %s" % (
+        title, 1000 * report['total'], 1000 * report['fastest'], 1000 * report['interpreter'],
+        1000 * report['imports'], report['devices'], 1000 * report['device_seconds'], report['tick']))
+
+
+if __name__ == '__main__':
+    names = [program[0] for program in PROGRAMS]
+    parser = argparse.ArgumentParser(description='Measure how long each robot program takes to start')
+    parser.add_argument('programs', nargs='*', help='all of them if none are given')
+    parser.add_argument('--runs', type=int, default=9)
+    parser.add_argument('--timeout', type=float, default=30.0, help='seconds to wait for one start')
+    parser.add_argument('--save', help='save the medians to this JSON file')
+    parser.add_argument('--check', help='compare the medians with this file from --save')
+    parser.add_argument('--tolerance', type=float, default=1.3)
+    parser.add_argument('--slack-ms', type=float, default=20.0)
+    parser.add_argument('--imports', action='store_true', help='list the slowest imports of each program')
+    parser.add_argument('--compare', metavar='ROBOTS', help="measure each program in another checkout's robots too")
+    args = parser.parse_args()
+
+    baseline = {}
+
+    if args.check:
+        with open(args.check) as fh:
+            baseline = json.load(fh)
+
+    print("%20s %9s %9s %9s %9s %11s  %s" % (
+        'program', 'start ms', 'fastest', 'python', 'imports', 'devices', 'first tick'))
+    results = {}
+    slower = []
+
+    for program in PROGRAMS:
+        name = program[0]
+
+        if args.programs and name not in args.programs:
+            continue
+
+        if args.compare:
+            try:
+                before = measure(program, args.runs, args.timeout, args.compare)
+            except RuntimeError as e:
+                before = None
+                print(str(e).splitlines()[-1])
+
+            print_report('before', name, before)
+
+        report = measure(program, args.runs, args.timeout)
+        results[name] = report['total']
+        print_report('after' if args.compare else '', name, report)
+
+        if args.imports:
+            for (module, seconds) in report['slowest_imports']:
+                print("%32s %9.1f" % (module, 1000 * seconds))
+
+        if name in baseline and report['total'] > args.tolerance * baseline[name] + args.slack_ms / 1000.0:
+            slower.append("%s starts in %.1fms, it was %.1fms" % (name, 1000 * report['total'], 1000 * baseline[name]))
+
+    if args.save:
+        with open(args.save, 'w') as fh:
+            json.dump(results, fh, indent=4, sort_keys=True)
+
+    for line in slower:
+        print(line)
+
+    sys.exit(1 if slower else 0)
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+
+"""
+Measure how quickly El3ctricGuitar's pitch follows the hand over its IR
+sensor, with a beep per note as it used to play and with ToneSynth, on a
+fake sysfs tree. No EV3 or sound card needed.
+
+A player thread moves the hand to another note every --interval seconds,
+give or take half of it. "tones" is play_tones(), Sound.tone() starting
+sleep for as long as the note instead of beep. "synth" is play_music()
+with the synthesizer writing to a pipe, or with --wav to a WAV file that
+can be listened to afterwards.
+
+    $ ./bench_synth.py --seconds 10
+    $ ./bench_synth.py --busy --wav guitar.wav
+
+For each we report how many times per second the pitch could change,
+how long after the hand moved the new note was heard, the silent gaps
+between notes and the synthesizer's underruns. A beep is heard from when
+it starts, beep's own startup is not in the numbers. --busy adds a thread
+that keeps the CPU busy, the way the rest of a robot program would.
+"""
+
+import argparse
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+
+from clipcache import FileSink, WavSink
+from deviceregistry import registry
+from fakesys import FakeSys
+from synth import ToneSynth
+from threadloop import clock
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'EL3CTRIC_GUITAR'))
+
+
+class Player(threading.Thread):
+    """
+    Moves the hand to a different note every interval seconds or so,
+    moves are (time, note)
+    """
+
+    def __init__(self, fake, notes, seconds, interval, rand):
+        threading.Thread.__init__(self, daemon=True)
+        self.fake = fake
+        self.notes = notes
+        self.seconds = seconds
+        self.interval = interval
+        self.rand = rand
+        self.moves = []
+
+    def run(self):
+        end = clock() + self.seconds
+        note = 0
+
+        while clock() < end:
+            note = self.rand.choice([n for n in range(self.notes) if n != note])
+            self.fake.set('ev3-ports:in4', 'value0', 5 * note)
+            self.moves.append((clock(), note))
+            time.sleep(self.rand.uniform(0.5 * self.interval, 1.5 * self.interval))
+
+
+def busy_loop(stop):
+    while not stop.is_set():
+        sum(range(1000))
+
+
+def drain(fd):
+    while os.read(fd, 65536):
+        pass
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def first_after(t, times):
+    """
+    The first of times at or after t, None if there is none
+    """
+    later = [when for when in times if when >= t]
+    return min(later) if later else None
+
+
+def run_tones(guitar, player, seconds):
+    """
+    Returns (notes, latencies, gaps, underruns)
+    """
+    from ev3dev2.sound import Sound
+    tone = Sound.tone
+    played = []
+
+    def sleeping_tone(speaker, frequency, duration, play_type=Sound.PLAY_WAIT_FOR_COMPLETE):
+        started = clock()
+        subprocess.call(['sleep', '%.3f' % (duration / 1000.0)])
+        played.append((started, clock()))
+
+    Sound.tone = sleeping_tone
+
+    try:
+        player.start()
+        end = clock() + seconds
+
+        while clock() < end:
+            guitar.play_tones()
+    finally:
+        Sound.tone = tone
+
+    starts = [started for (started, ended) in played]
+    latencies = [first_after(moved, starts) - moved for (moved, note) in player.moves
+                 if first_after(moved, starts) is not None]
+    gaps = [played[i + 1][0] - played[i][1] for i in range(len(played) - 1)]
+    return (len(played), latencies, gaps, 0)
+
+
+def run_synth(guitar, player, seconds, wav):
+    if wav:
+        sink = WavSink(wav)
+    else:
+        (read_fd, write_fd) = os.pipe()
+        threading.Thread(target=drain, args=(read_fd,), daemon=True).start()
+        sink = FileSink(write_fd)
+
+    guitar.synth = ToneSynth(sink)
+    guitar.synth.start()
+    passes = 0
+
+    try:
+        player.start()
+        end = clock() + seconds
+
+        while clock() < end:
+            guitar.play_music()
+            passes += 1
+    finally:
+        guitar.synth.close()
+
+    called = [called for (called, heard) in guitar.synth.changes]
+    latencies = []
+
+    for (moved, note) in player.moves:
+        when = first_after(moved, called)
+
+        if when is not None:
+            latencies.append(guitar.synth.changes[called.index(when)][1] - moved)
+
+    return (passes, latencies, [], guitar.synth.late)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Measure how quickly El3ctricGuitar's pitch follows the hand")
+    parser.add_argument('--seconds', type=float, default=10.0)
+    parser.add_argument('--interval', type=float, default=0.3, help='seconds between notes')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--busy', action='store_true', help='run a CPU hungry thread alongside')
+    parser.add_argument('--wav', help='write what the synthesizer played to this WAV file')
+    args = parser.parse_args()
+
+    fake = FakeSys()
+    stop_busy = threading.Event()
+
+    try:
+        fake.add_motor('ev3-ports:outD', 'lego-ev3-m-motor')
+        fake.add_sensor('ev3-ports:in1', 'lego-ev3-touch')
+        fake.add_sensor('ev3-ports:in4', 'lego-ev3-ir', 'IR-PROX')
+        fake.install()
+
+        from el3ctric_guitar import El3ctricGuitar
+
+        if args.busy:
+            threading.Thread(target=busy_loop, args=(stop_busy,), daemon=True).start()
+
+        print("%6s %9s %9s %9s %9s %9s %9s" % ('', 'updates/s', 'p50 ms', 'p95 ms', 'max ms', 'gaps ms', 'underruns'))
+
+        for variant in ('tones', 'synth'):
+            registry.clear()
+            guitar = El3ctricGuitar()
+            player = Player(fake, guitar.N_NOTES, args.seconds, args.interval, random.Random(args.seed))
+
+            if variant == 'tones':
+                (updates, latencies, gaps, underruns) = run_tones(guitar, player, args.seconds)
+            else:
+                (updates, latencies, gaps, underruns) = run_synth(guitar, player, args.seconds, args.wav)
+
+            player.join()
+            print("%6s %9.1f %9.1f %9.1f %9.1f %9s %9d" % (
+                variant, updates / args.seconds, 1000 * percentile(latencies, 0.5), 1000 * percentile(latencies, 0.95),
+                1000 * max(latencies), '%.1f' % (1000 * percentile(gaps, 0.5)) if gaps else '-', underruns))
+    finally:
+        stop_busy.set()
+        fake.cleanup()
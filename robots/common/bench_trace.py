@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+
+"""
+Measure what TraceRecorder adds to each pass of the Dinor3x, Spik3r and
+El3ctricGuitar main loops on a fake sysfs tree, no EV3 needed.
+
+For each robot we time --passes passes of its real decision functions
+without a trace, with its TraceRecorder sampling every pass and with a
+print() of the same values every pass, the way you would debug it
+otherwise, into a file. No buttons are pressed, so the robots never move
+and the passes are all sensor reads.
+
+"sample" is TraceRecorder.sample() on its own, p50 and p99. "growth" is
+how much more memory Python holds after --passes more samples, once the
+ring buffer is full. "flush" writes the full ring buffer to a file.
+
+    $ ./bench_trace.py --passes 5000
+    $ taskset -c 0 ./bench_trace.py
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from deviceregistry import registry
+from fakesys import FakeSys
+
+ROBOTS = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def dinor3x(fake, path):
+    fake.add_motor('ev3-ports:outA', 'lego-ev3-m-motor')
+    fake.add_motor('ev3-ports:outB')
+    fake.add_motor('ev3-ports:outC')
+    fake.add_sensor('ev3-ports:in1', 'lego-ev3-touch')
+    fake.add_sensor('ev3-ports:in3', 'lego-ev3-color', 'COL-COLOR')
+    fake.add_sensor('ev3-ports:in4', 'lego-ev3-ir', 'IR-REMOTE')
+    fake.install()
+
+    sys.path.append(os.path.join(ROBOTS, 'DINOR3X'))
+    from dinor3x import Dinor3x
+    robot = Dinor3x(trace_file=path)
+
+    def decide():
+        robot.sensors.tick()
+        robot.roar_by_ir_beacon()
+        robot.change_speed_by_color()
+        robot.walk_by_ir_beacon()
+
+    def debug_print(fh):
+        print(robot.touch_sensor.is_pressed, robot.color_sensor.color, robot.ir_sensor.value(0),
+              robot.jaw_motor.position, robot.left_motor.position, robot.left_motor.speed,
+              robot.right_motor.position, robot.right_motor.speed, file=fh)
+
+    return (robot, decide, debug_print)
+
+
+def spik3r(fake, path):
+    fake.add_motor('ev3-ports:outA', 'lego-ev3-m-motor')
+    fake.add_motor('ev3-ports:outB')
+    fake.add_motor('ev3-ports:outD')
+    fake.add_sensor('ev3-ports:in1', 'lego-ev3-touch')
+    fake.add_sensor('ev3-ports:in4', 'lego-ev3-ir', 'IR-REMOTE')
+    fake.install()
+
+    sys.path.append(os.path.join(ROBOTS, 'SPIK3R'))
+    from spik3r import Spik3r
+    robot = Spik3r(trace_file=path)
+
+    def decide():
+        robot.snap_claw_if_touched()
+        robot.move_by_ir_beacon()
+        robot.sting_by_ir_beacon()
+
+    def debug_print(fh):
+        print(robot.touch_sensor.is_pressed, robot.ir_sensor.value(0), robot.claw_motor.position,
+              robot.move_motor.position, robot.move_motor.speed, robot.sting_motor.position, file=fh)
+
+    return (robot, decide, debug_print)
+
+
+def el3ctric_guitar(fake, path):
+    fake.add_motor('ev3-ports:outD', 'lego-ev3-m-motor')
+    fake.add_sensor('ev3-ports:in1', 'lego-ev3-touch')
+    fake.add_sensor('ev3-ports:in4', 'lego-ev3-ir', 'IR-PROX')
+    fake.install()
+
+    # It plays a note whenever the touch sensor is let go
+    fake.set('ev3-ports:in1', 'value0', 1)
+
+    sys.path.append(os.path.join(ROBOTS, 'EL3CTRIC_GUITAR'))
+    from el3ctric_guitar import El3ctricGuitar
+    robot = El3ctricGuitar(trace_file=path)
+
+    def decide():
+        robot.play_music()
+
+    def debug_print(fh):
+        print(robot.touch_sensor.is_pressed, robot.ir_sensor.proximity, robot.lever_motor.position, file=fh)
+
+    return (robot, decide, debug_print)
+
+
+def time_passes(passes, function):
+    """
+    Returns microseconds per pass
+    """
+    start = time.perf_counter()
+
+    for i in range(passes):
+        function()
+
+    return 1000000 * (time.perf_counter() - start) / passes
+
+
+def run(make_robot, passes, directory):
+    path = os.path.join(directory, make_robot.__name__ + '.trace')
+    fake = FakeSys()
+
+    try:
+        measure(make_robot, fake, path, passes, directory)
+    finally:
+        fake.cleanup()
+
+        # The next robot's devices are on another fake tree
+        registry.clear()
+
+
+def measure(make_robot, fake, path, passes, directory):
+    (robot, decide, debug_print) = make_robot(fake, path)
+    trace = robot.trace
+
+    def traced():
+        trace.sample()
+        decide()
+
+    with open(os.path.join(directory, 'print.log'), 'w') as fh:
+
+        def printed():
+            debug_print(fh)
+            decide()
+
+        # Warm up, and fill the ring buffer
+        for i in range(trace.capacity):
+            traced()
+
+        plain = time_passes(passes, decide)
+        with_trace = time_passes(passes, traced)
+        with_print = time_passes(passes, printed)
+
+    samples = []
+
+    for i in range(passes):
+        start = time.perf_counter()
+        trace.sample()
+        samples.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+
+    for i in range(passes):
+        trace.sample()
+
+    growth = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+
+    start = time.perf_counter()
+    trace.flush()
+    flush = time.perf_counter() - start
+    size = os.path.getsize(path)
+    print("%16s %8d %9.1f %9.1f %9.1f %9.1f %9.1f %7d %8.1f %9d" % (
+        make_robot.__name__, len(trace.names), plain, with_trace, 1000000 * percentile(samples, 0.5),
+        1000000 * percentile(samples, 0.99), with_print, growth, 1000 * flush, size))
+    trace.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Measure the per pass cost of the robot trace recorder')
+    parser.add_argument('--passes', type=int, default=5000)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix='bench-trace-')
+
+    try:
+        print("%16s %8s %9s %9s %9s %9s %9s %7s %8s %9s" % (
+            'robot', 'channels', 'pass (us)', '+trace', 'sample', 'p99', '+print', 'growth', 'flush ms', 'bytes'))
+
+        for make_robot in (dinor3x, spik3r, el3ctric_guitar):
+            run(make_robot, args.passes, directory)
+    finally:
+        for name in os.listdir(directory):
+            os.remove(os.path.join(directory, name))
+
+        os.rmdir(directory)
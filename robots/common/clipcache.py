@@ -0,0 +1,478 @@
+#!/usr/bin/env python3
+
+"""
+Play short sound clips the moment a robot wants them, from memory, through
+one audio player that stays open.
+
+Sound.play_file() sets the volume with amixer and starts a new aplay for
+every call, which then reads the WAV from the SD card, so a roar or a hiss
+is heard a good while after the motion it goes with has started. ClipCache
+reads and decodes each WAV once, at startup, and a mixer thread feeds the
+samples of whatever is playing to a single aplay reading raw samples from
+its stdin:
+
+    clips = ClipCache()
+    clips.load('T-rex roar.wav')
+    clips.start()                       # starts aplay and the mixer
+
+    voice = clips.play('T-rex roar.wav')
+    voice.stop()                        # or voice.wait()
+
+    clips.play('T-rex roar.wav', block=True)
+
+Unless block, play() never blocks, it wakes the mixer, which writes the clip's first
+period to aplay straight away. Clips that overlap are mixed, voice.stop()
+and stop_all() cut them off at the next period. The mixer writes silence
+while nothing plays, so aplay never runs dry, and keeps about lead seconds
+of sound queued in it, which is how late a clip is heard after play().
+
+Every clip is converted to 16 bit mono samples at the cache's rate, the
+rate of the first clip loaded unless one is given. Only uncompressed 8 or
+16 bit WAVs are read. Where there is no aplay, play() falls back to
+Sound.play_file(). Under micropython, which has no subprocess module to
+start aplay with, it always does and load() does not read the WAVs at
+all. play_file() gives no process to wait for there, so a Voice played
+without block is done straight away: play with block to wait for the clip.
+"""
+
+import _thread
+import logging
+import os
+import struct
+import sys
+import time
+from array import array
+
+from threadloop import ThreadLoop, clock
+
+log = logging.getLogger(__name__)
+
+
+def read_wav(path):
+    """
+    Returns (rate, samples) of an uncompressed WAV, the samples an
+    array('h') of 16 bit mono samples
+    """
+    with open(path, 'rb') as fh:
+        data = fh.read()
+
+    if data[0:4] != b'RIFF' or data[8:12] != b'WAVE':
+        raise ValueError("%s is not a WAV file" % path)
+
+    offset = 12
+    fmt = None
+    frames = None
+
+    while offset + 8 <= len(data):
+        (chunk, size) = struct.unpack('<4sI', data[offset:offset + 8])
+        body = data[offset + 8:offset + 8 + size]
+
+        if chunk == b'fmt ':
+            fmt = struct.unpack('<HHIIHH', body[0:16])
+        elif chunk == b'data':
+            frames = body
+
+        offset += 8 + size + (size & 1)
+
+    if fmt is None or frames is None:
+        raise ValueError("%s has no fmt or no data chunk" % path)
+
+    (encoding, channels, rate, byte_rate, block_align, bits) = fmt
+
+    if encoding != 1 or bits not in (8, 16):
+        raise ValueError("%s is not 8 or 16 bit PCM" % path)
+
+    if bits == 16:
+        samples = array('h', frames[:len(frames) - len(frames) % 2])
+    else:
+        samples = array('h', ((byte - 128) << 8 for byte in frames))
+
+    if channels > 1:
+        samples = array('h', (sum(samples[i:i + channels]) // channels
+                              for i in range(0, len(samples) - channels + 1, channels)))
+
+    return (rate, samples)
+
+
+def resample(samples, rate, to_rate):
+    """
+    The nearest sample at to_rate, good enough for sound effects
+    """
+    if rate == to_rate:
+        return samples
+
+    count = len(samples) * to_rate // rate
+    return array('h', (samples[i * rate // to_rate] for i in range(count)))
+
+
+class Clip(object):
+
+    def __init__(self, name, path, samples):
+        self.name = name
+        self.path = path
+        self.samples = samples
+
+    def __len__(self):
+        return len(self.samples)
+
+
+class Voice(object):
+    """
+    One play() of a clip. started is when its first samples went to the
+    sink and queued how many seconds of sound were ahead of them there, so
+    it is heard about started + queued.
+    """
+
+    def __init__(self, clip, volume, process=None):
+        self.clip = clip
+        self.volume = volume
+        self.position = 0
+        self.stopped = False
+        self.triggered = clock()
+        self.started = None
+        self.queued = None
+        self.process = process
+
+    @property
+    def done(self):
+        if self.process is not None:
+            return self.process.poll() is not None
+        return self.stopped or self.position >= len(self.clip)
+
+    def stop(self):
+        self.stopped = True
+
+        if self.process is not None and self.process.poll() is None:
+            self.process.terminate()
+
+    def wait(self, timeout=None, interval=0.01):
+        """
+        Returns True once the clip has played or been stopped, False if it
+        was still playing after timeout seconds
+        """
+        end = None if timeout is None else clock() + timeout
+
+        while not self.done:
+            if end is not None and clock() >= end:
+                return False
+            time.sleep(interval)
+
+        return True
+
+    def take(self, frames):
+        """
+        The next frames samples as bytes, fewer at the end of the clip
+        """
+        start = self.position
+        self.position = min(start + frames, len(self.clip))
+        return bytes(memoryview(self.clip.samples)[start:self.position])
+
+
+class AplaySink(object):
+    """
+    One aplay playing raw samples from its stdin, buffer seconds of them
+    at most in the sound card
+    """
+
+    def __init__(self, command='/usr/bin/aplay', buffer=0.05):
+        self.command = command
+        self.buffer = buffer
+        self.process = None
+
+    def open(self, rate):
+        import subprocess
+
+        if not os.path.exists(self.command):
+            raise OSError("%s does not exist" % self.command)
+
+        self.process = subprocess.Popen(
+            [self.command, '-q', '-t', 'raw', '-f', 'S16_LE', '-c', '1', '-r', str(rate),
+             '--buffer-time=%d' % (1000000 * self.buffer)],
+            stdin=subprocess.PIPE)
+
+    def write(self, data):
+        self.process.stdin.write(data)
+        self.process.stdin.flush()
+
+    def close(self):
+        if self.process is not None:
+            self.process.stdin.close()
+            self.process.wait()
+            self.process = None
+
+
+class FileSink(object):
+    """
+    Raw samples to a file descriptor, a pipe that stands in for the sound
+    card in bench_clips.py for example
+    """
+
+    def __init__(self, fd):
+        self.fd = fd
+
+    def open(self, rate):
+        pass
+
+    def write(self, data):
+        while data:
+            data = data[os.write(self.fd, data):]
+
+    def close(self):
+        os.close(self.fd)
+
+
+class WavSink(object):
+    """
+    Writes the samples to a WAV file instead of playing them, on a machine
+    without a sound card for example
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.fh = None
+        self.rate = None
+        self.size = 0
+
+    def open(self, rate):
+        self.fh = open(self.path, 'wb')
+        self.rate = rate
+        self.size = 0
+        self.fh.write(self.header())
+
+    def header(self):
+        return struct.pack('<4sI4s4sIHHIIHH4sI', b'RIFF', 36 + self.size, b'WAVE', b'fmt ', 16,
+                           1, 1, self.rate, 2 * self.rate, 2, 16, b'data', self.size)
+
+    def write(self, data):
+        self.fh.write(data)
+        self.size += len(data)
+
+    def close(self):
+        self.fh.seek(0)
+        self.fh.write(self.header())
+        self.fh.close()
+
+
+class AudioStream(ThreadLoop):
+    """
+    A thread that writes period after period of samples, from
+    next_period(), to a sink. It keeps about lead seconds of sound queued
+    in the sink, ahead of what is being heard, and wake() has it write the
+    next period straight away.
+
+    periods counts the periods written, late those written after the sink
+    had run dry, an underrun
+    """
+
+    def __init__(self, sink, rate, period, lead):
+        ThreadLoop.__init__(self)
+        self.sink = sink if sink is not None else AplaySink()
+        self.rate = rate
+        self.period = period
+        self.lead = lead
+        self.periods = 0
+        self.late = 0
+
+    def start(self):
+        """
+        Open the sink and start the thread. Raises ImportError or OSError
+        if the sink cannot be opened.
+        """
+        if self.running:
+            return
+
+        self.sink.open(self.rate)
+        ThreadLoop.start(self)
+
+    def close(self):
+        """
+        Stop the thread and close the sink
+        """
+        if self.stopped is None:
+            return
+
+        ThreadLoop.close(self)
+        self.sink.close()
+
+    def next_period(self, frames, now, queued):
+        """
+        The next frames samples as bytes, written at now behind queued
+        seconds of sound
+        """
+        raise NotImplementedError()
+
+    def loop(self):
+        frames = int(self.rate * self.period)
+        seconds = float(frames) / self.rate
+        began = clock()
+        written = 0.0
+
+        while self.running:
+            now = clock()
+
+            # written is how much sound the sink has been given, the part
+            # ahead of now is still queued in it
+            if began + written < now:
+                if written:
+                    self.late += 1
+                began = now - written
+
+            self.sink.write(self.next_period(frames, now, began + written - now))
+            self.periods += 1
+            written += seconds
+
+            # Until wake() or only lead is left queued. The sink needs
+            # subprocess, so this is never micropython and can wait on
+            # the lock rather than in ThreadLoop.sleep()'s steps
+            delay = began + written - self.lead - clock()
+
+            if delay > 0:
+                self.awake.acquire(True, delay)
+
+
+class ClipCache(AudioStream):
+    """
+    mixed counts the periods that had more than one voice or a voice not
+    at full volume
+    """
+
+    def __init__(self, sink=None, rate=None, period=0.02, lead=0.05):
+        AudioStream.__init__(self, sink, rate, period, lead)
+        self.clips = {}
+        self.voices = []
+        self.lock = _thread.allocate_lock()
+        self.mixed = 0
+
+        # micropython cannot start aplay, every clip is played with
+        # Sound.play_file() and never decoded
+        self.fallback = sink is None and sys.implementation.name == 'micropython'
+
+    def load(self, path, name=None):
+        """
+        Read and decode path, played as name, its file name by default.
+        Only its path is kept if it can only be played with play_file().
+        """
+        if self.fallback:
+            return self.add(Clip(name or os.path.basename(path), path, array('h')))
+
+        (rate, samples) = read_wav(path)
+
+        if self.rate is None:
+            self.rate = rate
+
+        return self.add(Clip(name or os.path.basename(path), path, resample(samples, rate, self.rate)))
+
+    def add(self, clip):
+        """
+        Play clip, already at the cache's rate, as clip.name
+        """
+        self.clips[clip.name] = clip
+        return clip
+
+    def start(self):
+        """
+        Start the sink and the mixer, play() does if they have not been
+        """
+        if self.running or self.fallback:
+            return
+
+        try:
+            AudioStream.start(self)
+        except (ImportError, OSError) as e:
+            log.warning("cannot start the sound sink (%s), playing with Sound.play_file" % e)
+            self.fallback = True
+
+    def close(self):
+        """
+        Stop everything and the sink
+        """
+        self.stop_all()
+        AudioStream.close(self)
+
+    def play(self, name, volume=100, block=False):
+        """
+        Start playing the clip called name and return its Voice, waiting
+        for it to end if block
+        """
+        clip = self.clips[name]
+
+        if not self.running:
+            self.start()
+
+        if self.fallback:
+            return self.play_file(clip, volume, block)
+
+        voice = Voice(clip, volume)
+
+        with self.lock:
+            self.voices.append(voice)
+
+        self.wake()
+
+        if block:
+            voice.wait()
+
+        return voice
+
+    def play_file(self, clip, volume, block=False):
+        if clip.path is None:
+            log.warning("%s was not loaded from a file, it cannot be played without the sink" % clip.name)
+            voice = Voice(clip, volume)
+            voice.stop()
+            return voice
+
+        from ev3dev2.sound import Sound
+        play_type = Sound.PLAY_WAIT_FOR_COMPLETE if block else Sound.PLAY_NO_WAIT_FOR_COMPLETE
+        process = Sound().play_file(clip.path, volume=volume, play_type=play_type)
+        voice = Voice(clip, volume, process)
+
+        # Played already, or under micropython with no process to tell
+        if process is None:
+            voice.position = len(clip)
+
+        return voice
+
+    def stop_all(self):
+        with self.lock:
+            voices = self.voices
+            self.voices = []
+
+        for voice in voices:
+            voice.stop()
+
+    # The mixer thread
+
+    def next_period(self, frames, now, queued):
+        with self.lock:
+            self.voices = [voice for voice in self.voices if not voice.done]
+            voices = list(self.voices)
+
+        for voice in voices:
+            if voice.position == 0:
+                voice.started = now
+                voice.queued = queued
+
+        if not voices:
+            return bytes(2 * frames)
+
+        # One clip at full volume, which is most of the time, is copied as it is
+        if len(voices) == 1 and voices[0].volume == 100:
+            data = voices[0].take(frames)
+            return data + bytes(2 * frames - len(data))
+
+        self.mixed += 1
+        mix = [0] * frames
+
+        for voice in voices:
+            start = voice.position
+            voice.position = min(start + frames, len(voice.clip))
+            samples = voice.clip.samples
+
+            if voice.volume == 100:
+                for i in range(voice.position - start):
+                    mix[i] += samples[start + i]
+            else:
+                for i in range(voice.position - start):
+                    mix[i] += samples[start + i] * voice.volume // 100
+
+        return bytes(array('h', (max(-32768, min(32767, sample)) for sample in mix)))
@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+
+"""
+Create each robot device the first time it is used, once per port, and
+share it between everything that drives that port.
+
+Constructing an ev3dev2 device is not free: it lists its /sys/class
+directory and reads the address of every device in it until one matches,
+a motor also reads its max_speed and count_per_rot, and a MoveTank or
+MoveSteering makes two more motors of its own and resets them. A robot
+that builds everything in __init__, including drive helpers it may never
+use, pays for all of it before it can react to anything.
+
+DeviceRegistry hands out LazyDevice stand-ins instead. Nothing is read
+until an attribute of the device is first used, and asking for the same
+port twice returns the same device:
+
+    from deviceregistry import registry
+
+    self.jaw_motor = registry.get(MediumMotor, OUTPUT_A)
+    self.color_sensor = registry.get(ColorSensor, INPUT_3, mode=ColorSensor.MODE_COL_COLOR)
+    self.tank_driver = registry.lazy(MoveTank, OUTPUT_B, OUTPUT_C, motor_class=LargeMotor)
+
+The keyword arguments of get() are attributes set on the device when it
+is created, so the mode write also waits for the first use.
+
+A MoveTank or MoveSteering given motor_class=registry.shared(LargeMotor)
+drives the registry's motors instead of making its own, so left_motor,
+the tank and the steering all use the same LargeMotor objects and the
+same open sysfs files. usage() counts what the process has open, None
+for the numbers it needs /proc for.
+"""
+
+import _thread
+import os
+
+
+class LazyDevice(object):
+    """
+    Stands in for the device factory(*args, **kwargs) returns, which is
+    made on first use. Reading any attribute that is not one of
+    LazyDevice's own, or calling a method, goes to the device. Setting one
+    does not: set it on device(), or pass it to DeviceRegistry.get().
+    """
+
+    def __init__(self, registry, name, factory, args=(), kwargs=None, settings=None):
+        self._registry = registry
+        self._name = name
+        self._factory = factory
+        self._args = args
+        self._kwargs = kwargs or {}
+        self._settings = settings or {}
+        self._target = None
+        self._lock = _thread.allocate_lock()
+
+    @property
+    def created(self):
+        return self._target is not None
+
+    def device(self):
+        """
+        Returns the device, making it first if it has not been used yet
+        """
+        target = self._target
+
+        if target is None:
+            target = self._registry.create(self)
+
+        return target
+
+    def __getattr__(self, name):
+        return getattr(self.device(), name)
+
+    def __str__(self):
+        return str(self.device())
+
+    def __repr__(self):
+        if self._target is None:
+            return '<LazyDevice %s>' % self._name
+        return repr(self._target)
+
+
+class DeviceRegistry(object):
+
+    def __init__(self):
+        self.devices = {}
+
+    def get(self, device_class, address, **settings):
+        """
+        The device_class device on address, the same one every time.
+        settings are set on it, in no particular order, when it is made.
+        """
+        lazy = self.devices.get(address)
+
+        if lazy is None:
+            lazy = LazyDevice(self, '%s(%s)' % (device_class.__name__, address), device_class,
+                              kwargs={'address': address}, settings=settings)
+            self.devices[address] = lazy
+
+        elif lazy._factory is not device_class:
+            raise ValueError("%s is already a %s, not a %s" % (address, lazy._factory.__name__, device_class.__name__))
+
+        elif settings:
+            # Another user of the port wants the same mode, or a different
+            # one for whatever it does next
+            if lazy.created:
+                for (name, value) in settings.items():
+                    setattr(lazy._target, name, value)
+            else:
+                lazy._settings.update(settings)
+
+        return lazy
+
+    def lazy(self, factory, *args, **kwargs):
+        """
+        Anything else that talks to the hardware when it is made, a
+        MoveTank, Sound or Leds, made on first use. It is not shared.
+        """
+        return LazyDevice(self, factory.__name__, factory, args, kwargs)
+
+    def shared(self, device_class):
+        """
+        A motor_class for MoveTank, MoveSteering and the other MotorSets
+        that hands them the registry's device_class motors
+        """
+
+        def make(address):
+            return self.get(device_class, address).device()
+
+        return make
+
+    def adopt(self, address, device):
+        """
+        Share a device something else has already made, the motors of a
+        library class that cannot be given a motor_class for example
+        """
+        lazy = self.get(type(device), address)
+
+        if lazy._target is None:
+            lazy._target = device
+
+        elif lazy._target is not device:
+            raise ValueError("%s is already shared, as another %s" % (address, type(device).__name__))
+
+        return lazy
+
+    def usage(self):
+        """
+        Returns a dict of how many devices the registry has made, how many
+        sysfs attribute files the process has open and its resident memory
+        in kB, None for those it cannot tell without /proc
+        """
+        return {
+            'devices': sum(1 for lazy in self.devices.values() if lazy.created),
+            'sysfs_files': sysfs_files(),
+            'rss_kb': resident_kb(),
+        }
+
+    def create(self, lazy):
+        # One lock per device, making a MoveTank makes its motors
+        with lazy._lock:
+            if lazy._target is None:
+                target = lazy._factory(*lazy._args, **lazy._kwargs)
+
+                for (name, value) in lazy._settings.items():
+                    setattr(target, name, value)
+
+                lazy._target = target
+
+        return lazy._target
+
+    def clear(self):
+        """
+        Forget every device, the next get() makes a new one
+        """
+        self.devices = {}
+
+
+def sysfs_files():
+    """
+    How many files under the ev3dev2 sysfs root the process has open
+    """
+    from ev3dev2 import Device
+
+    try:
+        fds = os.listdir('/proc/self/fd')
+    except OSError:
+        return None
+
+    # The devices in /sys/class are links into /sys/devices
+    root = Device.DEVICE_ROOT_PATH
+    root = '/sys/' if root == '/sys/class' else os.path.realpath(root) + '/'
+    count = 0
+
+    for fd in fds:
+        try:
+            if os.readlink('/proc/self/fd/' + fd).startswith(root):
+                count += 1
+        except OSError:
+            pass
+
+    return count
+
+
+def resident_kb():
+    try:
+        with open('/proc/self/status') as fh:
+            for line in fh:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+
+    return None
+
+
+registry = DeviceRegistry()
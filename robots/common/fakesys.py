@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+
+"""
+A fake /sys/class tree so the ev3dev2 device classes can be used on a PC.
+
+The benchmarks use this to run the real robot classes against plain files.
+Only the attributes the demos touch are created, with the values an EV3
+reports for them. Values written by ev3dev2 are not padded like the ones
+set() writes, so only read back attributes the test itself sets.
+
+    fake = FakeSys()
+    fake.add_motor('ev3-ports:outA', 'lego-ev3-m-motor')
+    fake.add_sensor('ev3-ports:in3', 'lego-ev3-color', 'COL-COLOR')
+    fake.install()
+    ...
+    fake.set('ev3-ports:in3', 'value0', 5)
+    ...
+    fake.cleanup()
+
+On a PC ev3dev2 finds no LEDs, its platform has none, so add_ev3_leds()
+makes the brick's four and ev3_leds() a Leds for them.
+"""
+
+import os
+import shutil
+import tempfile
+from collections import OrderedDict
+
+MOTOR_MAX_SPEED = {
+    'lego-ev3-l-motor': 1050,
+    'lego-ev3-m-motor': 1560,
+}
+
+SENSOR_MODES = {
+    'lego-ev3-color': ('COL-REFLECT', 'COL-AMBIENT', 'COL-COLOR', 'REF-RAW', 'RGB-RAW', 'COL-CAL'),
+    'lego-ev3-ir': ('IR-PROX', 'IR-SEEK', 'IR-REMOTE', 'IR-REM-A', 'IR-S-ALT', 'IR-CAL'),
+    'lego-ev3-touch': ('TOUCH',),
+    'lego-ev3-gyro': ('GYRO-ANG', 'GYRO-RATE', 'GYRO-FAS', 'GYRO-G&A', 'GYRO-CAL'),
+    'lego-ev3-us': ('US-DIST-CM', 'US-DIST-IN', 'US-LISTEN', 'US-SI-CM', 'US-SI-IN'),
+}
+
+
+class FakeSys(object):
+
+    def __init__(self, root=None):
+        self.root = root if root is not None else tempfile.mkdtemp(prefix='fake-sys-')
+        self.paths = {}
+        self.previous_root = None
+
+    def write(self, path, name, value):
+        # Padded to a fixed length so a reader never sees a half written file
+        filename = os.path.join(path, name)
+        fd = os.open(filename, os.O_WRONLY | os.O_CREAT)
+        os.pwrite(fd, ('%-15s\n' % value).encode(), 0)
+        os.close(fd)
+
+        # ev3dev2 opens attributes read/write based on the group bits
+        os.chmod(filename, 0o664)
+
+    def add_device(self, class_name, prefix, address, attributes, name=None):
+        class_path = os.path.join(self.root, class_name)
+        index = len(os.listdir(class_path)) if os.path.isdir(class_path) else 0
+        path = os.path.join(class_path, name or '%s%d' % (prefix, index))
+        os.makedirs(path)
+
+        for (name, value) in attributes.items():
+            self.write(path, name, value)
+
+        self.paths[address] = path
+        return path
+
+    def add_motor(self, address, driver_name='lego-ev3-l-motor'):
+        return self.add_device('tacho-motor', 'motor', address, {
+            'address': address,
+            'driver_name': driver_name,
+            'commands': 'run-forever run-to-abs-pos run-to-rel-pos run-timed run-direct stop reset',
+            'stop_actions': 'coast brake hold',
+            'count_per_rot': 360,
+            'max_speed': MOTOR_MAX_SPEED.get(driver_name, 1050),
+            'command': '',
+            'state': '',
+            'position': 0,
+            'position_sp': 0,
+            'speed': 0,
+            'speed_sp': 0,
+            'duty_cycle_sp': 0,
+            'time_sp': 0,
+            'ramp_up_sp': 0,
+            'ramp_down_sp': 0,
+            'polarity': 'normal',
+            'stop_action': 'coast',
+        })
+
+    def add_sensor(self, address, driver_name, mode=None):
+        modes = SENSOR_MODES.get(driver_name, ('VALUE',))
+        attributes = {
+            'address': address,
+            'driver_name': driver_name,
+            'modes': ' '.join(modes),
+            'mode': mode if mode is not None else modes[0],
+            'num_values': 4,
+            'decimals': 0,
+            'units': '',
+        }
+
+        for n in range(8):
+            attributes['value%d' % n] = 0
+
+        return self.add_device('lego-sensor', 'sensor', address, attributes)
+
+    def add_power_supply(self, address='lego-ev3-battery', voltage=7500000):
+        return self.add_device('power_supply', 'lego-ev3-battery', address, {
+            'address': address,
+            'type': 'Battery',
+            'technology': 'Li-ion',
+            'voltage_now': voltage,
+            'current_now': 180000,
+            'voltage_max_design': 8400000,
+            'voltage_min_design': 6000000,
+        })
+
+    def add_led(self, name, max_brightness=255):
+        return self.add_device('leds', 'led', name, {
+            'brightness': 0,
+            'max_brightness': max_brightness,
+            'trigger': '[none] timer heartbeat default-on',
+        }, name=name)
+
+    def add_ev3_leds(self):
+        from ev3dev2._platform.ev3 import LEDS
+
+        for name in LEDS.values():
+            self.add_led(name)
+
+    def ev3_leds(self):
+        """
+        A Leds with the brick's LEDs, groups and colors, after install()
+        """
+        from ev3dev2._platform.ev3 import LEDS, LED_GROUPS, LED_COLORS
+        from ev3dev2.led import Led, Leds
+
+        leds = Leds()
+        leds.leds = OrderedDict((key, Led(name_pattern=name, name_exact=True, desc=key)) for (key, name) in LEDS.items())
+        leds.led_groups = OrderedDict((key, [leds.leds[name] for name in names]) for (key, names) in LED_GROUPS.items())
+        leds.led_colors = LED_COLORS
+        return leds
+
+    def set(self, address, name, value):
+        self.write(self.paths[address], name, value)
+
+    def install(self):
+        """
+        Point the ev3dev2 device classes at this tree
+        """
+        from ev3dev2 import Device
+
+        self.previous_root = Device.DEVICE_ROOT_PATH
+        Device.DEVICE_ROOT_PATH = self.root
+
+    def cleanup(self):
+        if self.previous_root is not None:
+            from ev3dev2 import Device
+            Device.DEVICE_ROOT_PATH = self.previous_root
+            self.previous_root = None
+
+        shutil.rmtree(self.root, ignore_errors=True)
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+
+"""
+Dead-man leases: stop the motors unless whoever is driving keeps saying so.
+
+A web page whose move-stop gets lost, a phone that drops off the WiFi or a
+remote control loop that stalls would otherwise leave the robot driving.
+Whatever starts the motors grants a lease for ttl seconds and renews it
+while it wants them to keep going. Watchdog waits on its own thread, on
+the monotonic clock, for the lease to run out and calls expire(lease) as
+soon as it does, so the motors stop at most ttl plus the time expire()
+takes after the last renewal.
+
+    watchdog = Watchdog(stop_motors)
+    watchdog.grant(0.5)     # started driving
+    watchdog.renew(0.5)     # still driving, ignored once stopped
+    watchdog.release()      # stopped on purpose
+
+expire is called with the number of the lease that ran out. It is called
+without the watchdog's lock held so it may take its own locks, and if it
+compares that number with watchdog.lease once it has them it can tell
+whether the lease was renewed in the meantime. It returns True if it
+stopped the motors.
+
+expired counts the leases that ran out, late_max and late_mean are how
+long after the lease ran out expire() had finished.
+"""
+
+import logging
+import threading
+import time
+from ev3dev2.control.rc_tank import RemoteControlledTank
+
+from deviceregistry import registry
+
+log = logging.getLogger(__name__)
+
+
+class Watchdog(object):
+
+    def __init__(self, expire, name='watchdog'):
+        self.expire = expire
+        self.lock = threading.Lock()
+        self.changed = threading.Condition(self.lock)
+        self.deadline = None
+        self.lease = 0
+        self.closed = False
+        self.expired = 0
+        self.late_max = 0.0
+        self.late_total = 0.0
+        self.thread = threading.Thread(target=self.run, name=name, daemon=True)
+        self.thread.start()
+
+    def __str__(self):
+        return "%d leases expired, stopped %.1fms late on average, %.1fms at worst" % (
+            self.expired, 1000 * self.late_mean, 1000 * self.late_max)
+
+    @property
+    def late_mean(self):
+        return self.late_total / self.expired if self.expired else 0.0
+
+    @property
+    def held(self):
+        return self.deadline is not None
+
+    def extend(self, ttl):
+        # With the lock held. The thread, waiting for the deadline, only
+        # needs waking if the lease now runs out sooner
+        deadline = time.monotonic() + ttl
+        sooner = self.deadline is None or deadline < self.deadline
+        self.lease += 1
+        self.deadline = deadline
+
+        if sooner:
+            self.changed.notify()
+
+    def grant(self, ttl):
+        with self.lock:
+            self.extend(ttl)
+
+    def renew(self, ttl):
+        """
+        Extend the lease, returns False if there is none
+        """
+        with self.lock:
+            if self.deadline is None:
+                return False
+
+            self.extend(ttl)
+            return True
+
+    def release(self):
+        with self.lock:
+            self.lease += 1
+            self.deadline = None
+
+    def close(self):
+        with self.lock:
+            self.closed = True
+            self.deadline = None
+            self.changed.notify()
+
+    def wait_for_expiry(self):
+        """
+        Returns (lease, deadline) once a lease runs out, None once closed
+        """
+        with self.lock:
+            while not self.closed:
+                if self.deadline is None:
+                    self.changed.wait()
+                    continue
+
+                remaining = self.deadline - time.monotonic()
+
+                # A renewal does not wake us, check again at the old deadline
+                if remaining > 0:
+                    self.changed.wait(remaining)
+                    continue
+
+                deadline = self.deadline
+                self.deadline = None
+                return (self.lease, deadline)
+
+        return None
+
+    def run(self):
+        while True:
+            expiry = self.wait_for_expiry()
+
+            if expiry is None:
+                return
+
+            (lease, deadline) = expiry
+
+            try:
+                stopped = self.expire(lease)
+            except Exception as e:
+                log.exception(e)
+                continue
+
+            if stopped:
+                late = time.monotonic() - deadline
+                self.expired += 1
+                self.late_total += late
+                self.late_max = max(self.late_max, late)
+                log.warning("lease %d expired, stopped %.1fms late" % (lease, 1000 * late))
+
+
+class LeasedRemoteControlledTank(RemoteControlledTank):
+    """
+    RemoteControlledTank whose main loop holds a lease, renewed every pass,
+    so if the loop stalls for more than ttl the motors are stopped. A
+    button still held when the loop gets going again has to be pressed
+    again.
+    """
+
+    def __init__(self, left_motor_port, right_motor_port, ttl=0.3, **kwargs):
+        RemoteControlledTank.__init__(self, left_motor_port, right_motor_port, **kwargs)
+
+        # RemoteControlledTank makes its own motors, share them with
+        # anything else that drives these ports
+        for (port, motor) in self.motors.items():
+            registry.adopt(port, motor)
+
+        self.ttl = ttl
+        self.watchdog = Watchdog(self.expire, name='lease')
+
+    def stop_motors(self):
+        self.off()
+
+        if hasattr(self, 'medium_motor'):
+            self.medium_motor.stop()
+
+    def expire(self, lease):
+        if self.watchdog.lease != lease:
+            return False
+
+        self.stop_motors()
+        return True
+
+    def main(self):
+
+        try:
+            while True:
+                self.watchdog.grant(self.ttl)
+                self.remote.process()
+                time.sleep(0.01)
+
+        # Exit cleanly so that all motors are stopped
+        except (KeyboardInterrupt, Exception) as e:
+            log.exception(e)
+            self.watchdog.close()
+            self.stop_motors()
@@ -0,0 +1,344 @@
+#!/usr/bin/env python3
+
+"""
+Animate the brick's LEDs from one background thread, from tables of
+frames worked out before they are played.
+
+Leds.animate_flash() and the other animations either block the caller for
+as long as they last or run in a thread of their own, one at a time, and
+write every LED of a group on every step whether it changed or not. A
+demo like misc/leds.py sets four brightness_pct attributes and sleeps, on
+the main thread, for as long as a fade lasts. LedAnimator plays
+Animations, the brightness of each of their LEDs frame by frame, and
+writes only the LEDs whose brightness is not what it last wrote:
+
+    animator = LedAnimator(Leds())
+    animator.start()
+
+    flashing = animator.play(animator.flash('ORANGE', duration=3))
+    ...                                 # the robot carries on
+    flashing.cancel()                   # or flashing.wait()
+
+play() and cancel() never block. The thread sleeps until the next frame
+of any animation is due, checking every PERIOD for a wake() from play()
+or cancel(), so a new animation starts within PERIOD and the thread
+wakes only that often while nothing plays (see threadloop.py).
+
+Animations played together are layered: each LED shows the most
+recently played animation that drives it, a None in a frame leaves the
+LED to the ones underneath, and when an animation ends the one
+underneath shows again. An LED nothing drives keeps its last brightness.
+
+A frame is due period seconds after the one before it, counted from when
+the animation was played, so a thread that wakes late skips to the frame
+that is due rather than falling behind.
+
+frames counts the frames written, skipped those that were due while the
+thread was late, writes the brightness attributes written and jitter the
+last JITTERS times, in seconds, a frame was written after it was due.
+"""
+
+import _thread
+import logging
+import math
+import time
+
+from threadloop import ThreadLoop, clock
+
+log = logging.getLogger(__name__)
+
+# Keep this many jitter times
+JITTERS = 1000
+
+# Frames of fades, in seconds
+PERIOD = 0.05
+
+
+class Animation(object):
+    """
+    The brightness of the LEDs names (keys of Leds.leds) in each frame, a
+    frame lasting period seconds, played loops times or forever if None.
+    Brightness is in the units of the LED's brightness attribute, or None.
+    """
+
+    def __init__(self, name, names, frames, period, loops=1):
+        self.name = name
+        self.names = tuple(names)
+        self.frames = tuple(tuple(frame) for frame in frames)
+        self.period = period
+        self.loops = loops
+
+        if not self.frames:
+            raise ValueError("%s has no frames" % name)
+
+    @property
+    def seconds(self):
+        """
+        How long the animation lasts, None if it loops forever
+        """
+        if self.loops is None:
+            return None
+
+        return len(self.frames) * self.period * self.loops
+
+    def __str__(self):
+        return self.name
+
+
+def sequence(name, *animations):
+    """
+    One animation playing animations one after the other, once each, all
+    at the shortest of their periods
+    """
+    names = []
+
+    for animation in animations:
+        names.extend(led for led in animation.names if led not in names)
+
+    period = min(animation.period for animation in animations)
+    frames = []
+
+    for animation in animations:
+        if animation.loops is None:
+            raise ValueError("%s loops forever" % animation)
+
+        index = [animation.names.index(led) if led in animation.names else None for led in names]
+        steps = int(round(animation.seconds / period))
+
+        for step in range(steps):
+            frame = animation.frames[int(step * period / animation.period + 1e-6) % len(animation.frames)]
+            frames.append([None if i is None else frame[i] for i in index])
+
+    return Animation(name, names, frames, period)
+
+
+class Playing(object):
+    """
+    An animation played at started, until it ends or is cancelled
+    """
+
+    def __init__(self, animation, started):
+        self.animation = animation
+        self.started = started
+        self.cancelled = False
+        self.shown = None
+        seconds = animation.seconds
+        self.ends = None if seconds is None else started + seconds
+
+    @property
+    def done(self):
+        return self.cancelled or (self.ends is not None and clock() >= self.ends)
+
+    def cancel(self):
+        self.cancelled = True
+
+    def wait(self, timeout=None, interval=0.01):
+        """
+        Returns False if the animation was still playing after timeout seconds
+        """
+        until = None if timeout is None else clock() + timeout
+
+        while not self.done:
+            if until is not None and clock() >= until:
+                return False
+
+            time.sleep(interval)
+
+        return True
+
+    def frame(self, now):
+        """
+        The index of the frame due at now and when it was due
+        """
+        period = self.animation.period
+        index = int((now - self.started) / period + 1e-6)
+        return (index, self.started + index * period)
+
+
+class LedAnimator(ThreadLoop):
+
+    def __init__(self, leds):
+        ThreadLoop.__init__(self)
+        self.leds = leds
+        self.playing = []
+        self.written = {}
+        self.lock = _thread.allocate_lock()
+        self.frames = 0
+        self.skipped = 0
+        self.writes = 0
+        self.jitter = []
+
+    # Making animations
+
+    def brightness(self, group, color, pct=1):
+        """
+        {LED name: brightness} of group showing color, a name in
+        Leds.led_colors or a tuple of fractions
+        """
+        # A platform without LEDs
+        if not self.leds.leds:
+            return {}
+
+        if isinstance(color, str):
+            color = self.leds.led_colors[color]
+
+        return dict((led.desc, int(value * pct * led.max_brightness))
+                    for (led, value) in zip(self.leds.led_groups[group], color))
+
+    def keyframes(self, name, groups, colors, period, loops=1):
+        """
+        An animation showing each of colors on groups for a frame
+        """
+        frames = []
+        names = None
+
+        for color in colors:
+            values = {}
+
+            for group in groups:
+                values.update(self.brightness(group, color))
+
+            if names is None:
+                names = sorted(values)
+
+            frames.append([values[led] for led in names])
+
+        return Animation(name, names or (), frames, period, loops)
+
+    def flash(self, color, groups=('LEFT', 'RIGHT'), sleeptime=0.5, duration=5):
+        """
+        Leds.animate_flash(): color and off every sleeptime seconds, for
+        duration seconds or forever if None
+        """
+        loops = None if duration is None else max(1, int(math.ceil(duration / (2.0 * sleeptime))))
+        return self.keyframes('flash %s' % (color,), groups, (color, 'BLACK'), sleeptime, loops)
+
+    def cycle(self, colors, groups=('LEFT', 'RIGHT'), sleeptime=0.5, duration=5):
+        """
+        Leds.animate_cycle(): each of colors for sleeptime seconds in turn,
+        a traffic light with ('GREEN', 'YELLOW', 'RED')
+        """
+        loops = None if duration is None else max(1, int(math.ceil(duration / (len(colors) * sleeptime))))
+        return self.keyframes('cycle %s' % ' '.join(str(color) for color in colors), groups, colors, sleeptime, loops)
+
+    def fade(self, start, end, groups=('LEFT', 'RIGHT'), seconds=1.0, period=PERIOD):
+        """
+        From color start to color end over seconds, ending on end
+        """
+        steps = max(1, int(round(seconds / period)))
+        ends = self.keyframes('', groups, (start, end), period)
+        (first, last) = ends.frames
+        frames = [[int(round(a + (b - a) * step / float(steps))) for (a, b) in zip(first, last)]
+                  for step in range(1, steps + 1)]
+        return Animation('fade %s %s' % (start, end), ends.names, frames, period)
+
+    def wave(self, name, functions, seconds, period=PERIOD, loops=None):
+        """
+        {LED name: function(t)} sampled every period over seconds, each
+        function giving the LED's brightness as a fraction at t seconds
+        """
+        names = sorted(functions)
+        maximum = dict((led, self.leds.leds[led].max_brightness) for led in names)
+        frames = [[int(maximum[led] * min(1.0, max(0.0, functions[led](step * period)))) for led in names]
+                  for step in range(max(1, int(round(seconds / period))))]
+        return Animation(name, names, frames, period, loops)
+
+    # Playing them
+
+    def play(self, animation):
+        """
+        Play animation on top of what is playing, returns its Playing
+        """
+        playing = Playing(animation, clock())
+
+        with self.lock:
+            self.playing.append(playing)
+
+        self.wake()
+        return playing
+
+    def cancel_all(self, names=None):
+        """
+        Cancel the animations driving any of names, or all of them
+        """
+        with self.lock:
+            for playing in self.playing:
+                if names is None or set(names) & set(playing.animation.names):
+                    playing.cancel()
+
+        self.wake()
+
+    def set_color(self, group, color, pct=1):
+        """
+        Leds.set_color() through the animator, after cancelling what plays on group
+        """
+        values = self.brightness(group, color, pct)
+        self.cancel_all(values)
+        names = sorted(values)
+        return self.play(Animation('set %s %s' % (group, color), names, [[values[led] for led in names]], PERIOD))
+
+    def all_off(self):
+        self.cancel_all()
+        names = list(self.leds.leds)
+        return self.play(Animation('all off', names, [[0] * len(names)], PERIOD))
+
+    # The animator thread
+
+    def show(self, now):
+        """
+        Write the frames due at now, returns when the next one is due or
+        None if nothing plays
+        """
+        with self.lock:
+            self.playing = [playing for playing in self.playing if not playing.cancelled and
+                            (playing.ends is None or now < playing.ends)]
+            playing = list(self.playing)
+
+        values = {}
+        due = None
+        late = None
+
+        # The most recently played first, so it wins
+        for current in reversed(playing):
+            animation = current.animation
+            (index, started) = current.frame(now)
+
+            if index != current.shown:
+                if current.shown is not None and index > current.shown + 1:
+                    self.skipped += index - current.shown - 1
+
+                current.shown = index
+                late = now - started if late is None else max(late, now - started)
+
+            frame = animation.frames[index % len(animation.frames)]
+
+            for (led, value) in zip(animation.names, frame):
+                if value is not None and led not in values:
+                    values[led] = value
+
+            following = started + animation.period
+
+            if current.ends is not None:
+                following = min(following, current.ends)
+
+            due = following if due is None else min(due, following)
+
+        for (led, value) in values.items():
+            if self.written.get(led) != value:
+                self.leds.leds[led].brightness = value
+                self.written[led] = value
+                self.writes += 1
+
+        if late is not None:
+            self.frames += 1
+            self.jitter.append(late)
+
+            if len(self.jitter) > JITTERS:
+                del self.jitter[0]
+
+        return due
+
+    def loop(self):
+        # close() leaves the LEDs as they are
+        while self.running:
+            self.sleep(self.show(clock()), PERIOD)
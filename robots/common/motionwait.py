@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+
+"""
+Wait for one or more motors without spinning on sysfs.
+
+The tacho-motor driver notifies the ``state`` attribute of a motor whenever
+it changes, so instead of reading ``state`` every 100ms we poll() the state
+files of all of the motors at once and only read them when the kernel says
+something changed. Motors that have no sysfs state file (a simulator for
+instance) fall back to an adaptive backoff poller that starts at a couple
+of milliseconds and slows down the longer the wait goes on.
+
+    from motionwait import MotionWaiter
+
+    waiter = MotionWaiter([left_motor, right_motor])
+    waiter.wait_until_not_moving()
+    waiter.wait_until_not_moving(require=any)
+
+Works with both the ev3dev2 and the older ev3dev motor classes. Timeouts are
+in milliseconds to match Motor.wait().
+"""
+
+import logging
+import os
+import select
+import time
+
+log = logging.getLogger(__name__)
+
+# sysfs_notify() wakes up poll() with POLLPRI | POLLERR. We still look at
+# the state every NOTIFY_TIMEOUT seconds in case a notification is missed,
+# the same as Motor.wait() does.
+NOTIFY_EVENTS = select.POLLPRI | select.POLLERR if hasattr(select, 'poll') else 0
+NOTIFY_TIMEOUT = 0.1
+
+
+def not_moving(state):
+    return 'running' not in state or 'stalled' in state
+
+
+def not_running(state):
+    return not state
+
+
+class AdaptiveBackoff(object):
+    """
+    Sleep intervals that start at min_interval and grow by factor up to
+    max_interval, call reset() when something happens
+    """
+
+    def __init__(self, min_interval=0.002, max_interval=0.04, factor=1.5):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.factor = factor
+        self.interval = min_interval
+
+    def reset(self):
+        self.interval = self.min_interval
+
+    def next(self):
+        interval = self.interval
+        self.interval = min(self.interval * self.factor, self.max_interval)
+        return interval
+
+
+class MotionWaiter(object):
+    """
+    Waits for a condition on the state of several motors at once. The
+    backoff poller sleeps between min_interval and max_interval. reads and
+    polls count the syscalls made, which is handy for benchmarking.
+    """
+    notify_events = NOTIFY_EVENTS
+
+    def __init__(self, motors, clock=time, min_interval=0.002, max_interval=0.04):
+        self.motors = list(motors)
+        self.clock = clock
+        self.max_interval = max_interval
+        self.min_interval = min_interval
+        self.reads = 0
+        self.polls = 0
+        self.fds = []
+        self.poll = None
+
+        if NOTIFY_EVENTS:
+            for motor in self.motors:
+                fd = self.open_state(motor)
+
+                if fd is None:
+                    self.close()
+                    break
+
+                self.fds.append(fd)
+
+        if self.fds:
+            self.poll = select.poll()
+
+            for (motor, fd) in zip(self.motors, self.fds):
+                self.poll.register(self.notify_fd(motor, fd), self.notify_events)
+        else:
+            log.debug("no sysfs state files for %s, using the backoff poller" % self.motors)
+
+    def open_state(self, motor):
+        """
+        Return a file descriptor for the state attribute of motor, or None
+        """
+        path = getattr(motor, '_path', None)
+
+        if not path:
+            return None
+
+        try:
+            return os.open(os.path.join(path, 'state'), os.O_RDONLY)
+        except OSError:
+            return None
+
+    def notify_fd(self, motor, fd):
+        """
+        The file descriptor to poll() for changes to the state of motor,
+        sysfs notifies on the state file itself
+        """
+        return fd
+
+    def close(self):
+        for fd in self.fds:
+            os.close(fd)
+        self.fds = []
+        self.poll = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def states(self):
+        """
+        The state of each motor as a list of flags, like Motor.state
+        """
+        self.reads += len(self.motors)
+
+        if self.fds:
+            return [os.pread(fd, 256, 0).decode().split() for fd in self.fds]
+
+        return [motor.state for motor in self.motors]
+
+    def wait(self, cond, timeout=None, require=all, stop=None):
+        """
+        Block until require(cond(state) for each motor) is True. require is
+        all or any. Returns False if timeout (in ms) is reached or stop()
+        returns True first.
+        """
+        start = self.clock.time()
+        backoff = AdaptiveBackoff(self.min_interval, self.max_interval)
+        previous = None
+
+        while True:
+            states = self.states()
+
+            if require(cond(state) for state in states):
+                return True
+
+            if stop is not None and stop():
+                return False
+
+            # The backoff poller starts over whenever a motor changes state,
+            # another change is likely to follow soon
+            if states != previous:
+                backoff.reset()
+                previous = states
+
+            interval = NOTIFY_TIMEOUT if self.poll else backoff.next()
+
+            if timeout is not None:
+                remaining = timeout / 1000.0 - (self.clock.time() - start)
+
+                if remaining <= 0:
+                    return False
+
+                interval = min(interval, remaining)
+
+            self.polls += 1
+
+            if self.poll:
+                self.poll.poll(interval * 1000)
+            else:
+                self.clock.sleep(interval)
+
+    def wait_until_not_moving(self, timeout=None, require=all, stop=None):
+        return self.wait(not_moving, timeout, require, stop)
+
+    def wait_until(self, flag, timeout=None, require=all, stop=None):
+        return self.wait(lambda state: flag in state, timeout, require, stop)
+
+    def wait_while(self, flag, timeout=None, require=all, stop=None):
+        return self.wait(lambda state: flag not in state, timeout, require, stop)
+
+
+def wait_until_not_moving(motors, timeout=None, require=all):
+    """
+    One-off wait, opens and closes the state files of motors
+    """
+    with MotionWaiter(motors) as waiter:
+        return waiter.wait_until_not_moving(timeout, require)
+
+
+def wait_for_position(motor, target, clock=time, stop=None, speed=None, min_interval=0.002, max_interval=0.5):
+    """
+    Block until a running motor gets to target (going up or down depending on
+    which side of target it starts). position is not notified by the driver
+    so we sleep for most of the time the remaining distance takes at speed
+    (read from the motor if None) instead of spinning on it. Returns False
+    if the motor stops short of target or stop() returns True.
+    """
+    position = motor.position
+    direction = 1 if target >= position else -1
+    backoff = AdaptiveBackoff(min_interval, max_interval)
+    previous = None
+
+    while True:
+        remaining = (target - position) * direction
+
+        if remaining <= 0:
+            return True
+
+        if stop is not None and stop():
+            return False
+
+        if position == previous and 'running' not in motor.state:
+            return False
+
+        current_speed = abs(motor.speed) if speed is None else speed
+
+        if current_speed:
+            interval = min(max(0.8 * remaining / current_speed, min_interval), max_interval)
+        else:
+            # Still ramping up
+            interval = backoff.next()
+
+        previous = position
+        clock.sleep(interval)
+        position = motor.position
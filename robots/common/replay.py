@@ -0,0 +1,541 @@
+#!/usr/bin/env python3
+
+"""
+Replay recorded sensor readings through a robot's own control code on a
+PC, in virtual time, and record the motor and sound commands it makes.
+
+The robot's ev3dev2 devices are the real classes on a FakeSys tree. While
+a Replay is installed their attribute reads and writes go through it:
+
+- sensor readings come from a SensorStream, a trace recorded by
+  TraceRecorder (see traceread.py), a CSV file or made up by the caller.
+  Each channel of the stream is written to its sysfs attribute as the
+  virtual clock reaches each sample.
+- every attribute write is logged, and a motor command sets the motor's
+  state to running until the time, the distance or the stop it was given
+  says it is done, so Motor.wait() and MotionWaiter return when the
+  robot would.
+- time.time(), time.sleep() and time.monotonic() are the virtual clock,
+  each sysfs read costs read_cost of it, Sound, ClipCache and ToneSynth
+  only log what they would play, LedAnimator logs the animations played
+  without writing them and Button reports a press once the stream has run
+  out.
+
+Nothing depends on how fast the PC is, so a replay makes the same
+commands at the same virtual times every run (random is seeded too). With
+speedup the clock also really sleeps, 1.0 is real time.
+
+A decision is the robot's code running between two waits, or one pass of
+a main loop, that reads at least one sensor. Replay times each one with
+its own overhead taken out.
+
+    stream = SensorStream.load('guitar.trace')
+    channels = {'touch': ('ev3-ports:in1', 'value0'), ...}
+
+    with Replay(fake, stream, channels) as replay:
+        from el3ctric_guitar import El3ctricGuitar
+        guitar = El3ctricGuitar()
+        replay.run_passes(guitar.play_music)
+
+    print(replay)
+
+Import the robot's module inside the with block, "from time import sleep"
+only picks up the virtual clock if it runs while the replay is installed.
+"""
+
+import bisect
+import csv
+import logging
+import random
+import time
+
+import ev3dev2.button
+import ev3dev2.led
+import ev3dev2.stopwatch
+from ev3dev2 import Device
+from ev3dev2.motor import Motor
+from ev3dev2.sound import Sound
+
+import clipcache
+import ledanimator
+import motionwait
+import synth
+import traceread
+from tracerecorder import MAGIC
+
+log = logging.getLogger(__name__)
+
+FOREVER = float('inf')
+
+SOUND_METHODS = ('beep', 'tone', 'play_tone', 'play_note', 'play_file', 'speak', 'play_song', 'set_volume')
+
+
+class ReplayFinished(Exception):
+    """
+    Raised in the robot's code when it waits past the end of the stream
+    """
+    pass
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def sound_duration(name, args, kwargs):
+    """
+    How long a Sound call blocks for, in seconds
+    """
+    if kwargs.get('play_type', Sound.PLAY_WAIT_FOR_COMPLETE) != Sound.PLAY_WAIT_FOR_COMPLETE:
+        return 0.0
+
+    if name == 'tone':
+        if len(args) == 1:
+            return sum(t[1] + (t[2] if len(t) > 2 else 0) for t in args[0]) / 1000.0
+        return args[1] / 1000.0
+
+    if name in ('play_tone', 'play_note'):
+        return args[1] + (args[2] if len(args) > 2 and name == 'play_tone' else 0)
+
+    return 0.0
+
+
+class ReplayVoice(object):
+    """
+    A ClipCache Voice that plays for as long as its clip in virtual time
+    """
+
+    def __init__(self, replay, seconds):
+        self.replay = replay
+        self.ends = replay.now + seconds
+
+    @property
+    def done(self):
+        return self.replay.now >= self.ends
+
+    def stop(self):
+        self.ends = min(self.ends, self.replay.now)
+
+    def wait(self, timeout=None, interval=0.01):
+        seconds = self.ends - self.replay.now
+
+        if timeout is not None and timeout < seconds:
+            self.replay.sleep(timeout)
+            return False
+
+        self.replay.sleep(seconds)
+        return True
+
+
+class SensorStream(object):
+    """
+    Sensor readings over time, times in seconds from the start of the
+    stream and one list of values per channel
+    """
+
+    def __init__(self, names, times, columns):
+        self.names = names
+        self.times = times
+        self.columns = columns
+
+    def __len__(self):
+        return len(self.times)
+
+    @property
+    def end(self):
+        return self.times[-1] if self.times else 0.0
+
+    @classmethod
+    def from_trace(cls, trace):
+        start = trace.times[0] if len(trace) else 0.0
+        times = [t - start for t in trace.times]
+        return cls(trace.names, times, dict((name, list(trace.column(name))) for name in trace.names))
+
+    @classmethod
+    def from_csv(cls, path):
+        with open(path) as fh:
+            rows = list(csv.reader(fh))
+
+        names = rows[0][1:]
+        times = [float(row[0]) for row in rows[1:]]
+        start = times[0] if times else 0.0
+        columns = dict((name, [int(row[n + 1]) for row in rows[1:]]) for (n, name) in enumerate(names))
+        return cls(names, [t - start for t in times], columns)
+
+    @classmethod
+    def load(cls, path):
+        """
+        A trace written by TraceRecorder, or a CSV file like traceread.py
+        prints
+        """
+        with open(path, 'rb') as fh:
+            binary = fh.read(len(MAGIC)) == MAGIC
+
+        return cls.from_trace(traceread.load(path)) if binary else cls.from_csv(path)
+
+    def index(self, t):
+        """
+        The sample in effect at t, -1 before the first
+        """
+        return bisect.bisect_right(self.times, t) - 1
+
+
+class Replay(object):
+    """
+    channels maps each channel of stream to the (address, attribute) it
+    is read from. commands is the log of every attribute write and sound
+    as (time, device, name, value), latencies the CPU time of each
+    decision in seconds.
+    """
+
+    def __init__(self, fake, stream, channels, duration=None, read_cost=0.0005, speedup=None, seed=1):
+        self.fake = fake
+        self.stream = stream
+        self.channels = [(name, channels[name]) for name in stream.names if name in channels]
+        self.end = duration if duration is not None else stream.end
+        self.read_cost = read_cost
+        self.speedup = speedup
+        self.seed = seed
+
+        self.now = 0.0
+        self.sample = None
+        self.reads = 0
+        self.commands = []
+        self.latencies = []
+        self.wall = 0.0
+
+        # Motor path -> when its current command is done, and its setpoints
+        self.busy = {}
+        self.setpoints = {}
+
+        self.span_start = None
+        self.deciding = False
+        self.span_overhead = 0.0
+        self.saved = None
+
+    def __str__(self):
+        if not self.latencies:
+            return "0 decisions in %.1fs" % self.now
+
+        return "%d decisions in %.1fs (%.2fs wall, %.0f/s), latency p50 %.0fus p99 %.0fus max %.0fus, %d commands" % (
+            len(self.latencies), self.now, self.wall, self.decisions_per_second, 1000000 * percentile(self.latencies, 0.5),
+            1000000 * percentile(self.latencies, 0.99), 1000000 * max(self.latencies), len(self.commands))
+
+    @property
+    def decisions_per_second(self):
+        return len(self.latencies) / self.wall if self.wall else 0.0
+
+    def command_counts(self):
+        """
+        {kind: count}, kind is 'motor' for motor commands, 'setting' for
+        other motor attributes, 'mode' for sensor modes, 'sound' and 'leds'
+        for LED animations
+        """
+        counts = {'motor': 0, 'setting': 0, 'mode': 0, 'sound': 0, 'leds': 0}
+
+        for (t, device, name, value) in self.commands:
+            if device == 'Sound':
+                counts['sound'] += 1
+            elif device == 'Leds':
+                counts['leds'] += 1
+            elif name == 'command':
+                counts['motor'] += 1
+            elif name == 'mode':
+                counts['mode'] += 1
+            else:
+                counts['setting'] += 1
+
+        return counts
+
+    def write_commands(self, fh):
+        for (t, device, name, value) in self.commands:
+            fh.write("%.3f %s %s %s\n" % (t, device, name, value))
+
+    # Installing and removing the hooks
+
+    def install(self):
+        replay = self
+        self.saved = {
+            'get': Device._get_attribute,
+            'set': Device._set_attribute,
+            'wait': Motor.wait,
+            'button': ev3dev2.button.Button,
+            'notify': motionwait.NOTIFY_EVENTS,
+            'time': (time.time, time.sleep, time.monotonic),
+            'led_sleep': ev3dev2.led.sleep,
+            'ticks': ev3dev2.stopwatch.get_ticks_ms,
+            'sound': dict((name, getattr(Sound, name)) for name in SOUND_METHODS),
+            'streams': (clipcache.AudioStream.start, clipcache.ClipCache.play, synth.ToneSynth.glide_to),
+            'animator': (ledanimator.LedAnimator.start, ledanimator.LedAnimator.play),
+        }
+        get_attribute = self.saved['get']
+        set_attribute = self.saved['set']
+
+        def replay_get_attribute(device, attribute, name):
+            replay.read()
+            return get_attribute(device, attribute, name)
+
+        def replay_set_attribute(device, attribute, name, value):
+            attribute = set_attribute(device, attribute, name, value)
+            replay.written(device, name, value)
+            return attribute
+
+        def replay_wait(motor, cond, timeout=None):
+            return replay.motor_wait(motor, cond, timeout)
+
+        def make_sound(name):
+            def sound(speaker, *args, **kwargs):
+                replay.log('Sound', name, ' '.join(repr(arg) for arg in args))
+                replay.sleep(sound_duration(name, args, kwargs))
+            return sound
+
+        def replay_start(stream):
+            stream.running = True
+
+        def replay_play(cache, name, volume=100, block=False):
+            replay.log('Sound', 'play_clip', repr(name))
+            voice = ReplayVoice(replay, len(cache.clips[name]) / float(cache.rate))
+
+            if block:
+                voice.wait()
+
+            return voice
+
+        def replay_animate(animator, animation):
+            replay.log('Leds', 'play', repr(animation.name))
+            return ledanimator.Playing(animation, replay.now)
+
+        def replay_glide_to(tone, frequency):
+            if frequency != tone.target:
+                replay.log('Sound', 'glide_to', repr(frequency))
+                tone.request = (frequency, replay.now)
+
+        class ReplayButton(object):
+
+            @property
+            def buttons_pressed(self):
+                return ['enter'] if replay.now >= replay.end else []
+
+            def any(self):
+                return bool(self.buttons_pressed)
+
+            def process(self):
+                pass
+
+        Device._get_attribute = replay_get_attribute
+        Device._set_attribute = replay_set_attribute
+        Motor.wait = replay_wait
+        ev3dev2.button.Button = ReplayButton
+        motionwait.NOTIFY_EVENTS = 0
+        (time.time, time.sleep, time.monotonic) = (self.time, self.sleep, self.time)
+
+        # Leds' animations and StopWatch took their clock at import
+        ev3dev2.led.sleep = self.sleep
+        ev3dev2.stopwatch.get_ticks_ms = lambda: int(1000 * replay.now)
+
+        for name in SOUND_METHODS:
+            setattr(Sound, name, make_sound(name))
+
+        (clipcache.AudioStream.start, clipcache.ClipCache.play, synth.ToneSynth.glide_to) = (
+            replay_start, replay_play, replay_glide_to)
+        (ledanimator.LedAnimator.start, ledanimator.LedAnimator.play) = (replay_start, replay_animate)
+
+        random.seed(self.seed)
+        self.now = 0.0
+        self.update()
+
+    def restore(self):
+        saved = self.saved
+        Device._get_attribute = saved['get']
+        Device._set_attribute = saved['set']
+        Motor.wait = saved['wait']
+        ev3dev2.button.Button = saved['button']
+        motionwait.NOTIFY_EVENTS = saved['notify']
+        (time.time, time.sleep, time.monotonic) = saved['time']
+        ev3dev2.led.sleep = saved['led_sleep']
+        ev3dev2.stopwatch.get_ticks_ms = saved['ticks']
+
+        for (name, method) in saved['sound'].items():
+            setattr(Sound, name, method)
+
+        (clipcache.AudioStream.start, clipcache.ClipCache.play, synth.ToneSynth.glide_to) = saved['streams']
+        (ledanimator.LedAnimator.start, ledanimator.LedAnimator.play) = saved['animator']
+
+        self.saved = None
+
+    def __enter__(self):
+        self.install()
+        return self
+
+    def __exit__(self, *args):
+        self.restore()
+
+    # The virtual clock
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        if seconds > 0:
+            self.advance_to(self.now + seconds)
+
+    def advance_to(self, t):
+        """
+        The robot waits until t, this ends a decision
+        """
+        self.end_decision()
+
+        if t > self.end:
+            self.now = self.end
+            raise ReplayFinished()
+
+        if self.speedup and t > self.now:
+            self.saved['time'][1]((t - self.now) / self.speedup)
+
+        self.now = max(self.now, t)
+        self.update()
+        self.start_decision()
+
+    def read(self):
+        """
+        Account for one sysfs read
+        """
+        self.reads += 1
+        self.deciding = True
+        self.now += self.read_cost
+
+        if self.sample + 1 < len(self.stream) and self.stream.times[self.sample + 1] <= self.now:
+            start = time.perf_counter()
+            self.update()
+            self.span_overhead += time.perf_counter() - start
+
+    def update(self):
+        """
+        Write the samples due by now to sysfs and finish motor commands
+        that are done
+        """
+        sample = self.stream.index(self.now)
+
+        if sample != self.sample and sample >= 0:
+            previous = self.sample
+
+            for (name, (address, attribute)) in self.channels:
+                column = self.stream.columns[name]
+
+                if previous is None or previous < 0 or column[previous] != column[sample]:
+                    self.fake.set(address, attribute, column[sample])
+
+        self.sample = sample
+
+        for (path, until) in list(self.busy.items()):
+            if until is not None and until <= self.now:
+                self.busy[path] = None
+                self.fake.write(path, 'state', '')
+
+    def start_decision(self):
+        self.span_start = time.perf_counter()
+        self.deciding = False
+        self.span_overhead = 0.0
+
+    def end_decision(self):
+        if self.span_start is not None and self.deciding:
+            self.latencies.append(time.perf_counter() - self.span_start - self.span_overhead)
+
+        self.span_start = None
+
+    # What the robot does
+
+    def log(self, device, name, value):
+        self.commands.append((round(self.now, 6), device, name, value))
+
+    def written(self, device, name, value):
+        start = time.perf_counter()
+
+        if isinstance(value, bytes):
+            value = value.decode()
+
+        self.log(str(device), name, value)
+
+        if isinstance(device, Motor):
+            self.setpoints.setdefault(device._path, {})[name] = value
+
+            if name == 'command':
+                self.motor_command(device, value)
+
+        self.span_overhead += time.perf_counter() - start
+
+    def motor_command(self, motor, command):
+        path = motor._path
+        setpoints = self.setpoints[path]
+        speed = abs(int(setpoints.get('speed_sp', 0))) or 1
+
+        if command in ('run-forever', 'run-direct'):
+            until = FOREVER
+        elif command == 'run-timed':
+            until = self.now + int(setpoints.get('time_sp', 0)) / 1000.0
+        elif command in ('run-to-rel-pos', 'run-to-abs-pos'):
+            until = self.now + abs(int(setpoints.get('position_sp', 0))) / float(speed)
+        else:
+            until = None
+
+        self.busy[path] = until
+        self.fake.write(path, 'state', 'running' if until is not None else '')
+
+    def motor_wait(self, motor, cond, timeout=None):
+        """
+        Motor.wait() in virtual time
+        """
+        deadline = None if timeout is None else self.now + timeout / 1000.0
+
+        while True:
+            if cond(motor.state):
+                return True
+
+            if deadline is not None and self.now >= deadline:
+                return False
+
+            until = self.busy.get(motor._path)
+            wake = [t for t in (until, deadline) if t is not None and t != FOREVER]
+
+            # Waiting for a motor that never stops, until the stream runs out
+            self.advance_to(min(wake) if wake else FOREVER)
+
+    # Running the robot
+
+    def run(self, function, *args):
+        """
+        Run function, a robot's main() or a script, until it returns or
+        waits past the end of the stream
+        """
+        start = time.perf_counter()
+        self.start_decision()
+
+        try:
+            function(*args)
+            self.end_decision()
+        except ReplayFinished:
+            pass
+        finally:
+            self.wall += time.perf_counter() - start
+
+    def run_passes(self, function):
+        """
+        Call function, one pass of a robot's main loop, at every sample of
+        the stream it has not blocked past
+        """
+
+        def passes():
+            sample = 0
+
+            while True:
+                sample = max(sample, bisect.bisect_left(self.stream.times, self.now))
+
+                if sample >= len(self.stream):
+                    return
+
+                self.advance_to(self.stream.times[sample])
+                self.deciding = True
+                function()
+                sample += 1
+
+        self.run(passes)
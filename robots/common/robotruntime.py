@@ -0,0 +1,308 @@
+#!/usr/bin/env python3
+
+"""
+Run a robot on one asyncio event loop instead of a thread per job.
+
+The threaded demos start a thread per sensor to watch, each one calling
+something like ``remote.process()`` and then ``sleep(0.01)`` forever, plus
+an Event and a join() per thread to shut them all down again. On the
+single core of the EV3 those threads fight over the GIL and wake each
+other up for nothing. RobotRuntime runs the same jobs as coroutines on one
+loop:
+
+    runtime = RobotRuntime()
+    runtime.every(0.01, remote.process, 'remote')
+    runtime.spawn(open_claw())
+    runtime.run()
+
+every() calls a function (or awaits a coroutine function) at a fixed rate,
+without drifting and without a burst of catch-up calls when it falls
+behind. Motor actions are coroutines that start the motor and then
+``await runtime.wait_until_not_moving(motor)``, so they never block the
+loop. run() returns once shutdown() has been called, by SIGINT/SIGTERM or
+by the robot itself, after every task has been cancelled.
+
+Each periodic task keeps TaskStats: how late each call was compared to its
+schedule and the jitter of the interval between calls.
+
+Sticks to what asyncio had in python 3.5, the version on ev3dev stretch.
+"""
+
+import asyncio
+import logging
+import math
+import signal
+import time
+
+from motionwait import AdaptiveBackoff, not_moving
+
+log = logging.getLogger(__name__)
+
+
+class TaskStats(object):
+    """
+    Lateness (how long after its scheduled time each call started) and the
+    interval between calls of a periodic task, in seconds
+    """
+
+    def __init__(self, name, interval):
+        self.name = name
+        self.interval = interval
+        self.calls = 0
+        self.late_total = 0.0
+        self.late_max = 0.0
+        self.lates = []
+        self.interval_total = 0.0
+        self.interval_squares = 0.0
+        self.previous = None
+
+    def __str__(self):
+        return "%s: %d calls, late %.2fms mean %.2fms max, jitter %.2fms" % (
+            self.name, self.calls, 1000 * self.mean_late, 1000 * self.late_max, 1000 * self.jitter)
+
+    def record(self, scheduled, now):
+        late = max(now - scheduled, 0.0)
+        self.calls += 1
+        self.late_total += late
+        self.late_max = max(self.late_max, late)
+        self.lates.append(late)
+
+        # Only keep enough samples for percentiles on a long run
+        if len(self.lates) > 10000:
+            self.lates = self.lates[5000:]
+
+        if self.previous is not None:
+            interval = now - self.previous
+            self.interval_total += interval
+            self.interval_squares += interval * interval
+
+        self.previous = now
+
+    @property
+    def mean_late(self):
+        return self.late_total / self.calls if self.calls else 0.0
+
+    @property
+    def mean_interval(self):
+        return self.interval_total / (self.calls - 1) if self.calls > 1 else 0.0
+
+    @property
+    def jitter(self):
+        """
+        Standard deviation of the interval between calls
+        """
+        if self.calls < 3:
+            return 0.0
+
+        n = self.calls - 1
+        mean = self.interval_total / n
+        return math.sqrt(max(self.interval_squares / n - mean * mean, 0.0))
+
+    def late_percentile(self, p):
+        if not self.lates:
+            return 0.0
+
+        lates = sorted(self.lates)
+        return lates[min(int(len(lates) * p), len(lates) - 1)]
+
+
+class RobotRuntime(object):
+    """
+    One event loop for every job a robot does. Set handle_signals to False
+    to leave SIGINT and SIGTERM alone, the benchmarks do.
+    """
+
+    def __init__(self, loop=None, handle_signals=True):
+        self.loop = loop if loop is not None else asyncio.new_event_loop()
+        self.handle_signals = handle_signals
+        self.tasks = []
+        self.stats = {}
+        self.timers = {}
+        self.pollers = {}
+        self.running = False
+        self.finished = None
+
+    def spawn(self, coro):
+        """
+        Run coro on the loop, an exception in it shuts the robot down
+        """
+        task = self.loop.create_task(self._guard(coro))
+        self.tasks = [t for t in self.tasks if not t.done()]
+        self.tasks.append(task)
+        return task
+
+    async def _guard(self, coro):
+        try:
+            return await coro
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            log.exception(e)
+            self.shutdown()
+
+    def every(self, interval, function, name=None):
+        """
+        Call function every interval seconds until shutdown, it may return
+        a coroutine which is awaited before the next call is scheduled.
+        Jobs with the same interval share one timer and run in the order
+        they were added, so the loop wakes up once per tick for all of them.
+        """
+        if name is None:
+            name = getattr(function, '__name__', str(function))
+
+        stats = TaskStats(name, interval)
+        self.stats[name] = stats
+
+        if interval in self.timers:
+            self.timers[interval].append((function, stats))
+        else:
+            self.timers[interval] = [(function, stats)]
+            self.spawn(self._periodic(interval, self.timers[interval]))
+
+        return stats
+
+    async def _periodic(self, interval, jobs):
+        scheduled = self.loop.time()
+
+        while True:
+            for (function, stats) in jobs:
+                stats.record(scheduled, self.loop.time())
+                result = function()
+
+                if asyncio.iscoroutine(result):
+                    await result
+
+            scheduled += interval
+            now = self.loop.time()
+
+            # Skip the calls we have missed rather than making them all at once
+            if scheduled < now:
+                scheduled = now
+
+            await asyncio.sleep(scheduled - now)
+
+    def adaptive(self, poller, name=None):
+        """
+        Run an adaptivepoll.AdaptivePoller until shutdown, at the interval
+        it asks for after each poll. Lateness is measured against that
+        interval.
+        """
+        if name is None:
+            name = getattr(poller.poll, '__name__', str(poller.poll))
+
+        stats = TaskStats(name, poller.min_interval)
+        self.stats[name] = stats
+        self.pollers[name] = poller
+        return self.spawn(self._adaptive(poller, stats))
+
+    async def _adaptive(self, poller, stats):
+        scheduled = self.loop.time()
+
+        while True:
+            stats.record(scheduled, self.loop.time())
+            scheduled += poller.step()
+            now = self.loop.time()
+
+            if scheduled < now:
+                scheduled = now
+
+            await asyncio.sleep(scheduled - now)
+
+    async def wait_for(self, predicate, timeout=None, min_interval=0.002, max_interval=0.04):
+        """
+        Wait for predicate() to return True, checking it with an adaptive
+        backoff. Returns False if timeout (in seconds) is reached first.
+        """
+        start = self.loop.time()
+        backoff = AdaptiveBackoff(min_interval, max_interval)
+
+        while not predicate():
+            interval = backoff.next()
+
+            if timeout is not None:
+                remaining = timeout - (self.loop.time() - start)
+
+                if remaining <= 0:
+                    return False
+
+                interval = min(interval, remaining)
+
+            await asyncio.sleep(interval)
+
+        return True
+
+    async def wait_until_not_moving(self, motor, timeout=None):
+        """
+        The coroutine version of Motor.wait_until_not_moving()
+        """
+        return await self.wait_for(lambda: not_moving(motor.state), timeout)
+
+    async def sleep(self, seconds):
+        await asyncio.sleep(seconds)
+
+    def shutdown(self):
+        """
+        Cancel every task and make run() return, safe to call more than once
+        """
+        if not self.running:
+            return
+
+        log.info('shutting down')
+        self.running = False
+
+        for task in self.tasks:
+            task.cancel()
+
+        if self.finished is not None and not self.finished.done():
+            self.finished.set_result(None)
+
+    def signal_handler(self, signum):
+        log.info('Caught %s' % ('SIGINT' if signum == signal.SIGINT else 'SIGTERM'))
+        self.shutdown()
+
+    def run(self, main=None, duration=None):
+        """
+        Run the loop until shutdown(), or for duration seconds. main is an
+        optional coroutine to spawn first.
+        """
+        self.running = True
+        self.finished = self.loop.create_future()
+
+        if self.handle_signals:
+            for signum in (signal.SIGINT, signal.SIGTERM):
+                self.loop.add_signal_handler(signum, self.signal_handler, signum)
+
+        if main is not None:
+            self.spawn(main)
+
+        if duration is not None:
+            self.loop.call_later(duration, self.shutdown)
+
+        try:
+            self.loop.run_until_complete(self.finished)
+
+            # Let the cancelled tasks unwind
+            tasks = [task for task in self.tasks if not task.done()]
+
+            if tasks:
+                self.loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+        finally:
+            self.running = False
+            self.tasks = []
+            self.timers = {}
+
+            if self.handle_signals:
+                for signum in (signal.SIGINT, signal.SIGTERM):
+                    self.loop.remove_signal_handler(signum)
+
+    def close(self):
+        self.loop.close()
+
+
+def cpu_percent(cpu_start, wall_start):
+    """
+    Percentage of one core this process used since cpu_start/wall_start,
+    which come from time.process_time() and time.time()
+    """
+    wall = time.time() - wall_start
+    return 100.0 * (time.process_time() - cpu_start) / wall if wall > 0 else 0.0
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+
+"""
+Read each sensor attribute at most once per pass of a control loop.
+
+Each ev3dev2 sensor call is its own sysfs read, and most of them read the
+``mode`` attribute first to make sure the sensor is in the right mode. A
+loop that asks ``color_sensor.color`` three times and the IR sensor for
+five different buttons does a couple of dozen reads per pass for two
+values. SensorSnapshot keeps the attribute files open, reads each value the
+first time it is asked for in a tick and hands the same value to everything
+else that asks during that tick.
+
+    sensors = SensorSnapshot()
+    sensors.add('color', color_sensor, 'value0', int)
+    sensors.add('ir', ir_sensor, 'value0', int)
+
+    while True:
+        sensors.tick()
+        if sensors.get('color') == ColorSensor.COLOR_RED:
+            ...
+
+The sensors must already be in the mode the values are read in, the
+snapshot never checks or changes the mode. Works under micropython too,
+which has no os.pread, by rewinding an open file instead.
+"""
+
+import os
+
+if hasattr(os, 'pread'):
+
+    def open_attribute(path):
+        return os.open(path, os.O_RDONLY)
+
+    def read_attribute(fd):
+        return os.pread(fd, 256, 0)
+
+    def close_attribute(fd):
+        os.close(fd)
+
+else:
+
+    def open_attribute(path):
+        return open(path, 'rb')
+
+    def read_attribute(fh):
+        fh.seek(0)
+        return fh.read()
+
+    def close_attribute(fh):
+        fh.close()
+
+
+class SensorSnapshot(object):
+    """
+    reads is the total number of sysfs reads, reads_per_tick the number
+    done in the last complete tick
+    """
+
+    def __init__(self):
+        self.sources = {}
+        self.values = {}
+        self.reads = 0
+        self.ticks = 0
+        self.tick_reads = 0
+        self.reads_per_tick = 0
+
+    def add(self, name, device, attribute, convert=str):
+        """
+        Make device's attribute available as name, convert is applied to
+        the stripped string value
+        """
+        self.sources[name] = (open_attribute(device._path + '/' + attribute), convert)
+
+    def tick(self):
+        """
+        Start a new pass of the control loop, everything is read fresh
+        """
+        if self.ticks:
+            self.reads_per_tick = self.tick_reads
+
+        self.ticks += 1
+        self.tick_reads = 0
+        self.values = {}
+
+    def get(self, name):
+        if name not in self.values:
+            (fd, convert) = self.sources[name]
+            self.values[name] = convert(read_attribute(fd).decode().strip())
+            self.reads += 1
+            self.tick_reads += 1
+
+        return self.values[name]
+
+    def close(self):
+        for (fd, convert) in self.sources.values():
+            close_attribute(fd)
+        self.sources = {}
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+
+"""
+Play a Sound.play_song() song as one sound instead of one per note.
+
+play_song() starts beep, and waits for it, for every note, so a long song
+stutters while each beep starts and the notes drift a little further
+behind on a busy brick. It also drops the fraction of a millisecond of
+every note, which adds up over a few hundred. SongCache compiles the
+(note, value) tuples once into a tone sequence that Sound.tone() plays
+with a single beep, the notes rounded so they start on time rather than
+each rounded on its own:
+
+    songs = SongCache()
+    songs.play(STAR_WARS)               # one beep for the whole song
+
+or renders it to samples for a ClipCache (see clipcache.py), which plays
+it from memory through the aplay that is already open:
+
+    clips.add(songs.clip('star wars', STAR_WARS, clips.rate))
+    clips.play('star wars')
+
+Both are kept, by the song, tempo and delay they were made from, so a song
+is only compiled or rendered the first time it is played.
+"""
+
+from ev3dev2.sound import Sound
+
+from clipcache import Clip
+from synth import wavetable
+
+# Fade each note in and out over this many seconds, so it does not click
+FADE = 0.002
+
+
+def note_seconds(value, tempo):
+    """
+    How long a note value ('q', 'e3', 'h.', 'q/3', 'e*1.5'...) lasts at tempo,
+    as play_song() reckons it
+    """
+    value = value.lower()
+
+    # 'q/3' multiplies by 3 too, play_song() does
+    if '/' in value:
+        (base, factor) = value.split('/')
+        factor = float(factor)
+    elif '*' in value:
+        (base, factor) = value.split('*')
+        factor = float(factor)
+    elif value.endswith('.'):
+        (base, factor) = (value[:-1], 1.5)
+    elif value.endswith('3'):
+        (base, factor) = (value[:-1], 2 / 3.0)
+    else:
+        (base, factor) = (value, 1.0)
+
+    try:
+        return 240.0 / tempo * Sound._NOTE_VALUES[base] * factor
+    except KeyError:
+        raise ValueError('invalid note (%s)' % base)
+
+
+def compile_song(song, tempo=120, delay=0.05):
+    """
+    Returns ((frequency, duration, delay) ...) in ms for Sound.tone(), and
+    the rest before the first note in seconds. Rests become the delay
+    after the note before them.
+    """
+    if tempo <= 0:
+        raise ValueError('invalid tempo (%s)' % tempo)
+    if delay < 0:
+        raise ValueError('invalid delay (%s)' % delay)
+
+    # (frequency, start, end of the note, end of its delay) in seconds
+    notes = []
+    t = 0.0
+    lead = 0.0
+
+    for (note, value) in song:
+        seconds = note_seconds(value, tempo)
+
+        if note == 'R':
+            if notes:
+                notes[-1][3] += seconds + delay
+            else:
+                lead += seconds + delay
+
+            t += seconds + delay
+            continue
+
+        notes.append([Sound._NOTE_FREQUENCIES[note.upper()], t, t + seconds, t + seconds + delay])
+        t += seconds + delay
+
+    # Round the times the notes start and stop, not their lengths
+    sequence = []
+
+    for (frequency, start, end, until) in notes:
+        (start, end, until) = (int(round(1000 * start)), int(round(1000 * end)), int(round(1000 * until)))
+        sequence.append((frequency, end - start, until - end))
+
+    return (tuple(sequence), lead)
+
+
+def render(sequence, lead, rate, volume=50):
+    """
+    The samples of a compiled song, an array('h')
+    """
+    from array import array
+
+    table = wavetable(256, 32767 * volume / 100.0)
+    size = len(table)
+    fade = max(1, int(FADE * rate))
+    samples = array('h', bytes(2 * int(round(lead * rate))))
+    t = 0
+
+    for (frequency, duration, delay) in sequence:
+        start = len(samples)
+        t += duration
+        frames = int(round(lead * rate + t * rate / 1000.0)) - start
+        step = frequency * size / float(rate)
+        note = [table[int(step * i) % size] for i in range(frames)]
+
+        for i in range(min(fade, frames // 2)):
+            note[i] = note[i] * i // fade
+            note[frames - 1 - i] = note[frames - 1 - i] * i // fade
+
+        samples.extend(array('h', note))
+        t += delay
+        samples.extend(array('h', bytes(2 * (int(round(lead * rate + t * rate / 1000.0)) - len(samples)))))
+
+    return samples
+
+
+def song_key(song, tempo, delay):
+    return (tuple((note, value) for (note, value) in song), tempo, delay)
+
+
+class SongCache(object):
+    """
+    compiled and rendered count the songs compiled and rendered, hits the
+    times one was found already done
+    """
+
+    def __init__(self, speaker=None):
+        self.speaker = speaker
+        self.sequences = {}
+        self.clips = {}
+        self.compiled = 0
+        self.rendered = 0
+        self.hits = 0
+
+    def compile(self, song, tempo=120, delay=0.05):
+        """
+        Returns the (sequence, lead) of compile_song(), compiling it the
+        first time
+        """
+        key = song_key(song, tempo, delay)
+        compiled = self.sequences.get(key)
+
+        if compiled is None:
+            compiled = compile_song(song, tempo, delay)
+            self.sequences[key] = compiled
+            self.compiled += 1
+        else:
+            self.hits += 1
+
+        return compiled
+
+    def play(self, song, tempo=120, delay=0.05, play_type=Sound.PLAY_WAIT_FOR_COMPLETE):
+        """
+        Play song like Sound.play_song() does, with one beep. Rests before
+        the first note are a silent tone of it, so play_type
+        PLAY_NO_WAIT_FOR_COMPLETE never waits for them.
+        """
+        (sequence, lead) = self.compile(song, tempo, delay)
+
+        if self.speaker is None:
+            self.speaker = Sound()
+
+        if lead:
+            frequency = sequence[0][0] if sequence else Sound._NOTE_FREQUENCIES['A4']
+            sequence = ((frequency, 0, int(round(1000 * lead))),) + sequence
+
+        if sequence:
+            return self.speaker.tone(sequence, play_type=play_type)
+
+    def clip(self, name, song, rate, tempo=120, delay=0.05, volume=50):
+        """
+        A Clip of song at rate, for ClipCache.add()
+        """
+        key = (name, song_key(song, tempo, delay), rate, volume)
+        clip = self.clips.get(key)
+
+        if clip is None:
+            samples = render(*self.compile(song, tempo, delay), rate=rate, volume=volume)
+            clip = Clip(name, None, samples)
+            self.clips[key] = clip
+            self.rendered += 1
+        else:
+            self.hits += 1
+
+        return clip
@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+
+"""
+Profile how long a robot program takes to start: from the process starting
+to its first control tick, the first time it reads a sensor value, with
+where that time went.
+
+    $ ./startprofile.py ../DINOR3X/dinor3x.py
+    $ ./startprofile.py --tick command ../EDUCATOR/square.py
+    $ ./startprofile.py --exit-at-tick --min-ms 0.5 ../MINDCUB3R/mindcuber.py
+
+The program runs as usual, the report goes to stderr at its first tick:
+
+    startprofile: dinor3x.py first tick after 412.3ms, value0 of ColorSensor(in3)
+      interpreter     35.1ms
+      imports        301.5ms
+      devices         12.8ms  8 made
+      other           62.9ms
+    import time: self [us] | cumulative | imported package
+    ...
+
+The import lines are those of python -X importtime, which micropython and
+older Pythons do not have, for every import that took at least --min-ms.
+"devices" is the time spent in ev3dev2 Device.__init__. The interpreter
+time comes from /proc, to the nearest 10ms. --tick command stops at the
+first motor command instead, for programs that never read a sensor, and
+--sys points ev3dev2 at another /sys/class, a FakeSys tree for example.
+--json prints the report as one JSON object, for bench_startup.py.
+"""
+
+import argparse
+import builtins
+import importlib
+import json
+import os
+import re
+import runpy
+import sys
+import time
+
+# runpy imports pkgutil, it is not the program's
+importlib.import_module('pkgutil')
+
+SENSOR_VALUE = re.compile(r'^(value\d|bin_data)$')
+
+
+def process_age():
+    """
+    Returns how many seconds ago this process started, or None
+    """
+    try:
+        with open('/proc/self/stat') as fh:
+            started = int(fh.read().rsplit(')', 1)[1].split()[19])
+
+        with open('/proc/uptime') as fh:
+            uptime = float(fh.read().split()[0])
+
+        return uptime - started / float(os.sysconf('SC_CLK_TCK'))
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class StartProfile(object):
+    """
+    imports is a list of (depth, name, self, cumulative) seconds in the
+    order the imports finished, like python -X importtime prints them
+    """
+
+    def __init__(self, script, tick='sensor', sys_root=None, exit_at_tick=False, min_seconds=0.001, as_json=False):
+        self.script = script
+        self.tick = tick
+        self.sys_root = sys_root
+        self.exit_at_tick = exit_at_tick
+        self.min_seconds = min_seconds
+        self.as_json = as_json
+        self.imports = []
+        self.depth = 0
+        self.children = [0.0]
+        self.devices = 0
+        self.device_seconds = 0.0
+        self.patched = set()
+        self.ticked = False
+        self.started = None
+        self.interpreter = None
+
+    # Imports
+
+    def install_import_timer(self):
+        original_import = builtins.__import__
+        profile = self
+
+        def timed_import(name, globals=None, locals=None, fromlist=(), level=0):
+            full_name = absolute_name(name, globals, level)
+
+            if full_name in sys.modules:
+                return original_import(name, globals, locals, fromlist, level)
+
+            profile.depth += 1
+            profile.children.append(0.0)
+            start = time.perf_counter()
+
+            try:
+                return original_import(name, globals, locals, fromlist, level)
+            finally:
+                cumulative = time.perf_counter() - start
+                children = profile.children.pop()
+                profile.depth -= 1
+                profile.children[-1] += cumulative
+                profile.imports.append((profile.depth, full_name, cumulative - children, cumulative))
+
+                if not profile.depth:
+                    profile.patch_modules()
+
+        builtins.__import__ = timed_import
+
+    def import_seconds(self):
+        return sum(cumulative for (depth, name, own, cumulative) in self.imports if depth == 0)
+
+    # Devices and ticks, patched in as soon as the program imports them so
+    # the time to import them is the program's
+
+    def patch_modules(self):
+        if 'ev3dev2' in sys.modules and 'ev3dev2' not in self.patched:
+            self.patched.add('ev3dev2')
+            self.patch_devices(sys.modules['ev3dev2'].Device)
+
+        if 'sensorsnapshot' in sys.modules and 'sensorsnapshot' not in self.patched:
+            self.patched.add('sensorsnapshot')
+            self.patch_snapshot(sys.modules['sensorsnapshot'])
+
+    def patch_devices(self, Device):
+        profile = self
+        device_init = Device.__init__
+        get_attribute = Device._get_attribute
+        set_attribute = Device._set_attribute
+
+        if self.sys_root:
+            Device.DEVICE_ROOT_PATH = self.sys_root
+
+        def timed_init(device, *args, **kwargs):
+            start = time.perf_counter()
+
+            try:
+                device_init(device, *args, **kwargs)
+            finally:
+                profile.devices += 1
+                profile.device_seconds += time.perf_counter() - start
+
+        def watched_get_attribute(device, attribute, name):
+            result = get_attribute(device, attribute, name)
+
+            if profile.tick == 'sensor' and SENSOR_VALUE.match(name):
+                profile.first_tick("%s of %s" % (name, device_name(device)))
+
+            return result
+
+        def watched_set_attribute(device, attribute, name, value):
+            result = set_attribute(device, attribute, name, value)
+
+            if profile.tick == 'command' and name == 'command' and value != 'reset':
+                profile.first_tick("%s command to %s" % (value, device_name(device)))
+
+            return result
+
+        Device.__init__ = timed_init
+        Device._get_attribute = watched_get_attribute
+        Device._set_attribute = watched_set_attribute
+
+    def patch_snapshot(self, module):
+        profile = self
+        read_attribute = module.read_attribute
+
+        def watched_read_attribute(fd):
+            value = read_attribute(fd)
+
+            if profile.tick == 'sensor':
+                profile.first_tick('a SensorSnapshot read')
+
+            return value
+
+        module.read_attribute = watched_read_attribute
+
+    # The report
+
+    def first_tick(self, what):
+        if self.ticked:
+            return
+
+        self.ticked = True
+        self.report(time.perf_counter() - self.started, what)
+
+        if self.exit_at_tick:
+            sys.stderr.flush()
+            sys.stdout.flush()
+            os._exit(0)
+
+    def report(self, seconds, what):
+        interpreter = self.interpreter or 0.0
+        total = interpreter + seconds
+        imports = self.import_seconds()
+
+        if self.as_json:
+            print(json.dumps({
+                'script': os.path.basename(self.script),
+                'tick': what,
+                'ticked': self.ticked,
+                'total': total,
+                'interpreter': interpreter,
+                'imports': imports,
+                'devices': self.devices,
+                'device_seconds': self.device_seconds,
+                'slowest_imports': [(name, cumulative) for (depth, name, own, cumulative) in
+                                    sorted((i for i in self.imports if i[0] == 0), key=lambda i: -i[3])[:5]],
+            }), file=sys.stderr)
+            return
+
+        lines = [
+            "startprofile: %s first tick after %.1fms, %s" % (os.path.basename(self.script), 1000 * total, what),
+            "  interpreter %8.1fms" % (1000 * interpreter),
+            "  imports     %8.1fms" % (1000 * imports),
+            "  devices     %8.1fms  %d made" % (1000 * self.device_seconds, self.devices),
+            "  other       %8.1fms" % (1000 * (seconds - imports - self.device_seconds)),
+            "import time: self [us] | cumulative | imported package",
+        ]
+
+        for (depth, name, own, cumulative) in self.imports:
+            if cumulative >= self.min_seconds:
+                lines.append("import time: %9d | %10d | %s%s" % (1000000 * own, 1000000 * cumulative, '  ' * depth, name))
+
+        print('\n'.join(lines), file=sys.stderr)
+
+    def run(self, args):
+        self.interpreter = process_age()
+        self.started = time.perf_counter()
+        self.install_import_timer()
+        self.patch_modules()
+
+        sys.argv = [self.script] + list(args)
+        sys.path[0] = os.path.dirname(os.path.abspath(self.script))
+
+        try:
+            runpy.run_path(self.script, run_name='__main__')
+        finally:
+            if not self.ticked:
+                self.report(time.perf_counter() - self.started, 'no tick, the program finished')
+
+
+def absolute_name(name, globals, level):
+    """
+    The module a relative import of name imports
+    """
+    if not level or not globals:
+        return name
+
+    package = globals.get('__package__') or globals.get('__name__', '')
+    package = package.rsplit('.', level - 1)[0] if level > 1 else package
+    return '%s.%s' % (package, name) if name else package
+
+
+def device_name(device):
+    address = device.kwargs.get('address') or os.path.basename(device._path)
+    return '%s(%s)' % (type(device).__name__, address.split(':')[-1])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Profile how long a robot program takes to start')
+    parser.add_argument('--tick', choices=('sensor', 'command'), default='sensor',
+                        help='what counts as the first control tick, a sensor read or a motor command')
+    parser.add_argument('--exit-at-tick', action='store_true', help='stop the program at its first tick')
+    parser.add_argument('--min-ms', type=float, default=1.0, help='list imports that took at least this long')
+    parser.add_argument('--sys', help='the /sys/class tree to use')
+    parser.add_argument('--json', action='store_true', help='print the report as JSON')
+    parser.add_argument('script')
+    parser.add_argument('args', nargs=argparse.REMAINDER)
+    args = parser.parse_args()
+
+    StartProfile(args.script, tick=args.tick, sys_root=args.sys, exit_at_tick=args.exit_at_tick,
+                 min_seconds=args.min_ms / 1000.0, as_json=args.json).run(args.args)
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+
+"""
+A continuous tone whose pitch follows a sensor, for an instrument like
+El3ctricGuitar.
+
+Sound.tone() starts the beep program for every note and waits for it to
+finish, so the pitch can change only once per note and there is a gap
+between notes while the next beep starts. ToneSynth is an AudioStream
+(see clipcache.py): a thread that generates the tone one period at a time
+and writes it to one aplay that stays open, with the sound already queued
+in aplay as its ring buffer. glide_to() only sets the frequency the tone
+should move to, from any thread, and never blocks:
+
+    synth = ToneSynth()
+    synth.start()
+
+    while True:
+        synth.glide_to(440 + 10 * distance())   # or None for silence
+        sleep(0.01)
+
+The tone glides to a new frequency over about glide seconds without
+starting again, its phase carries on from one period to the next. It
+fades in and out over a period so starting and stopping do not click.
+
+changes are the last (called, heard) times of glide_to() calls and of
+when the tone was heard starting to move to their frequency: at the next
+period, after what was queued ahead of it. late counts the underruns, the
+periods written after aplay had run out of sound. A WavSink instead of
+aplay writes the tone to a WAV file, on a machine without a sound card.
+"""
+
+import math
+from array import array
+
+from clipcache import AudioStream
+from threadloop import clock
+
+# Keep this many changes
+CHANGES = 1000
+
+
+def wavetable(size, amplitude):
+    """
+    One cycle of a square wave's first two harmonics, the beep of Sound.tone()
+    without its harshness
+    """
+    wave = [math.sin(x) + math.sin(3 * x) / 3 for x in (2 * math.pi * i / size for i in range(size))]
+    peak = max(abs(value) for value in wave)
+    return [int(amplitude * value / peak) for value in wave]
+
+
+class ToneSynth(AudioStream):
+    TABLE_SIZE = 256
+
+    def __init__(self, sink=None, rate=16000, period=0.01, lead=0.03, glide=0.03, volume=50):
+        AudioStream.__init__(self, sink, rate, period, lead)
+        self.table = wavetable(self.TABLE_SIZE, 32767 * volume / 100.0)
+        self.glide_step = 1 - math.exp(-period / glide)
+        self.request = (None, None)
+        self.seen = self.request
+        self.frequency = None
+        self.phase = 0.0
+        self.amplitude = 0.0
+        self.changes = []
+
+    @property
+    def target(self):
+        return self.request[0]
+
+    def glide_to(self, frequency):
+        """
+        Move the tone to frequency in Hz, or fade it out if it is None
+        """
+        if frequency != self.request[0]:
+            self.request = (frequency, clock())
+
+    # The synthesizer thread
+
+    def next_period(self, frames, now, queued):
+        request = self.request
+
+        if request is not self.seen:
+            self.seen = request
+            self.changes.append((request[1], now + queued))
+
+            if len(self.changes) > CHANGES:
+                del self.changes[0]
+
+        (target, changed) = request
+        amplitude = 0.0 if target is None else 1.0
+
+        if amplitude == 0.0 and self.amplitude == 0.0:
+            self.frequency = None
+            return bytes(2 * frames)
+
+        if self.frequency is None:
+            self.frequency = target
+        elif target is not None:
+            self.frequency += (target - self.frequency) * self.glide_step
+
+        table = self.table
+        size = self.TABLE_SIZE
+        phase = self.phase
+        step = self.frequency * size / self.rate
+
+        if amplitude == self.amplitude:
+            samples = [table[int(phase + step * i) % size] for i in range(frames)]
+        else:
+            # Fade in or out over the period
+            start = self.amplitude
+            ramp = (amplitude - start) / frames
+            samples = [int(table[int(phase + step * i) % size] * (start + ramp * i)) for i in range(frames)]
+
+        self.phase = (phase + step * frames) % size
+        self.amplitude = amplitude
+        return bytes(array('h', samples))
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+
+"""
+The background thread shared by ClipCache's mixer, ToneSynth and
+LedAnimator: one thread, started with _thread so it runs under
+micropython too, that runs loop() from start() until close().
+
+    class Blinker(ThreadLoop):
+
+        def loop(self):
+            while self.running:
+                ...
+                self.sleep(until)           # or until wake()
+
+wake() cuts the thread's sleep short, close() wakes it and waits for
+loop() to return. An exception out of loop() is logged and stops the
+thread.
+"""
+
+import _thread
+import logging
+import time
+
+log = logging.getLogger(__name__)
+
+
+def clock():
+    return time.monotonic() if hasattr(time, 'monotonic') else time.time()
+
+
+class ThreadLoop(object):
+
+    def __init__(self):
+        self.running = False
+        self.stopped = None
+        self.awake = _thread.allocate_lock()
+        self.awake.acquire()
+
+    def start(self):
+        if self.running:
+            return
+
+        self.running = True
+        self.stopped = _thread.allocate_lock()
+        self.stopped.acquire()
+        _thread.start_new_thread(self.run, ())
+
+    def close(self):
+        """
+        Stop the thread, once loop() has returned
+        """
+        if self.stopped is None:
+            return
+
+        self.running = False
+        self.wake()
+        self.stopped.acquire()
+        self.stopped = None
+
+    def wake(self):
+        try:
+            self.awake.release()
+        except RuntimeError:
+            # Already woken
+            pass
+
+    def sleep(self, until, step):
+        """
+        Until clock() reaches until, None for ever, or wake(), checking
+        for a wake() every step seconds: micropython's locks cannot be
+        acquired with a timeout
+        """
+        while self.running and not self.awake.acquire(False):
+            delay = step if until is None else until - clock()
+
+            if delay <= 0:
+                return
+
+            time.sleep(min(delay, step))
+
+    def loop(self):
+        raise NotImplementedError()
+
+    def run(self):
+        try:
+            self.loop()
+        except Exception as e:
+            log.exception(e)
+            self.running = False
+        finally:
+            self.stopped.release()
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+
+"""
+Read a trace written by TraceRecorder (tracerecorder.py) and print it as
+CSV, with the wall clock time of each sample in the first column.
+
+    $ ./traceread.py dinor3x.trace > dinor3x.csv
+    $ ./traceread.py --summary dinor3x.trace
+
+or from Python, with NumPy for to_numpy():
+
+    trace = load('dinor3x.trace')
+    columns = trace.to_numpy()
+    columns['time'], columns['color']
+"""
+
+import argparse
+import csv
+import struct
+import sys
+from array import array
+
+from tracerecorder import HEADER, MAGIC, VERSION
+
+
+class Trace(object):
+    """
+    times is the wall clock time of each sample, values one int per
+    channel per sample, a row after the other
+    """
+
+    def __init__(self, names, times, values):
+        self.names = names
+        self.times = times
+        self.values = values
+
+    def __len__(self):
+        return len(self.times)
+
+    def rows(self):
+        width = len(self.names)
+
+        for (n, t) in enumerate(self.times):
+            yield (t,) + tuple(self.values[n * width:(n + 1) * width])
+
+    def column(self, name):
+        width = len(self.names)
+        return self.values[self.names.index(name)::width]
+
+    def to_numpy(self):
+        """
+        Returns {'time': float64 array, name: int32 array, ...}
+        """
+        import numpy as np
+
+        width = len(self.names)
+        values = np.frombuffer(self.values, dtype=np.int32).reshape(len(self), width)
+        columns = {'time': np.array(self.times)}
+
+        for (n, name) in enumerate(self.names):
+            columns[name] = values[:, n]
+
+        return columns
+
+    def write_csv(self, fh):
+        writer = csv.writer(fh)
+        writer.writerow(['time'] + self.names)
+
+        for row in self.rows():
+            writer.writerow(('%.6f' % row[0],) + row[1:])
+
+
+def load(path):
+    with open(path, 'rb') as fh:
+        data = fh.read()
+
+    (magic, version, order, width, count, since_last, flushed, names_length) = struct.unpack_from(HEADER, data)
+
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("%s is not a version %d trace" % (path, VERSION))
+
+    offset = struct.calcsize(HEADER)
+    names = data[offset:offset + names_length].decode().split(',') if names_length else []
+    offset += names_length
+
+    deltas = array('I')
+    deltas.frombytes(data[offset:offset + 4 * count])
+    offset += 4 * count
+    values = array('i')
+    values.frombytes(data[offset:offset + 4 * count * width])
+
+    if (order == 0) != (sys.byteorder == 'little'):
+        deltas.byteswap()
+        values.byteswap()
+
+    # Count back from the flush, the first delta is from a sample that
+    # is no longer in the trace
+    times = [0.0] * count
+    t = flushed - since_last / 1000000.0
+
+    for n in range(count - 1, -1, -1):
+        times[n] = t
+        t -= deltas[n] / 1000000.0
+
+    return Trace(names, times, values)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Print a robot trace as CSV')
+    parser.add_argument('trace')
+    parser.add_argument('--summary', action='store_true', help='print the rate and range of each channel instead')
+    args = parser.parse_args()
+
+    trace = load(args.trace)
+
+    if not args.summary:
+        trace.write_csv(sys.stdout)
+
+    elif len(trace):
+        seconds = trace.times[-1] - trace.times[0]
+        print("%d samples over %.1fs, %.1f per second" % (len(trace), seconds, (len(trace) - 1) / seconds if seconds else 0))
+
+        for name in trace.names:
+            column = trace.column(name)
+            print("  %-16s min %8d  max %8d" % (name, min(column), max(column)))
+    else:
+        print("no samples")
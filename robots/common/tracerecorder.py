@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+
+"""
+Record what a robot's sensors and motors read, every pass of its main
+loop, cheaply enough to leave on.
+
+The channels are sysfs attributes, read the way SensorSnapshot reads them
+through files kept open. Each sample is stored in a ring buffer allocated
+up front, an array of the microseconds since the sample before and an
+array of int32 values, so recording never allocates and the newest
+capacity samples are kept. flush() writes them to a file, oldest first,
+any time it is called, and close() does it one last time.
+
+    trace = TraceRecorder('dinor3x.trace')
+    trace.add('color', color_sensor, 'value0')
+    trace.add('left_position', left_motor, 'position')
+
+    try:
+        while True:
+            trace.sample()
+            ...
+    finally:
+        trace.close()
+
+for_devices() makes one from a list of channels, or None without a path,
+for a robot that records only when it is given a trace file:
+
+    self.trace = TraceRecorder.for_devices(trace_file, [
+        ('color', self.color_sensor, 'value0'),
+        ('left_position', self.left_motor, 'position'),
+    ])
+
+Works under micropython, on its ticks_us clock. traceread.py turns a
+trace into CSV or NumPy arrays on a PC.
+
+The file is a header, the channel names separated by commas, the time
+deltas (uint32) and the values (int32, one row of channels per sample):
+
+    magic b'EV3T', uint8 version, uint8 byte order (0 little, 1 big),
+    uint16 channels, uint32 samples, uint32 microseconds from the last
+    sample to the flush, float64 wall clock time of the flush,
+    uint16 length of the names
+"""
+
+import struct
+import sys
+import time
+from array import array
+
+from sensorsnapshot import open_attribute, read_attribute, close_attribute
+
+MAGIC = b'EV3T'
+VERSION = 1
+HEADER = '<4sBBHIIdH'
+
+if hasattr(time, 'ticks_us'):
+    ticks_us = time.ticks_us
+    ticks_diff = time.ticks_diff
+
+else:
+
+    def ticks_us():
+        return int(time.perf_counter() * 1000000)
+
+    def ticks_diff(end, start):
+        return end - start
+
+
+class TraceRecorder(object):
+    """
+    Keeps the last capacity samples of the channels added. samples counts
+    every sample taken, including the ones overwritten since.
+    """
+
+    def __init__(self, path=None, capacity=4096):
+        self.path = path
+        self.capacity = capacity
+        self.names = []
+        self.sources = []
+        self.deltas = None
+        self.values = None
+        self.samples = 0
+        self.last = None
+
+    @classmethod
+    def for_devices(cls, path, channels, capacity=4096):
+        """
+        A recorder of channels, (name, device, attribute) each, written to
+        path, or None if path is empty
+        """
+        if not path:
+            return None
+
+        trace = cls(path, capacity)
+
+        for (name, device, attribute) in channels:
+            trace.add(name, device, attribute)
+
+        return trace
+
+    def add(self, name, device, attribute):
+        """
+        Record device's attribute as name, it must read as an integer
+        """
+        if self.values is not None:
+            raise ValueError("add %s before the first sample" % name)
+
+        self.names.append(name)
+        self.sources.append(open_attribute(device._path + '/' + attribute))
+
+    def start(self):
+        self.deltas = array('I', bytes(4 * self.capacity))
+        self.values = array('i', bytes(4 * self.capacity * len(self.sources)))
+        self.last = ticks_us()
+
+    def sample(self):
+        if self.values is None:
+            self.start()
+
+        now = ticks_us()
+        slot = self.samples % self.capacity
+        self.deltas[slot] = ticks_diff(now, self.last)
+        self.last = now
+
+        values = self.values
+        i = slot * len(self.sources)
+
+        for source in self.sources:
+            values[i] = int(read_attribute(source))
+            i += 1
+
+        self.samples += 1
+
+    def flush(self, path=None):
+        """
+        Write the samples in the ring buffer to path, or the path given
+        when the recorder was made. Returns the number written.
+        """
+        path = path or self.path
+        count = min(self.samples, self.capacity)
+        width = len(self.names)
+        names = ','.join(self.names).encode()
+        since_last = ticks_diff(ticks_us(), self.last) if count else 0
+
+        # The oldest sample is in the next slot once the ring has wrapped
+        first = self.samples % self.capacity if self.samples > self.capacity else 0
+
+        with open(path, 'wb') as fh:
+            fh.write(struct.pack(HEADER, MAGIC, VERSION, 0 if sys.byteorder == 'little' else 1,
+                                  width, count, since_last, time.time(), len(names)))
+            fh.write(names)
+
+            if count:
+                deltas = memoryview(self.deltas)
+                values = memoryview(self.values)
+                fh.write(deltas[first:count])
+                fh.write(deltas[:first])
+                fh.write(values[first * width:count * width])
+                fh.write(values[:first * width])
+
+        return count
+
+    def close(self):
+        if self.path and self.samples:
+            self.flush()
+
+        for source in self.sources:
+            close_attribute(source)
+
+        self.sources = []
@@ -0,0 +1,322 @@
+#!/usr/bin/env python3
+
+"""
+Measure console_menu's CPU while it waits for a button and how long after
+a button is released the menu shows it, reading buttons as it used to and
+from their input device. Needs python-evdev and a writable /dev/uinput on
+a Linux PC, no EV3:
+
+    $ sudo modprobe uinput
+    $ sudo ./bench_console_menu.py
+    $ sudo ./bench_console_menu.py --presses 200 --idle 10
+    $ ./bench_console_menu.py --fifo
+
+A virtual input device with the EV3's six buttons stands in for the
+brick's. Where there is no uinput, --fifo writes the same key events to a
+named pipe instead: menu() reads it as it would the device, and the old
+loop reads whatever events are waiting once per poll, in place of the
+EVIOCGKEY ioctl a pipe does not have, and blocks in select() for the
+release as ButtonEVIO does in read_loop(). Each variant runs menu() in a
+child process, printing to a pipe instead of the LCD:
+
+- "poll" is the menu as it was: buttons_pressed read over and over, the
+  console cleared and every choice drawn again after each press.
+- "events" is menu() now, sleeping in poll() on the input device and only
+  drawing the choices whose highlight changed.
+
+Idle is the child's CPU, as a share of one core, over --idle seconds with
+no button pressed. The latency is from releasing a button, up and right in
+turn so the highlight moves every time, until the child has written the
+choice in inverse. "bytes" is what it wrote to the console per press.
+
+With --fifo, the defaults, on a one core Xeon VM with no uinput (not yet
+run on a brick):
+
+             idle cpu   p50 ms   p95 ms   max ms    bytes
+        poll    96.8%     0.27     1.54     7.38       42
+      events     0.0%     0.26     0.34     0.74       26
+
+The old loop spins a whole core while nothing happens, and has that core
+to itself here, so it sees a release as soon as menu() does; its tail is
+when the bench's own thread has to wait for it. On the brick's one slow
+core the spinning is taken from whatever else is running.
+"""
+
+import argparse
+import os
+import select
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from ev3dev2.console import Console
+
+import console_menu
+
+KEYS = {'up': 103, 'right': 106}
+INVERSE = '\x1b[7m'
+
+
+class PipeConsole(Console):
+    """
+    The EV3 LCD's 14 columns and 5 rows, printed to stdout, without setfont or stty
+    """
+
+    def __init__(self):
+        self._font = None
+        self._columns = 14
+        self._rows = 5
+        self._echo = False
+        self._cursor = False
+
+
+class FifoButtons(object):
+    """
+    ButtonEVIO for the old loop on a named pipe of key events
+    """
+
+    def __init__(self, path):
+        self.fd = os.open(path, os.O_RDONLY | os.O_NONBLOCK)
+        self.pressed = []
+
+    def read_events(self):
+        try:
+            data = os.read(self.fd, 16 * console_menu.EVENT_SIZE)
+        except BlockingIOError:
+            return
+
+        for offset in range(0, len(data) - console_menu.EVENT_SIZE + 1, console_menu.EVENT_SIZE):
+            (_, _, kind, code, value) = struct.unpack(console_menu.EVENT_FORMAT,
+                                                      data[offset:offset + console_menu.EVENT_SIZE])
+
+            if kind == console_menu.EV_KEY and code in console_menu.BUTTON_NAMES:
+                name = console_menu.BUTTON_NAMES[code]
+
+                if value == 1 and name not in self.pressed:
+                    self.pressed.append(name)
+                elif value == 0 and name in self.pressed:
+                    self.pressed.remove(name)
+
+    @property
+    def buttons_pressed(self):
+        self.read_events()
+        return list(self.pressed)
+
+    def wait_for_released(self, name):
+        while name in self.buttons_pressed:
+            select.select([self.fd], [], [])
+
+        return True
+
+
+def poll_menu(choices, device, fifo=False):
+    """
+    menu() before it read the input device: busy polling and a full redraw
+    """
+    from ev3dev2.button import ButtonEVIO
+
+    class Buttons(ButtonEVIO):
+        _buttons = dict((name, {'name': device, 'value': code}) for (code, name) in console_menu.BUTTON_NAMES.items())
+        evdev_device_name = 'EV3 Brick Buttons'
+
+    console = PipeConsole()
+    button = FifoButtons(device) if fifo else Buttons()
+    positions = console_menu.get_positions(console)
+    last = None
+
+    while True:
+        console.reset_console()
+        for btn, (name, _) in choices.items():
+            align, col, row = positions[btn]
+            console.text_at(name, col, row, inverse=(btn == last), alignment=align)
+        console_menu.flush()
+
+        pressed = None
+        while True:
+            allpressed = button.buttons_pressed
+            if bool(allpressed):
+                pressed = allpressed[0]
+                while not button.wait_for_released(pressed):
+                    pass
+                break
+
+        if pressed in choices:
+            last = pressed
+
+
+def child(variant, device, fifo):
+    console_menu.Console = PipeConsole
+    choices = {'up': ('MI1', lambda: None), 'right': ('MI2', lambda: None), 'enter': ('CAL', lambda: None)}
+
+    if variant == 'poll':
+        poll_menu(choices, device, fifo)
+    else:
+        console_menu.menu(choices, buttons=console_menu.ButtonEvents(device))
+
+
+class UinputKeys(object):
+    """
+    Presses keys on a virtual input device
+    """
+
+    def __init__(self):
+        from evdev import UInput, ecodes
+        self.ecodes = ecodes
+        self.ui = UInput({ecodes.EV_KEY: sorted(console_menu.BUTTON_NAMES)}, name='EV3 Brick Buttons')
+        self.path = self.ui.device.path
+
+        # Give udev time to make the device node readable
+        time.sleep(0.5)
+
+    def connect(self):
+        pass
+
+    def key(self, code, value):
+        self.ui.write(self.ecodes.EV_KEY, code, value)
+        self.ui.syn()
+
+    def close(self):
+        self.ui.close()
+
+
+class FifoKeys(object):
+    """
+    Writes key events, each a struct input_event and an EV_SYN, to a
+    named pipe
+    """
+
+    def __init__(self):
+        self.folder = tempfile.mkdtemp()
+        self.path = os.path.join(self.folder, 'buttons')
+        os.mkfifo(self.path)
+        self.fd = None
+
+    def connect(self):
+        # Blocks until the first child opens the pipe to read it
+        if self.fd is None:
+            self.fd = os.open(self.path, os.O_WRONLY)
+
+    def key(self, code, value):
+        now = time.time()
+        (seconds, us) = (int(now), int(now % 1 * 1000000))
+        os.write(self.fd, struct.pack(console_menu.EVENT_FORMAT, seconds, us, console_menu.EV_KEY, code, value) +
+                 struct.pack(console_menu.EVENT_FORMAT, seconds, us, 0, 0, 0))
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+
+        os.unlink(self.path)
+        os.rmdir(self.folder)
+
+
+class Screen(threading.Thread):
+    """
+    Reads what the child writes to the console, shown is when a choice
+    was last written in inverse
+    """
+
+    def __init__(self, fd):
+        threading.Thread.__init__(self, daemon=True)
+        self.fd = fd
+        self.written = 0
+        self.shown = threading.Event()
+        self.when = None
+
+    def run(self):
+        while True:
+            data = os.read(self.fd, 65536)
+
+            if not data:
+                return
+
+            self.written += len(data)
+
+            if INVERSE.encode() in data:
+                self.when = time.monotonic()
+                self.shown.set()
+
+
+def cpu_seconds(pid):
+    with open('/proc/%d/stat' % pid) as fh:
+        fields = fh.read().rsplit(')', 1)[1].split()
+
+    return (int(fields[11]) + int(fields[12])) / float(os.sysconf('SC_CLK_TCK'))
+
+
+def measure(variant, keys, idle, presses):
+    """
+    Returns (idle CPU share, latencies, bytes written per press)
+    """
+    command = [sys.executable, os.path.abspath(__file__), '--child', variant, '--device', keys.path]
+
+    if isinstance(keys, FifoKeys):
+        command.append('--fifo')
+
+    process = subprocess.Popen(command, stdout=subprocess.PIPE)
+    screen = Screen(process.stdout.fileno())
+    screen.start()
+
+    try:
+        keys.connect()
+        time.sleep(1.0)
+        start = (time.monotonic(), cpu_seconds(process.pid))
+        time.sleep(idle)
+        cpu = (cpu_seconds(process.pid) - start[1]) / (time.monotonic() - start[0])
+
+        latencies = []
+        written = screen.written
+
+        for i in range(presses):
+            key = KEYS['up' if i % 2 == 0 else 'right']
+            screen.shown.clear()
+            keys.key(key, 1)
+            time.sleep(0.02)
+            released = time.monotonic()
+            keys.key(key, 0)
+
+            if not screen.shown.wait(5):
+                raise ValueError("%s never showed the press" % variant)
+
+            latencies.append(screen.when - released)
+            time.sleep(0.05)
+
+        return (cpu, latencies, (screen.written - written) / float(presses))
+    finally:
+        process.kill()
+        process.wait()
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Measure console_menu's idle CPU and button latency")
+    parser.add_argument('--idle', type=float, default=5.0, help='seconds to measure the idle CPU over')
+    parser.add_argument('--presses', type=int, default=100)
+    parser.add_argument('--fifo', action='store_true', help='press the buttons through a named pipe, without uinput')
+    parser.add_argument('--child', choices=('poll', 'events'), help=argparse.SUPPRESS)
+    parser.add_argument('--device', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child, args.device, args.fifo)
+        sys.exit(0)
+
+    keys = FifoKeys() if args.fifo else UinputKeys()
+
+    try:
+        print("%8s %8s %8s %8s %8s %8s" % ('', 'idle cpu', 'p50 ms', 'p95 ms', 'max ms', 'bytes'))
+
+        for variant in ('poll', 'events'):
+            (cpu, latencies, written) = measure(variant, keys, args.idle, args.presses)
+            print("%8s %7.1f%% %8.2f %8.2f %8.2f %8.0f" % (
+                variant, 100 * cpu, 1000 * percentile(latencies, 0.5), 1000 * percentile(latencies, 0.95),
+                1000 * max(latencies), written))
+    finally:
+        keys.close()
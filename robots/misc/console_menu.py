@@ -1,8 +1,10 @@
 #!/usr/bin/env micropython
-from time import sleep
-from sys import stderr
+import select
+import struct
+from time import sleep, time
+from sys import stderr, stdout
 from os import listdir
-from ev3dev2.button import Button
+from ev3dev2.button import BUTTONS_FILENAME
 from ev3dev2.console import Console
 from ev3dev2.led import Leds
 from ev3dev2.sensor import list_sensors, INPUT_1, INPUT_2, INPUT_3, INPUT_4
@@ -11,9 +13,62 @@ from ev3dev2.sensor import list_sensors, INPUT_1, INPUT_2, INPUT_3, INPUT_4
 """
 Used to create a console menu for switching between programs quickly
 without having to return to Brickman to find and launch a program.
-Demonstrates the EV3DEV2 Console(), Led(), and Button() classes.
+Demonstrates the EV3DEV2 Console() and Led() classes, and reading the
+EV3 buttons from their input device.
 """
 
+# struct input_event from linux/input.h: the time, type, code and value
+EVENT_FORMAT = "llHHi"
+EVENT_SIZE = struct.calcsize(EVENT_FORMAT)
+EV_KEY = 1
+
+BUTTON_NAMES = {
+    103: "up",
+    108: "down",
+    105: "left",
+    106: "right",
+    28: "enter",
+    14: "backspace",
+}
+
+
+class ButtonEvents(object):
+    """
+    The EV3 buttons as the key events of their input device. wait() sleeps
+    in poll() until a button is pressed or released, rather than reading
+    their state over and over.
+    Parameter:
+    - `path` (str): the input device, the EV3 buttons by default
+    """
+
+    def __init__(self, path=BUTTONS_FILENAME):
+        self.device = open(path, "rb", 0)
+        self.poller = select.poll()
+        self.poller.register(self.device.fileno(), select.POLLIN)
+
+    def close(self):
+        self.device.close()
+
+    def wait(self, timeout=None):
+        """
+        Wait up to `timeout` seconds, for ever if None, for buttons to change.
+        returns a list of (button-name, pressed) tuples, empty if none changed
+        """
+        if not self.poller.poll(-1 if timeout is None else max(0, int(1000 * timeout))):
+            return []
+
+        data = self.device.read(16 * EVENT_SIZE)
+        changes = []
+
+        for offset in range(0, len(data) - EVENT_SIZE + 1, EVENT_SIZE):
+            (_, _, kind, code, value) = struct.unpack(EVENT_FORMAT, data[offset:offset + EVENT_SIZE])
+
+            # value 2 is the key repeating while it is held down
+            if kind == EV_KEY and code in BUTTON_NAMES and value in (0, 1):
+                changes.append((BUTTON_NAMES[code], bool(value)))
+
+        return changes
+
 
 def get_positions(console):
     """
@@ -36,25 +91,58 @@ def get_positions(console):
     }
 
 
-def wait_for_button_press(button):
+def wait_for_button_press(buttons, timeout=None):
     """
     Wait for a button to be pressed and released.
-    Parameter:
-    - `button` (Button): an instance of the EV3 Button() class
-    return the Button name that was pressed.
+    Parameters:
+    - `buttons` (ButtonEvents): the EV3 buttons
+    - `timeout` seconds to wait for a press, for ever if None
+    return the Button name that was pressed, None if none was within `timeout`.
     """
     pressed = None
+    deadline = None if timeout is None else time() + timeout
     while True:
-        allpressed = button.buttons_pressed
-        if bool(allpressed):
-            pressed = allpressed[0]  # just get the first one
-            while not button.wait_for_released(pressed):
-                pass
-            break
-    return pressed
+        if pressed is None and deadline is not None:
+            remaining = deadline - time()
+            if remaining <= 0:
+                return None
+        else:
+            remaining = None  # once pressed, wait for the release
 
+        for name, down in buttons.wait(remaining):
+            if down and pressed is None:
+                pressed = name  # just get the first one
+            elif not down and name == pressed:
+                return pressed
 
-def menu(choices, before_run_function=None, after_run_function=None):
+
+def show_choice(console, positions, choices, btn, inverse):
+    """
+    Draw one choice at its position, in inverse if it is highlighted.
+    """
+    name, _ = choices[btn]
+    align, col, row = positions[btn]
+    console.text_at(name, col, row, inverse=inverse, alignment=align)
+
+
+def show_menu(console, positions, choices, last):
+    """
+    Clear the console and draw every choice, the last choice in inverse.
+    """
+    console.reset_console()
+    for btn in choices:
+        show_choice(console, positions, choices, btn, btn == last)
+    flush()
+
+
+def flush():
+    # Console prints without a newline, so nothing shows until the output is flushed
+    if hasattr(stdout, "flush"):
+        stdout.flush()
+
+
+def menu(choices, before_run_function=None, after_run_function=None,
+         timeout=None, idle_function=None, buttons=None):
     """
     Console Menu that accepts choices and corresponding functions to call.
     The user must press the same button twice: once to see their choice highlited,
@@ -76,11 +164,20 @@ def menu(choices, before_run_function=None, after_run_function=None):
         note don't call them with parentheses, unless preceded by lambda: to defer the call
     - `before_run_function` when not None, call this function before each mission run, passed with mission-name
     - `after_run_function` when not None, call this function after each mission run, passed with mission-name
+    - `timeout` when not None, call `idle_function` every `timeout` seconds no button is pressed
+    - `idle_function` returns the button-name of a mission to run straight away, or None to keep waiting,
+        so missions can be started by something other than the buttons
+    - `buttons` the ButtonEvents to read, left open for the caller to close; by default the EV3
+        buttons, closed when the menu returns
+    The menu sleeps until a button changes or `timeout` is up, and only redraws the choices whose
+    highlight changed.
     """
 
     console = Console()
     leds = Leds()
-    button = Button()
+    opened = buttons is None
+    if opened:
+        buttons = ButtonEvents()
 
     leds.all_off()
     leds.set_color("LEFT", "GREEN")
@@ -89,41 +186,54 @@ def menu(choices, before_run_function=None, after_run_function=None):
 
     last = None  # the last choice--initialize to None
 
-    while True:
-        # display the menu of choices, but show the last choice in inverse
-        console.reset_console()
-        for btn, (name, _) in choices.items():
-            align, col, row = menu_positions[btn]
-            console.text_at(name, col, row, inverse=(btn == last), alignment=align)
-
-        pressed = wait_for_button_press(button)
-
-        # get the choice for the button pressed
-        if pressed in choices:
-            if last == pressed:   # was same button pressed?
-                console.reset_console()
-                leds.set_color("LEFT", "RED")
-                leds.set_color("RIGHT", "RED")
-
-                # call the user's subroutine to run the mission, but catch any errors
-                try:
-                    name, mission_function = choices[pressed]
-                    if before_run_function is not None:
-                        before_run_function(name)
-                    mission_function()
-                except Exception as ex:
-                    print("**** Exception when running")
-                    print(ex)
-                finally:
-                    if after_run_function is not None:
-                        after_run_function(name)
-                    last = None
-                    leds.set_color("LEFT", "GREEN")
-                    leds.set_color("RIGHT", "GREEN")
-            else:   # different button pressed
+    # display the menu of choices
+    show_menu(console, menu_positions, choices, last)
+
+    try:
+        while True:
+            pressed = wait_for_button_press(buttons, timeout)
+
+            if pressed is None:
+                # let something else start a mission, as if its button was pressed twice
+                pressed = idle_function() if idle_function is not None else None
+                if pressed not in choices:
+                    continue
                 last = pressed
-                leds.set_color("LEFT", "AMBER")
-                leds.set_color("RIGHT", "AMBER")
+
+            # get the choice for the button pressed
+            if pressed in choices:
+                if last == pressed:   # was same button pressed?
+                    console.reset_console()
+                    leds.set_color("LEFT", "RED")
+                    leds.set_color("RIGHT", "RED")
+
+                    # call the user's subroutine to run the mission, but catch any errors
+                    try:
+                        name, mission_function = choices[pressed]
+                        if before_run_function is not None:
+                            before_run_function(name)
+                        mission_function()
+                    except Exception as ex:
+                        print("**** Exception when running")
+                        print(ex)
+                    finally:
+                        if after_run_function is not None:
+                            after_run_function(name)
+                        last = None
+                        leds.set_color("LEFT", "GREEN")
+                        leds.set_color("RIGHT", "GREEN")
+                        show_menu(console, menu_positions, choices, last)
+                else:   # different button pressed, show it in inverse instead of the last choice
+                    if last is not None:
+                        show_choice(console, menu_positions, choices, last, False)
+                    show_choice(console, menu_positions, choices, pressed, True)
+                    flush()
+                    last = pressed
+                    leds.set_color("LEFT", "AMBER")
+                    leds.set_color("RIGHT", "AMBER")
+    finally:
+        if opened:
+            buttons.close()
 
 
 if __name__ == "__main__":
@@ -26,57 +26,69 @@
 """ This demo illustrates how to use the two red-green LEDs of the EV3 brick.
 """
 
-import time
 import math
+import os
+import sys
 
-from ev3dev.ev3 import Leds
+from ev3dev2.led import Leds
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'common'))
+from ledanimator import LedAnimator
 
 print(__doc__.lstrip())
 
+leds = Leds()
+
+# The animations are worked out before they play, and played by a thread
+# that writes only the LEDs that change
+animator = LedAnimator(leds)
+
+
+def off(seconds):
+    return animator.keyframes('off', ('LEFT', 'RIGHT'), ('BLACK',), seconds)
+
+
+def lit(i):
+    # One LED at a time, 0.5s each
+    return lambda t: 1.0 if int(t / 0.5 + 1e-6) % 4 == i else 0.0
+
+
+# continuous mix of colors, 10 degrees every 50ms
+fade = {
+    'red_left': lambda t: .5 * (1 + math.cos(math.radians(200 * t))),
+    'green_left': lambda t: .5 * (1 + math.sin(math.radians(200 * t))),
+    'red_right': lambda t: .5 * (1 + math.sin(math.radians(200 * t))),
+    'green_right': lambda t: .5 * (1 + math.cos(math.radians(200 * t))),
+}
+
+show = [
+    (None, off(1)),
+    ('traffic light', animator.cycle(('GREEN', 'YELLOW', 'RED'), duration=4.5)),
+    (None, off(0.5)),
+    ('side to side', animator.wave('side to side', dict(
+        (name, lit(i)) for (i, name) in enumerate(('red_left', 'red_right', 'green_left', 'green_right'))),
+        seconds=2, loops=3)),
+    (None, off(0.5)),
+    ('colors fade', animator.wave('colors fade', fade, seconds=1.8, loops=10)),
+    (None, off(0.5)),
+]
+
 print('saving current LEDs state')
 
 # save current state
-saved_state = [led.brightness_pct for led in Leds.LEFT + Leds.RIGHT]
-
-Leds.all_off()
-time.sleep(1)
-
-# cycle LEDs like a traffic light
-print('traffic light')
-for _ in range(3):
-    for color in (Leds.GREEN, Leds.YELLOW, Leds.RED):
-        for group in (Leds.LEFT, Leds.RIGHT):
-            Leds.set_color(group, color)
-        time.sleep(0.5)
-
-Leds.all_off()
-time.sleep(0.5)
-
-# blink LEDs from side to side now
-print('side to side')
-for _ in range(3):
-    for led in (Leds.red_left, Leds.red_right, Leds.green_left, Leds.green_right):
-        led.brightness_pct = 100
-        time.sleep(0.5)
-        led.brightness_pct = 0
-
-Leds.all_off()
-time.sleep(0.5)
-
-# continuous mix of colors
-print('colors fade')
-for i in range(360):
-    rd = math.radians(10 * i)
-    Leds.red_left.brightness_pct = .5 * (1 + math.cos(rd))
-    Leds.green_left.brightness_pct = .5 * (1 + math.sin(rd))
-    Leds.red_right.brightness_pct = .5 * (1 + math.sin(rd))
-    Leds.green_right.brightness_pct = .5 * (1 + math.cos(rd))
-    time.sleep(0.05)
-
-Leds.all_off()
-time.sleep(0.5)
+saved_state = [(led, led.brightness) for led in leds.leds.values()]
 
-print('restoring initial LEDs state')
-for led, level in zip(Leds.RIGHT + Leds.LEFT, saved_state) :
-    led.brightness_pct = level
+animator.start()
 
+try:
+    for (title, animation) in show:
+        if title:
+            print(title)
+
+        animator.play(animation).wait()
+finally:
+    animator.close()
+
+print('restoring initial LEDs state')
+for led, level in saved_state:
+    led.brightness = level
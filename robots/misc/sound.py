@@ -28,20 +28,16 @@
 
 from textwrap import dedent
 import os
+import sys
 
 from ev3dev2.sound import Sound
 
 _HERE = os.path.dirname(__file__)
 
-print(dedent("""
-    A long time ago
-    in a galaxy far,
-    far away...
-"""))
-
-speaker = Sound()
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'common'))
+from songcache import SongCache
 
-speaker.play_song((
+STAR_WARS = (
     ('D4', 'e3'),
     ('D4', 'e3'),
     ('D4', 'e3'),
@@ -61,7 +57,19 @@ speaker.play_song((
     ('B4', 'e3'),
     ('C5', 'e3'),
     ('A4', 'h.'),
-))
+)
+
+print(dedent("""
+    A long time ago
+    in a galaxy far,
+    far away...
+"""))
+
+speaker = Sound()
+
+# The whole song in one beep, instead of play_song()'s one per note
+songs = SongCache(speaker)
+songs.play(STAR_WARS)
 
 speaker.play_file(os.path.join(_HERE, 'snd/r2d2.wav'))
 